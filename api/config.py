@@ -1,19 +1,37 @@
 import os
 from datetime import timedelta
+from urllib.parse import urlparse
+
+from dotenv import load_dotenv
+
+# Settings may come from api/.env (see env.example); variables already set take precedence
+load_dotenv()
 
 # Environment-based configuration
 class Config:
-    # Test mode - uses local _data files instead of GitHub
-    TEST_MODE = os.getenv('TEST_MODE', 'false').lower() == 'true'
-    
     # Passthrough mode - bypasses cache and fetches directly from GitHub
     PASSTHROUGH_MODE = os.getenv('PASSTHROUGH_MODE', 'false').lower() == 'true'
     
+    # Test mode - uses local _data files instead of GitHub. The default unless PASSTHROUGH_MODE is set,
+    # since GitHub is read-only: cached GitHub mode needs TEST_MODE=false
+    TEST_MODE = os.getenv('TEST_MODE', 'false' if PASSTHROUGH_MODE else 'true').lower() == 'true'
+    
     # S3 mode - uses S3 bucket instead of GitHub or local files
     S3_MODE = os.getenv('S3_MODE', 'false').lower() == 'true'
     
     # GitHub configuration (only used when not in test mode or S3 mode)
     GITHUB_RAW_BASE_URL = os.getenv('GITHUB_RAW_BASE_URL', 'https://raw.githubusercontent.com/awales0177/test_data/main')
+    # GitHub sync: 'raw' downloads each file from GITHUB_RAW_BASE_URL; 'archive' resolves GITHUB_BRANCH to a commit,
+    # downloads that commit's tarball from GITHUB_API_URL into GITHUB_ARCHIVE_DIR and serves every file pinned to it.
+    # Repository, branch and data directory default to the ones in GITHUB_RAW_BASE_URL (owner/repo/branch/path)
+    GITHUB_SYNC = os.getenv('GITHUB_SYNC', 'raw').lower()
+    _GITHUB_RAW_PATH = urlparse(GITHUB_RAW_BASE_URL).path.strip('/').split('/')
+    GITHUB_REPO = os.getenv('GITHUB_REPO', '/'.join(_GITHUB_RAW_PATH[:2]))
+    GITHUB_BRANCH = os.getenv('GITHUB_BRANCH', _GITHUB_RAW_PATH[2] if len(_GITHUB_RAW_PATH) > 2 else 'main')
+    GITHUB_DATA_PATH = os.getenv('GITHUB_DATA_PATH', '/'.join(_GITHUB_RAW_PATH[3:]))
+    GITHUB_API_URL = os.getenv('GITHUB_API_URL', 'https://api.github.com')
+    GITHUB_TOKEN = os.getenv('GITHUB_TOKEN', '')
+    GITHUB_ARCHIVE_DIR = os.getenv('GITHUB_ARCHIVE_DIR', os.path.join('.catalog_cache', 'archive'))
     
     # S3 configuration
     S3_BUCKET_NAME = os.getenv('S3_BUCKET_NAME')
@@ -21,9 +39,86 @@ class Config:
     AWS_ACCESS_KEY_ID = os.getenv('AWS_ACCESS_KEY_ID')
     AWS_SECRET_ACCESS_KEY = os.getenv('AWS_SECRET_ACCESS_KEY')
     
+    # Storage engine for _data documents: 'json' (one file per collection), 'sqlite' (one row per entity),
+    # 'sharded' (one file per entity for STORAGE_SHARDED_FILES) or 'journal' (write-ahead journal of JSON patches)
+    STORAGE_ENGINE = os.getenv('STORAGE_ENGINE', 'json').lower()
+    STORAGE_SQLITE_PATH = os.getenv('STORAGE_SQLITE_PATH', os.path.join('_data', 'catalog.db'))
+    STORAGE_SHARDED_FILES = [f.strip() for f in os.getenv(
+        'STORAGE_SHARDED_FILES', 'dataModels.json,dataAgreements.json,datasets.json,rules.json,toolkit.json'
+    ).split(',') if f.strip()]
+    STORAGE_CHECKPOINT_SECONDS = float(os.getenv('STORAGE_CHECKPOINT_SECONDS', '30'))
+    STORAGE_CHECKPOINT_RECORDS = int(os.getenv('STORAGE_CHECKPOINT_RECORDS', '1000'))
+    # Runtime state kept next to the data rather than in it: version history and commit records
+    STORAGE_STATE_DIR = os.getenv('STORAGE_STATE_DIR', '.catalog_state')
+    # Version history of committed collections (STORAGE_STATE_DIR/history); excluded files are not versioned
+    STORAGE_HISTORY = os.getenv('STORAGE_HISTORY', 'true').lower() == 'true'
+    STORAGE_HISTORY_EXCLUDE = [f.strip() for f in os.getenv(
+        'STORAGE_HISTORY_EXCLUDE', 'statistics.json'
+    ).split(',') if f.strip()]
+    # Retention per collection: at most this many versions, none superseded more than this many days ago (0: no limit)
+    STORAGE_HISTORY_KEEP_VERSIONS = int(os.getenv('STORAGE_HISTORY_KEEP_VERSIONS', '1000'))
+    STORAGE_HISTORY_KEEP_DAYS = float(os.getenv('STORAGE_HISTORY_KEEP_DAYS', '0'))
+    # On-disk encoding of the collection files: 'pretty' (indented JSON), 'compact' or 'msgpack', optionally
+    # '+gzip' or '+zstd'; STORAGE_CODECS overrides it per file ('datasets.json=compact,...')
+    STORAGE_CODEC = os.getenv('STORAGE_CODEC', 'pretty').lower()
+    STORAGE_CODECS = [f.strip() for f in os.getenv(
+        'STORAGE_CODECS', 'datasets.json=compact,toolkit.json=compact'
+    ).split(',') if f.strip()]
+    
+    # Seconds S3 documents are served from the in-memory cache before their ETag is revalidated
+    STORAGE_CACHE_SECONDS = float(os.getenv('STORAGE_CACHE_SECONDS', '5'))
+    # Times a write that lost to a concurrent writer (conditional S3 PUT) is re-read and re-applied before a 409
+    STORAGE_WRITE_RETRIES = int(os.getenv('STORAGE_WRITE_RETRIES', '3'))
+    # Tiered cache of S3 / GitHub documents: parsed documents in memory up to CACHE_MEMORY_MB, raw bytes and
+    # ETags on disk under CACHE_DISK_DIR (empty disables it), so a restarted replica starts warm
+    CACHE_MEMORY_MB = float(os.getenv('CACHE_MEMORY_MB', '64'))
+    CACHE_DISK_DIR = os.getenv('CACHE_DISK_DIR', '.catalog_cache')
+    # Every collection is read at startup by CACHE_PREFETCH_THREADS threads and, for S3 / GitHub, revalidated in
+    # the background shortly before its TTL runs out. CACHE_REFRESH_SECONDS overrides the TTL per file
+    CACHE_PREFETCH = os.getenv('CACHE_PREFETCH', 'true').lower() == 'true'
+    CACHE_PREFETCH_THREADS = int(os.getenv('CACHE_PREFETCH_THREADS', '4'))
+    CACHE_REFRESH_SECONDS = {
+        name.strip(): float(seconds) for name, _, seconds in (
+            entry.partition('=') for entry in os.getenv(
+                'CACHE_REFRESH_SECONDS', 'theme.json=3600,statistics.json=30'
+            ).split(',')
+        ) if seconds.strip()
+    }
+    
+    # Thread pools for blocking work awaited by async endpoints (file/S3/GitHub I/O, package introspection)
+    IO_THREADS = int(os.getenv('IO_THREADS', '16'))
+    INTROSPECTION_THREADS = int(os.getenv('INTROSPECTION_THREADS', '2'))
+    
+    # Shared S3 client (services/s3_client.py): the pool covers IO_THREADS plus the write coordinator's
+    # writers; 'adaptive' retries back off and rate-limit client-side when S3 throttles
+    S3_MAX_POOL_CONNECTIONS = int(os.getenv('S3_MAX_POOL_CONNECTIONS', str(IO_THREADS + 4)))
+    S3_RETRY_MODE = os.getenv('S3_RETRY_MODE', 'adaptive').lower()
+    S3_MAX_ATTEMPTS = int(os.getenv('S3_MAX_ATTEMPTS', '5'))
+    S3_CONNECT_TIMEOUT = float(os.getenv('S3_CONNECT_TIMEOUT', '3'))
+    S3_READ_TIMEOUT = float(os.getenv('S3_READ_TIMEOUT', '10'))
+    # Bucket listings are cached (and kept current by this process's writes) for this many seconds;
+    # sub-prefixes (one per sharded collection) are listed on up to S3_LIST_THREADS threads
+    S3_LIST_CACHE_SECONDS = float(os.getenv('S3_LIST_CACHE_SECONDS', '60'))
+    S3_LIST_THREADS = int(os.getenv('S3_LIST_THREADS', '8'))
+    # Compression of the objects S3Service writes: 'none', 'gzip' or 'zstd' (recorded in the object's
+    # Content-Encoding and metadata; reads decompress whatever they find). Smaller objects stay plain.
+    S3_COMPRESSION = os.getenv('S3_COMPRESSION', 'none').lower()
+    S3_COMPRESSION_MIN_BYTES = int(os.getenv('S3_COMPRESSION_MIN_BYTES', '1024'))
+    
     # Cache configuration
     CACHE_DURATION = timedelta(minutes=int(os.getenv('CACHE_DURATION_MINUTES', '15')))
     
+    # Search analyzer chain (comma-separated filter names, see services/search_analyzer.py)
+    SEARCH_ANALYZER_FILTERS = os.getenv('SEARCH_ANALYZER_FILTERS', 'split_identifiers,lowercase,fold_accents,stop_words,stem')
+    
+    # Search queries slower than this (ms) are kept in the slow-query log
+    SEARCH_SLOW_QUERY_MS = float(os.getenv('SEARCH_SLOW_QUERY_MS', '50'))
+    SEARCH_SLOW_QUERY_LOG_SIZE = int(os.getenv('SEARCH_SLOW_QUERY_LOG_SIZE', '100'))
+    
+    # Vectorized (NumPy) search scoring: 'auto' uses it for broad queries, 'on' always, 'off' never
+    SEARCH_VECTOR_SCORING = os.getenv('SEARCH_VECTOR_SCORING', 'auto').lower()
+    SEARCH_VECTOR_MIN_CANDIDATES = int(os.getenv('SEARCH_VECTOR_MIN_CANDIDATES', '2000'))
+    
     # Server configuration
     HOST = os.getenv('HOST', '0.0.0.0')
     PORT = int(os.getenv('PORT', '8000'))
@@ -1,13 +1,17 @@
 from fastapi import FastAPI, HTTPException, Depends, Query, Body
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import HTTPBasic, HTTPBasicCredentials
 from pydantic import BaseModel, Field
+import copy
 import json
 import os
 from typing import Dict, Any, List, Optional
 import secrets
+import shutil
 import requests
-from datetime import datetime, timedelta
+from contextvars import ContextVar
+from datetime import datetime
 import logging
 import threading
 import time
@@ -15,13 +19,26 @@ from time import perf_counter
 # Import authentication modules
 from auth import get_current_user_optional, require_editor_or_admin, require_admin, UserRole
 from endpoints.auth import router as auth_router
+from config import Config
+from services import json_codec, s3_client
 from services.search_service import search_service
+from services.document_prefetcher import DocumentPrefetcher
+from services.github_archive import GitHubArchiveStore
+from services.storage_codecs import CodecRegistry
+from services.storage_engine import ReadOnlyStorage, WriteConflict, create_storage_engine
+from services.storage_gateway import CachedDocumentStorageEngine, GitHubDocumentStore, S3DocumentStore
+from services.json_patch import make_patch
+from services.storage_history import VersionHistory
+from services.storage_transactions import TransactionManager
+from services.unit_of_work import UnitOfWork, unit_of_work_stats
+from services.write_coordinator import WriteCoordinator
 from services.catalog_rule_id import (
     next_catalog_rule_id,
     normalize_rule_stage,
     normalize_rule_zone,
 )
 from services.python_introspection_service import python_introspection_service
+from services.async_io import blocking_io, event_loop_lag, introspection_io
 from catalog_uuid import new_uuid_str
 
 # Configure logging
@@ -82,6 +99,18 @@ def get_performance_stats():
         "github": {
             "total_requests": performance_metrics["github"]["requests"],
             "errors": performance_metrics["github"]["errors"]
+        },
+        "storage": storage.get_stats(),
+        "prefetch": prefetcher.get_stats() if prefetcher is not None else None,
+        "json_backend": json_codec.backend(),
+        "s3_client": s3_client.get_stats(),
+        "writes": write_coordinator.get_stats(),
+        "transactions": transactions.get_stats(),
+        "unit_of_work": unit_of_work_stats.get_stats(),
+        "event_loop": {
+            "lag": event_loop_lag.get_stats(),
+            "blocking_io": blocking_io.get_stats(),
+            "introspection_io": introspection_io.get_stats()
         }
     }
     
@@ -157,6 +186,11 @@ def find_model_index(models_data: Dict[str, Any], identifier: str) -> Optional[i
     return None
 
 
+def find_model(model_ref: str, engine=None):
+    """(storage handle, model) for a uuid, numeric id or shortName ref (same precedence as find_model_index)."""
+    return find_entity_by_ref('models', 'models', model_ref, ("uuid", "id", "shortName"), engine)
+
+
 def agreement_search_doc_id(agreement: Dict[str, Any]) -> str:
     u = agreement.get("uuid")
     if u:
@@ -164,6 +198,13 @@ def agreement_search_doc_id(agreement: Dict[str, Any]) -> str:
     return str(agreement.get("id", ""))
 
 
+class CatalogJSONResponse(JSONResponse):
+    """JSON response rendered by the API's JSON codec (orjson when installed)."""
+
+    def render(self, content: Any) -> bytes:
+        return json_codec.dumps(content)
+
+
 # API Documentation
 app = FastAPI(
     title="Catalog API",
@@ -190,7 +231,8 @@ app = FastAPI(
     version="1.0.0",
     docs_url="/docs",
     redoc_url="/redoc",
-    openapi_url="/openapi.json"
+    openapi_url="/openapi.json",
+    default_response_class=CatalogJSONResponse
 )
 
 # Enable CORS
@@ -206,20 +248,165 @@ app.add_middleware(
 app.include_router(auth_router)
 
 # GitHub configuration
-GITHUB_RAW_BASE_URL = "https://raw.githubusercontent.com/awales0177/test_data/main"
-CACHE_DURATION = timedelta(minutes=15)
-PASSTHROUGH_MODE = False  # Can be toggled via environment variable
-TEST_MODE = True  # Set to True to use local _data files instead of GitHub
+GITHUB_RAW_BASE_URL = Config.GITHUB_RAW_BASE_URL
+CACHE_DURATION = Config.CACHE_DURATION
 
 # Log server configuration
 logger.info("=" * 50)
 logger.info("Server Configuration:")
-logger.info(f"Mode: {'PASSTHROUGH' if PASSTHROUGH_MODE else 'DIRECT'}")
-logger.info(f"Test Mode: {'ENABLED' if TEST_MODE else 'DISABLED'}")
-logger.info(f"Caching: DISABLED - Always fresh data")
+logger.info(f"Data source: {Config.get_mode_description()}")
 logger.info(f"GitHub Base URL: {GITHUB_RAW_BASE_URL}")
 logger.info("=" * 50)
 
+# Storage engine for _data documents (JSON files or SQLite)
+def _storage_object_store():
+    """S3 bucket for the sharded engine in S3 mode; None means the local _data directory."""
+    if Config.STORAGE_ENGINE != 'sharded' or not Config.S3_MODE:
+        return None
+    from services.s3_service import S3Service
+    from services.storage_sharded import S3ObjectStore
+    s3_service = S3Service()
+    if not s3_service.is_available():
+        logger.warning("S3 mode is set but S3 is not available; sharded storage uses local _data")
+        return None
+    return S3ObjectStore(s3_service)
+
+def _cache_tiers(ttl: float):
+    """Memory budget, disk directory and per-file TTLs of the remote document cache (Config.CACHE_*)."""
+    return {'memory_bytes': int(Config.CACHE_MEMORY_MB * 1024 * 1024), 'disk_dir': Config.CACHE_DISK_DIR or None,
+            # Passthrough (ttl=0) revalidates every read, whatever the file
+            'ttls': Config.CACHE_REFRESH_SECONDS if ttl else None}
+
+def _create_storage():
+    """The storage gateway every endpoint reads and writes through, for Config's data source.
+
+    S3 and GitHub documents are served through a shared read-through cache (revalidated after
+    STORAGE_CACHE_SECONDS, or CACHE_DURATION for GitHub, CACHE_REFRESH_SECONDS per file;
+    passthrough mode revalidates every read). With GITHUB_SYNC=archive GitHub documents come
+    from one commit's tarball instead of raw file URLs. Local files use the configured
+    STORAGE_ENGINE, as does sharded storage in S3 mode.
+    """
+    source = Config.get_data_source()
+    if source == 's3' and Config.STORAGE_ENGINE != 'sharded':
+        from services.s3_service import S3Service
+        s3_service = S3Service()
+        if s3_service.is_available():
+            return CachedDocumentStorageEngine(S3DocumentStore(s3_service), Config.STORAGE_CACHE_SECONDS,
+                                               **_cache_tiers(Config.STORAGE_CACHE_SECONDS))
+        logger.warning("S3 mode is set but S3 is not available; using local _data")
+    elif source in ('github', 'cached_github'):
+        ttl = 0 if source == 'github' else Config.CACHE_DURATION.total_seconds()
+        if Config.GITHUB_SYNC == 'archive':
+            # One commit of the data repo, unpacked on disk (which makes the disk tier redundant)
+            store = GitHubArchiveStore(Config.GITHUB_API_URL, Config.GITHUB_REPO, Config.GITHUB_BRANCH,
+                                       Config.GITHUB_ARCHIVE_DIR, Config.GITHUB_DATA_PATH, Config.GITHUB_TOKEN,
+                                       check_seconds=ttl)
+            return CachedDocumentStorageEngine(store, ttl, **dict(_cache_tiers(ttl), disk_dir=None))
+        return CachedDocumentStorageEngine(GitHubDocumentStore(GITHUB_RAW_BASE_URL), ttl, **_cache_tiers(ttl))
+    return create_storage_engine(Config.STORAGE_ENGINE, '_data', Config.STORAGE_SQLITE_PATH,
+                                 Config.STORAGE_SHARDED_FILES, _storage_object_store(),
+                                 Config.STORAGE_CHECKPOINT_SECONDS, Config.STORAGE_CHECKPOINT_RECORDS,
+                                 CodecRegistry.from_config(Config.STORAGE_CODEC, Config.STORAGE_CODECS))
+
+storage = _create_storage()
+logger.info(f"Storage engine: {storage.name} ({Config.get_data_source()})")
+search_service.document_loader = storage.read_document
+# History and the commit record are kept on this replica's disk, so only for documents on that disk:
+# with S3 or GitHub replicas would diverge, and rolling a pending commit forward could undo others' writes
+_remote_store = getattr(storage, 'store', None)
+_local_documents = _remote_store is None or _remote_store.name == 'local'
+if Config.STORAGE_HISTORY and not _local_documents:
+    logger.warning(f"Version history is disabled: documents are in {_remote_store.name}, not on local disk")
+# Multi-collection commits are published atomically; each request reads one snapshot of the catalog
+def _state_dir(name: str) -> str:
+    """STORAGE_STATE_DIR/<name>, taking over the _data/_<name> directory earlier versions kept there."""
+    path = os.path.join(Config.STORAGE_STATE_DIR, name)
+    legacy = os.path.join('_data', f'_{name}')
+    if os.path.isdir(legacy) and not os.path.exists(path):
+        os.makedirs(Config.STORAGE_STATE_DIR, exist_ok=True)
+        shutil.move(legacy, path)
+        logger.info(f"Moved {legacy} to {path}")
+    return path
+
+history = VersionHistory(_state_dir('history'), Config.STORAGE_HISTORY_EXCLUDE,
+                         keep_versions=Config.STORAGE_HISTORY_KEEP_VERSIONS,
+                         keep_days=Config.STORAGE_HISTORY_KEEP_DAYS) if Config.STORAGE_HISTORY and _local_documents else None
+transactions = TransactionManager(storage, _state_dir('txn') if _local_documents else None, history)
+write_coordinator = WriteCoordinator(storage, transactions, conflict_retries=Config.STORAGE_WRITE_RETRIES)
+
+@app.on_event("startup")
+async def start_event_loop_lag_monitor():
+    event_loop_lag.start()
+
+@app.on_event("shutdown")
+async def stop_event_loop_lag_monitor():
+    await event_loop_lag.stop()
+    blocking_io.close()
+    introspection_io.close()
+
+@app.on_event("startup")
+def start_prefetcher():
+    if prefetcher is not None:
+        prefetcher.start()
+
+@app.on_event("shutdown")
+def close_storage():
+    """Finish queued writes, then flush the storage engine (final journal checkpoint, SQLite connection)."""
+    if prefetcher is not None:
+        prefetcher.stop()
+    write_coordinator.close()
+    if history is not None:
+        history.close()
+    storage.close()
+
+_request_unit_of_work: ContextVar[Optional[UnitOfWork]] = ContextVar('request_unit_of_work', default=None)
+
+def unit_of_work() -> UnitOfWork:
+    """The current request's unit of work (a one-off one outside requests)."""
+    uow = _request_unit_of_work.get()
+    return uow if uow is not None else UnitOfWork(transactions.snapshot(), write_coordinator)
+
+def _conflict_detail(error: WriteConflict) -> str:
+    logger.warning(f"Write conflict: {error}")
+    return f"{error.file_name} was changed concurrently by another writer; reload and try again"
+
+@app.exception_handler(WriteConflict)
+async def write_conflict_handler(request, exc: WriteConflict):
+    """Concurrent edits of the same collection (e.g. on another API replica) that kept conflicting after retries."""
+    return JSONResponse(status_code=409, content={"detail": _conflict_detail(exc)})
+
+# Answer for writes when the data source is read-only (GitHub)
+_READ_ONLY_HEADERS = {"Allow": "GET, HEAD"}
+
+@app.exception_handler(ReadOnlyStorage)
+async def read_only_handler(request, exc: ReadOnlyStorage):
+    """Writes while the data source is GitHub, which the API cannot write to."""
+    return JSONResponse(status_code=405, headers=_READ_ONLY_HEADERS, content={"detail": str(exc)})
+
+@app.middleware("http")
+async def request_unit_of_work(request, call_next):
+    """Serve each request from one catalog snapshot through a unit of work; mutations a handler
+    staged without flushing are committed before the response is returned."""
+    uow = UnitOfWork(transactions.snapshot(), write_coordinator)
+    token = _request_unit_of_work.set(uow)
+    try:
+        response = await call_next(request)
+        if uow.dirty:
+            dirty = uow.dirty
+            try:
+                await uow.flush()
+            except WriteConflict as e:
+                return JSONResponse(status_code=409, content={"detail": _conflict_detail(e)})
+            except ReadOnlyStorage as e:
+                return JSONResponse(status_code=405, headers=_READ_ONLY_HEADERS, content={"detail": str(e)})
+            except Exception as e:
+                logger.error(f"Error committing staged changes to {', '.join(dirty)}: {str(e)}")
+                return JSONResponse(status_code=500, content={"detail": f"Error saving changes: {str(e)}"})
+        return response
+    finally:
+        _request_unit_of_work.reset(token)
+        uow.close()
+
 # Initialize search index
 logger.info("Initializing search index...")
 try:
@@ -308,6 +495,9 @@ JSON_FILES = {
     "dataProducts": "dataProducts.json"  # Alias for data-products
 }
 
+# Warms every collection at startup; remote ones are then refreshed before their TTL runs out
+prefetcher = DocumentPrefetcher(storage, JSON_FILES.values(), Config.CACHE_PREFETCH_THREADS) if Config.CACHE_PREFETCH else None
+
 # Data type to key mapping for counting items
 DATA_TYPE_KEYS = {
     "dataAgreements": "agreements",
@@ -348,7 +538,7 @@ def fetch_from_github(file_name: str) -> Dict:
             logger.error(f"GitHub API error: {response.status_code} - {response.text}")
             raise HTTPException(status_code=500, detail=f"GitHub API error: {response.status_code}")
         
-        data = response.json()
+        data = json_codec.loads(response.content)
         logger.info(f"Successfully fetched and parsed JSON for {file_name}")
         log_performance("github_fetch", start_time, github_request=True)
         return data
@@ -380,30 +570,25 @@ def fetch_from_github(file_name: str) -> Dict:
 #         del cache["last_updated"][file_name]
 
 def get_cached_data(file_name: str) -> Dict:
-    """Get data directly from local files (no caching)."""
+    """Get a data file through the storage gateway (Config's data source and its cache)."""
     start_time = perf_counter()
-    logger.info(f"Reading data directly from local files for {file_name}")
+    if file_name not in JSON_FILES:
+        logger.error(f"File {file_name} not found in JSON_FILES mapping")
+        raise HTTPException(status_code=404, detail="File not found")
     
-    if TEST_MODE:
-        logger.info(f"Reading from local _data files for {file_name}")
-        try:
-            data = read_json_file(JSON_FILES[file_name])
-            logger.info(f"Local file loaded successfully for {file_name}")
-            log_performance("local_file_read", start_time)
-            return data
-        except Exception as e:
-            logger.error(f"Error reading local file {file_name}: {str(e)}")
-            # Fallback to GitHub if local file fails
-            logger.info(f"Falling back to GitHub for {file_name}")
-            data = fetch_from_github(file_name)
-            logger.info(f"GitHub fallback loaded for {file_name}")
-            log_performance("github_fallback", start_time)
-            return data
-    else:
-        logger.info(f"Fetching from GitHub for {file_name}")
+    try:
+        data = read_collection(JSON_FILES[file_name])
+        log_performance("storage_read", start_time)
+        return data
+    except Exception as e:
+        if Config.get_data_source() != 'local':
+            raise
+        logger.error(f"Error reading local file {file_name}: {str(e)}")
+        # Fallback to GitHub if local file fails
+        logger.info(f"Falling back to GitHub for {file_name}")
         data = fetch_from_github(file_name)
-        logger.info(f"GitHub data loaded for {file_name}")
-        log_performance("github_fetch", start_time)
+        logger.info(f"GitHub fallback loaded for {file_name}")
+        log_performance("github_fallback", start_time)
         return data
 
 # Search endpoints (must be before generic {file_name} route)
@@ -411,9 +596,19 @@ def get_cached_data(file_name: str) -> Dict:
 def global_search(
     q: str = Query(..., description="Search query"),
     types: str = Query(None, description="Comma-separated list of data types to search"),
-    limit: int = Query(50, ge=1, le=200, description="Maximum number of results")
+    limit: int = Query(50, ge=1, le=200, description="Maximum number of results per page"),
+    offset: int = Query(0, ge=0, description="Number of ranked hits to skip (ignored when cursor is set)"),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    include_documents: bool = Query(False, description="Return full documents instead of identifying fields and highlights")
 ):
-    """Global search across all data types."""
+    """
+    Global search across all data types.
+    
+    Each hit carries its identifying fields (uuid, id, name, ...), `_matched_terms` and
+    `_highlights`: per-field snippets with `[start, end]` match offsets into the snippet.
+    `total` is the number of matching documents in the index; pass `next_cursor` back as
+    `cursor` (or use `offset`) to fetch the next page.
+    """
     try:
         # Parse types parameter
         doc_types = None
@@ -421,14 +616,22 @@ def global_search(
             doc_types = [t.strip() for t in types.split(',') if t.strip()]
         
         # Perform search
-        results = search_service.search(q, doc_types, limit)
+        try:
+            page = search_service.search_page(q, doc_types, limit, offset, cursor, include_document=include_documents)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
         
         return {
             "query": q,
-            "results": results,
-            "total": len(results),
+            "results": page["results"],
+            "total": page["total"],
+            "offset": page["offset"],
+            "limit": limit,
+            "next_cursor": page["next_cursor"],
             "types_searched": doc_types or "all"
         }
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error in global search: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Search error: {str(e)}")
@@ -452,7 +655,7 @@ def rebuild_search_index(current_user: dict = Depends(require_admin)):
 
 @app.get("/api/search/stats")
 def get_search_stats():
-    """Get search index statistics."""
+    """Get search index statistics, per-phase and per-type query latency, the slow-query log and sampled plans."""
     try:
         stats = search_service.get_stats()
         return stats
@@ -460,6 +663,17 @@ def get_search_stats():
         logger.error(f"Error getting search stats: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error getting stats: {str(e)}")
 
+@app.post("/api/search/query-plans")
+def configure_query_plan_sampling(
+    enabled: bool = Query(..., description="Capture query plans for a sample of searches"),
+    sample_rate: Optional[float] = Query(None, ge=0, le=1, description="Fraction of searches to sample"),
+    current_user: dict = Depends(require_admin)
+):
+    """Turn query plan sampling on or off (admin only). Sampled plans appear in /api/search/stats."""
+    search_service.metrics.configure_plan_sampling(enabled, sample_rate)
+    logger.info(f"Search query plan sampling {'enabled' if enabled else 'disabled'} by {current_user.get('username')}")
+    return search_service.get_stats()["queries"]["plan_sampling"]
+
 @app.get("/api/search/suggest")
 def search_suggestions(
     q: str = Query(..., description="Partial search query"),
@@ -468,7 +682,7 @@ def search_suggestions(
     """Get search suggestions based on partial query."""
     try:
         # Get search results for suggestions
-        results = search_service.search(q, limit=limit)
+        results = search_service.search(q, limit=limit, include_document=True)
         
         # Extract unique suggestions from results
         suggestions = set()
@@ -507,11 +721,11 @@ def get_zones():
         logger.info("Request for zones - reading from zones.json and grouping domains")
         
         # Get zones definitions from zones.json
-        zones_data = get_cached_data("zones") if not PASSTHROUGH_MODE else fetch_from_github("zones")
+        zones_data = get_cached_data("zones")
         zones_definitions = zones_data.get("zones", [])
         
         # Get domains data
-        domains_data = get_cached_data("domains") if not PASSTHROUGH_MODE else fetch_from_github("domains")
+        domains_data = get_cached_data("domains")
         domains = domains_data.get("domains", [])
         
         # Create a map of zone name to zone definition
@@ -575,7 +789,7 @@ def get_datasets():
     start_time = perf_counter()
     logger.info("Request for datasets")
     try:
-        data = get_cached_data("datasets") if not PASSTHROUGH_MODE else fetch_from_github("datasets")
+        data = get_cached_data("datasets")
         # datasets.json is an array, wrap it in an object
         if isinstance(data, list):
             result = {"datasets": data}
@@ -593,7 +807,7 @@ def get_dataset_by_id(dataset_id: int):
     start_time = perf_counter()
     logger.info(f"Request for dataset {dataset_id}")
     try:
-        data = get_cached_data("datasets") if not PASSTHROUGH_MODE else fetch_from_github("datasets")
+        data = get_cached_data("datasets")
         datasets = data if isinstance(data, list) else data.get("datasets", [])
         dataset = next((d for d in datasets if d.get("id") == dataset_id), None)
         if not dataset:
@@ -612,7 +826,7 @@ def get_pipelines():
     start_time = perf_counter()
     logger.info("Request for pipelines")
     try:
-        data = get_cached_data("pipelines") if not PASSTHROUGH_MODE else fetch_from_github("pipelines")
+        data = get_cached_data("pipelines")
         # pipelines.json is an array, wrap it in an object
         if isinstance(data, list):
             result = {"pipelines": data}
@@ -628,8 +842,8 @@ def get_pipelines():
 def get_json_file(file_name: str):
     """Get JSON file content with direct file reading or passthrough mode."""
     start_time = perf_counter()
-    logger.info(f"Request for {file_name} - Using {'passthrough' if PASSTHROUGH_MODE else 'direct'} mode")
-    result = fetch_from_github(file_name) if PASSTHROUGH_MODE else get_cached_data(file_name)
+    logger.info(f"Request for {file_name} from {storage.name}")
+    result = get_cached_data(file_name)
     
     # Ensure clickCount is initialized for all toolkit components
     if file_name == 'toolkit' and isinstance(result, dict) and 'toolkit' in result:
@@ -649,8 +863,8 @@ def get_paginated_json_file(
     page_size: int = Query(10, ge=1, le=100)
 ):
     """Get paginated JSON file content."""
-    logger.info(f"Paginated request for {file_name} - Using {'passthrough' if PASSTHROUGH_MODE else 'direct'} mode")
-    data = get_cached_data(file_name) if not PASSTHROUGH_MODE else fetch_from_github(file_name)
+    logger.info(f"Paginated request for {file_name} from {storage.name}")
+    data = get_cached_data(file_name)
     key = DATA_TYPE_KEYS.get(file_name)
     
     if not key or key not in data:
@@ -671,8 +885,8 @@ def get_paginated_json_file(
 @app.get("/api/count/{file_name}")
 def get_count(file_name: str):
     """Get the count of items in a specific data file."""
-    logger.info(f"Count request for {file_name} - Using {'passthrough' if PASSTHROUGH_MODE else 'direct'} mode")
-    data = get_cached_data(file_name) if not PASSTHROUGH_MODE else fetch_from_github(file_name)
+    logger.info(f"Count request for {file_name} from {storage.name}")
+    data = get_cached_data(file_name)
     # statistics.json is analytics metadata (not a single list) — expose totalViews for nav badges
     if file_name == "statistics" and isinstance(data, dict):
         total = data.get("totalViews")
@@ -721,8 +935,8 @@ async def get_agreements_by_model(model_short_name: str):
         HTTPException: If the model is not found
     """
     try:
-        agreements_data = read_json_file(JSON_FILES['dataAgreements'])
-        model_data = read_json_file(JSON_FILES['models'])
+        agreements_data = await read_collection_async(JSON_FILES['dataAgreements'])
+        model_data = await read_collection_async(JSON_FILES['models'])
 
         idx = find_model_index(model_data, model_short_name)
         if idx is None:
@@ -779,28 +993,14 @@ async def create_model(request: CreateModelRequest, current_user: dict = Depends
     try:
         logger.info(f"Create request for new model")
         
-        # Read current models data
-        models_data = read_json_file(JSON_FILES['models'])
-        
-        # Check if the shortName already exists
-        for existing_model in models_data['models']:
-            if existing_model['shortName'] == request.shortName:
-                raise HTTPException(
-                    status_code=400,
-                    detail=f"Model with shortName '{request.shortName}' already exists"
-                )
-        
-        # Generate a new ID (max existing ID + 1)
-        new_id = max([m['id'] for m in models_data['models']], default=0) + 1
-        
         # Ensure meta has clickCount initialized to 0
         meta = request.meta.copy() if request.meta else {}
         if 'clickCount' not in meta:
             meta['clickCount'] = 0
         
-        # Create the new model from the request
+        # Create the new model from the request (id assigned when it is appended)
         new_model = {
-            'id': new_id,
+            'id': None,
             'uuid': new_uuid_str(),
             'shortName': request.shortName,
             'name': request.name,
@@ -818,13 +1018,24 @@ async def create_model(request: CreateModelRequest, current_user: dict = Depends
             'lastUpdated': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
         }
         
-        # Add the new model to the array
-        models_data['models'].append(new_model)
+        def append_model(batch):
+            # Check if the shortName already exists
+            existing = batch.find_entities(JSON_FILES['models'], 'models', 'shortName', request.shortName)
+            if any(m.get('shortName') == request.shortName for _, m in existing):
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"Model with shortName '{request.shortName}' already exists"
+                )
+            
+            # Generate a new ID (max existing ID + 1)
+            new_model['id'] = batch.max_int_id(JSON_FILES['models'], 'models') + 1
+            batch.append_entity(JSON_FILES['models'], 'models', new_model)
+            return new_model['id']
         
-        # Save the updated data to local file
+        # Append the new model to the collection
         local_file_path = JSON_FILES['models']
-        write_json_file(local_file_path, models_data)
-        logger.info(f"Created new model in local file {local_file_path}")
+        new_id = await mutate_json_file(local_file_path, append_model)
+        logger.info(f"Created new model in {local_file_path}")
         
         # Update search index
         update_search_index("models", "add", new_model, model_search_doc_id(new_model))
@@ -839,6 +1050,8 @@ async def create_model(request: CreateModelRequest, current_user: dict = Depends
             "created": True
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error creating model: {str(e)}")
         raise HTTPException(
@@ -863,25 +1076,22 @@ async def delete_model(model_ref: str, current_user: dict = Depends(require_edit
     try:
         logger.info(f"Delete request for model: {model_ref}")
         
-        # Read current models data
-        models_data = read_json_file(JSON_FILES['models'])
-        
-        del_idx = find_model_index(models_data, model_ref)
-        if del_idx is None:
-            raise HTTPException(
-                status_code=404,
-                detail=f"Model '{model_ref}' not found"
-            )
-        model_to_delete = models_data['models'][del_idx]
-        doc_id = model_search_doc_id(model_to_delete)
-        
-        # Remove the model from the array
-        models_data['models'] = [m for m in models_data['models'] if m is not model_to_delete]
+        def remove_model(batch):
+            hit = find_model(model_ref, batch)
+            if hit is None:
+                raise HTTPException(
+                    status_code=404,
+                    detail=f"Model '{model_ref}' not found"
+                )
+            handle, model = hit
+            batch.delete_entity(JSON_FILES['models'], 'models', handle)
+            return model
         
-        # Save the updated data to local file
+        # Remove the model from the collection
         local_file_path = JSON_FILES['models']
-        write_json_file(local_file_path, models_data)
-        logger.info(f"Model deleted from local file {local_file_path}")
+        model_to_delete = await mutate_json_file(local_file_path, remove_model)
+        doc_id = model_search_doc_id(model_to_delete)
+        logger.info(f"Model deleted from {local_file_path}")
         
         # Update search index
         update_search_index("models", "delete", item_id=doc_id)
@@ -895,6 +1105,8 @@ async def delete_model(model_ref: str, current_user: dict = Depends(require_edit
             "deleted": True
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error deleting model: {str(e)}")
         raise HTTPException(
@@ -919,34 +1131,30 @@ async def track_model_click(model_ref: str):
     try:
         logger.info(f"Click tracking request for model: {model_ref}")
         
-        # Read current models data
-        models_data = read_json_file(JSON_FILES['models'])
-        
-        model_index = find_model_index(models_data, model_ref)
-        
-        if model_index is None:
-            raise HTTPException(
-                status_code=404,
-                detail=f"Model '{model_ref}' not found"
-            )
-        
-        # Get the current model
-        model = models_data['models'][model_index]
-        
-        # Initialize clickCount in meta if it doesn't exist
-        if 'meta' not in model:
-            model['meta'] = {}
-        
-        # Increment click count (initialize to 1 if not present)
-        current_count = model['meta'].get('clickCount', 0)
-        model['meta']['clickCount'] = current_count + 1
-        
-        # Update the model in the array
-        models_data['models'][model_index] = model
-        
-        # Save the updated data to local file
-        local_file_path = JSON_FILES['models']
-        write_json_file(local_file_path, models_data)
+        def increment_click_count(batch):
+            hit = find_model(model_ref, batch)
+            
+            if hit is None:
+                raise HTTPException(
+                    status_code=404,
+                    detail=f"Model '{model_ref}' not found"
+                )
+            
+            # Get the current model
+            model_handle, model = hit
+            
+            # Initialize clickCount in meta if it doesn't exist
+            if 'meta' not in model:
+                model['meta'] = {}
+            
+            # Increment click count (initialize to 1 if not present)
+            current_count = model['meta'].get('clickCount', 0)
+            model['meta']['clickCount'] = current_count + 1
+            batch.replace_entity(JSON_FILES['models'], 'models', model_handle, model)
+            return model
+        
+        # Save the updated model (concurrent clicks are applied in order and written together)
+        model = await mutate_json_file(JSON_FILES['models'], increment_click_count)
         logger.info(f"Updated click count for model {model_ref} to {model['meta']['clickCount']}")
         
         return {
@@ -965,6 +1173,36 @@ async def track_model_click(model_ref: str):
             detail=f"Error tracking click: {str(e)}"
         )
 
+# Files holding references to a model's shortName, updated with the model when it is renamed
+MODEL_REFERENCE_FILES = [JSON_FILES['dataAgreements'], JSON_FILES['rules'], JSON_FILES['dataProducts']]
+
+def rename_model_references(batch, old_short_name: str, new_short_name: str):
+    """Point agreements, rules and data products at a model's new shortName (inside a transaction)."""
+    for file_key, list_path in (('dataAgreements', 'agreements'), ('rules', 'rules')):
+        file_name = JSON_FILES[file_key]
+        try:
+            matches = batch.find_entities(file_name, list_path, 'modelShortName', old_short_name)
+        except FileNotFoundError:
+            continue
+        for handle, entity in matches:
+            if entity.get('modelShortName') == old_short_name:
+                entity['modelShortName'] = new_short_name
+                batch.replace_entity(file_name, list_path, handle, entity)
+                logger.info(f"Updated {list_path[:-1]} {entity.get('id')} modelShortName from '{old_short_name}' to '{new_short_name}'")
+    
+    # Data products list the models they are built from in dataSources
+    products_file = JSON_FILES['dataProducts']
+    try:
+        products = batch.read_document(products_file).get('products', [])
+    except FileNotFoundError:
+        return
+    for handle, product in enumerate(products):
+        sources = product.get('dataSources') or []
+        if old_short_name in sources:
+            product['dataSources'] = [new_short_name if s == old_short_name else s for s in sources]
+            batch.replace_entity(products_file, 'products', handle, product)
+            logger.info(f"Updated data product {product.get('id')} dataSources from '{old_short_name}' to '{new_short_name}'")
+
 @app.put("/api/models/{model_ref}")
 async def update_model(model_ref: str, request: UpdateModelRequest, current_user: dict = Depends(require_editor_or_admin)):
     """
@@ -983,72 +1221,74 @@ async def update_model(model_ref: str, request: UpdateModelRequest, current_user
     try:
         logger.info(f"Update request for model: {model_ref}")
         
-        # Read current models data
-        models_data = read_json_file(JSON_FILES['models'])
-        
-        model_index = find_model_index(models_data, model_ref)
-        
-        if model_index is None:
-            raise HTTPException(
-                status_code=404,
-                detail=f"Model '{model_ref}' not found"
-            )
-        
-        # Update the model
-        old_model = models_data['models'][model_index]
-        updated_model = {**old_model, **request.modelData}
-        updated_model.pop('owner', None)
-        
-        # Preserve clickCount in meta if it exists in the old model
-        if 'meta' in request.modelData and 'meta' in old_model:
-            old_click_count = old_model['meta'].get('clickCount', 0)
-            if 'clickCount' not in updated_model.get('meta', {}):
-                if 'meta' not in updated_model:
-                    updated_model['meta'] = {}
-                updated_model['meta']['clickCount'] = old_click_count
-        
-        # Check if shortName is being changed
-        old_short_name = old_model.get('shortName')
-        new_short_name = updated_model.get('shortName')
-        is_short_name_changing = old_short_name != new_short_name
-        
-        if is_short_name_changing:
-            logger.info(f"ShortName is being changed from '{old_short_name}' to '{new_short_name}'")
+        def replace_model(batch):
+            hit = find_model(model_ref, batch)
+            
+            if hit is None:
+                raise HTTPException(
+                    status_code=404,
+                    detail=f"Model '{model_ref}' not found"
+                )
+            
+            # Update the model
+            model_handle, old_model = hit
+            updated_model = {**old_model, **request.modelData}
+            updated_model.pop('owner', None)
+            
+            # Preserve clickCount in meta if it exists in the old model
+            if 'meta' in request.modelData and 'meta' in old_model:
+                old_click_count = old_model['meta'].get('clickCount', 0)
+                if 'clickCount' not in updated_model.get('meta', {}):
+                    if 'meta' not in updated_model:
+                        updated_model['meta'] = {}
+                    updated_model['meta']['clickCount'] = old_click_count
             
             # Check if the new shortName conflicts with existing models
-            for existing_model in models_data['models']:
-                if existing_model['id'] != old_model['id'] and existing_model['shortName'] == new_short_name:
-                    raise HTTPException(
-                        status_code=400,
-                        detail=f"Model with shortName '{new_short_name}' already exists"
-                    )
+            new_short_name = updated_model.get('shortName')
+            if old_model.get('shortName') != new_short_name:
+                for _, existing_model in batch.find_entities(JSON_FILES['models'], 'models', 'shortName', new_short_name):
+                    if existing_model['id'] != old_model['id'] and existing_model['shortName'] == new_short_name:
+                        raise HTTPException(
+                            status_code=400,
+                            detail=f"Model with shortName '{new_short_name}' already exists"
+                        )
             
-            # Update agreements that reference the old shortName (only if requested)
-            if request.updateAssociatedLinks:
-                try:
-                    agreements_data = read_json_file(JSON_FILES['dataAgreements'])
-                    agreements_updated = False
-                    
-                    for agreement in agreements_data['agreements']:
-                        if agreement.get('modelShortName') == old_short_name:
-                            agreement['modelShortName'] = new_short_name
-                            agreements_updated = True
-                            logger.info(f"Updated agreement {agreement['id']} modelShortName from '{old_short_name}' to '{new_short_name}'")
-                    
-                    if agreements_updated:
-                        write_json_file(JSON_FILES['dataAgreements'], agreements_data)
-                        logger.info(f"Updated agreements file with new modelShortName references")
-                    
-                except Exception as e:
-                    logger.error(f"Error updating agreements: {str(e)}")
-                    raise HTTPException(
-                        status_code=500,
-                        detail=f"Failed to update agreements: {str(e)}"
-                    )
+            # Update the lastUpdated field with full timestamp
+            updated_model['lastUpdated'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            batch.replace_entity(JSON_FILES['models'], 'models', model_handle, updated_model)
+            return old_model, updated_model
+        
+        def rename_links(batch):
+            old_model, updated_model = staged_model
+            old_short_name = old_model.get('shortName')
+            new_short_name = updated_model.get('shortName')
+            if old_short_name != new_short_name:
+                logger.info(f"ShortName is being changed from '{old_short_name}' to '{new_short_name}'")
+                rename_model_references(batch, old_short_name, new_short_name)
             else:
-                logger.info(f"Not updating agreements - keeping old references to '{old_short_name}'")
+                logger.info(f"ShortName unchanged: '{old_short_name}'")
+        
+        def replace_and_keep_model(batch):
+            staged_model[:] = replace_model(batch)
+        
+        # Replace the model and cascade a shortName change to its references (only if requested);
+        # staged together, they are committed as one transaction
+        staged_model = []
+        uow = unit_of_work()
+        local_file_path = JSON_FILES['models']
+        uow.stage(local_file_path, replace_and_keep_model)
+        if request.updateAssociatedLinks:
+            uow.stage(MODEL_REFERENCE_FILES, rename_links)
         else:
-            logger.info(f"ShortName unchanged: '{old_short_name}'")
+            logger.info("Not updating associated links - keeping old references to the model's shortName")
+        try:
+            await uow.flush()
+        except FileNotFoundError as e:
+            raise HTTPException(status_code=404, detail=f"File not found: {e}")
+        old_model, updated_model = staged_model
+        logger.info(f"Updated model in {local_file_path}")
+        old_short_name = old_model.get('shortName')
+        new_short_name = updated_model.get('shortName')
         
         # Log the update details for debugging
         logger.info(f"Model update details:")
@@ -1060,17 +1300,6 @@ async def update_model(model_ref: str, request: UpdateModelRequest, current_user
         logger.info(f"  shortName will be: {new_short_name}")
         logger.info(f"  updateAssociatedLinks: {request.updateAssociatedLinks}")
         
-        # Update the lastUpdated field with full timestamp
-        updated_model['lastUpdated'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        
-        # Replace the model in the array
-        models_data['models'][model_index] = updated_model
-        
-        # Save the updated data to local file
-        local_file_path = JSON_FILES['models']
-        write_json_file(local_file_path, models_data)
-        logger.info(f"Updated local file {local_file_path}")
-        
         # Update search index
         update_search_index("models", "update", updated_model, model_search_doc_id(updated_model))
         
@@ -1087,6 +1316,10 @@ async def update_model(model_ref: str, request: UpdateModelRequest, current_user
             "lastUpdated": updated_model['lastUpdated']
         }
         
+    except (WriteConflict, ReadOnlyStorage):
+        raise
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error updating model {model_ref}: {str(e)}")
         raise HTTPException(
@@ -1130,58 +1363,90 @@ def update_json_path(data: Dict, path: str, value: Any) -> Dict:
     
     return data
 
-def read_json_file(file_path: str) -> Dict:
+def _storage_name(file_path: str) -> str:
+    """Document name relative to _data (accepts 'dataModels.json' or '_data/dataModels.json')."""
+    return file_path[len('_data/'):] if file_path.startswith('_data/') else file_path
+
+def _read_error(file_path: str, error: Exception) -> HTTPException:
+    if isinstance(error, FileNotFoundError):
+        logger.error(f"File not found: {file_path}")
+        return HTTPException(status_code=404, detail=f"File not found: {file_path}")
+    if isinstance(error, json.JSONDecodeError):
+        logger.error(f"Invalid JSON file: {file_path}: {str(error)}")
+        return HTTPException(status_code=500, detail=f"Invalid JSON in file {file_path}: {str(error)}")
+    logger.error(f"Error reading file {file_path}: {str(error)}")
+    return HTTPException(status_code=500, detail=f"Error reading file {file_path}: {str(error)}")
+
+def read_collection(file_path: str) -> Dict:
+    """A data file as read by the current request's unit of work.
+    
+    Each file is read and parsed at most once per request and the document is shared by every
+    caller in the request; change collections with a staged mutation (mutate_json_file), not
+    by editing this document.
+    """
     try:
-        # Handle both relative and absolute paths
-        if file_path.startswith('_data/'):
-            data_path = file_path
-        else:
-            data_path = os.path.join('_data', file_path)
-        
-        logger.info(f"Reading JSON file from: {data_path}")
-        with open(data_path, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    except FileNotFoundError:
-        logger.error(f"File not found: {data_path}")
-        raise HTTPException(status_code=404, detail=f"File not found: {file_path}")
-    except json.JSONDecodeError as e:
-        logger.error(f"Invalid JSON file: {data_path}: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Invalid JSON in file {file_path}: {str(e)}")
+        return unit_of_work().read_document(_storage_name(file_path))
     except Exception as e:
-        logger.error(f"Error reading file {data_path}: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Error reading file {file_path}: {str(e)}")
+        raise _read_error(file_path, e)
 
-def write_json_file(file_path: str, data: Dict):
+async def read_collection_async(file_path: str) -> Dict:
+    """read_collection for async endpoints: a file not yet read in this request is loaded on the
+    blocking I/O pool, off the event loop."""
     try:
-        # Handle both relative and absolute paths
-        if file_path.startswith('_data/'):
-            data_path = file_path
-        else:
-            data_path = os.path.join('_data', file_path)
-        
-        # Ensure directory exists
-        os.makedirs(os.path.dirname(data_path), exist_ok=True)
-        
-        logger.info(f"Writing JSON file to: {data_path}")
-        
-        # Write to a temporary file first, then rename (atomic write)
-        temp_path = f"{data_path}.tmp"
-        with open(temp_path, 'w', encoding='utf-8') as f:
-            json.dump(data, f, indent=2, ensure_ascii=False)
-        
-        # Atomic rename
-        if os.path.exists(data_path):
-            os.replace(temp_path, data_path)
-        else:
-            os.rename(temp_path, data_path)
-        
-        logger.info(f"Successfully wrote to: {data_path}")
-    except json.JSONEncodeError as e:
-        logger.error(f"JSON encoding error writing file {data_path}: {str(e)}", exc_info=True)
-        raise HTTPException(status_code=500, detail=f"Error encoding JSON for file {file_path}: {str(e)}")
+        return await unit_of_work().read_document_async(_storage_name(file_path))
     except Exception as e:
-        logger.error(f"Error writing file {data_path}: {str(e)}", exc_info=True)
-        raise HTTPException(status_code=500, detail=f"Error writing file {file_path}: {str(e)}")
+        raise _read_error(file_path, e)
+
+def find_entity_by_ref(file_key: str, list_path: str, ref: str, fields=("uuid", "id"), engine=None):
+    """(handle, entity) for the first entity whose field matches ref, trying fields in order; None if not found.
+    
+    Lookups go through the request's unit of work: a file it already read is searched in
+    memory, otherwise the storage engine answers (with the SQLite engine, from its indexes).
+    Pass the write batch as engine inside a mutation.
+    """
+    ref = (ref or "").strip()
+    if not ref:
+        return None
+    for field in fields:
+        hit = (engine or unit_of_work()).find_entity(JSON_FILES[file_key], list_path, field, ref)
+        if hit is not None:
+            return hit
+    return None
+
+async def mutate_json_file(file_path: str, mutation):
+    """Apply mutation(batch) to a data file and return its result once it is persisted.
+    
+    The mutation is staged on the request's unit of work and flushed with anything else staged
+    so far. Mutations of one file run one at a time, and those queued while a write is in
+    progress are persisted together in one write; staged mutations of several files are
+    committed as one transaction. batch offers read_document/write_document and the storage
+    entity calls for the staged files; if a mutation raises, none of the changes are written.
+    """
+    uow = unit_of_work()
+    uow.stage(_storage_name(file_path), mutation)
+    try:
+        return (await uow.flush())[-1]
+    except FileNotFoundError:
+        logger.error(f"File not found: {file_path}")
+        raise HTTPException(status_code=404, detail=f"File not found: {file_path}")
+    except WriteConflict as e:
+        raise HTTPException(status_code=409, detail=_conflict_detail(e))
+    except ReadOnlyStorage as e:
+        raise HTTPException(status_code=405, detail=str(e), headers=_READ_ONLY_HEADERS)
+
+def mutate_json_file_sync(file_path: str, mutation):
+    """mutate_json_file for endpoints running in the threadpool (plain def)."""
+    uow = unit_of_work()
+    uow.stage(_storage_name(file_path), mutation)
+    try:
+        return uow.flush_sync()[-1]
+    except FileNotFoundError:
+        logger.error(f"File not found: {file_path}")
+        raise HTTPException(status_code=404, detail=f"File not found: {file_path}")
+    except WriteConflict as e:
+        raise HTTPException(status_code=409, detail=_conflict_detail(e))
+    except ReadOnlyStorage as e:
+        raise HTTPException(status_code=405, detail=str(e), headers=_READ_ONLY_HEADERS)
 
 def update_search_index(data_type: str, action: str, item: Dict[str, Any] = None, item_id: str = None):
     """Update search index after data changes"""
@@ -1219,20 +1484,20 @@ async def create_agreement(request: Dict[str, Any], current_user: dict = Depends
     """
     try:
         logger.info(f"Create request for new agreement")
-        agreements_data = read_json_file(JSON_FILES['dataAgreements'])
-        
-        # Generate automatic ID
-        new_id = generate_next_agreement_id(agreements_data)
-        
-        # Add lastUpdated timestamp and assign the generated ID
+        # Add lastUpdated timestamp; the ID is generated when the agreement is appended
         new_agreement = request.copy()
-        new_agreement['id'] = new_id
         new_agreement['uuid'] = new_uuid_str()
         new_agreement['lastUpdated'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
         
-        agreements_data['agreements'].append(new_agreement)
+        def append_agreement(batch):
+            # Generate automatic ID
+            existing_ids = batch.entity_ids(JSON_FILES['dataAgreements'], 'agreements', prefix='agreement-')
+            new_agreement['id'] = generate_next_agreement_id({'agreements': [{'id': i} for i in existing_ids]})
+            batch.append_entity(JSON_FILES['dataAgreements'], 'agreements', new_agreement)
+            return new_agreement['id']
+        
         local_file_path = JSON_FILES['dataAgreements']
-        write_json_file(local_file_path, agreements_data)
+        new_id = await mutate_json_file(local_file_path, append_agreement)
         
         # Update search index
         update_search_index("dataAgreements", "add", new_agreement, agreement_search_doc_id(new_agreement))
@@ -1246,6 +1511,8 @@ async def create_agreement(request: Dict[str, Any], current_user: dict = Depends
             "uuid": new_agreement['uuid'],
             "created": True
         }
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error creating agreement: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error creating agreement: {str(e)}")
@@ -1267,32 +1534,23 @@ async def update_agreement(agreement_id: str, request: Dict[str, Any], current_u
     """
     try:
         logger.info(f"Update request for agreement: {agreement_id}")
-        agreements_data = read_json_file(JSON_FILES['dataAgreements'])
-        
-        # Find the agreement to update
-        agreement_to_update = None
-        for agreement in agreements_data['agreements']:
-            if matches_uuid_or_legacy_id(agreement, agreement_id):
-                agreement_to_update = agreement
-                break
-        
-        if not agreement_to_update:
-            raise HTTPException(status_code=404, detail=f"Agreement '{agreement_id}' not found")
-        
-        # Update the agreement
-        updated_agreement = agreement_to_update.copy()
-        updated_agreement.update(request)
-        updated_agreement['lastUpdated'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        def replace_agreement(batch):
+            # Find the agreement to update
+            hit = find_entity_by_ref('dataAgreements', 'agreements', agreement_id, engine=batch)
+            if hit is None:
+                raise HTTPException(status_code=404, detail=f"Agreement '{agreement_id}' not found")
+            handle, agreement_to_update = hit
+            
+            # Update the agreement
+            updated_agreement = agreement_to_update.copy()
+            updated_agreement.update(request)
+            updated_agreement['lastUpdated'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            batch.replace_entity(JSON_FILES['dataAgreements'], 'agreements', handle, updated_agreement)
+            return updated_agreement
         
         # Replace the old agreement with the updated one
-        agreements_data['agreements'] = [
-            a for a in agreements_data['agreements']
-            if not matches_uuid_or_legacy_id(a, agreement_id)
-        ]
-        agreements_data['agreements'].append(updated_agreement)
-        
         local_file_path = JSON_FILES['dataAgreements']
-        write_json_file(local_file_path, agreements_data)
+        updated_agreement = await mutate_json_file(local_file_path, replace_agreement)
         
         # Update search index
         update_search_index("dataAgreements", "update", updated_agreement, agreement_search_doc_id(updated_agreement))
@@ -1305,6 +1563,8 @@ async def update_agreement(agreement_id: str, request: Dict[str, Any], current_u
             "id": agreement_id,
             "updated": True
         }
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error updating agreement: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error updating agreement: {str(e)}")
@@ -1326,30 +1586,23 @@ async def update_data_product(product_id: str, request: Dict[str, Any], current_
     """
     try:
         logger.info(f"Update request for data product: {product_id}")
-        products_data = read_json_file(JSON_FILES['data-products'])
-        
-        # Find the product to update
-        product_to_update = None
-        product_index = None
-        for i, product in enumerate(products_data.get('products', [])):
-            if product.get('id', '').lower() == product_id.lower():
-                product_to_update = product
-                product_index = i
-                break
-        
-        if not product_to_update:
-            raise HTTPException(status_code=404, detail=f"Data product with ID '{product_id}' not found")
-        
-        # Update the product
-        updated_product = product_to_update.copy()
-        updated_product.update(request)
-        updated_product['lastUpdated'] = datetime.now().strftime('%Y-%m-%d')
+        def replace_product(batch):
+            # Find the product to update
+            hit = find_entity_by_ref('data-products', 'products', product_id, ("id",), batch)
+            if hit is None:
+                raise HTTPException(status_code=404, detail=f"Data product with ID '{product_id}' not found")
+            product_handle, product_to_update = hit
+            
+            # Update the product
+            updated_product = product_to_update.copy()
+            updated_product.update(request)
+            updated_product['lastUpdated'] = datetime.now().strftime('%Y-%m-%d')
+            batch.replace_entity(JSON_FILES['data-products'], 'products', product_handle, updated_product)
+            return updated_product
         
         # Replace the old product with the updated one
-        products_data['products'][product_index] = updated_product
-        
         local_file_path = JSON_FILES['data-products']
-        write_json_file(local_file_path, products_data)
+        updated_product = await mutate_json_file(local_file_path, replace_product)
         
         # Update search index
         update_search_index("data-products", "update", updated_product, product_id)
@@ -1362,6 +1615,8 @@ async def update_data_product(product_id: str, request: Dict[str, Any], current_
             "id": product_id,
             "updated": True
         }
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error updating data product: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error updating data product: {str(e)}")
@@ -1382,24 +1637,16 @@ async def delete_agreement(agreement_id: str, current_user: dict = Depends(requi
     """
     try:
         logger.info(f"Delete request for agreement: {agreement_id}")
-        agreements_data = read_json_file(JSON_FILES['dataAgreements'])
-        
-        agreement_to_delete = None
-        for agreement in agreements_data['agreements']:
-            if matches_uuid_or_legacy_id(agreement, agreement_id):
-                agreement_to_delete = agreement
-                break
-        
-        if not agreement_to_delete:
-            raise HTTPException(status_code=404, detail=f"Agreement '{agreement_id}' not found")
-        
-        agreements_data['agreements'] = [
-            a for a in agreements_data['agreements']
-            if not matches_uuid_or_legacy_id(a, agreement_id)
-        ]
+        def remove_agreement(batch):
+            hit = find_entity_by_ref('dataAgreements', 'agreements', agreement_id, engine=batch)
+            if hit is None:
+                raise HTTPException(status_code=404, detail=f"Agreement '{agreement_id}' not found")
+            handle, agreement = hit
+            batch.delete_entity(JSON_FILES['dataAgreements'], 'agreements', handle)
+            return agreement
         
         local_file_path = JSON_FILES['dataAgreements']
-        write_json_file(local_file_path, agreements_data)
+        agreement_to_delete = await mutate_json_file(local_file_path, remove_agreement)
         
         # Update search index
         update_search_index("dataAgreements", "delete", item_id=agreement_search_doc_id(agreement_to_delete))
@@ -1412,6 +1659,8 @@ async def delete_agreement(agreement_id: str, current_user: dict = Depends(requi
             "id": agreement_id,
             "deleted": True
         }
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error deleting agreement: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error deleting agreement: {str(e)}")
@@ -1481,19 +1730,24 @@ async def create_reference_item(request: Dict[str, Any], current_user: dict = De
     """
     try:
         logger.info(f"Create request for new reference item")
-        reference_data = read_json_file(JSON_FILES['reference'])
+        local_file_path = JSON_FILES['reference']
         
-        # Generate automatic ID
-        new_id = generate_next_reference_id(reference_data)
+        def add_item(batch):
+            reference_data = batch.read_document(JSON_FILES['reference'])
         
-        # Add lastUpdated timestamp and assign the generated ID
-        new_item = request.copy()
-        new_item['id'] = new_id
-        new_item['lastUpdated'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            # Generate automatic ID
+            new_id = generate_next_reference_id(reference_data)
         
-        reference_data['items'].append(new_item)
-        local_file_path = JSON_FILES['reference']
-        write_json_file(local_file_path, reference_data)
+            # Add lastUpdated timestamp and assign the generated ID
+            new_item = request.copy()
+            new_item['id'] = new_id
+            new_item['lastUpdated'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        
+            reference_data['items'].append(new_item)
+            batch.write_document(local_file_path, reference_data)
+            return new_id
+        
+        new_id = await mutate_json_file(local_file_path, add_item)
         
         logger.info(f"Created new reference item in local file {local_file_path}")
         logger.info(f"Reference item {new_id} created successfully")
@@ -1503,6 +1757,8 @@ async def create_reference_item(request: Dict[str, Any], current_user: dict = De
             "id": new_id,
             "created": True
         }
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error creating reference item: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error creating reference item: {str(e)}")
@@ -1524,32 +1780,36 @@ async def update_reference_item(item_id: str, request: Dict[str, Any], current_u
     """
     try:
         logger.info(f"Update request for reference item: {item_id}")
-        reference_data = read_json_file(JSON_FILES['reference'])
-        
-        # Find the reference item to update
-        item_to_update = None
-        for item in reference_data['items']:
-            if item['id'].lower() == item_id.lower():
-                item_to_update = item
-                break
-        
-        if not item_to_update:
-            raise HTTPException(status_code=404, detail=f"Reference item with ID '{item_id}' not found")
-        
-        # Update the reference item
-        updated_item = item_to_update.copy()
-        updated_item.update(request)
-        updated_item['lastUpdated'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        
-        # Replace the old item with the updated one
-        reference_data['items'] = [
-            i for i in reference_data['items'] 
-            if i['id'].lower() != item_id.lower()
-        ]
-        reference_data['items'].append(updated_item)
-        
         local_file_path = JSON_FILES['reference']
-        write_json_file(local_file_path, reference_data)
+        
+        def replace_item(batch):
+            reference_data = batch.read_document(JSON_FILES['reference'])
+        
+            # Find the reference item to update
+            item_to_update = None
+            for item in reference_data['items']:
+                if item['id'].lower() == item_id.lower():
+                    item_to_update = item
+                    break
+        
+            if not item_to_update:
+                raise HTTPException(status_code=404, detail=f"Reference item with ID '{item_id}' not found")
+        
+            # Update the reference item
+            updated_item = item_to_update.copy()
+            updated_item.update(request)
+            updated_item['lastUpdated'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        
+            # Replace the old item with the updated one
+            reference_data['items'] = [
+                i for i in reference_data['items'] 
+                if i['id'].lower() != item_id.lower()
+            ]
+            reference_data['items'].append(updated_item)
+        
+            batch.write_document(local_file_path, reference_data)
+        
+        await mutate_json_file(local_file_path, replace_item)
         
         logger.info(f"Reference item updated in local file {local_file_path}")
         logger.info(f"Reference item {item_id} updated successfully")
@@ -1559,6 +1819,8 @@ async def update_reference_item(item_id: str, request: Dict[str, Any], current_u
             "id": item_id,
             "updated": True
         }
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error updating reference item: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error updating reference item: {str(e)}")
@@ -1579,24 +1841,28 @@ async def delete_reference_item(item_id: str, current_user: dict = Depends(requi
     """
     try:
         logger.info(f"Delete request for reference item: {item_id}")
-        reference_data = read_json_file(JSON_FILES['reference'])
+        local_file_path = JSON_FILES['reference']
         
-        item_to_delete = None
-        for item in reference_data['items']:
-            if item['id'].lower() == item_id.lower():
-                item_to_delete = item
-                break
+        def remove_item(batch):
+            reference_data = batch.read_document(JSON_FILES['reference'])
         
-        if not item_to_delete:
-            raise HTTPException(status_code=404, detail=f"Reference item with ID '{item_id}' not found")
+            item_to_delete = None
+            for item in reference_data['items']:
+                if item['id'].lower() == item_id.lower():
+                    item_to_delete = item
+                    break
         
-        reference_data['items'] = [
-            i for i in reference_data['items'] 
-            if i['id'].lower() != item_id.lower()
-        ]
+            if not item_to_delete:
+                raise HTTPException(status_code=404, detail=f"Reference item with ID '{item_id}' not found")
         
-        local_file_path = JSON_FILES['reference']
-        write_json_file(local_file_path, reference_data)
+            reference_data['items'] = [
+                i for i in reference_data['items'] 
+                if i['id'].lower() != item_id.lower()
+            ]
+        
+            batch.write_document(local_file_path, reference_data)
+        
+        await mutate_json_file(local_file_path, remove_item)
         
         logger.info(f"Reference item deleted from local file {local_file_path}")
         logger.info(f"Reference item {item_id} deleted successfully")
@@ -1606,6 +1872,8 @@ async def delete_reference_item(item_id: str, current_user: dict = Depends(requi
             "id": item_id,
             "deleted": True
         }
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error deleting reference item: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error deleting reference item: {str(e)}")
@@ -1627,40 +1895,45 @@ async def create_glossary_term(request: Dict[str, Any], current_user: dict = Dep
     """
     try:
         logger.info(f"Create request for new glossary term")
-        glossary_data = read_json_file(JSON_FILES['glossary'])
+        local_file_path = JSON_FILES['glossary']
         
-        # Generate automatic ID if not provided
-        if not request.get('id'):
-            max_number = 0
-            for term in glossary_data.get('terms', []):
-                if term.get('id', '').startswith('glossary-'):
-                    try:
-                        number = int(term['id'].split('-')[1])
-                        max_number = max(max_number, number)
-                    except (ValueError, IndexError):
-                        continue
-            new_id = f"glossary-{max_number + 1:03d}"
-        else:
-            new_id = request['id']
+        def add_term(batch):
+            glossary_data = batch.read_document(JSON_FILES['glossary'])
+        
+            # Generate automatic ID if not provided
+            if not request.get('id'):
+                max_number = 0
+                for term in glossary_data.get('terms', []):
+                    if term.get('id', '').startswith('glossary-'):
+                        try:
+                            number = int(term['id'].split('-')[1])
+                            max_number = max(max_number, number)
+                        except (ValueError, IndexError):
+                            continue
+                new_id = f"glossary-{max_number + 1:03d}"
+            else:
+                new_id = request['id']
         
-        # Check if ID already exists
-        existing_term = next((t for t in glossary_data.get('terms', []) if t.get('id') == new_id), None)
-        if existing_term:
-            raise HTTPException(status_code=400, detail=f"Glossary term with ID '{new_id}' already exists")
+            # Check if ID already exists
+            existing_term = next((t for t in glossary_data.get('terms', []) if t.get('id') == new_id), None)
+            if existing_term:
+                raise HTTPException(status_code=400, detail=f"Glossary term with ID '{new_id}' already exists")
         
-        # Add lastUpdated timestamp and assign the generated ID
-        new_term = request.copy()
-        new_term['id'] = new_id
-        new_term['uuid'] = new_uuid_str()
-        if not new_term.get('lastUpdated'):
-            new_term['lastUpdated'] = datetime.now().strftime('%Y-%m-%d')
+            # Add lastUpdated timestamp and assign the generated ID
+            new_term = request.copy()
+            new_term['id'] = new_id
+            new_term['uuid'] = new_uuid_str()
+            if not new_term.get('lastUpdated'):
+                new_term['lastUpdated'] = datetime.now().strftime('%Y-%m-%d')
         
-        if 'terms' not in glossary_data:
-            glossary_data['terms'] = []
-        glossary_data['terms'].append(new_term)
+            if 'terms' not in glossary_data:
+                glossary_data['terms'] = []
+            glossary_data['terms'].append(new_term)
         
-        local_file_path = JSON_FILES['glossary']
-        write_json_file(local_file_path, glossary_data)
+            batch.write_document(local_file_path, glossary_data)
+            return new_id, new_term
+        
+        new_id, new_term = await mutate_json_file(local_file_path, add_term)
         
         logger.info(f"Created new glossary term in local file {local_file_path}")
         logger.info(f"Glossary term {new_id} created successfully")
@@ -1694,34 +1967,38 @@ async def update_glossary_term(term_id: str, request: Dict[str, Any], current_us
     """
     try:
         logger.info(f"Update request for glossary term: {term_id}")
-        glossary_data = read_json_file(JSON_FILES['glossary'])
-        
-        # Find the glossary term to update
-        term_to_update = None
-        for term in glossary_data.get('terms', []):
-            if matches_uuid_or_legacy_id(term, term_id):
-                term_to_update = term
-                break
-        
-        if not term_to_update:
-            raise HTTPException(status_code=404, detail=f"Glossary term '{term_id}' not found")
-        
-        # Update the glossary term
-        updated_term = term_to_update.copy()
-        updated_term.update(request)
-        updated_term['id'] = term_to_update['id']
-        updated_term['uuid'] = term_to_update.get('uuid')
-        updated_term['lastUpdated'] = datetime.now().strftime('%Y-%m-%d')
-        
-        # Replace the old term with the updated one
-        glossary_data['terms'] = [
-            t for t in glossary_data.get('terms', [])
-            if not matches_uuid_or_legacy_id(t, term_id)
-        ]
-        glossary_data['terms'].append(updated_term)
-        
         local_file_path = JSON_FILES['glossary']
-        write_json_file(local_file_path, glossary_data)
+        
+        def replace_term(batch):
+            glossary_data = batch.read_document(JSON_FILES['glossary'])
+        
+            # Find the glossary term to update
+            term_to_update = None
+            for term in glossary_data.get('terms', []):
+                if matches_uuid_or_legacy_id(term, term_id):
+                    term_to_update = term
+                    break
+        
+            if not term_to_update:
+                raise HTTPException(status_code=404, detail=f"Glossary term '{term_id}' not found")
+        
+            # Update the glossary term
+            updated_term = term_to_update.copy()
+            updated_term.update(request)
+            updated_term['id'] = term_to_update['id']
+            updated_term['uuid'] = term_to_update.get('uuid')
+            updated_term['lastUpdated'] = datetime.now().strftime('%Y-%m-%d')
+        
+            # Replace the old term with the updated one
+            glossary_data['terms'] = [
+                t for t in glossary_data.get('terms', [])
+                if not matches_uuid_or_legacy_id(t, term_id)
+            ]
+            glossary_data['terms'].append(updated_term)
+        
+            batch.write_document(local_file_path, glossary_data)
+        
+        await mutate_json_file(local_file_path, replace_term)
         
         logger.info(f"Glossary term updated in local file {local_file_path}")
         logger.info(f"Glossary term {term_id} updated successfully")
@@ -1753,24 +2030,28 @@ async def delete_glossary_term(term_id: str, current_user: dict = Depends(requir
     """
     try:
         logger.info(f"Delete request for glossary term: {term_id}")
-        glossary_data = read_json_file(JSON_FILES['glossary'])
+        local_file_path = JSON_FILES['glossary']
         
-        term_to_delete = None
-        for term in glossary_data.get('terms', []):
-            if matches_uuid_or_legacy_id(term, term_id):
-                term_to_delete = term
-                break
+        def remove_term(batch):
+            glossary_data = batch.read_document(JSON_FILES['glossary'])
         
-        if not term_to_delete:
-            raise HTTPException(status_code=404, detail=f"Glossary term '{term_id}' not found")
+            term_to_delete = None
+            for term in glossary_data.get('terms', []):
+                if matches_uuid_or_legacy_id(term, term_id):
+                    term_to_delete = term
+                    break
         
-        glossary_data['terms'] = [
-            t for t in glossary_data.get('terms', [])
-            if not matches_uuid_or_legacy_id(t, term_id)
-        ]
+            if not term_to_delete:
+                raise HTTPException(status_code=404, detail=f"Glossary term '{term_id}' not found")
         
-        local_file_path = JSON_FILES['glossary']
-        write_json_file(local_file_path, glossary_data)
+            glossary_data['terms'] = [
+                t for t in glossary_data.get('terms', [])
+                if not matches_uuid_or_legacy_id(t, term_id)
+            ]
+        
+            batch.write_document(local_file_path, glossary_data)
+        
+        await mutate_json_file(local_file_path, remove_term)
         
         logger.info(f"Glossary term deleted from local file {local_file_path}")
         logger.info(f"Glossary term {term_id} deleted successfully")
@@ -1803,21 +2084,26 @@ async def create_application(application: Dict[str, Any], current_user: dict = D
     """
     try:
         logger.info(f"Create request for application: {application.get('name', 'Unknown')}")
-        applications_data = read_json_file(JSON_FILES['applications'])
-        
-        # Generate new ID
-        max_id = max([app['id'] for app in applications_data['applications']]) if applications_data['applications'] else 0
-        new_id = max_id + 1
-        
-        # Preserve full payload from client (roles, email, image, etc.); assign server id
-        incoming = dict(application)
-        incoming.pop("id", None)
-        new_application = {**incoming, "id": new_id, "uuid": new_uuid_str()}
+        local_file_path = JSON_FILES['applications']
         
-        applications_data['applications'].append(new_application)
+        def add_application(batch):
+            applications_data = batch.read_document(JSON_FILES['applications'])
+            
+            # Generate new ID
+            max_id = max([app['id'] for app in applications_data['applications']]) if applications_data['applications'] else 0
+            new_id = max_id + 1
+            
+            # Preserve full payload from client (roles, email, image, etc.); assign server id
+            incoming = dict(application)
+            incoming.pop("id", None)
+            new_application = {**incoming, "id": new_id, "uuid": new_uuid_str()}
+            
+            applications_data['applications'].append(new_application)
+            
+            batch.write_document(local_file_path, applications_data)
+            return new_id, new_application
         
-        local_file_path = JSON_FILES['applications']
-        write_json_file(local_file_path, applications_data)
+        new_id, new_application = await mutate_json_file(local_file_path, add_application)
         
         logger.info(f"Application created in local file {local_file_path}")
         logger.info(f"Application {new_id} created successfully")
@@ -1828,6 +2114,8 @@ async def create_application(application: Dict[str, Any], current_user: dict = D
             "uuid": new_application["uuid"],
             "application": new_application
         }
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error creating application: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error creating application: {str(e)}")
@@ -1849,39 +2137,45 @@ async def update_application(application_id: str, application: Dict[str, Any], c
     """
     try:
         logger.info(f"Update request for application: {application_id}")
-        applications_data = read_json_file(JSON_FILES['applications'])
-        
-        # Find the application to update
-        app_to_update = None
-        for i, app in enumerate(applications_data['applications']):
-            if matches_uuid_or_legacy_id(app, str(application_id)):
-                app_to_update = i
-                break
-        
-        if app_to_update is None:
-            raise HTTPException(status_code=404, detail=f"Application '{application_id}' not found")
-        
-        # Merge so optional fields (image, email, roles, etc.) persist
-        existing = applications_data['applications'][app_to_update]
-        body = dict(application)
-        body["id"] = existing["id"]
-        if existing.get("uuid"):
-            body["uuid"] = existing["uuid"]
-        applications_data['applications'][app_to_update] = {**existing, **body}
-        
         local_file_path = JSON_FILES['applications']
-        write_json_file(local_file_path, applications_data)
+        
+        def replace_application(batch):
+            applications_data = batch.read_document(JSON_FILES['applications'])
+            
+            # Find the application to update
+            app_to_update = None
+            for i, app in enumerate(applications_data['applications']):
+                if matches_uuid_or_legacy_id(app, str(application_id)):
+                    app_to_update = i
+                    break
+            
+            if app_to_update is None:
+                raise HTTPException(status_code=404, detail=f"Application '{application_id}' not found")
+            
+            # Merge so optional fields (image, email, roles, etc.) persist
+            existing = applications_data['applications'][app_to_update]
+            body = dict(application)
+            body["id"] = existing["id"]
+            if existing.get("uuid"):
+                body["uuid"] = existing["uuid"]
+            applications_data['applications'][app_to_update] = {**existing, **body}
+            
+            batch.write_document(local_file_path, applications_data)
+            return applications_data['applications'][app_to_update]
+        
+        updated = await mutate_json_file(local_file_path, replace_application)
         
         logger.info(f"Application updated in local file {local_file_path}")
         logger.info(f"Application {application_id} updated successfully")
         
-        updated = applications_data['applications'][app_to_update]
         return {
             "message": "Application updated successfully",
             "id": updated["id"],
             "uuid": updated.get("uuid"),
             "application": updated
         }
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error updating application: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error updating application: {str(e)}")
@@ -1902,24 +2196,29 @@ async def delete_application(application_id: str, current_user: dict = Depends(r
     """
     try:
         logger.info(f"Delete request for application: {application_id}")
-        applications_data = read_json_file(JSON_FILES['applications'])
-        
-        app_to_delete = None
-        for app in applications_data['applications']:
-            if matches_uuid_or_legacy_id(app, str(application_id)):
-                app_to_delete = app
-                break
-        
-        if not app_to_delete:
-            raise HTTPException(status_code=404, detail=f"Application '{application_id}' not found")
+        local_file_path = JSON_FILES['applications']
         
-        applications_data['applications'] = [
-            app for app in applications_data['applications']
-            if not matches_uuid_or_legacy_id(app, str(application_id))
-        ]
+        def remove_application(batch):
+            applications_data = batch.read_document(JSON_FILES['applications'])
+            
+            app_to_delete = None
+            for app in applications_data['applications']:
+                if matches_uuid_or_legacy_id(app, str(application_id)):
+                    app_to_delete = app
+                    break
+            
+            if not app_to_delete:
+                raise HTTPException(status_code=404, detail=f"Application '{application_id}' not found")
+            
+            applications_data['applications'] = [
+                app for app in applications_data['applications']
+                if not matches_uuid_or_legacy_id(app, str(application_id))
+            ]
+            
+            batch.write_document(local_file_path, applications_data)
+            return app_to_delete
         
-        local_file_path = JSON_FILES['applications']
-        write_json_file(local_file_path, applications_data)
+        app_to_delete = await mutate_json_file(local_file_path, remove_application)
         
         logger.info(f"Application deleted from local file {local_file_path}")
         logger.info(f"Application {application_id} deleted successfully")
@@ -1930,6 +2229,8 @@ async def delete_application(application_id: str, current_user: dict = Depends(r
             "uuid": app_to_delete.get("uuid"),
             "deleted": True
         }
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error deleting application: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error deleting application: {str(e)}")
@@ -1953,139 +2254,138 @@ async def create_toolkit_component(component: Dict[str, Any], current_user: dict
         logger.info(f"Create request for toolkit component: {component.get('name', 'Unknown')}")
         logger.debug(f"Component data received: {json.dumps(component, default=str)[:500]}")  # Log first 500 chars
         
-        toolkit_data = read_json_file(JSON_FILES['toolkit'])
-        
-        # Ensure toolkit structure exists
-        if 'toolkit' not in toolkit_data:
-            toolkit_data['toolkit'] = {}
-        
-        # Determine component type and generate ID
-        component_type = component.get('type', 'functions')
-        if component_type not in ['functions', 'containers', 'terraform', 'toolkits']:
-            raise HTTPException(status_code=400, detail="Invalid component type")
-        
-        # Initialize component type array if it doesn't exist
-        if component_type not in toolkit_data['toolkit']:
-            toolkit_data['toolkit'][component_type] = []
-        
-        # Workbench toolkits (technologies hub + optional cardImage as data URL)
-        if component_type == 'toolkits':
-            if not (component.get('name') or '').strip():
-                raise HTTPException(status_code=400, detail="Toolkit name is required")
-            new_id = new_uuid_str()
-            technologies = component.get('technologies', [])
-            if not isinstance(technologies, list):
-                technologies = []
+        def add_component(batch):
+            toolkit_data = batch.read_document(JSON_FILES['toolkit'])
+            
+            # Ensure toolkit structure exists
+            if 'toolkit' not in toolkit_data:
+                toolkit_data['toolkit'] = {}
+            
+            # Determine component type and generate ID
+            component_type = component.get('type', 'functions')
+            if component_type not in ['functions', 'containers', 'terraform', 'toolkits']:
+                raise HTTPException(status_code=400, detail="Invalid component type")
+            
+            # Initialize component type array if it doesn't exist
+            if component_type not in toolkit_data['toolkit']:
+                toolkit_data['toolkit'][component_type] = []
+            
+            # Workbench toolkits (technologies hub + optional cardImage as data URL)
+            if component_type == 'toolkits':
+                if not (component.get('name') or '').strip():
+                    raise HTTPException(status_code=400, detail="Toolkit name is required")
+                new_id = new_uuid_str()
+                technologies = component.get('technologies', [])
+                if not isinstance(technologies, list):
+                    technologies = []
+                new_component = {
+                    "id": new_id,
+                    "uuid": new_id,
+                    "name": component.get('name', ''),
+                    "displayName": component.get('displayName', component.get('name', '')),
+                    "description": component.get('description', ''),
+                    "category": component.get('category', ''),
+                    "tags": component.get('tags', []),
+                    "technologies": technologies,
+                    "rankingDisabled": bool(component.get('rankingDisabled', False)),
+                    "multipleTechnologies": component.get('multipleTechnologies', True) is not False,
+                    "author": component.get('author', ''),
+                    "version": component.get('version', '1.0.0'),
+                    "lastUpdated": datetime.now().isoformat(),
+                    "clickCount": 0,
+                }
+                ci = component.get('cardImage')
+                if ci is not None and ci != "":
+                    new_component["cardImage"] = ci
+                toolkit_data["toolkit"][component_type].append(new_component)
+                batch.write_document(JSON_FILES["toolkit"], toolkit_data)
+                logger.info(f"Toolkit workbench created: {new_id}")
+                return new_id, new_component
+
+            # For functions, generate a UUID as the ID
+            if component_type == 'functions':
+                function_name = component.get('name', '')
+                if not function_name:
+                    raise HTTPException(status_code=400, detail="Function name is required")
+                
+                # Check if function name already exists (for display purposes, not ID)
+                existing_names = [item.get('name', '') for item in toolkit_data['toolkit'][component_type] if item.get('name')]
+                if function_name in existing_names:
+                    raise HTTPException(status_code=400, detail=f"Function with name '{function_name}' already exists")
+                
+                # Generate UUID for function ID
+                new_id = new_uuid_str()
+            else:
+                # Generate new ID for containers / terraform only
+                existing_ids = [item.get('id', '') for item in toolkit_data['toolkit'][component_type] if item.get('id')]
+                if component_type == 'containers':
+                    prefix = 'cont_'
+                else:
+                    prefix = 'tf_'
+                
+                max_num = 0
+                for item_id in existing_ids:
+                    if item_id and item_id.startswith(prefix):
+                        try:
+                            num = int(item_id.split('_')[1])
+                            max_num = max(max_num, num)
+                        except (ValueError, IndexError):
+                            pass
+                
+                new_id = f"{prefix}{max_num + 1:03d}"
+            
+            # Functions use UUID as id; containers/terraform keep legacy id plus a distinct uuid for URLs
+            component_uuid = new_uuid_str() if component_type in ("containers", "terraform") else new_id
+
+            # Create new component with ID
             new_component = {
                 "id": new_id,
-                "uuid": new_id,
+                "uuid": component_uuid,
                 "name": component.get('name', ''),
                 "displayName": component.get('displayName', component.get('name', '')),
                 "description": component.get('description', ''),
+                "type": component_type,
                 "category": component.get('category', ''),
                 "tags": component.get('tags', []),
-                "technologies": technologies,
-                "rankingDisabled": bool(component.get('rankingDisabled', False)),
-                "multipleTechnologies": component.get('multipleTechnologies', True) is not False,
                 "author": component.get('author', ''),
                 "version": component.get('version', '1.0.0'),
                 "lastUpdated": datetime.now().isoformat(),
-                "clickCount": 0,
-            }
-            ci = component.get('cardImage')
-            if ci is not None and ci != "":
-                new_component["cardImage"] = ci
-            toolkit_data["toolkit"][component_type].append(new_component)
-            local_file_path = JSON_FILES["toolkit"]
-            write_json_file(local_file_path, toolkit_data)
-            logger.info(f"Toolkit workbench created in local file {local_file_path}: {new_id}")
-            return {
-                "message": "Toolkit component created successfully",
-                "id": new_id,
-                "component": new_component,
+                "usage": component.get('usage', ''),
+                "dependencies": component.get('dependencies', []),
+                "examples": component.get('examples', []),
+                "git": component.get('git', ''),
+                "rating": component.get('rating', 5.0),
+                "downloads": 0,
+                "clickCount": 0
             }
-
-        # For functions, generate a UUID as the ID
-        if component_type == 'functions':
-            function_name = component.get('name', '')
-            if not function_name:
-                raise HTTPException(status_code=400, detail="Function name is required")
             
-            # Check if function name already exists (for display purposes, not ID)
-            existing_names = [item.get('name', '') for item in toolkit_data['toolkit'][component_type] if item.get('name')]
-            if function_name in existing_names:
-                raise HTTPException(status_code=400, detail=f"Function with name '{function_name}' already exists")
+            # Add type-specific fields
+            if component_type == 'functions':
+                new_component['language'] = component.get('language', 'python')
+                # Safely handle code field - ensure it's a string
+                code_value = component.get('code', '')
+                new_component['code'] = str(code_value) if code_value is not None else ''
+                # Safely handle parameters - ensure it's a list
+                params = component.get('parameters', [])
+                new_component['parameters'] = params if isinstance(params, list) else []
+            elif component_type == 'containers':
+                new_component['dockerfile'] = component.get('dockerfile', '')
+                new_component['dockerCompose'] = component.get('dockerCompose', '')
+            elif component_type == 'terraform':
+                new_component['provider'] = component.get('provider', '')
+                new_component['mainTf'] = component.get('mainTf', '')
+                new_component['variablesTf'] = component.get('variablesTf', '')
+                new_component['outputsTf'] = component.get('outputsTf', '')
             
-            # Generate UUID for function ID
-            new_id = new_uuid_str()
-        else:
-            # Generate new ID for containers / terraform only
-            existing_ids = [item.get('id', '') for item in toolkit_data['toolkit'][component_type] if item.get('id')]
-            if component_type == 'containers':
-                prefix = 'cont_'
-            else:
-                prefix = 'tf_'
+            toolkit_data['toolkit'][component_type].append(new_component)
             
-            max_num = 0
-            for item_id in existing_ids:
-                if item_id and item_id.startswith(prefix):
-                    try:
-                        num = int(item_id.split('_')[1])
-                        max_num = max(max_num, num)
-                    except (ValueError, IndexError):
-                        pass
+            logger.debug(f"About to write component with ID: {new_id}, name: {new_component.get('name')}")
             
-            new_id = f"{prefix}{max_num + 1:03d}"
-        
-        # Functions use UUID as id; containers/terraform keep legacy id plus a distinct uuid for URLs
-        component_uuid = new_uuid_str() if component_type in ("containers", "terraform") else new_id
-
-        # Create new component with ID
-        new_component = {
-            "id": new_id,
-            "uuid": component_uuid,
-            "name": component.get('name', ''),
-            "displayName": component.get('displayName', component.get('name', '')),
-            "description": component.get('description', ''),
-            "type": component_type,
-            "category": component.get('category', ''),
-            "tags": component.get('tags', []),
-            "author": component.get('author', ''),
-            "version": component.get('version', '1.0.0'),
-            "lastUpdated": datetime.now().isoformat(),
-            "usage": component.get('usage', ''),
-            "dependencies": component.get('dependencies', []),
-            "examples": component.get('examples', []),
-            "git": component.get('git', ''),
-            "rating": component.get('rating', 5.0),
-            "downloads": 0,
-            "clickCount": 0
-        }
-        
-        # Add type-specific fields
-        if component_type == 'functions':
-            new_component['language'] = component.get('language', 'python')
-            # Safely handle code field - ensure it's a string
-            code_value = component.get('code', '')
-            new_component['code'] = str(code_value) if code_value is not None else ''
-            # Safely handle parameters - ensure it's a list
-            params = component.get('parameters', [])
-            new_component['parameters'] = params if isinstance(params, list) else []
-        elif component_type == 'containers':
-            new_component['dockerfile'] = component.get('dockerfile', '')
-            new_component['dockerCompose'] = component.get('dockerCompose', '')
-        elif component_type == 'terraform':
-            new_component['provider'] = component.get('provider', '')
-            new_component['mainTf'] = component.get('mainTf', '')
-            new_component['variablesTf'] = component.get('variablesTf', '')
-            new_component['outputsTf'] = component.get('outputsTf', '')
-        
-        toolkit_data['toolkit'][component_type].append(new_component)
-        
-        logger.debug(f"About to write component with ID: {new_id}, name: {new_component.get('name')}")
+            batch.write_document(JSON_FILES['toolkit'], toolkit_data)
+            return new_id, new_component
         
         local_file_path = JSON_FILES['toolkit']
-        write_json_file(local_file_path, toolkit_data)
+        new_id, new_component = await mutate_json_file(local_file_path, add_component)
         
         logger.info(f"Toolkit component created in local file {local_file_path}")
         logger.info(f"Component {new_id} created successfully")
@@ -2130,101 +2430,102 @@ async def update_toolkit_package(
         if not isinstance(package_data, dict):
             raise HTTPException(status_code=400, detail=f"Package data must be a dictionary, got {type(package_data)}")
         
-        # Read toolkit data
-        try:
-            toolkit_data = read_json_file(JSON_FILES['toolkit'])
-        except Exception as e:
-            logger.error(f"Error reading toolkit file: {str(e)}")
-            raise HTTPException(status_code=500, detail=f"Error reading toolkit data: {str(e)}")
-        
-        # Ensure toolkit structure exists
-        if 'toolkit' not in toolkit_data:
-            toolkit_data['toolkit'] = {}
-        
-        # Initialize packages array if it doesn't exist
-        if 'packages' not in toolkit_data['toolkit']:
-            toolkit_data['toolkit']['packages'] = []
-        
-        # Find existing package or create new one
-        packages = toolkit_data['toolkit'].get('packages', [])
-        package_index = None
-        is_new_package = (package_id == 'new' or package_id not in [pkg.get('id') for pkg in packages])
-        
-        if not is_new_package:
-            for i, pkg in enumerate(packages):
-                if pkg.get('id') == package_id:
-                    package_index = i
-                    break
-        
-        # Safely extract and validate data
-        try:
-            # Ensure functionIds is a list
-            function_ids = package_data.get('functionIds', [])
-            if function_ids is None:
-                function_ids = []
-            elif not isinstance(function_ids, list):
-                logger.warning(f"functionIds is not a list, converting: {function_ids}")
-                function_ids = list(function_ids) if hasattr(function_ids, '__iter__') else []
-            
-            # Ensure maintainers is a list
-            maintainers = package_data.get('maintainers', [])
-            if maintainers is None:
-                maintainers = []
-            elif not isinstance(maintainers, list):
-                logger.warning(f"maintainers is not a list, converting: {maintainers}")
-                maintainers = list(maintainers) if hasattr(maintainers, '__iter__') else []
-            
-            # Safely get string fields
-            description = str(package_data.get('description', '')) if package_data.get('description') is not None else ''
-            version = str(package_data.get('version', '')) if package_data.get('version') is not None else ''
-            latest_release_date = str(package_data.get('latestReleaseDate', '')) if package_data.get('latestReleaseDate') is not None else ''
-            documentation = str(package_data.get('documentation', '')) if package_data.get('documentation') is not None else ''
-            github_repo = str(package_data.get('githubRepo', '')) if package_data.get('githubRepo') is not None else ''
-            package_name = package_data.get('name', '')
-            if not package_name:
-                raise HTTPException(status_code=400, detail="Package name is required")
-            
-            pip_install = str(package_data.get('pipInstall', f'pip install {package_name}')) if package_data.get('pipInstall') is not None else f'pip install {package_name}'
-            
-            # Generate UUID for new packages
-            if is_new_package:
-                package_uuid = new_uuid_str()
-            else:
-                package_uuid = package_id
-            
-            package_metadata = {
-                "id": package_uuid,
-                "name": package_name,
-                "description": description,
-                "version": version,
-                "latestReleaseDate": latest_release_date,
-                "maintainers": maintainers,
-                "documentation": documentation,
-                "githubRepo": github_repo,
-                "pipInstall": pip_install,
-                "functionIds": function_ids,
-            }
-        except Exception as e:
-            logger.error(f"Error processing package data: {str(e)}", exc_info=True)
-            raise HTTPException(status_code=400, detail=f"Error processing package data: {str(e)}")
-        
-        # Update or create package
-        try:
-            if package_index is not None:
-                toolkit_data['toolkit']['packages'][package_index] = package_metadata
-                logger.info(f"Updated existing package: {package_name} (ID: {package_uuid})")
-            else:
-                toolkit_data['toolkit']['packages'].append(package_metadata)
-                logger.info(f"Created new package: {package_name} (ID: {package_uuid})")
-        except Exception as e:
-            logger.error(f"Error updating package in memory: {str(e)}", exc_info=True)
-            raise HTTPException(status_code=500, detail=f"Error updating package: {str(e)}")
+        def save_package(batch):
+            # Read toolkit data
+            toolkit_data = batch.read_document(JSON_FILES['toolkit'])
+            
+            # Ensure toolkit structure exists
+            if 'toolkit' not in toolkit_data:
+                toolkit_data['toolkit'] = {}
+            
+            # Initialize packages array if it doesn't exist
+            if 'packages' not in toolkit_data['toolkit']:
+                toolkit_data['toolkit']['packages'] = []
+            
+            # Find existing package or create new one
+            packages = toolkit_data['toolkit'].get('packages', [])
+            package_index = None
+            is_new_package = (package_id == 'new' or package_id not in [pkg.get('id') for pkg in packages])
+            
+            if not is_new_package:
+                for i, pkg in enumerate(packages):
+                    if pkg.get('id') == package_id:
+                        package_index = i
+                        break
+            
+            # Safely extract and validate data
+            try:
+                # Ensure functionIds is a list
+                function_ids = package_data.get('functionIds', [])
+                if function_ids is None:
+                    function_ids = []
+                elif not isinstance(function_ids, list):
+                    logger.warning(f"functionIds is not a list, converting: {function_ids}")
+                    function_ids = list(function_ids) if hasattr(function_ids, '__iter__') else []
+                
+                # Ensure maintainers is a list
+                maintainers = package_data.get('maintainers', [])
+                if maintainers is None:
+                    maintainers = []
+                elif not isinstance(maintainers, list):
+                    logger.warning(f"maintainers is not a list, converting: {maintainers}")
+                    maintainers = list(maintainers) if hasattr(maintainers, '__iter__') else []
+                
+                # Safely get string fields
+                description = str(package_data.get('description', '')) if package_data.get('description') is not None else ''
+                version = str(package_data.get('version', '')) if package_data.get('version') is not None else ''
+                latest_release_date = str(package_data.get('latestReleaseDate', '')) if package_data.get('latestReleaseDate') is not None else ''
+                documentation = str(package_data.get('documentation', '')) if package_data.get('documentation') is not None else ''
+                github_repo = str(package_data.get('githubRepo', '')) if package_data.get('githubRepo') is not None else ''
+                package_name = package_data.get('name', '')
+                if not package_name:
+                    raise HTTPException(status_code=400, detail="Package name is required")
+                
+                pip_install = str(package_data.get('pipInstall', f'pip install {package_name}')) if package_data.get('pipInstall') is not None else f'pip install {package_name}'
+                
+                # Generate UUID for new packages
+                if is_new_package:
+                    package_uuid = new_uuid_str()
+                else:
+                    package_uuid = package_id
+                
+                package_metadata = {
+                    "id": package_uuid,
+                    "name": package_name,
+                    "description": description,
+                    "version": version,
+                    "latestReleaseDate": latest_release_date,
+                    "maintainers": maintainers,
+                    "documentation": documentation,
+                    "githubRepo": github_repo,
+                    "pipInstall": pip_install,
+                    "functionIds": function_ids,
+                }
+            except Exception as e:
+                logger.error(f"Error processing package data: {str(e)}", exc_info=True)
+                raise HTTPException(status_code=400, detail=f"Error processing package data: {str(e)}")
+            
+            # Update or create package
+            try:
+                if package_index is not None:
+                    toolkit_data['toolkit']['packages'][package_index] = package_metadata
+                    logger.info(f"Updated existing package: {package_name} (ID: {package_uuid})")
+                else:
+                    toolkit_data['toolkit']['packages'].append(package_metadata)
+                    logger.info(f"Created new package: {package_name} (ID: {package_uuid})")
+            except Exception as e:
+                logger.error(f"Error updating package in memory: {str(e)}", exc_info=True)
+                raise HTTPException(status_code=500, detail=f"Error updating package: {str(e)}")
+            
+            batch.write_document(JSON_FILES['toolkit'], toolkit_data)
+            return package_metadata
         
         # Save the updated toolkit data
         try:
-            local_file_path = JSON_FILES['toolkit']
-            write_json_file(local_file_path, toolkit_data)
-            logger.info(f"Package {package_name} (ID: {package_uuid}) saved successfully")
+            package_metadata = await mutate_json_file(JSON_FILES['toolkit'], save_package)
+            logger.info(f"Package {package_metadata['name']} (ID: {package_metadata['id']}) saved successfully")
+        except HTTPException:
+            raise
         except Exception as e:
             logger.error(f"Error writing toolkit file: {str(e)}", exc_info=True)
             raise HTTPException(status_code=500, detail=f"Error saving toolkit data: {str(e)}")
@@ -2261,89 +2562,78 @@ async def update_toolkit_component(component_type: str, component_id: str, compo
         if component_type not in ['functions', 'containers', 'terraform', 'toolkits']:
             raise HTTPException(status_code=400, detail="Invalid component type")
         
-        toolkit_data = read_json_file(JSON_FILES['toolkit'])
-        if 'toolkit' not in toolkit_data or component_type not in toolkit_data['toolkit']:
-            raise HTTPException(status_code=404, detail="Toolkit data not found")
-        
-        # Find the component to update (uuid or legacy id)
-        comp_to_update = None
-        for i, comp in enumerate(toolkit_data['toolkit'][component_type]):
-            if _toolkit_component_matches(comp, component_id):
-                comp_to_update = i
-                break
-        
-        if comp_to_update is None:
-            raise HTTPException(status_code=404, detail=f"Component with ID {component_id} not found")
-        
-        # Update the component
-        existing_component = toolkit_data['toolkit'][component_type][comp_to_update]
-
-        # Workbench toolkits: merge whitelisted fields (supports cardImage data URLs + technologies)
-        if component_type == 'toolkits':
-            updated_component = {**existing_component}
-            merge_keys = (
-                'name', 'displayName', 'description', 'category', 'tags', 'cardImage',
-                'rankingDisabled', 'multipleTechnologies', 'technologies', 'author', 'version',
-                'itemId', 'item_id',
-            )
-            for key in merge_keys:
-                if key in component:
-                    updated_component[key] = component[key]
-            updated_component['id'] = existing_component['id']
-            updated_component['uuid'] = existing_component.get('uuid') or existing_component['id']
-            updated_component['lastUpdated'] = datetime.now().isoformat()
+        list_path = f"toolkit.{component_type}"
+        
+        def replace_component(batch):
+            # Find the component to update (legacy id or uuid)
+            hit = find_entity_by_ref('toolkit', list_path, component_id, ("id", "uuid"), batch)
+            if hit is None:
+                raise HTTPException(status_code=404, detail=f"Component with ID {component_id} not found")
+            
+            # Update the component
+            comp_handle, existing_component = hit
+
+            # Workbench toolkits: merge whitelisted fields (supports cardImage data URLs + technologies)
+            if component_type == 'toolkits':
+                updated_component = {**existing_component}
+                merge_keys = (
+                    'name', 'displayName', 'description', 'category', 'tags', 'cardImage',
+                    'rankingDisabled', 'multipleTechnologies', 'technologies', 'author', 'version',
+                    'itemId', 'item_id',
+                )
+                for key in merge_keys:
+                    if key in component:
+                        updated_component[key] = component[key]
+                updated_component['id'] = existing_component['id']
+                updated_component['uuid'] = existing_component.get('uuid') or existing_component['id']
+                updated_component['lastUpdated'] = datetime.now().isoformat()
+                if 'clickCount' in existing_component:
+                    updated_component['clickCount'] = existing_component['clickCount']
+                batch.replace_entity(JSON_FILES['toolkit'], list_path, comp_handle, updated_component)
+                logger.info(f"Toolkit workbench updated: {component_id}")
+                return updated_component
+
+            updated_component = {
+                **existing_component,
+                "name": component.get('name', ''),
+                "displayName": component.get('displayName', component.get('name', '')),
+                "description": component.get('description', ''),
+                "category": component.get('category', ''),
+                "tags": component.get('tags', []),
+                "author": component.get('author', ''),
+                "version": component.get('version', '1.0.0'),
+                "lastUpdated": datetime.now().isoformat(),
+                "usage": component.get('usage', ''),
+                "dependencies": component.get('dependencies', []),
+                "examples": component.get('examples', []),
+                "git": component.get('git', ''),
+                "rating": component.get('rating', 5.0)
+            }
+            # Preserve clickCount if it exists
             if 'clickCount' in existing_component:
                 updated_component['clickCount'] = existing_component['clickCount']
-            toolkit_data['toolkit'][component_type][comp_to_update] = updated_component
-            local_file_path = JSON_FILES['toolkit']
-            write_json_file(local_file_path, toolkit_data)
-            logger.info(f"Toolkit workbench updated: {component_id}")
-            return {
-                "message": "Toolkit component updated successfully",
-                "id": component_id,
-                "component": updated_component,
-            }
-
-        updated_component = {
-            **existing_component,
-            "name": component.get('name', ''),
-            "displayName": component.get('displayName', component.get('name', '')),
-            "description": component.get('description', ''),
-            "category": component.get('category', ''),
-            "tags": component.get('tags', []),
-            "author": component.get('author', ''),
-            "version": component.get('version', '1.0.0'),
-            "lastUpdated": datetime.now().isoformat(),
-            "usage": component.get('usage', ''),
-            "dependencies": component.get('dependencies', []),
-            "examples": component.get('examples', []),
-            "git": component.get('git', ''),
-            "rating": component.get('rating', 5.0)
-        }
-        # Preserve clickCount if it exists
-        if 'clickCount' in existing_component:
-            updated_component['clickCount'] = existing_component['clickCount']
-        
-        # Update type-specific fields
-        if component_type == 'functions':
-            updated_component['language'] = component.get('language', '')
-            updated_component['code'] = component.get('code', '')
-            updated_component['parameters'] = component.get('parameters', [])
-        elif component_type == 'containers':
-            updated_component['dockerfile'] = component.get('dockerfile', '')
-            updated_component['dockerCompose'] = component.get('dockerCompose', '')
-        elif component_type == 'terraform':
-            updated_component['provider'] = component.get('provider', '')
-            updated_component['mainTf'] = component.get('mainTf', '')
-            updated_component['variablesTf'] = component.get('variablesTf', '')
-            updated_component['outputsTf'] = component.get('outputsTf', '')
-        
-        toolkit_data['toolkit'][component_type][comp_to_update] = updated_component
+            
+            # Update type-specific fields
+            if component_type == 'functions':
+                updated_component['language'] = component.get('language', '')
+                updated_component['code'] = component.get('code', '')
+                updated_component['parameters'] = component.get('parameters', [])
+            elif component_type == 'containers':
+                updated_component['dockerfile'] = component.get('dockerfile', '')
+                updated_component['dockerCompose'] = component.get('dockerCompose', '')
+            elif component_type == 'terraform':
+                updated_component['provider'] = component.get('provider', '')
+                updated_component['mainTf'] = component.get('mainTf', '')
+                updated_component['variablesTf'] = component.get('variablesTf', '')
+                updated_component['outputsTf'] = component.get('outputsTf', '')
+            
+            batch.replace_entity(JSON_FILES['toolkit'], list_path, comp_handle, updated_component)
+            return updated_component
         
         local_file_path = JSON_FILES['toolkit']
-        write_json_file(local_file_path, toolkit_data)
+        updated_component = await mutate_json_file(local_file_path, replace_component)
         
-        logger.info(f"Toolkit component updated in local file {local_file_path}")
+        logger.info(f"Toolkit component updated in {local_file_path}")
         logger.info(f"Component {component_id} updated successfully")
         
         return {
@@ -2351,6 +2641,8 @@ async def update_toolkit_component(component_type: str, component_id: str, compo
             "id": component_id,
             "component": updated_component
         }
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error updating toolkit component: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error updating toolkit component: {str(e)}")
@@ -2379,9 +2671,9 @@ async def import_functions_from_library(
         logger.info(f"Import request for library: {package_name}, module: {module_path}, pypi_url: {pypi_url}, bulk_mode: {bulk_mode}")
         
         if bulk_mode:
-            result = python_introspection_service.get_all_functions_from_package(package_name, module_path, pypi_url, include_submodules=True)
+            result = await introspection_io.run(python_introspection_service.get_all_functions_from_package, package_name, module_path, pypi_url, include_submodules=True)
         else:
-            result = python_introspection_service.get_functions_from_package(package_name, module_path, pypi_url)
+            result = await introspection_io.run(python_introspection_service.get_functions_from_package, package_name, module_path, pypi_url)
         
         if not result["success"]:
             raise HTTPException(
@@ -2420,53 +2712,58 @@ async def delete_toolkit_package(
     try:
         logger.info(f"Delete request for toolkit package: {package_id}")
         
-        # Read toolkit data
-        toolkit_data = read_json_file(JSON_FILES['toolkit'])
-        
-        # Ensure toolkit structure exists
-        if 'toolkit' not in toolkit_data:
-            toolkit_data['toolkit'] = {}
-        
-        # Initialize packages array if it doesn't exist
-        if 'packages' not in toolkit_data['toolkit']:
-            toolkit_data['toolkit']['packages'] = []
-        
-        # Find the package to delete by ID (with fallback to name for backward compatibility)
-        packages = toolkit_data['toolkit'].get('packages', [])
-        package_to_delete = None
-        actual_id = None
-        actual_name = None
-        
-        for pkg in packages:
-            # Check by ID first
-            if pkg.get('id') == package_id:
-                package_to_delete = pkg
-                actual_id = pkg.get('id')
-                actual_name = pkg.get('name')
-                break
-            # Fallback: check by name for backward compatibility
-            if pkg.get('name') == package_id:
-                package_to_delete = pkg
-                actual_id = pkg.get('id')
-                actual_name = pkg.get('name')
-                break
-        
-        if not package_to_delete:
-            # Check if package_id looks like a UUID (has dashes and is 36 chars) or is a name
-            # If it's a name and no package found, it might not exist in packages array
-            # Log more details for debugging
-            logger.warning(f"Package not found. Searched for ID/name: '{package_id}'. Available packages: {[p.get('name') for p in packages]}")
-            raise HTTPException(status_code=404, detail=f"Package with ID/name '{package_id}' not found in packages array")
-        
-        # Remove the package - use the actual ID or name from the found package
-        toolkit_data['toolkit']['packages'] = [
-            pkg for pkg in packages 
-            if not (actual_id and pkg.get('id') == actual_id) and not (actual_name and pkg.get('name') == actual_name and not pkg.get('id'))
-        ]
-        
-        # Save the updated toolkit data
         local_file_path = JSON_FILES['toolkit']
-        write_json_file(local_file_path, toolkit_data)
+        
+        def remove_package(batch):
+            # Read toolkit data
+            toolkit_data = batch.read_document(JSON_FILES['toolkit'])
+            
+            # Ensure toolkit structure exists
+            if 'toolkit' not in toolkit_data:
+                toolkit_data['toolkit'] = {}
+            
+            # Initialize packages array if it doesn't exist
+            if 'packages' not in toolkit_data['toolkit']:
+                toolkit_data['toolkit']['packages'] = []
+            
+            # Find the package to delete by ID (with fallback to name for backward compatibility)
+            packages = toolkit_data['toolkit'].get('packages', [])
+            package_to_delete = None
+            actual_id = None
+            actual_name = None
+            
+            for pkg in packages:
+                # Check by ID first
+                if pkg.get('id') == package_id:
+                    package_to_delete = pkg
+                    actual_id = pkg.get('id')
+                    actual_name = pkg.get('name')
+                    break
+                # Fallback: check by name for backward compatibility
+                if pkg.get('name') == package_id:
+                    package_to_delete = pkg
+                    actual_id = pkg.get('id')
+                    actual_name = pkg.get('name')
+                    break
+            
+            if not package_to_delete:
+                # Check if package_id looks like a UUID (has dashes and is 36 chars) or is a name
+                # If it's a name and no package found, it might not exist in packages array
+                # Log more details for debugging
+                logger.warning(f"Package not found. Searched for ID/name: '{package_id}'. Available packages: {[p.get('name') for p in packages]}")
+                raise HTTPException(status_code=404, detail=f"Package with ID/name '{package_id}' not found in packages array")
+            
+            # Remove the package - use the actual ID or name from the found package
+            toolkit_data['toolkit']['packages'] = [
+                pkg for pkg in packages 
+                if not (actual_id and pkg.get('id') == actual_id) and not (actual_name and pkg.get('name') == actual_name and not pkg.get('id'))
+            ]
+            
+            # Save the updated toolkit data
+            batch.write_document(local_file_path, toolkit_data)
+            return package_to_delete
+        
+        package_to_delete = await mutate_json_file(local_file_path, remove_package)
         
         logger.info(f"Package {package_to_delete.get('name', 'Unknown')} (ID: {package_id}) deleted successfully")
         
@@ -2503,26 +2800,30 @@ async def delete_toolkit_component(component_type: str, component_id: str, curre
         if component_type not in ['functions', 'containers', 'terraform', 'toolkits']:
             raise HTTPException(status_code=400, detail="Invalid component type")
         
-        toolkit_data = read_json_file(JSON_FILES['toolkit'])
-        if 'toolkit' not in toolkit_data or component_type not in toolkit_data['toolkit']:
-            raise HTTPException(status_code=404, detail="Toolkit data not found")
-        
-        comp_to_delete = None
-        for comp in toolkit_data['toolkit'][component_type]:
-            if _toolkit_component_matches(comp, component_id):
-                comp_to_delete = comp
-                break
-        
-        if not comp_to_delete:
-            raise HTTPException(status_code=404, detail=f"Component with ID {component_id} not found")
+        local_file_path = JSON_FILES['toolkit']
         
-        toolkit_data['toolkit'][component_type] = [
-            comp for comp in toolkit_data['toolkit'][component_type]
-            if not _toolkit_component_matches(comp, component_id)
-        ]
+        def remove_component(batch):
+            toolkit_data = batch.read_document(JSON_FILES['toolkit'])
+            if 'toolkit' not in toolkit_data or component_type not in toolkit_data['toolkit']:
+                raise HTTPException(status_code=404, detail="Toolkit data not found")
+            
+            comp_to_delete = None
+            for comp in toolkit_data['toolkit'][component_type]:
+                if _toolkit_component_matches(comp, component_id):
+                    comp_to_delete = comp
+                    break
+            
+            if not comp_to_delete:
+                raise HTTPException(status_code=404, detail=f"Component with ID {component_id} not found")
+            
+            toolkit_data['toolkit'][component_type] = [
+                comp for comp in toolkit_data['toolkit'][component_type]
+                if not _toolkit_component_matches(comp, component_id)
+            ]
+            
+            batch.write_document(local_file_path, toolkit_data)
         
-        local_file_path = JSON_FILES['toolkit']
-        write_json_file(local_file_path, toolkit_data)
+        await mutate_json_file(local_file_path, remove_component)
         
         logger.info(f"Toolkit component deleted from local file {local_file_path}")
         logger.info(f"Component {component_id} deleted successfully")
@@ -2532,6 +2833,8 @@ async def delete_toolkit_component(component_type: str, component_id: str, curre
             "id": component_id,
             "deleted": True
         }
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error deleting toolkit component: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error deleting toolkit component: {str(e)}")
@@ -2540,7 +2843,7 @@ async def delete_toolkit_component(component_type: str, component_id: str, curre
 def get_policies():
     """Get all data policies."""
     try:
-        policies_data = read_json_file(JSON_FILES['policies'])
+        policies_data = read_collection(JSON_FILES['policies'])
         return policies_data
     except Exception as e:
         logger.error(f"Error reading policies: {str(e)}")
@@ -2552,24 +2855,28 @@ def create_policy(policy: Dict[str, Any], current_user: dict = Depends(require_e
     try:
         logger.info(f"Create request for new policy: {policy.get('name', 'Unknown')}")
         
-        policies_data = read_json_file(JSON_FILES['policies'])
-        
-        # Generate new ID if not provided
-        if not policy.get('id'):
-            policy['id'] = f"{policy.get('type', 'policy')}_{policy.get('name', 'unknown').lower().replace(' ', '_')}_{int(time.time())}"
-        
-        if not policy.get('uuid'):
-            policy['uuid'] = new_uuid_str()
-        
-        # Add timestamp
-        policy['lastUpdated'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        local_file_path = JSON_FILES['policies']
         
-        # Add to policies list
-        policies_data['policies'].append(policy)
+        def add_policy(batch):
+            policies_data = batch.read_document(JSON_FILES['policies'])
+            
+            # Generate new ID if not provided
+            if not policy.get('id'):
+                policy['id'] = f"{policy.get('type', 'policy')}_{policy.get('name', 'unknown').lower().replace(' ', '_')}_{int(time.time())}"
+            
+            if not policy.get('uuid'):
+                policy['uuid'] = new_uuid_str()
+            
+            # Add timestamp
+            policy['lastUpdated'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            
+            # Add to policies list
+            policies_data['policies'].append(policy)
+            
+            # Write to file
+            batch.write_document(local_file_path, policies_data)
         
-        # Write to file
-        local_file_path = JSON_FILES['policies']
-        write_json_file(local_file_path, policies_data)
+        mutate_json_file_sync(local_file_path, add_policy)
         
         logger.info(f"Policy created successfully with ID: {policy['id']}")
         
@@ -2578,6 +2885,8 @@ def create_policy(policy: Dict[str, Any], current_user: dict = Depends(require_e
             "id": policy['id'],
             "policy": policy
         }
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error creating policy: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error creating policy: {str(e)}")
@@ -2588,33 +2897,37 @@ def update_policy(policy_id: str, policy: Dict[str, Any], current_user: dict = D
     try:
         logger.info(f"Update request for policy: {policy_id}")
         
-        policies_data = read_json_file(JSON_FILES['policies'])
-        
-        # Find existing policy
-        existing_policy = None
-        for i, p in enumerate(policies_data['policies']):
-            if matches_uuid_or_legacy_id(p, policy_id):
-                existing_policy = i
-                break
-        
-        if existing_policy is None:
-            raise HTTPException(status_code=404, detail=f"Policy '{policy_id}' not found")
-        
-        # Update timestamp
-        policy['lastUpdated'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        local_file_path = JSON_FILES['policies']
         
-        # Update the policy (preserve stable ids)
-        prev = policies_data['policies'][existing_policy]
-        policy['id'] = prev['id']
-        if prev.get('uuid'):
-            policy['uuid'] = prev['uuid']
-        elif not policy.get('uuid'):
-            policy['uuid'] = new_uuid_str()
-        policies_data['policies'][existing_policy] = policy
+        def replace_policy(batch):
+            policies_data = batch.read_document(JSON_FILES['policies'])
+            
+            # Find existing policy
+            existing_policy = None
+            for i, p in enumerate(policies_data['policies']):
+                if matches_uuid_or_legacy_id(p, policy_id):
+                    existing_policy = i
+                    break
+            
+            if existing_policy is None:
+                raise HTTPException(status_code=404, detail=f"Policy '{policy_id}' not found")
+            
+            # Update timestamp
+            policy['lastUpdated'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            
+            # Update the policy (preserve stable ids)
+            prev = policies_data['policies'][existing_policy]
+            policy['id'] = prev['id']
+            if prev.get('uuid'):
+                policy['uuid'] = prev['uuid']
+            elif not policy.get('uuid'):
+                policy['uuid'] = new_uuid_str()
+            policies_data['policies'][existing_policy] = policy
+            
+            # Write to file
+            batch.write_document(local_file_path, policies_data)
         
-        # Write to file
-        local_file_path = JSON_FILES['policies']
-        write_json_file(local_file_path, policies_data)
+        mutate_json_file_sync(local_file_path, replace_policy)
         
         logger.info(f"Policy {policy_id} updated successfully")
         
@@ -2636,21 +2949,25 @@ def delete_policy(policy_id: str, current_user: dict = Depends(require_editor_or
     try:
         logger.info(f"Delete request for policy: {policy_id}")
         
-        policies_data = read_json_file(JSON_FILES['policies'])
-        
-        # Find and remove policy
-        original_length = len(policies_data['policies'])
-        policies_data['policies'] = [
-            p for p in policies_data['policies']
-            if not matches_uuid_or_legacy_id(p, policy_id)
-        ]
+        local_file_path = JSON_FILES['policies']
         
-        if len(policies_data['policies']) == original_length:
-            raise HTTPException(status_code=404, detail=f"Policy '{policy_id}' not found")
+        def remove_policy(batch):
+            policies_data = batch.read_document(JSON_FILES['policies'])
+            
+            # Find and remove policy
+            original_length = len(policies_data['policies'])
+            policies_data['policies'] = [
+                p for p in policies_data['policies']
+                if not matches_uuid_or_legacy_id(p, policy_id)
+            ]
+            
+            if len(policies_data['policies']) == original_length:
+                raise HTTPException(status_code=404, detail=f"Policy '{policy_id}' not found")
+            
+            # Write to file
+            batch.write_document(local_file_path, policies_data)
         
-        # Write to file
-        local_file_path = JSON_FILES['policies']
-        write_json_file(local_file_path, policies_data)
+        mutate_json_file_sync(local_file_path, remove_policy)
         
         logger.info(f"Policy {policy_id} deleted successfully")
         
@@ -2669,10 +2986,26 @@ def delete_policy(policy_id: str, current_user: dict = Depends(require_editor_or
 @app.get("/api/debug/cache")
 def get_cache_status():
     """Get the current status of the cache (disabled)."""
+    storage_stats = storage.get_stats()
+    if storage_stats.get('engine') != CachedDocumentStorageEngine.name:
+        return {
+            "status": "Caching disabled",
+            "message": "All data is read fresh from local files on each request",
+            "data_source": Config.get_data_source()
+        }
+    tiers = storage_stats['tiers']
     return {
-        "status": "Caching disabled",
-        "message": "All data is read fresh from files on each request",
-        "test_mode": TEST_MODE
+        "status": "Read-through cache",
+        "message": f"Documents from {storage_stats['backend']} are revalidated after {storage_stats['ttl_seconds']}s",
+        "data_source": Config.get_data_source(),
+        "hit_ratios": {
+            "memory": tiers['memory']['hit_ratio'],
+            "disk": tiers['disk']['hit_ratio'] if tiers['disk'] else None,
+            "origin_not_modified": tiers['origin']['not_modified_ratio'],
+            "overall": storage_stats['hit_ratio']
+        },
+        "cache": storage_stats,
+        "prefetch": prefetcher.get_stats() if prefetcher is not None else None
     }
 
 @app.get("/api/debug/performance")
@@ -2684,8 +3017,8 @@ def get_performance_metrics():
 def get_model_relationships():
     """Debug endpoint to check model and agreement relationships."""
     try:
-        models_data = read_json_file(JSON_FILES['models'])
-        agreements_data = read_json_file(JSON_FILES['dataAgreements'])
+        models_data = read_collection(JSON_FILES['models'])
+        agreements_data = read_collection(JSON_FILES['dataAgreements'])
         
         relationships = {}
         for model in models_data['models']:
@@ -2714,6 +3047,144 @@ def get_model_relationships():
         logger.error(f"Error in model relationships debug: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+# Version history endpoints
+def _history_file(data_type: str) -> str:
+    if history is None:
+        raise HTTPException(status_code=404, detail="Version history is disabled (STORAGE_HISTORY=false)")
+    if data_type not in JSON_FILES or data_type not in DATA_TYPE_KEYS:
+        raise HTTPException(status_code=404, detail=f"Unknown data type: {data_type}")
+    if not history.tracks(JSON_FILES[data_type]):
+        raise HTTPException(status_code=404, detail=f"{data_type} is excluded from the version history")
+    return JSON_FILES[data_type]
+
+def _history_entities(document: Any, data_type: str) -> List[Dict[str, Any]]:
+    """Entities of a collection document; toolkit groups its lists by component type."""
+    items = document.get(DATA_TYPE_KEYS[data_type]) if isinstance(document, dict) else None
+    if isinstance(items, dict):
+        return [item for group in items.values() if isinstance(group, list) for item in group]
+    return items if isinstance(items, list) else []
+
+def _find_history_entity(document: Any, data_type: str, entity_ref: str) -> Optional[Dict[str, Any]]:
+    for item in _history_entities(document, data_type):
+        if isinstance(item, dict) and (matches_uuid_or_legacy_id(item, entity_ref) or item.get('shortName') == entity_ref):
+            return item
+    return None
+
+def _history_version(file_name: str, version: Optional[int], at: Optional[str]):
+    """(version, timestamp, document) of a collection as of a version or an ISO timestamp."""
+    timestamp = None
+    if at:
+        try:
+            timestamp = datetime.fromisoformat(at).timestamp()
+        except ValueError:
+            raise HTTPException(status_code=400, detail=f"Invalid timestamp: {at}")
+    entry = history.version_at(file_name, version, timestamp)
+    if entry is None:
+        raise HTTPException(status_code=404, detail=f"No history of {file_name} at that point")
+    return entry
+
+def _history_entry(version: int, timestamp: float) -> Dict[str, Any]:
+    return {"version": version, "timestamp": datetime.fromtimestamp(timestamp).isoformat()}
+
+@app.get("/api/history/{data_type}/versions")
+def get_history_versions(data_type: str):
+    """List the recorded versions of a collection (oldest first)."""
+    file_name = _history_file(data_type)
+    return {
+        "dataType": data_type,
+        "currentVersion": transactions.version,
+        "versions": [_history_entry(version, ts) for version, ts, _ in history.versions(file_name)]
+    }
+
+@app.get("/api/history/{data_type}/diff")
+def get_history_diff(
+    data_type: str,
+    from_version: int = Query(..., description="Catalog version to diff from"),
+    to_version: Optional[int] = Query(None, description="Catalog version to diff to (default: latest)"),
+    entity: Optional[str] = Query(None, description="Limit the diff to one entity (uuid, id or shortName)")
+):
+    """JSON Patch between two versions of a collection, or of one entity in it."""
+    file_name = _history_file(data_type)
+    old_version, _, old_document = _history_version(file_name, from_version, None)
+    new_version, _, new_document = _history_version(file_name, to_version, None)
+    if entity:
+        old_document = _find_history_entity(old_document, data_type, entity)
+        new_document = _find_history_entity(new_document, data_type, entity)
+        if old_document is None and new_document is None:
+            raise HTTPException(status_code=404, detail=f"{entity} not found in either version")
+    return {
+        "dataType": data_type,
+        "entity": entity,
+        "fromVersion": old_version,
+        "toVersion": new_version,
+        "patch": make_patch(old_document, new_document)
+    }
+
+@app.get("/api/history/{data_type}/{entity_ref}")
+def get_history_entity(
+    data_type: str,
+    entity_ref: str,
+    version: Optional[int] = Query(None, description="Catalog version"),
+    at: Optional[str] = Query(None, description="ISO timestamp, e.g. 2026-04-19T21:59:52")
+):
+    """An entity (by uuid, id or shortName) as it was at a catalog version or point in time."""
+    file_name = _history_file(data_type)
+    found_version, ts, document = _history_version(file_name, version, at)
+    entity = _find_history_entity(document, data_type, entity_ref)
+    if entity is None:
+        raise HTTPException(status_code=404, detail=f"{entity_ref} did not exist in {data_type} at version {found_version}")
+    return {**_history_entry(found_version, ts), "entity": copy.deepcopy(entity)}
+
+@app.post("/api/history/{data_type}/{entity_ref}/restore")
+async def restore_history_entity(
+    data_type: str,
+    entity_ref: str,
+    version: Optional[int] = Query(None, description="Catalog version to restore"),
+    at: Optional[str] = Query(None, description="ISO timestamp to restore"),
+    current_user: dict = Depends(require_editor_or_admin)
+):
+    """Restore an entity to an earlier version; the restore is committed as a new version."""
+    if version is None and not at:
+        raise HTTPException(status_code=400, detail="Pass version or at")
+    file_name = _history_file(data_type)
+    # The first access loads the collection's history from disk
+    found_version, _, document = await blocking_io.run(_history_version, file_name, version, at)
+    old_entity = _find_history_entity(document, data_type, entity_ref)
+    if old_entity is None:
+        raise HTTPException(status_code=404, detail=f"{entity_ref} did not exist in {data_type} at version {found_version}")
+    restored = copy.deepcopy(old_entity)
+    
+    def restore_entity(batch):
+        current = batch.read_document(file_name)
+        items = current.get(DATA_TYPE_KEYS[data_type])
+        groups = [g for g in items.values() if isinstance(g, list)] if isinstance(items, dict) else [items]
+        for group in groups:
+            for i, item in enumerate(group):
+                if isinstance(item, dict) and (matches_uuid_or_legacy_id(item, entity_ref) or item.get('shortName') == entity_ref):
+                    group[i] = restored
+                    batch.write_document(file_name, current)
+                    return False
+        if not isinstance(items, list):
+            raise HTTPException(status_code=409, detail=f"{entity_ref} no longer exists and cannot be re-created in {data_type}")
+        # Deleted since: add it back
+        items.append(restored)
+        batch.write_document(file_name, current)
+        return True
+    
+    recreated = await mutate_json_file(file_name, restore_entity)
+    search_doc_ids = {
+        "models": model_search_doc_id,
+        "specifications": model_search_doc_id,
+        "dataAgreements": agreement_search_doc_id,
+        "data-products": lambda product: str(product.get('id', '')),
+        "dataProducts": lambda product: str(product.get('id', '')),
+    }
+    if data_type in search_doc_ids:
+        search_type = {"specifications": "models", "dataProducts": "data-products"}.get(data_type, data_type)
+        update_search_index(search_type, "add" if recreated else "update", restored, search_doc_ids[data_type](restored))
+    logger.info(f"Restored {data_type} {entity_ref} to version {found_version}")
+    return {"message": "Entity restored", "restoredVersion": found_version, "recreated": recreated, "entity": restored}
+
 # Statistics endpoints
 @app.post("/api/statistics/page-view")
 async def track_page_view(page: str = Query(..., description="Page path/name to track")):
@@ -2730,38 +3201,42 @@ async def track_page_view(page: str = Query(..., description="Page path/name to
         # Get current date in YYYY-MM-DD format
         today = datetime.now().strftime('%Y-%m-%d')
         
-        # Read or initialize statistics file
-        try:
-            stats_data = read_json_file(JSON_FILES['statistics'])
-        except HTTPException:
-            # File doesn't exist, create new structure
-            stats_data = {
-                "pageViews": {},
-                "siteVisits": {
+        def count_page_view(batch):
+            # Read or initialize statistics file
+            try:
+                stats_data = batch.read_document(JSON_FILES['statistics'])
+            except FileNotFoundError:
+                # File doesn't exist, create new structure
+                stats_data = {
+                    "pageViews": {},
+                    "siteVisits": {
+                        "daily": {},
+                        "total": 0
+                    },
+                    "lastUpdated": datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+                }
+            
+            # Initialize page if it doesn't exist
+            if page not in stats_data['pageViews']:
+                stats_data['pageViews'][page] = {
                     "daily": {},
                     "total": 0
-                },
-                "lastUpdated": datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            }
-        
-        # Initialize page if it doesn't exist
-        if page not in stats_data['pageViews']:
-            stats_data['pageViews'][page] = {
-                "daily": {},
-                "total": 0
-            }
-        
-        # Increment daily count
-        if today not in stats_data['pageViews'][page]['daily']:
-            stats_data['pageViews'][page]['daily'][today] = 0
-        
-        stats_data['pageViews'][page]['daily'][today] += 1
-        stats_data['pageViews'][page]['total'] += 1
-        # Don't increment totalViews here - it's tracked separately as site visits
-        stats_data['lastUpdated'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+                }
+            
+            # Increment daily count
+            if today not in stats_data['pageViews'][page]['daily']:
+                stats_data['pageViews'][page]['daily'][today] = 0
+            
+            stats_data['pageViews'][page]['daily'][today] += 1
+            stats_data['pageViews'][page]['total'] += 1
+            # Don't increment totalViews here - it's tracked separately as site visits
+            stats_data['lastUpdated'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            
+            # Save updated statistics
+            batch.write_document(JSON_FILES['statistics'], stats_data)
+            return stats_data
         
-        # Save updated statistics
-        write_json_file(JSON_FILES['statistics'], stats_data)
+        stats_data = await mutate_json_file(JSON_FILES['statistics'], count_page_view)
         
         logger.info(f"Tracked page view for {page} on {today}")
         
@@ -2773,6 +3248,8 @@ async def track_page_view(page: str = Query(..., description="Page path/name to
             "totalCount": stats_data['pageViews'][page]['total']
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error tracking page view: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error tracking page view: {str(e)}")
@@ -2790,37 +3267,41 @@ async def track_site_visit():
         # Get current date in YYYY-MM-DD format
         today = datetime.now().strftime('%Y-%m-%d')
         
-        # Read or initialize statistics file
-        try:
-            stats_data = read_json_file(JSON_FILES['statistics'])
-        except HTTPException:
-            # File doesn't exist, create new structure
-            stats_data = {
-                "pageViews": {},
-                "siteVisits": {
+        def count_site_visit(batch):
+            # Read or initialize statistics file
+            try:
+                stats_data = batch.read_document(JSON_FILES['statistics'])
+            except FileNotFoundError:
+                # File doesn't exist, create new structure
+                stats_data = {
+                    "pageViews": {},
+                    "siteVisits": {
+                        "daily": {},
+                        "total": 0
+                    },
+                    "lastUpdated": datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+                }
+            
+            # Initialize siteVisits if it doesn't exist (for backward compatibility)
+            if 'siteVisits' not in stats_data:
+                stats_data['siteVisits'] = {
                     "daily": {},
                     "total": 0
-                },
-                "lastUpdated": datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            }
-        
-        # Initialize siteVisits if it doesn't exist (for backward compatibility)
-        if 'siteVisits' not in stats_data:
-            stats_data['siteVisits'] = {
-                "daily": {},
-                "total": 0
-            }
-        
-        # Increment daily site visit count
-        if today not in stats_data['siteVisits']['daily']:
-            stats_data['siteVisits']['daily'][today] = 0
-        
-        stats_data['siteVisits']['daily'][today] += 1
-        stats_data['siteVisits']['total'] += 1
-        stats_data['lastUpdated'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+                }
+            
+            # Increment daily site visit count
+            if today not in stats_data['siteVisits']['daily']:
+                stats_data['siteVisits']['daily'][today] = 0
+            
+            stats_data['siteVisits']['daily'][today] += 1
+            stats_data['siteVisits']['total'] += 1
+            stats_data['lastUpdated'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            
+            # Save updated statistics
+            batch.write_document(JSON_FILES['statistics'], stats_data)
+            return stats_data
         
-        # Save updated statistics
-        write_json_file(JSON_FILES['statistics'], stats_data)
+        stats_data = await mutate_json_file(JSON_FILES['statistics'], count_site_visit)
         
         logger.info(f"Tracked site visit on {today}")
         
@@ -2831,6 +3312,8 @@ async def track_site_visit():
             "totalCount": stats_data['siteVisits']['total']
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error tracking site visit: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error tracking site visit: {str(e)}")
@@ -2846,7 +3329,7 @@ def get_statistics(current_user: dict = Depends(require_admin)):
     try:
         # Read statistics file
         try:
-            stats_data = read_json_file(JSON_FILES['statistics'])
+            stats_data = read_collection(JSON_FILES['statistics'])
         except HTTPException:
             # File doesn't exist, return empty structure
             return {
@@ -2893,11 +3376,6 @@ def _norm_rule_model_short(rule: Dict[str, Any]) -> str:
     return str(rule.get("modelShortName") or "").strip().lower()
 
 
-def _rule_indices_by_id(rules: List[Dict[str, Any]], rule_id: str) -> List[int]:
-    rid = str(rule_id).lower()
-    return [i for i, r in enumerate(rules) if str(r.get("id", "")).lower() == rid]
-
-
 @app.post("/api/rules/assign")
 async def assign_rule_to_model(
     request: Dict[str, Any],
@@ -2916,56 +3394,60 @@ async def assign_rule_to_model(
                 detail="libraryRuleId and modelShortName are required",
             )
 
-        try:
-            rules_data = read_json_file(JSON_FILES["rules"])
-        except HTTPException:
-            rules_data = {"rules": []}
-
-        models_data = read_json_file(JSON_FILES["models"])
+        models_data = await read_collection_async(JSON_FILES["models"])
         msn = resolve_model_short_name(models_data, str(model_ref).strip())
         if not msn:
             raise HTTPException(status_code=400, detail=f"Unknown model: {model_ref}")
 
-        source = None
-        for rule in rules_data.get("rules", []):
-            if str(rule.get("id", "")).lower() == str(library_rule_id).lower():
-                source = rule
-                break
-        if source is None:
-            raise HTTPException(status_code=404, detail="Source rule not found")
-
-        src_lineage = _rule_lineage_key(source)
-        for rule in rules_data.get("rules", []):
-            if str(rule.get("modelShortName", "")).lower() != str(msn).lower():
-                continue
-            if _rule_lineage_key(rule) == src_lineage:
-                raise HTTPException(
-                    status_code=409,
-                    detail="This rule lineage is already on this model",
-                )
+        def append_rule_copy(batch):
+            try:
+                rules_data = batch.read_document(JSON_FILES["rules"])
+            except FileNotFoundError:
+                rules_data = {"rules": []}
+
+            source = None
+            for rule in rules_data.get("rules", []):
+                if str(rule.get("id", "")).lower() == str(library_rule_id).lower():
+                    source = rule
+                    break
+            if source is None:
+                raise HTTPException(status_code=404, detail="Source rule not found")
+
+            src_lineage = _rule_lineage_key(source)
+            for rule in rules_data.get("rules", []):
+                if str(rule.get("modelShortName", "")).lower() != str(msn).lower():
+                    continue
+                if _rule_lineage_key(rule) == src_lineage:
+                    raise HTTPException(
+                        status_code=409,
+                        detail="This rule lineage is already on this model",
+                    )
 
-        new_rule = {
-            k: v
-            for k, v in source.items()
-            if k not in ["newObjectInput", "newColumnInput", "ruleTypeIdentifier"]
-        }
-        for k in ("lastUpdated", "createdBy", "updatedBy"):
-            new_rule.pop(k, None)
-        new_rule.pop("isLibrary", None)
-        kept_id = str(source.get("id") or "").strip()
-        if not kept_id:
-            raise HTTPException(status_code=400, detail="Source rule has no id")
-        new_rule["id"] = kept_id
-        new_rule["libraryRuleId"] = _canonical_library_rule_ref(source)
-        new_rule["modelShortName"] = msn
-        new_rule["parentRuleId"] = None
-        new_rule["stage"] = normalize_rule_stage(new_rule.get("stage"))
-        new_rule["ruleZone"] = normalize_rule_zone(new_rule.get("ruleZone"))
-        new_rule["lastUpdated"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        new_rule["createdBy"] = current_user.get("username", "unknown")
-
-        rules_data["rules"].append(new_rule)
-        write_json_file(JSON_FILES["rules"], rules_data)
+            new_rule = {
+                k: v
+                for k, v in source.items()
+                if k not in ["newObjectInput", "newColumnInput", "ruleTypeIdentifier"]
+            }
+            for k in ("lastUpdated", "createdBy", "updatedBy"):
+                new_rule.pop(k, None)
+            new_rule.pop("isLibrary", None)
+            kept_id = str(source.get("id") or "").strip()
+            if not kept_id:
+                raise HTTPException(status_code=400, detail="Source rule has no id")
+            new_rule["id"] = kept_id
+            new_rule["libraryRuleId"] = _canonical_library_rule_ref(source)
+            new_rule["modelShortName"] = msn
+            new_rule["parentRuleId"] = None
+            new_rule["stage"] = normalize_rule_stage(new_rule.get("stage"))
+            new_rule["ruleZone"] = normalize_rule_zone(new_rule.get("ruleZone"))
+            new_rule["lastUpdated"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            new_rule["createdBy"] = current_user.get("username", "unknown")
+
+            rules_data["rules"].append(new_rule)
+            batch.write_document(JSON_FILES["rules"], rules_data)
+            return src_lineage, kept_id
+        
+        src_lineage, kept_id = await mutate_json_file(JSON_FILES["rules"], append_rule_copy)
         logger.info(f"Assigned rule lineage {src_lineage} to model {msn} with id {kept_id}")
 
         return {
@@ -2993,7 +3475,7 @@ async def get_rules_for_model(model_short_name: str):
     """
     try:
         try:
-            rules_data = read_json_file(JSON_FILES['rules'])
+            rules_data = await read_collection_async(JSON_FILES['rules'])
         except HTTPException as e:
             # File doesn't exist or can't be read, return empty structure
             logger.warning(f"Rules file not found or can't be read: {str(e)}")
@@ -3012,7 +3494,7 @@ async def get_rules_for_model(model_short_name: str):
             logger.warning("Rules file missing 'rules' key, returning empty rules")
             return {"rules": []}
         
-        models_data = read_json_file(JSON_FILES['models'])
+        models_data = await read_collection_async(JSON_FILES['models'])
         msn = resolve_model_short_name(models_data, model_short_name) or model_short_name
         
         # Filter rules by model
@@ -3044,28 +3526,32 @@ async def create_rule(request: Dict[str, Any], current_user: dict = Depends(requ
     try:
         logger.info(f"Create request for new model rule")
         
-        try:
-            rules_data = read_json_file(JSON_FILES['rules'])
-        except HTTPException:
-            # File doesn't exist, create new structure
-            rules_data = {"rules": []}
+        rules_file = JSON_FILES['rules']
         
         # Remove form state fields that shouldn't be saved
         new_rule = {k: v for k, v in request.items() if k not in ['newObjectInput', 'newColumnInput', 'ruleTypeIdentifier']}
-        # ID: {stage}_{ruleZone}_{NNN} (NNN increments per stage+zone; client-sent id ignored)
         new_rule['stage'] = normalize_rule_stage(new_rule.get('stage'))
         new_rule['ruleZone'] = normalize_rule_zone(new_rule.get('ruleZone'))
-        existing = rules_data.get('rules', [])
-        new_id = next_catalog_rule_id(existing, new_rule['stage'], new_rule['ruleZone'])
-        new_rule['id'] = new_id
         new_rule['lastUpdated'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
         new_rule['createdBy'] = current_user.get('username', 'unknown')
         
-        rules_data['rules'].append(new_rule)
-        local_file_path = JSON_FILES['rules']
-        write_json_file(local_file_path, rules_data)
+        def append_rule(batch):
+            try:
+                batch.read_document(rules_file)
+            except FileNotFoundError:
+                # File doesn't exist, create new structure
+                batch.write_document(rules_file, {"rules": []})
+            
+            # ID: {stage}_{ruleZone}_{NNN} (NNN increments per stage+zone; client-sent id ignored)
+            prefix = f"{new_rule['stage']}_{new_rule['ruleZone']}_"
+            existing = [{'id': i} for i in batch.entity_ids(rules_file, 'rules', prefix=prefix)]
+            new_rule['id'] = next_catalog_rule_id(existing, new_rule['stage'], new_rule['ruleZone'])
+            batch.append_entity(rules_file, 'rules', new_rule)
+            return new_rule['id']
+        
+        new_id = await mutate_json_file(rules_file, append_rule)
         
-        logger.info(f"Created new rule in local file {local_file_path}")
+        logger.info(f"Created new rule in {rules_file}")
         logger.info(f"Rule {new_id} created successfully")
         
         return {
@@ -3073,6 +3559,8 @@ async def create_rule(request: Dict[str, Any], current_user: dict = Depends(requ
             "id": new_id,
             "created": True
         }
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error creating rule: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error creating rule: {str(e)}")
@@ -3092,51 +3580,52 @@ async def update_rule(rule_id: str, request: Dict[str, Any], current_user: dict
     try:
         logger.info(f"Update request for model rule: {rule_id}")
         
-        rules_data = read_json_file(JSON_FILES['rules'])
-        rules_list = rules_data.get("rules", [])
-        indices = _rule_indices_by_id(rules_list, rule_id)
-        if not indices:
-            raise HTTPException(status_code=404, detail=f"Rule with ID '{rule_id}' not found")
+        # Rule ids are not unique (library and per-model copies share them)
+        rules_file = JSON_FILES['rules']
+        def replace_rule(batch):
+            candidates = batch.find_entities(rules_file, 'rules', 'id', rule_id)
+            if not candidates:
+                raise HTTPException(status_code=404, detail=f"Rule with ID '{rule_id}' not found")
 
-        cleaned_request = {k: v for k, v in request.items() if k not in ['newObjectInput', 'newColumnInput', 'ruleTypeIdentifier']}
-        if len(indices) > 1:
-            if "modelShortName" not in cleaned_request:
-                raise HTTPException(
-                    status_code=400,
-                    detail="Multiple rules share this id; include modelShortName in the request body to choose which copy to update.",
-                )
-            msn_raw = cleaned_request.get("modelShortName")
-            want = (
-                str(msn_raw).strip().lower()
-                if msn_raw is not None and str(msn_raw).strip() != ""
-                else ""
-            )
-            rule_to_update = None
-            for i in indices:
-                if _norm_rule_model_short(rules_list[i]) == want:
-                    rule_to_update = i
-                    break
-            if rule_to_update is None:
-                raise HTTPException(
-                    status_code=404,
-                    detail=f"No rule with ID '{rule_id}' and the given modelShortName",
+            cleaned_request = {k: v for k, v in request.items() if k not in ['newObjectInput', 'newColumnInput', 'ruleTypeIdentifier']}
+            if len(candidates) > 1:
+                if "modelShortName" not in cleaned_request:
+                    raise HTTPException(
+                        status_code=400,
+                        detail="Multiple rules share this id; include modelShortName in the request body to choose which copy to update.",
+                    )
+                msn_raw = cleaned_request.get("modelShortName")
+                want = (
+                    str(msn_raw).strip().lower()
+                    if msn_raw is not None and str(msn_raw).strip() != ""
+                    else ""
                 )
-        else:
-            rule_to_update = indices[0]
-
-        # Update the rule
-        updated_rule = rules_data['rules'][rule_to_update].copy()
-        updated_rule.update(cleaned_request)
-        updated_rule['id'] = rule_id  # Ensure ID doesn't change
-        updated_rule['lastUpdated'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        updated_rule['updatedBy'] = current_user.get('username', 'unknown')
-        
-        rules_data['rules'][rule_to_update] = updated_rule
+                rule_to_update = None
+                for candidate in candidates:
+                    if _norm_rule_model_short(candidate[1]) == want:
+                        rule_to_update = candidate
+                        break
+                if rule_to_update is None:
+                    raise HTTPException(
+                        status_code=404,
+                        detail=f"No rule with ID '{rule_id}' and the given modelShortName",
+                    )
+            else:
+                rule_to_update = candidates[0]
+
+            # Update the rule
+            rule_handle, existing_rule = rule_to_update
+            updated_rule = existing_rule.copy()
+            updated_rule.update(cleaned_request)
+            updated_rule['id'] = rule_id  # Ensure ID doesn't change
+            updated_rule['lastUpdated'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            updated_rule['updatedBy'] = current_user.get('username', 'unknown')
+            
+            batch.replace_entity(rules_file, 'rules', rule_handle, updated_rule)
         
-        local_file_path = JSON_FILES['rules']
-        write_json_file(local_file_path, rules_data)
+        await mutate_json_file(rules_file, replace_rule)
         
-        logger.info(f"Rule updated in local file {local_file_path}")
+        logger.info(f"Rule updated in {rules_file}")
         logger.info(f"Rule {rule_id} updated successfully")
         
         return {
@@ -3164,41 +3653,42 @@ async def delete_rule(
     try:
         logger.info(f"Delete request for model rule: {rule_id} modelShortName={model_short_name!r}")
         
-        rules_data = read_json_file(JSON_FILES['rules'])
-        models_data = read_json_file(JSON_FILES['models'])
-        rules_list = rules_data.get("rules", [])
-        indices = _rule_indices_by_id(rules_list, rule_id)
-        if not indices:
-            raise HTTPException(status_code=404, detail=f"Rule with ID '{rule_id}' not found")
+        rules_file = JSON_FILES['rules']
+        uow = unit_of_work()
+        def remove_rule(batch):
+            candidates = batch.find_entities(rules_file, 'rules', 'id', rule_id)
+            if not candidates:
+                raise HTTPException(status_code=404, detail=f"Rule with ID '{rule_id}' not found")
 
-        if len(indices) == 1:
-            idx = indices[0]
-        else:
-            if model_short_name is None:
-                raise HTTPException(
-                    status_code=400,
-                    detail="Multiple rules share this id; pass modelShortName query parameter (empty for library copy).",
-                )
-            msn_raw = str(model_short_name).strip()
-            if msn_raw == "":
-                matching = [i for i in indices if not str(rules_list[i].get("modelShortName") or "").strip()]
+            if len(candidates) == 1:
+                rule_handle = candidates[0][0]
             else:
-                msn = resolve_model_short_name(models_data, msn_raw) or msn_raw
-                want = msn.strip().lower()
-                matching = [i for i in indices if _norm_rule_model_short(rules_list[i]) == want]
-            if len(matching) != 1:
-                raise HTTPException(
-                    status_code=404,
-                    detail=f"No single rule with ID '{rule_id}' and the given modelShortName",
-                )
-            idx = matching[0]
+                if model_short_name is None:
+                    raise HTTPException(
+                        status_code=400,
+                        detail="Multiple rules share this id; pass modelShortName query parameter (empty for library copy).",
+                    )
+                msn_raw = str(model_short_name).strip()
+                if msn_raw == "":
+                    matching = [h for h, r in candidates if not str(r.get("modelShortName") or "").strip()]
+                else:
+                    # Models are only looked up, so through the request's unit of work
+                    model_hit = find_model(msn_raw, uow)
+                    msn = (model_hit[1].get("shortName") if model_hit else None) or msn_raw
+                    want = msn.strip().lower()
+                    matching = [h for h, r in candidates if _norm_rule_model_short(r) == want]
+                if len(matching) != 1:
+                    raise HTTPException(
+                        status_code=404,
+                        detail=f"No single rule with ID '{rule_id}' and the given modelShortName",
+                    )
+                rule_handle = matching[0]
 
-        rules_data["rules"] = [r for j, r in enumerate(rules_list) if j != idx]
+            batch.delete_entity(rules_file, 'rules', rule_handle)
         
-        local_file_path = JSON_FILES['rules']
-        write_json_file(local_file_path, rules_data)
+        await mutate_json_file(rules_file, remove_rule)
         
-        logger.info(f"Rule deleted from local file {local_file_path}")
+        logger.info(f"Rule deleted from {rules_file}")
         logger.info(f"Rule {rule_id} deleted successfully")
         
         return {
@@ -3225,7 +3715,7 @@ async def get_rule_count(model_short_name: str):
     """
     try:
         try:
-            rules_data = read_json_file(JSON_FILES['rules'])
+            rules_data = await read_collection_async(JSON_FILES['rules'])
         except HTTPException as e:
             logger.warning(f"Rules file not found or can't be read: {str(e)}")
             return {"count": 0}
@@ -3242,7 +3732,7 @@ async def get_rule_count(model_short_name: str):
             logger.warning("Rules file missing 'rules' key, returning count 0")
             return {"count": 0}
         
-        models_data = read_json_file(JSON_FILES['models'])
+        models_data = await read_collection_async(JSON_FILES['models'])
         msn = resolve_model_short_name(models_data, model_short_name) or model_short_name
         
         # Filter rules by model and count
@@ -3270,7 +3760,7 @@ async def get_rule_coverage(model_short_name: str):
     try:
         # Get model data to understand structure
         try:
-            models_data = read_json_file(JSON_FILES['models'])
+            models_data = await read_collection_async(JSON_FILES['models'])
             midx = find_model_index(models_data, model_short_name)
             model = models_data["models"][midx] if midx is not None else None
         except Exception as e:
@@ -3285,7 +3775,7 @@ async def get_rule_coverage(model_short_name: str):
         
         # Get rules for this model
         try:
-            rules_data = read_json_file(JSON_FILES['rules'])
+            rules_data = await read_collection_async(JSON_FILES['rules'])
         except HTTPException:
             rules_data = {"rules": []}
         except Exception as e:
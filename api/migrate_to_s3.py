@@ -1,14 +1,32 @@
 #!/usr/bin/env python3
 """
-Migration script to move local JSON files to S3 bucket
-Usage: python migrate_to_s3.py
+Sync the catalog's JSON files between the local _data directory and the S3 bucket
+Usage: python migrate_to_s3.py [--direction up|down] [--workers 8] [--compression gzip] [--force] [--dry-run]
+
+Uploads (up, the default) and downloads (down) run on a thread pool. An object whose ETag
+already matches the file is skipped, so re-running only transfers what changed; objects from
+--multipart-mb up go as multipart uploads. Progress is kept in a checkpoint file, so an
+interrupted run resumes where it stopped (the file is removed after a run without failures).
 """
 
-import os
+import argparse
+import hashlib
+import io
 import json
 import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, List, Optional, Tuple
+
+from boto3.s3.transfer import TransferConfig
 from dotenv import load_dotenv
-from services.s3_service import S3Service
+from config import Config
+from services import json_codec, s3_client
+from services.s3_service import S3Service, compress_object
+from services.storage_codecs import SUFFIXES, CodecRegistry, compression_available, decode, decompress
+from services.storage_engine import atomic_write_bytes
 
 # Load environment variables
 load_dotenv()
@@ -17,126 +35,334 @@ load_dotenv()
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-def migrate_local_to_s3():
-    """Migrate all local JSON files to S3"""
-    
+LOCAL_DATA_DIR = "_data"
+CHECKPOINT_FILE = ".s3sync-checkpoint.json"
+MB = 1024 * 1024
+
+
+def object_etag(body: bytes, multipart_threshold: int, part_size: int) -> str:
+    """The ETag S3 assigns to body uploaded with these transfer settings (MD5, or MD5 of part MD5s)"""
+    if len(body) < multipart_threshold:
+        return f'"{hashlib.md5(body).hexdigest()}"'
+    digests = [hashlib.md5(body[i:i + part_size]).digest() for i in range(0, len(body), part_size)]
+    return f'"{hashlib.md5(b"".join(digests)).hexdigest()}-{len(digests)}"'
+
+
+def local_files(data_dir: str) -> List[Tuple[str, str]]:
+    """(local path, object key) of the collection files; encoded variants map to the plain .json key"""
+    files = []
+    for root, dirs, names in os.walk(data_dir):
+        for name in names:
+            # Collections may be stored compressed or as MessagePack (see STORAGE_CODEC)
+            suffix = next((s for s in sorted(SUFFIXES, key=len, reverse=True) if name.endswith('.json' + s)), None)
+            if suffix is not None:
+                rel_path = os.path.relpath(os.path.join(root, name), data_dir).replace(os.sep, '/')
+                files.append((os.path.join(root, name), rel_path[:len(rel_path) - len(suffix)] if suffix else rel_path))
+    return files
+
+
+def local_body(path: str) -> bytes:
+    """What the bucket holds for a local file: the file itself if it is JSON, else its JSON encoding"""
+    with open(path, 'rb') as f:
+        body = f.read()
+    if path.endswith('.json'):
+        return body
+    return json_codec.dumps(decode(body), pretty=True)
+
+
+class SyncCheckpoint:
+    """Keys already transferred in this (possibly interrupted) run, with the ETag they were transferred at"""
+
+    def __init__(self, path: str, direction: str, bucket: str, save_every: int = 50):
+        self.path = path
+        self.scope = {'direction': direction, 'bucket': bucket}
+        self.save_every = save_every
+        self.done: Dict[str, str] = {}
+        self._lock = threading.Lock()
+        self._unsaved = 0
+        if os.path.exists(path):
+            try:
+                with open(path, 'rb') as f:
+                    saved = json.loads(f.read())
+            except ValueError:
+                logger.warning(f"Ignoring unreadable checkpoint {path}")
+                return
+            if all(saved.get(k) == v for k, v in self.scope.items()):
+                self.done = saved.get('done', {})
+                logger.info(f"Resuming from checkpoint: {len(self.done)} objects already transferred")
+
+    def is_done(self, key: str, etag: str) -> bool:
+        with self._lock:
+            return self.done.get(key) == etag
+
+    def mark(self, key: str, etag: str):
+        with self._lock:
+            self.done[key] = etag
+            self._unsaved += 1
+            if self._unsaved >= self.save_every:
+                self._save()
+
+    def _save(self):
+        atomic_write_bytes(self.path, json.dumps({**self.scope, 'done': self.done}).encode('utf-8'))
+        self._unsaved = 0
+
+    def save(self):
+        with self._lock:
+            self._save()
+
+    def remove(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class SyncStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counts = {'transferred': 0, 'unchanged': 0, 'resumed': 0, 'failed': 0, 'bytes': 0}
+        self.started = time.perf_counter()
+
+    def add(self, outcome: str, size: int = 0):
+        with self._lock:
+            self.counts[outcome] += 1
+            self.counts['bytes'] += size if outcome == 'transferred' else 0
+
+    def report(self, direction: str):
+        elapsed = time.perf_counter() - self.started
+        c = self.counts
+        logger.info(f"\nSync Summary ({direction}, {elapsed:.1f}s):")
+        logger.info(f"✓ Transferred: {c['transferred']} files, {c['bytes'] / MB:.2f} MB "
+                    f"({c['bytes'] / MB / elapsed if elapsed else 0:.2f} MB/s, {c['transferred'] / elapsed if elapsed else 0:.1f} files/s)")
+        logger.info(f"↷ Skipped: {c['unchanged']} unchanged, {c['resumed']} already done in an earlier run")
+        if c['failed']:
+            logger.error(f"✗ Failed: {c['failed']} files")
+        stats = s3_client.get_stats()
+        logger.info(f"S3 calls: {stats['calls']} ({stats['retries']} retries, {stats['throttles']} throttled)")
+
+
+class S3Sync:
+    """Transfers between the local data directory and the bucket, skipping objects that already match"""
+
+    def __init__(self, s3_service: S3Service, data_dir: str = LOCAL_DATA_DIR, workers: int = 8,
+                 compression: str = 'none', multipart_mb: int = 8, dry_run: bool = False, force: bool = False):
+        self.s3 = s3_service
+        self.data_dir = data_dir
+        self.workers = workers
+        self.compression = compression
+        self.dry_run = dry_run
+        self.force = force
+        self.transfer = TransferConfig(multipart_threshold=multipart_mb * MB, multipart_chunksize=multipart_mb * MB,
+                                       max_concurrency=2)
+        self.codecs = CodecRegistry.from_config(Config.STORAGE_CODEC, Config.STORAGE_CODECS)
+        self.stats = SyncStats()
+
+    def _etag(self, body: bytes) -> str:
+        return object_etag(body, self.transfer.multipart_threshold, self.transfer.multipart_chunksize)
+
+    def _stored_etags(self, body: bytes) -> List[str]:
+        """ETags the object for a local file body may have: stored as is or compressed by any uploader"""
+        etags = [self._etag(body)]
+        for compression in ('gzip', 'zstd'):
+            if compression_available(compression):
+                etags.append(self._etag(compress_object(body, compression, Config.S3_COMPRESSION_MIN_BYTES)[0]))
+        return etags
+
+    def remote_etags(self) -> Dict[str, str]:
+        """ETag of every object in the bucket (a paginated listing, no per-object HEAD)"""
+        return {obj['Key']: obj.get('ETag') for obj in self.s3.iter_objects()}
+
+    def _run(self, tasks, checkpoint: SyncCheckpoint, direction: str) -> bool:
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix=f's3-sync-{direction}') as pool:
+            futures = {pool.submit(task, checkpoint): name for name, task in tasks}
+            for future in as_completed(futures):
+                try:
+                    future.result()
+                except Exception as e:
+                    self.stats.add('failed')
+                    logger.error(f"✗ Error syncing {futures[future]}: {e}")
+        self.stats.report(direction)
+        if self.dry_run:
+            return self.stats.counts['failed'] == 0
+        if self.stats.counts['failed']:
+            checkpoint.save()
+            logger.info(f"Checkpoint kept in {checkpoint.path}; re-run to resume")
+            return False
+        checkpoint.remove()
+        return True
+
+    # -- local -> S3 ---------------------------------------------------------
+
+    def _upload(self, path: str, key: str, remote_etag: Optional[str], checkpoint: SyncCheckpoint):
+        # Compressed the way S3Service compresses what it writes, so the API and this tool agree on ETags
+        body, encoding = compress_object(local_body(path), self.compression, Config.S3_COMPRESSION_MIN_BYTES)
+        etag = self._etag(body)
+        if not self.force and checkpoint.is_done(key, etag):
+            self.stats.add('resumed')
+            return
+        if not self.force and remote_etag == etag:
+            self.stats.add('unchanged')
+            return
+        if self.dry_run:
+            logger.info(f"Would upload: {path} -> s3://{self.s3.bucket_name}/{key} ({len(body)} bytes)")
+            self.stats.add('transferred', len(body))
+            return
+        extra = {'ContentType': 'application/json', **encoding}
+        self.s3.s3_client.upload_fileobj(io.BytesIO(body), self.s3.bucket_name, key, ExtraArgs=extra, Config=self.transfer)
+        checkpoint.mark(key, etag)
+        self.stats.add('transferred', len(body))
+        logger.info(f"✓ Uploaded: {key} ({len(body)} bytes)")
+
+    def upload(self) -> bool:
+        if not os.path.exists(self.data_dir):
+            logger.error(f"Local data directory '{self.data_dir}' not found")
+            return False
+        files = local_files(self.data_dir)
+        if not files:
+            logger.warning("No JSON files found in local data directory")
+            return True
+        remote = self.remote_etags()
+        logger.info(f"Found {len(files)} local files, {len(remote)} objects in s3://{self.s3.bucket_name}")
+        checkpoint = SyncCheckpoint(CHECKPOINT_FILE, 'up', self.s3.bucket_name)
+        tasks = [(key, lambda cp, p=path, k=key: self._upload(p, k, remote.get(k), cp)) for path, key in files]
+        return self._run(tasks, checkpoint, 'up')
+
+    # -- S3 -> local ---------------------------------------------------------
+
+    def _download(self, key: str, remote_etag: str, checkpoint: SyncCheckpoint):
+        path = os.path.join(self.data_dir, *key.split('/'))
+        if not self.force and checkpoint.is_done(key, remote_etag):
+            self.stats.add('resumed')
+            return
+        if not self.force:
+            try:
+                body = local_body(self.codecs.locate(path))
+            except FileNotFoundError:
+                body = None
+            if body is not None and remote_etag in self._stored_etags(body):
+                self.stats.add('unchanged')
+                return
+        if self.dry_run:
+            logger.info(f"Would download: s3://{self.s3.bucket_name}/{key} -> {path}")
+            self.stats.add('transferred')
+            return
+        buffer = io.BytesIO()
+        self.s3.s3_client.download_fileobj(self.s3.bucket_name, key, buffer, Config=self.transfer)
+        body = buffer.getvalue()
+        body = decompress(body)
+        # Stored the way the API stores this collection (STORAGE_CODEC / STORAGE_CODECS)
+        codec = self.codecs.codec_for(path)
+        atomic_write_bytes(path + codec.suffix, codec.encode(decode(body)) if codec.suffix else body)
+        for stale in self.codecs.stale_variants(path):
+            os.remove(stale)
+        checkpoint.mark(key, remote_etag)
+        self.stats.add('transferred', len(body))
+        logger.info(f"✓ Downloaded: {key} ({len(body)} bytes)")
+
+    def download(self) -> bool:
+        remote = {key: etag for key, etag in self.remote_etags().items() if key.endswith('.json')}
+        if not remote:
+            logger.warning(f"No JSON objects in s3://{self.s3.bucket_name}")
+            return True
+        logger.info(f"Found {len(remote)} objects in s3://{self.s3.bucket_name}")
+        checkpoint = SyncCheckpoint(CHECKPOINT_FILE, 'down', self.s3.bucket_name)
+        tasks = [(key, lambda cp, k=key, e=etag: self._download(k, e, cp)) for key, etag in remote.items()]
+        return self._run(tasks, checkpoint, 'down')
+
+
+def _s3_service() -> Optional[S3Service]:
     # Check if S3 is configured
-    bucket_name = os.getenv('S3_BUCKET_NAME')
-    if not bucket_name:
+    if not os.getenv('S3_BUCKET_NAME'):
         logger.error("S3_BUCKET_NAME not set in environment variables")
-        return False
-    
+        return None
+
     # Initialize S3 service
     s3_service = S3Service()
     if not s3_service.is_available():
         logger.error("S3 service not available. Check your AWS credentials.")
-        return False
-    
-    # Local data directory
-    local_data_dir = "_data"
-    if not os.path.exists(local_data_dir):
-        logger.error(f"Local data directory '{local_data_dir}' not found")
-        return False
-    
-    # Get all JSON files
-    json_files = []
-    for root, dirs, files in os.walk(local_data_dir):
-        for file in files:
-            if file.endswith('.json'):
-                file_path = os.path.join(root, file)
-                rel_path = os.path.relpath(file_path, local_data_dir)
-                json_files.append((file_path, rel_path))
-    
-    if not json_files:
-        logger.warning("No JSON files found in local data directory")
-        return True
-    
-    logger.info(f"Found {len(json_files)} JSON files to migrate")
-    
-    # Migrate each file
-    success_count = 0
-    error_count = 0
-    
-    for local_path, s3_key in json_files:
-        try:
-            logger.info(f"Migrating: {local_path} -> s3://{bucket_name}/{s3_key}")
-            
-            # Read local file
-            with open(local_path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-            
-            # Write to S3
-            if s3_service.write_json_file(s3_key, data):
-                success_count += 1
-                logger.info(f"✓ Successfully migrated: {s3_key}")
-            else:
-                error_count += 1
-                logger.error(f"✗ Failed to migrate: {s3_key}")
-                
-        except Exception as e:
-            error_count += 1
-            logger.error(f"✗ Error migrating {local_path}: {e}")
-    
-    # Summary
-    logger.info(f"\nMigration Summary:")
-    logger.info(f"✓ Successfully migrated: {success_count} files")
-    if error_count > 0:
-        logger.error(f"✗ Failed to migrate: {error_count} files")
-    
-    return error_count == 0
+        return None
+    return s3_service
+
+def migrate_local_to_s3(**options):
+    """Upload the local JSON files that differ from the bucket"""
+    s3_service = _s3_service()
+    return s3_service is not None and S3Sync(s3_service, **options).upload()
+
+def sync_s3_to_local(**options):
+    """Download the objects that differ from the local JSON files"""
+    s3_service = _s3_service()
+    return s3_service is not None and S3Sync(s3_service, **options).download()
 
 def verify_s3_migration():
     """Verify that files were migrated correctly to S3"""
-    
+
     bucket_name = os.getenv('S3_BUCKET_NAME')
     if not bucket_name:
         logger.error("S3_BUCKET_NAME not set in environment variables")
         return False
-    
+
     s3_service = S3Service()
     if not s3_service.is_available():
         logger.error("S3 service not available")
         return False
-    
+
     # List files in S3
     files = s3_service.list_files()
     if files is None:
         logger.error("Failed to list S3 files")
         return False
-    
+
     logger.info(f"Files in S3 bucket '{bucket_name}':")
     for file_key in sorted(files):
         size = s3_service.get_file_size(file_key)
         size_str = f" ({size} bytes)" if size else ""
         logger.info(f"  - {file_key}{size_str}")
-    
+
     return True
 
 def main():
     """Main migration function"""
+    parser = argparse.ArgumentParser(description="Sync the _data JSON files with the S3 bucket")
+    parser.add_argument("--direction", choices=("up", "down"), default="up",
+                        help="up: local -> S3 (default), down: S3 -> local")
+    parser.add_argument("--data-dir", default=LOCAL_DATA_DIR)
+    parser.add_argument("--workers", type=int, default=8, help="Concurrent transfers")
+    parser.add_argument("--compression", choices=("none", "gzip", "zstd"), default=Config.S3_COMPRESSION,
+                        help="Upload compressed, like S3Service with S3_COMPRESSION (default: that setting)")
+    parser.add_argument("--gzip", dest="compression", action="store_const", const="gzip",
+                        help="Same as --compression gzip")
+    parser.add_argument("--multipart-mb", type=int, default=8, help="Multipart threshold and part size")
+    parser.add_argument("--force", action="store_true", help="Transfer even objects that match")
+    parser.add_argument("--dry-run", action="store_true", help="Only report what would be transferred")
+    args = parser.parse_args()
+    options = dict(data_dir=args.data_dir, workers=args.workers, compression=args.compression,
+                   multipart_mb=args.multipart_mb, force=args.force, dry_run=args.dry_run)
+
+    if args.direction == "down":
+        logger.info("Starting sync from S3 to local files...")
+        return 0 if sync_s3_to_local(**options) else 1
+
     logger.info("Starting migration from local files to S3...")
-    
+
     # Check environment
     if not os.getenv('S3_MODE'):
         logger.warning("S3_MODE not set to 'true'. Set this in your .env file to enable S3 mode.")
-    
+
     # Perform migration
-    if migrate_local_to_s3():
+    if migrate_local_to_s3(**options):
         logger.info("Migration completed successfully!")
-        
+
         # Verify migration
         logger.info("\nVerifying migration...")
         verify_s3_migration()
-        
+
         logger.info("\nNext steps:")
         logger.info("1. Set S3_MODE=true in your .env file")
         logger.info("2. Restart your API server")
         logger.info("3. Your API will now read from S3 instead of local files")
-        
+
     else:
         logger.error("Migration failed!")
         return 1
-    
+
     return 0
 
 if __name__ == "__main__":
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""Compare the standard library and the JSON codec (orjson) on the real _data files.
+
+Usage: python scripts/bench_json_codec.py [--data-dir _data] [--repeat 20]
+"""
+
+from __future__ import annotations
+
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+
+_API_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, _API_DIR)
+
+from services import json_codec  # noqa: E402
+
+
+def best_ms(func, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def stdlib_cases(body: bytes, data) -> dict:
+    return {
+        "parse": lambda: json.loads(body.decode("utf-8")),
+        "pretty": lambda: json.dumps(data, indent=2, ensure_ascii=False).encode("utf-8"),
+        "compact": lambda: json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8"),
+    }
+
+
+def codec_cases(body: bytes, data) -> dict:
+    return {
+        "parse": lambda: json_codec.loads(body),
+        "pretty": lambda: json_codec.dumps(data, pretty=True),
+        "compact": lambda: json_codec.dumps(data),
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--data-dir", default=os.path.join(_API_DIR, "_data"))
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    if not json_codec.is_available():
+        print("orjson is not installed; the codec uses the standard library, nothing to compare.")
+        return 1
+
+    files = sorted(glob.glob(os.path.join(args.data_dir, "*.json")), key=os.path.getsize, reverse=True)
+    totals = {"stdlib": {}, "codec": {}}
+    print(f"{'file':<24}{'KB':>7}  {'op':<8}{'stdlib ms':>10}{'orjson ms':>10}{'speedup':>9}")
+    for path in files:
+        with open(path, "rb") as f:
+            body = f.read()
+        data = json.loads(body)
+        stdlib, codec = stdlib_cases(body, data), codec_cases(body, data)
+        # Both backends must produce the same files
+        assert stdlib["pretty"]() == codec["pretty"](), f"{path}: pretty output differs"
+        for op in stdlib:
+            before, after = best_ms(stdlib[op], args.repeat), best_ms(codec[op], args.repeat)
+            totals["stdlib"][op] = totals["stdlib"].get(op, 0.0) + before
+            totals["codec"][op] = totals["codec"].get(op, 0.0) + after
+            print(f"{os.path.basename(path):<24}{len(body) / 1024:>7.0f}  {op:<8}{before:>10.3f}{after:>10.3f}"
+                  f"{before / after if after else float('inf'):>8.1f}x")
+
+    print()
+    for op in totals["stdlib"]:
+        before, after = totals["stdlib"][op], totals["codec"][op]
+        print(f"all files  {op:<8}{before:>10.2f} ms -> {after:.2f} ms  ({before / after:.1f}x)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""Estimate what S3_COMPRESSION saves on a cold read of each _data file.
+
+A cold read downloads the object and parses it; compressed, it downloads fewer bytes and
+decompresses them first. Transfer time is modelled from --mbps (per-connection S3 throughput),
+CPU time is measured.
+
+Usage: python scripts/bench_s3_compression.py [--data-dir _data] [--mbps 100] [--repeat 10]
+"""
+
+from __future__ import annotations
+
+import argparse
+import glob
+import os
+import sys
+import time
+
+_API_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, _API_DIR)
+
+from services import json_codec  # noqa: E402
+from services.s3_service import compress_object  # noqa: E402
+from services.storage_codecs import compression_available, decompress  # noqa: E402
+
+
+def best_ms(func, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--data-dir", default=os.path.join(_API_DIR, "_data"))
+    parser.add_argument("--mbps", type=float, default=100.0, help="Download throughput in megabits per second")
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    compressions = [c for c in ("gzip", "zstd") if compression_available(c)]
+    bytes_per_ms = args.mbps * 1e6 / 8 / 1000
+    files = sorted(glob.glob(os.path.join(args.data_dir, "*.json")), key=os.path.getsize, reverse=True)
+    print(f"{'file':<24}{'codec':<7}{'KB':>8}{'ratio':>7}{'encode ms':>11}{'cold read ms':>14}{'speedup':>9}")
+    for path in files:
+        with open(path, "rb") as f:
+            body = f.read()
+        plain_ms = len(body) / bytes_per_ms + best_ms(lambda: json_codec.loads(body), args.repeat)
+        print(f"{os.path.basename(path):<24}{'none':<7}{len(body) / 1024:>8.0f}{1:>7.1f}{0:>11.2f}{plain_ms:>14.2f}{1:>8.1f}x")
+        for compression in compressions:
+            stored, _ = compress_object(body, compression)
+            encode_ms = best_ms(lambda: compress_object(body, compression), args.repeat)
+            read_ms = len(stored) / bytes_per_ms + best_ms(lambda: json_codec.loads(decompress(stored)), args.repeat)
+            print(f"{'':<24}{compression:<7}{len(stored) / 1024:>8.0f}{len(body) / len(stored):>7.1f}"
+                  f"{encode_ms:>11.2f}{read_ms:>14.2f}{plain_ms / read_ms:>8.1f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
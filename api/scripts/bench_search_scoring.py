@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""Compare the pure-Python and vectorized (NumPy) search scorers on a synthetic catalog.
+
+Usage: python scripts/bench_search_scoring.py [--docs 100000] [--repeat 5]
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import random
+import sys
+import time
+
+_API_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, _API_DIR)
+
+from config import Config  # noqa: E402
+from services.search_service import SearchService  # noqa: E402
+
+DOC_TYPES = ["models", "agreements", "domains", "glossary", "toolkit", "policies"]
+
+COMMON_WORDS = ["data", "customer", "order", "product", "report", "daily", "model", "table", "event", "metric"]
+
+
+def _vocabulary(size: int, rng: random.Random) -> list[str]:
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    words = list(COMMON_WORDS)
+    seen = set(words)
+    while len(words) < size:
+        word = "".join(rng.choice(letters) for _ in range(rng.randint(4, 9)))
+        if word not in seen:
+            seen.add(word)
+            words.append(word)
+    return words
+
+
+def build_catalog(service: SearchService, n_docs: int, seed: int = 7) -> None:
+    rng = random.Random(seed)
+    vocab = _vocabulary(20000, rng)
+    # Zipf-like term distribution so a handful of terms are very common, as in real catalogs
+    weights = [1 / (rank + 1) for rank in range(len(vocab))]
+    for i in range(n_docs):
+        name = " ".join(rng.choices(vocab, weights=weights, k=3))
+        description = " ".join(rng.choices(vocab, weights=weights, k=rng.randint(10, 40)))
+        doc_type = DOC_TYPES[i % len(DOC_TYPES)]
+        service._index_document(doc_type, f"doc-{i}", {"id": f"doc-{i}", "name": name, "description": description})
+
+
+def time_queries(service: SearchService, queries: list[str], repeat: int) -> dict[str, float]:
+    timings = {}
+    for query in queries:
+        best = float("inf")
+        for _ in range(repeat):
+            start = time.perf_counter()
+            service.search_page(query, limit=20)
+            best = min(best, time.perf_counter() - start)
+        timings[query] = best * 1000
+    return timings
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--docs", type=int, default=100000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    service = SearchService()
+    if service._vector_scorer is None:
+        print("NumPy is not installed (or SEARCH_VECTOR_SCORING=off); nothing to compare.")
+        return 1
+
+    start = time.perf_counter()
+    build_catalog(service, args.docs)
+    print(f"Indexed {len(service.index)} documents, {len(service.postings)} terms in {time.perf_counter() - start:.1f}s")
+
+    start = time.perf_counter()
+    service._rebuild_matrix()
+    print(f"Built term-document matrix in {(time.perf_counter() - start) * 1000:.0f} ms")
+
+    queries = ["data", "customer order", "product report daily", "metric ev", "d"]
+
+    Config.SEARCH_VECTOR_SCORING = "off"
+    service_scorer = service._vector_scorer
+    service._vector_scorer = None
+    python_ms = time_queries(service, queries, args.repeat)
+
+    service._vector_scorer = service_scorer
+    Config.SEARCH_VECTOR_SCORING = "on"
+    vector_ms = time_queries(service, queries, args.repeat)
+
+    print(f"\n{'query':<24}{'matches':>10}{'python ms':>12}{'vector ms':>12}{'speedup':>10}")
+    for query in queries:
+        total = service.search_page(query, limit=1)["total"]
+        print(f"{query!r:<24}{total:>10}{python_ms[query]:>12.1f}{vector_ms[query]:>12.1f}{python_ms[query] / vector_ms[query]:>9.1f}x")
+
+    # Both backends must rank identically
+    for query in queries:
+        service._vector_scorer = None
+        expected = [hit["_search_id"] for hit in service.search_page(query, limit=50)["results"]]
+        service._vector_scorer = service_scorer
+        actual = [hit["_search_id"] for hit in service.search_page(query, limit=50)["results"]]
+        if expected != actual:
+            print(f"Ranking mismatch for {query!r}")
+            return 1
+    print("\nRankings match between scorers.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""Convert _data collections between monolithic JSON files and the sharded one-file-per-entity layout.
+
+Usage:
+  python scripts/convert_data_layout.py to-sharded   [--files dataModels.json,...] [--remove-source]
+  python scripts/convert_data_layout.py to-monolithic [--files dataModels.json,...] [--remove-shards]
+  add --s3 to convert objects in the configured S3 bucket instead of the local _data directory
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+
+_API_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, _API_DIR)
+
+from config import Config  # noqa: E402
+from services.storage_sharded import LocalObjectStore, S3ObjectStore, ShardedJsonStorageEngine  # noqa: E402
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("direction", choices=["to-sharded", "to-monolithic"])
+    parser.add_argument("--files", default=",".join(Config.STORAGE_SHARDED_FILES),
+                        help="Comma-separated document names (default: STORAGE_SHARDED_FILES)")
+    parser.add_argument("--data-dir", default=os.path.join(_API_DIR, "_data"))
+    parser.add_argument("--s3", action="store_true", help="Convert objects in S3_BUCKET_NAME")
+    parser.add_argument("--remove-source", action="store_true", help="Delete the monolithic file after sharding")
+    parser.add_argument("--remove-shards", action="store_true", help="Delete the entity files after merging")
+    args = parser.parse_args()
+
+    if args.s3:
+        from services.s3_service import S3Service
+        s3_service = S3Service()
+        if not s3_service.is_available():
+            print("S3 is not configured (S3_BUCKET_NAME / credentials)")
+            return 1
+        store = S3ObjectStore(s3_service)
+    else:
+        store = LocalObjectStore(args.data_dir)
+
+    files = [f.strip() for f in args.files.split(",") if f.strip()]
+    engine = ShardedJsonStorageEngine(store, files)
+    failed = 0
+    for file_name in files:
+        try:
+            if args.direction == "to-sharded":
+                count = engine.shard(file_name, remove_source=args.remove_source)
+            else:
+                count = engine.unshard(file_name, remove_shards=args.remove_shards)
+            print(f"{file_name}: {count} entities -> {args.direction[3:]}")
+        except FileNotFoundError as e:
+            print(f"{file_name}: skipped, not found ({e})")
+            failed += 1
+
+    stats = engine.get_stats()
+    print(f"\n{stats['object_writes']} objects written, {stats['object_deletes']} deleted")
+    return 1 if failed == len(files) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
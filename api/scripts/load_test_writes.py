@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""Concurrent click-count load test: unserialized read-modify-write vs. the group-committing write coordinator.
+
+Runs against a temporary copy of _data/dataModels.json and reports write throughput and the
+lost-update rate (increments missing from the final document).
+
+Usage: python scripts/load_test_writes.py [--engine json] [--workers 16] [--ops 50]
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import logging
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+_API_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, _API_DIR)
+
+from services.storage_engine import create_storage_engine  # noqa: E402
+from services.write_coordinator import WriteCoordinator  # noqa: E402
+
+FILE_NAME = "dataModels.json"
+
+
+def _click_counts(storage) -> dict[int, int]:
+    models = storage.read_document(FILE_NAME)["models"]
+    return {i: (m.get("meta") or {}).get("clickCount", 0) for i, m in enumerate(models)}
+
+
+def _increment(document: dict, index: int) -> None:
+    meta = document["models"][index].setdefault("meta", {})
+    meta["clickCount"] = meta.get("clickCount", 0) + 1
+
+
+def _plan(workers: int, ops: int, n_models: int, seed: int) -> list[list[int]]:
+    rng = random.Random(seed)
+    # Skewed towards a few popular models, like real click traffic
+    return [[min(int(rng.expovariate(0.5)), n_models - 1) for _ in range(ops)] for _ in range(workers)]
+
+
+def run_naive(storage, plan: list[list[int]]) -> tuple[float, int]:
+    """Each thread reads the whole document, increments and writes it back with no coordination."""
+    errors = 0
+    lock = threading.Lock()
+
+    def worker(indexes: list[int]) -> None:
+        nonlocal errors
+        for index in indexes:
+            try:
+                document = storage.read_document(FILE_NAME)
+                _increment(document, index)
+                storage.write_document(FILE_NAME, document)
+            except Exception:
+                with lock:
+                    errors += 1
+
+    threads = [threading.Thread(target=worker, args=(indexes,)) for indexes in plan]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - start, errors
+
+
+def _mutation(index: int):
+    def apply(batch) -> None:
+        document = batch.read_document(FILE_NAME)
+        _increment(document, index)
+        batch.write_document(FILE_NAME, document)
+    return apply
+
+
+def run_coordinated_threads(coordinator: WriteCoordinator, plan: list[list[int]]) -> tuple[float, int]:
+    def worker(indexes: list[int]) -> None:
+        for index in indexes:
+            coordinator.mutate_sync(FILE_NAME, _mutation(index))
+
+    threads = [threading.Thread(target=worker, args=(indexes,)) for indexes in plan]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - start, 0
+
+
+def run_coordinated_async(coordinator: WriteCoordinator, plan: list[list[int]]) -> tuple[float, int]:
+    """Concurrent requests on one event loop, as the API's async endpoints issue them."""
+    async def worker(indexes: list[int]) -> None:
+        for index in indexes:
+            await coordinator.mutate(FILE_NAME, _mutation(index))
+
+    async def main() -> None:
+        await asyncio.gather(*(worker(indexes) for indexes in plan))
+
+    start = time.perf_counter()
+    asyncio.run(main())
+    return time.perf_counter() - start, 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--engine", default="json", choices=["json", "sqlite", "sharded", "journal"])
+    parser.add_argument("--workers", type=int, default=16, help="Concurrent writers")
+    parser.add_argument("--ops", type=int, default=50, help="Increments per writer")
+    parser.add_argument("--seed", type=int, default=11)
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    results = []
+    for mode in ("naive", "coordinated-threads", "coordinated-async"):
+        data_dir = tempfile.mkdtemp(prefix="catalog-load-")
+        try:
+            shutil.copy(os.path.join(_API_DIR, "_data", FILE_NAME), data_dir)
+            storage = create_storage_engine(args.engine, data_dir, os.path.join(data_dir, "catalog.db"),
+                                            [FILE_NAME], checkpoint_interval=0)
+            before = _click_counts(storage)
+            plan = _plan(args.workers, args.ops, len(before), args.seed)
+            coordinator = WriteCoordinator(storage)
+            if mode == "naive":
+                elapsed, errors = run_naive(storage, plan)
+            elif mode == "coordinated-threads":
+                elapsed, errors = run_coordinated_threads(coordinator, plan)
+            else:
+                elapsed, errors = run_coordinated_async(coordinator, plan)
+            coordinator.close()
+            after = _click_counts(storage)
+            storage.close()
+        finally:
+            shutil.rmtree(data_dir, ignore_errors=True)
+
+        attempted = args.workers * args.ops
+        applied = sum(after.values()) - sum(before.values())
+        stats = coordinator.get_stats()
+        results.append((mode, attempted, applied, errors, elapsed, stats))
+
+    print(f"engine={args.engine} workers={args.workers} ops/worker={args.ops}\n")
+    print(f"{'mode':<22}{'ops/s':>9}{'lost':>8}{'lost %':>8}{'errors':>8}{'writes':>8}{'avg batch':>11}")
+    for mode, attempted, applied, errors, elapsed, stats in results:
+        lost = attempted - applied
+        writes = stats["writes"] if mode != "naive" else attempted - errors
+        avg_batch = f"{stats['avg_batch_size']:.1f}" if mode != "naive" else "-"
+        print(f"{mode:<22}{attempted / elapsed:>9.0f}{lost:>8}{lost / attempted * 100:>7.1f}%{errors:>8}{writes:>8}{avg_batch:>11}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""Serve a local directory as a GitHub repository for GITHUB_SYNC=archive.
+
+Answers the two GitHub API calls the archive sync makes: the branch head SHA
+(GET /repos/<repo>/commits/<branch>, with ETag / If-None-Match) and the commit tarball
+(GET /repos/<repo>/tarball/<sha>, redirected to /codeload/... as GitHub does). The "commit"
+is a hash of the directory's files, so editing a file publishes a new one.
+
+Usage: python scripts/serve_github_archive.py [--data-dir _data] [--repo local/catalog] [--port 8765]
+  then run the API with GITHUB_SYNC=archive GITHUB_API_URL=http://127.0.0.1:8765 GITHUB_REPO=local/catalog
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import io
+import os
+import sys
+import tarfile
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+_API_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def snapshot(data_dir: str) -> tuple[str, list[tuple[str, bytes]]]:
+    """(commit SHA, [(relative path, content)]) of the files under data_dir."""
+    files = []
+    for root, dirs, names in os.walk(data_dir):
+        dirs[:] = sorted(d for d in dirs if not d.startswith(("_", ".")))
+        for name in sorted(names):
+            path = os.path.join(root, name)
+            with open(path, "rb") as f:
+                files.append((os.path.relpath(path, data_dir).replace(os.sep, "/"), f.read()))
+    digest = hashlib.sha1()
+    for name, body in files:
+        digest.update(name.encode("utf-8") + b"\0" + hashlib.sha1(body).digest())
+    return digest.hexdigest(), files
+
+
+def tarball(prefix: str, files: list[tuple[str, bytes]]) -> bytes:
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode="w:gz") as tar:
+        for name, body in files:
+            info = tarfile.TarInfo(f"{prefix}/{name}")
+            info.size = len(body)
+            tar.addfile(info, io.BytesIO(body))
+    return buffer.getvalue()
+
+
+def make_handler(data_dir: str, repo: str, data_path: str):
+    class Handler(BaseHTTPRequestHandler):
+        def send(self, status: int, body: bytes = b"", headers: dict | None = None):
+            self.send_response(status)
+            for key, value in (headers or {}).items():
+                self.send_header(key, value)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            sha, files = snapshot(data_dir)
+            path = self.path.split("?")[0]
+            if path.startswith(f"/repos/{repo}/commits/"):
+                etag = f'"{sha}"'
+                if self.headers.get("If-None-Match") == etag:
+                    return self.send(304, headers={"ETag": etag})
+                return self.send(200, sha.encode(), {"ETag": etag, "Content-Type": "text/plain"})
+            if path.startswith(f"/repos/{repo}/tarball/"):
+                return self.send(302, headers={"Location": f"/codeload/{repo}/legacy.tar.gz/{path.rsplit('/', 1)[1]}"})
+            if path.startswith(f"/codeload/{repo}/legacy.tar.gz/"):
+                if path.rsplit("/", 1)[1] != sha:
+                    return self.send(404, b"only the current commit is served")
+                owner, name = repo.split("/", 1)
+                root = f"{owner}-{name}-{sha[:7]}" + (f"/{data_path}" if data_path else "")
+                return self.send(200, tarball(root, files), {"Content-Type": "application/x-gzip"})
+            self.send(404, b"not found")
+
+        def log_message(self, format, *args):
+            print(f"{self.address_string()} {format % args}")
+
+    return Handler
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--data-dir", default=os.path.join(_API_DIR, "_data"))
+    parser.add_argument("--repo", default="local/catalog", help="owner/name the API is configured with (GITHUB_REPO)")
+    parser.add_argument("--data-path", default="", help="Directory of the files inside the repository (GITHUB_DATA_PATH)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(args.data_dir, args.repo, args.data_path.strip("/")))
+    sha, files = snapshot(args.data_dir)
+    print(f"Serving {len(files)} files of {args.data_dir} as {args.repo} (commit {sha[:12]}) "
+          f"on http://{args.host}:{server.server_port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
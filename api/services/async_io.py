@@ -0,0 +1,140 @@
+"""
+Blocking I/O for async endpoints, and event loop lag measurement.
+async def handlers run on the event loop, so file, S3, GitHub and subprocess work they need is
+handed to a bounded thread pool (BlockingIO.run) instead of being called directly; a single
+slow read or pip install would otherwise stall every request in the worker.
+"""
+
+import asyncio
+import contextvars
+import functools
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+
+class BlockingIO:
+    """Runs blocking calls on a bounded thread pool and awaits them from the event loop."""
+
+    def __init__(self, max_workers: int, name: str = 'blocking-io'):
+        self.name = name
+        self.max_workers = max_workers
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+        self._lock = threading.Lock()
+        self.stats = {
+            'calls': 0,
+            'errors': 0,
+            'in_flight': 0,
+            'max_in_flight': 0,
+            'total_ms': 0.0,
+            'max_ms': 0.0,
+        }
+
+    def _call(self, func: Callable[..., Any], *args, **kwargs) -> Any:
+        started = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        except BaseException:
+            with self._lock:
+                self.stats['errors'] += 1
+            raise
+        finally:
+            elapsed = (time.perf_counter() - started) * 1000
+            with self._lock:
+                self.stats['in_flight'] -= 1
+                self.stats['total_ms'] += elapsed
+                self.stats['max_ms'] = max(self.stats['max_ms'], elapsed)
+
+    async def run(self, func: Callable[..., Any], *args, **kwargs) -> Any:
+        """Await func(*args, **kwargs) run on the pool; context variables (the request's catalog
+        snapshot) are carried over to the worker thread."""
+        with self._lock:
+            self.stats['calls'] += 1
+            self.stats['in_flight'] += 1
+            self.stats['max_in_flight'] = max(self.stats['max_in_flight'], self.stats['in_flight'])
+        context = contextvars.copy_context()
+        call = functools.partial(context.run, self._call, func, *args, **kwargs)
+        return await asyncio.get_running_loop().run_in_executor(self._executor, call)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self.stats)
+        stats['max_workers'] = self.max_workers
+        stats['avg_ms'] = round(stats['total_ms'] / stats['calls'], 2) if stats['calls'] else 0
+        stats['total_ms'] = round(stats['total_ms'], 2)
+        stats['max_ms'] = round(stats['max_ms'], 2)
+        return stats
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+
+
+class EventLoopLagMonitor:
+    """Measures how late the event loop wakes up from a short sleep.
+
+    Lag is the time the loop spent running something else (blocking code in a handler) past
+    the timer; on a healthy loop it stays near zero.
+    """
+
+    def __init__(self, interval: float = 0.25, window: int = 1200, stall_ms: float = 100.0):
+        self.interval = interval
+        self.stall_ms = stall_ms
+        self._samples: deque = deque(maxlen=window)
+        self._task: Optional[asyncio.Task] = None
+        self.max_ms = 0.0
+        self.stalls = 0
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, (loop.time() - started - self.interval) * 1000)
+            self._samples.append(lag)
+            self.max_ms = max(self.max_ms, lag)
+            if lag >= self.stall_ms:
+                self.stalls += 1
+                logger.warning(f"Event loop blocked for {lag:.0f} ms")
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        samples = sorted(self._samples)
+        if not samples:
+            return {'samples': 0, 'running': self._task is not None}
+        return {
+            'running': self._task is not None,
+            'samples': len(samples),
+            'interval_ms': self.interval * 1000,
+            'current_ms': round(self._samples[-1], 2),
+            'avg_ms': round(sum(samples) / len(samples), 2),
+            'p95_ms': round(samples[int(len(samples) * 0.95)], 2),
+            'p99_ms': round(samples[int(len(samples) * 0.99)], 2),
+            'max_ms': round(self.max_ms, 2),
+            f'stalls_over_{self.stall_ms:.0f}ms': self.stalls,
+        }
+
+
+# File, S3 and GitHub access from async endpoints
+blocking_io = BlockingIO(Config.IO_THREADS)
+# pip installs and module imports for toolkit introspection; kept apart so they cannot use up the file I/O threads
+introspection_io = BlockingIO(Config.INTROSPECTION_THREADS, 'introspection')
+event_loop_lag = EventLoopLagMonitor()
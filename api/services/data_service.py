@@ -1,8 +1,8 @@
-import json
 import os
 import logging
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Iterator, Optional
 from .s3_service import S3Service
+from .storage_codecs import CodecRegistry, decode
 from config import Config
 
 logger = logging.getLogger(__name__)
@@ -13,6 +13,7 @@ class DataService:
     def __init__(self):
         self.s3_service = S3Service() if Config.S3_MODE else None
         self.data_directory = "_data"
+        self.codecs = CodecRegistry.from_config(Config.STORAGE_CODEC, Config.STORAGE_CODECS)
         
     def read_json_file(self, file_path: str) -> Optional[Dict[str, Any]]:
         """
@@ -75,20 +76,18 @@ class DataService:
             if not file_path.endswith('.json'):
                 file_path = f"{file_path}.json"
             
-            # Check if file exists
-            if not os.path.exists(file_path):
-                logger.error(f"Local file not found: {file_path}")
-                return None
+            # The file may be stored with any codec (compressed or MessagePack variants)
+            file_path = self.codecs.locate(file_path)
             
-            with open(file_path, 'r', encoding='utf-8') as file:
-                data = json.load(file)
+            with open(file_path, 'rb') as file:
+                data = decode(file.read())
                 logger.info(f"Successfully read local file: {file_path}")
                 return data
                 
         except FileNotFoundError:
             logger.error(f"Local file not found: {file_path}")
             return None
-        except json.JSONDecodeError as e:
+        except ValueError as e:
             logger.error(f"Invalid JSON in local file {file_path}: {e}")
             return None
         except Exception as e:
@@ -116,10 +115,13 @@ class DataService:
             # Ensure directory exists
             os.makedirs(os.path.dirname(file_path), exist_ok=True)
             
-            with open(file_path, 'w', encoding='utf-8') as file:
-                json.dump(data, file, indent=2, ensure_ascii=False)
-                logger.info(f"Successfully wrote local file: {file_path}")
-                return True
+            codec = self.codecs.codec_for(file_path)
+            with open(file_path + codec.suffix, 'wb') as file:
+                file.write(codec.encode(data))
+            for stale in self.codecs.stale_variants(file_path):
+                os.remove(stale)
+            logger.info(f"Successfully wrote local file: {file_path} ({codec.name})")
+            return True
                 
         except Exception as e:
             logger.error(f"Error writing local file {file_path}: {e}")
@@ -152,7 +154,10 @@ class DataService:
             if not file_path.endswith('.json'):
                 file_path = f"{file_path}.json"
             
-            return os.path.exists(file_path)
+            self.codecs.locate(file_path)
+            return True
+        except FileNotFoundError:
+            return False
         except Exception as e:
             logger.error(f"Error checking local file existence: {e}")
             return False
@@ -184,8 +189,8 @@ class DataService:
             if not file_path.endswith('.json'):
                 file_path = f"{file_path}.json"
             
-            if os.path.exists(file_path):
-                return os.path.getsize(file_path)
+            return os.path.getsize(self.codecs.locate(file_path))
+        except FileNotFoundError:
             return None
         except Exception as e:
             logger.error(f"Error getting local file size: {e}")
@@ -209,24 +214,40 @@ class DataService:
             logger.warning("File listing not supported for GitHub mode")
             return None
     
+    def iter_files(self, prefix: str = "") -> Iterator[str]:
+        """
+        Stream the file keys under a prefix from the configured data source
+        
+        Unlike list_files(), the listing is never held in full: S3 keys arrive one listing page
+        at a time and local files as the directory walk reaches them.
+        """
+        if Config.S3_MODE and self.s3_service and self.s3_service.is_available():
+            yield from self.s3_service.iter_files(prefix)
+        elif Config.TEST_MODE:
+            yield from self._iter_local_files(prefix)
+        else:
+            logger.warning("File listing not supported for GitHub mode")
+    
+    def _iter_local_files(self, prefix: str = ""):
+        """JSON files under prefix (paths relative to the data directory), walked with os.scandir"""
+        base_path = os.path.join(self.data_directory, prefix) if prefix else self.data_directory
+        pending = [base_path]
+        while pending:
+            try:
+                entries = os.scandir(pending.pop())
+            except (FileNotFoundError, NotADirectoryError):
+                continue
+            with entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        pending.append(entry.path)
+                    elif entry.name.endswith('.json'):
+                        yield os.path.relpath(entry.path, self.data_directory)
+    
     def _list_local_files(self, prefix: str = "") -> Optional[list]:
         """List local files with optional prefix"""
         try:
-            base_path = self.data_directory
-            if prefix:
-                base_path = os.path.join(base_path, prefix)
-            
-            if not os.path.exists(base_path):
-                return []
-            
-            files = []
-            for root, dirs, filenames in os.walk(base_path):
-                for filename in filenames:
-                    if filename.endswith('.json'):
-                        rel_path = os.path.relpath(os.path.join(root, filename), self.data_directory)
-                        files.append(rel_path)
-            
-            return files
+            return list(self._iter_local_files(prefix))
         except Exception as e:
             logger.error(f"Error listing local files: {e}")
             return None
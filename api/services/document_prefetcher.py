@@ -0,0 +1,148 @@
+"""
+Background warming and refreshing of the catalog collections (main.JSON_FILES).
+At startup every collection is read in parallel, so the first request for each one no longer
+pays the fetch-and-parse cost. When storage is the remote read-through cache (storage_gateway.py)
+each document is then revalidated shortly before its TTL runs out: between REFRESH_AHEAD and
+REFRESH_AHEAD + REFRESH_JITTER of the TTL early, randomised so replicas and files do not all ask
+the origin at once. Request threads therefore find a confirmed copy and almost never miss.
+"""
+
+import heapq
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterable, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Fractions of a document's TTL by which it is refreshed early
+REFRESH_AHEAD = 0.1
+REFRESH_JITTER = 0.1
+# Wait before retrying a document whose refresh failed (the cached copy keeps being served)
+RETRY_SECONDS = 5.0
+
+
+class DocumentPrefetcher:
+    """Warms file_names through storage at start(); keeps them fresh if storage supports refresh()."""
+
+    def __init__(self, storage, file_names: Iterable[str], threads: int = 4):
+        self.storage = storage
+        self.file_names = sorted(set(file_names))
+        self.threads = threads
+        self.refreshes = hasattr(storage, 'refresh') and hasattr(storage, 'expires_at')
+        self._executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='prefetch')
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+        self.stats = {
+            'warmed': 0,
+            'warm_errors': 0,
+            'warm_ms': 0.0,
+            'refreshes': 0,
+            'refresh_errors': 0,
+            'last_error': None,
+        }
+
+    def _count(self, key: str, amount=1):
+        with self._lock:
+            self.stats[key] += amount
+
+    def _warm_one(self, file_name: str):
+        try:
+            self.storage.read_document(file_name)
+            self._count('warmed')
+        except FileNotFoundError:
+            # Collections a deployment does not have stay unwarmed
+            pass
+        except Exception as e:
+            self._count('warm_errors')
+            with self._lock:
+                self.stats['last_error'] = f"{file_name}: {e}"
+            logger.warning(f"Could not warm {file_name}: {e}")
+
+    def warm(self):
+        """Read every collection once, in parallel; returns when all have been tried."""
+        started = time.perf_counter()
+        list(self._executor.map(self._warm_one, self.file_names))
+        elapsed = (time.perf_counter() - started) * 1000
+        with self._lock:
+            self.stats['warm_ms'] = round(elapsed, 2)
+        logger.info(f"Warmed {self.stats['warmed']}/{len(self.file_names)} collections in {elapsed:.0f}ms")
+
+    def _due(self, file_name: str) -> float:
+        """When file_name should next be refreshed (time.monotonic())."""
+        expires = self.storage.expires_at(file_name)
+        if expires is None:
+            # Not cached (never loaded, evicted or deleted) or not yet confirmed by the origin
+            return time.monotonic()
+        ttl = self.storage.ttl_for(file_name)
+        return expires - ttl * (REFRESH_AHEAD + random.uniform(0, REFRESH_JITTER))
+
+    def _refresh_one(self, file_name: str) -> float:
+        """Refresh file_name if it is due (a request may have revalidated it meanwhile); next due time."""
+        due = self._due(file_name)
+        if due > time.monotonic():
+            return due
+        try:
+            self.storage.refresh(file_name)
+            self._count('refreshes')
+        except FileNotFoundError:
+            return time.monotonic() + max(self.storage.ttl_for(file_name), RETRY_SECONDS)
+        except Exception as e:
+            self._count('refresh_errors')
+            with self._lock:
+                self.stats['last_error'] = f"{file_name}: {e}"
+            logger.warning(f"Background refresh of {file_name} failed: {e}")
+            return time.monotonic() + RETRY_SECONDS
+        if self.storage.expires_at(file_name) is None:
+            # Too large for the memory tier: it is revalidated by the reads themselves
+            return time.monotonic() + max(self.storage.ttl_for(file_name), RETRY_SECONDS)
+        return self._due(file_name)
+
+    def _run(self):
+        self.warm()
+        if not self.refreshes:
+            return
+        schedule: List[Tuple[float, str]] = []
+        for file_name in self.file_names:
+            if self.storage.ttl_for(file_name) > 0:
+                heapq.heappush(schedule, (self._due(file_name), file_name))
+        while schedule and not self._stop.is_set():
+            due, _ = schedule[0]
+            if self._stop.wait(max(0.0, due - time.monotonic())):
+                break
+            # Refresh everything due now in parallel, then put each back at its next due time
+            batch = []
+            while schedule and schedule[0][0] <= time.monotonic():
+                batch.append(heapq.heappop(schedule)[1])
+            for file_name, next_due in zip(batch, self._executor.map(self._refresh_one, batch)):
+                heapq.heappush(schedule, (next_due, file_name))
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name='document-prefetcher', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+        self._executor.shutdown(wait=False)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self.stats)
+        stats['files'] = len(self.file_names)
+        stats['threads'] = self.threads
+        stats['refreshing'] = self.refreshes and self._thread is not None and self._thread.is_alive()
+        if self.refreshes:
+            now = time.monotonic()
+            stats['expires_in'] = {}
+            for file_name in self.file_names:
+                expires = self.storage.expires_at(file_name)
+                stats['expires_in'][file_name] = round(expires - now, 1) if expires is not None else None
+        return stats
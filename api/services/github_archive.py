@@ -0,0 +1,239 @@
+"""
+Catalog documents from one commit of the GitHub data repository (GITHUB_SYNC=archive).
+Instead of downloading each file from raw.githubusercontent.com, where files fetched at
+different times can come from different commits, the branch is resolved to a commit SHA
+(a conditional request: an unchanged branch costs a 304) and that commit's tarball is
+downloaded once and unpacked under GITHUB_ARCHIVE_DIR/<sha>. Every document is then served
+from that tree, so all collections come from the same commit, and only a new SHA on the
+branch triggers another download. Versions are git blob ids, so documents a commit did not
+touch stay NOT_MODIFIED across syncs.
+"""
+
+import hashlib
+import logging
+import os
+import re
+import shutil
+import tarfile
+import tempfile
+import threading
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import requests
+
+from . import json_codec
+from .s3_service import NOT_MODIFIED
+from .storage_engine import ReadOnlyStorage
+
+logger = logging.getLogger(__name__)
+
+_SHA = re.compile(r'^[0-9a-f]{40}$')
+# Written last into an unpacked tree: key -> blob id of every file in it
+_MANIFEST = '.files.json'
+
+
+def blob_id(body: bytes) -> str:
+    """The git object id of a file with this content."""
+    return hashlib.sha1(b'blob %d\0' % len(body) + body).hexdigest()
+
+
+class GitHubArchiveStore:
+    """Collection files served read-only from an unpacked tarball of one commit of a GitHub repository."""
+
+    name = 'github_archive'
+    writable = False
+
+    def __init__(self, api_url: str, repo: str, branch: str, archive_dir: str, data_path: str = '',
+                 token: str = '', check_seconds: float = 0, timeout: float = 60.0):
+        self.api_url = api_url.rstrip('/')
+        self.repo = repo
+        self.branch = branch
+        self.archive_dir = archive_dir
+        self.data_path = data_path.strip('/')
+        self.check_seconds = check_seconds
+        self.timeout = timeout
+        self.origin = f"{self.api_url}/repos/{repo}@{branch}/{self.data_path}"
+        self._session = requests.Session()
+        if token:
+            self._session.headers['Authorization'] = f"Bearer {token}"
+        self._lock = threading.Lock()
+        # (sha, {key: blob id}) of the tree documents are served from
+        self._snapshot: Optional[Tuple[str, Dict[str, str]]] = None
+        self._commit_etag: Optional[str] = None
+        self._resolved_at: Optional[float] = None
+        self._listeners: List[Callable[[], None]] = []
+        self.stats = {
+            'resolves': 0,
+            'resolve_not_modified': 0,
+            'syncs': 0,
+            'archive_bytes': 0,
+            'sync_ms': 0.0,
+            'errors': 0,
+            'last_error': None,
+            'synced_at': None,
+        }
+
+    def subscribe(self, listener: Callable[[], None]):
+        """Call listener after documents start being served from a new commit."""
+        self._listeners.append(listener)
+
+    def _resolve(self) -> str:
+        """SHA of the branch head."""
+        headers = {'Accept': 'application/vnd.github.sha'}
+        if self._snapshot is not None and self._commit_etag:
+            headers['If-None-Match'] = self._commit_etag
+        response = self._session.get(f"{self.api_url}/repos/{self.repo}/commits/{self.branch}",
+                                     headers=headers, timeout=self.timeout)
+        self.stats['resolves'] += 1
+        if response.status_code == 304:
+            self.stats['resolve_not_modified'] += 1
+            return self._snapshot[0]
+        response.raise_for_status()
+        sha = response.text.strip()
+        if not _SHA.match(sha):
+            raise ValueError(f"Unexpected commit SHA for {self.repo}@{self.branch}: {sha[:80]!r}")
+        self._commit_etag = response.headers.get('ETag')
+        return sha
+
+    def _tree(self, sha: str) -> str:
+        return os.path.join(self.archive_dir, sha)
+
+    def _load(self, sha: str) -> Optional[Dict[str, str]]:
+        """Manifest of an already unpacked tree, or None."""
+        try:
+            with open(os.path.join(self._tree(sha), _MANIFEST), 'rb') as f:
+                return json_codec.loads(f.read())
+        except (OSError, ValueError):
+            return None
+
+    def _member_key(self, name: str) -> Optional[str]:
+        """Key of a tarball member relative to data_path (None: outside it, or not a safe path)."""
+        parts = name.split('/')[1:]  # GitHub tarballs have one top-level '<owner>-<repo>-<sha>/' directory
+        if self.data_path:
+            prefix = self.data_path.split('/')
+            if parts[:len(prefix)] != prefix:
+                return None
+            parts = parts[len(prefix):]
+        if not parts or any(part in ('', '.', '..') for part in parts):
+            return None
+        return '/'.join(parts)
+
+    def _download(self, sha: str):
+        """Download and unpack the tarball of a commit into archive_dir/<sha>."""
+        started = time.perf_counter()
+        os.makedirs(self.archive_dir, exist_ok=True)
+        staging = tempfile.mkdtemp(prefix=f'.{sha}.', dir=self.archive_dir)
+        try:
+            with tempfile.TemporaryFile(dir=self.archive_dir) as archive:
+                with self._session.get(f"{self.api_url}/repos/{self.repo}/tarball/{sha}",
+                                       stream=True, timeout=self.timeout) as response:
+                    response.raise_for_status()
+                    for chunk in response.iter_content(1024 * 1024):
+                        archive.write(chunk)
+                size = archive.tell()
+                archive.seek(0)
+                files = {}
+                with tarfile.open(fileobj=archive, mode='r:*') as tar:
+                    for member in tar:
+                        key = self._member_key(member.name) if member.isfile() else None
+                        if key is None:
+                            continue
+                        body = tar.extractfile(member).read()
+                        path = os.path.join(staging, *key.split('/'))
+                        os.makedirs(os.path.dirname(path), exist_ok=True)
+                        with open(path, 'wb') as f:
+                            f.write(body)
+                        files[key] = blob_id(body)
+            with open(os.path.join(staging, _MANIFEST), 'wb') as f:
+                f.write(json_codec.dumps(files))
+            try:
+                os.rename(staging, self._tree(sha))
+            except OSError:
+                # Another worker sharing archive_dir unpacked the same commit first
+                if self._load(sha) is None:
+                    raise
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
+        elapsed = (time.perf_counter() - started) * 1000
+        self.stats['syncs'] += 1
+        self.stats['archive_bytes'] += size
+        self.stats['sync_ms'] = round(elapsed, 2)
+        logger.info(f"Synced {self.repo}@{self.branch} to {sha[:12]}: {len(files)} files, "
+                    f"{size / 1024:.0f}KB archive in {elapsed:.0f}ms")
+
+    def _prune(self, keep: List[str]):
+        """Remove unpacked commits other than keep (the previous one may still be read by another worker)."""
+        for name in os.listdir(self.archive_dir):
+            if _SHA.match(name) and name not in keep:
+                shutil.rmtree(os.path.join(self.archive_dir, name), ignore_errors=True)
+
+    def _latest_on_disk(self) -> Optional[str]:
+        if not os.path.isdir(self.archive_dir):
+            return None
+        trees = [name for name in os.listdir(self.archive_dir) if _SHA.match(name) and self._load(name) is not None]
+        return max(trees, key=lambda name: os.path.getmtime(self._tree(name)), default=None)
+
+    def sync(self) -> Tuple[str, Dict[str, str]]:
+        """The snapshot to serve, re-resolving the branch at most every check_seconds."""
+        with self._lock:
+            now = time.monotonic()
+            if (self._snapshot is not None and self._resolved_at is not None
+                    and now - self._resolved_at < self.check_seconds):
+                return self._snapshot
+            try:
+                sha = self._resolve()
+            except (requests.RequestException, ValueError) as e:
+                self.stats['errors'] += 1
+                self.stats['last_error'] = str(e)
+                sha = self._snapshot[0] if self._snapshot is not None else self._latest_on_disk()
+                if sha is None:
+                    raise
+                # Keep serving the last commit (or the newest on disk) until the branch resolves again
+                logger.warning(f"Could not resolve {self.repo}@{self.branch}, serving {sha[:12]}: {e}")
+            self._resolved_at = now
+            previous = self._snapshot
+            if previous is not None and previous[0] == sha:
+                return previous
+            files = self._load(sha)
+            if files is None:
+                self._download(sha)
+                files = self._load(sha)
+                if files is None:
+                    raise OSError(f"Unpacked commit {sha} has no readable {_MANIFEST}")
+            self._snapshot = (sha, files)
+            self.stats['synced_at'] = datetime.now().isoformat()
+            if previous is not None:
+                self._prune([sha, previous[0]])
+        if previous is not None:
+            logger.info(f"{self.repo}@{self.branch} moved from {previous[0][:12]} to {sha[:12]}")
+            for listener in self._listeners:
+                listener()
+        return self._snapshot
+
+    def fetch(self, key: str, version: Optional[str] = None):
+        """(body, blob id) of a file at the synced commit, NOT_MODIFIED if it still has version, None if absent."""
+        sha, files = self.sync()
+        blob = files.get(key)
+        if blob is None:
+            return None
+        if blob == version:
+            return NOT_MODIFIED
+        with open(os.path.join(self._tree(sha), *key.split('/')), 'rb') as f:
+            return f.read(), blob
+
+    def put(self, key: str, body: bytes, if_match: Optional[str] = None) -> Optional[str]:
+        raise ReadOnlyStorage(key)
+
+    def get_stats(self) -> Dict[str, Any]:
+        snapshot = self._snapshot
+        return {
+            'repo': self.repo,
+            'branch': self.branch,
+            'data_path': self.data_path,
+            'commit': snapshot[0] if snapshot is not None else None,
+            'files': len(snapshot[1]) if snapshot is not None else 0,
+            'check_seconds': self.check_seconds,
+            **self.stats,
+        }
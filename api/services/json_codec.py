@@ -0,0 +1,62 @@
+"""
+JSON encoding and decoding for the API.
+Uses orjson when it is installed (several times faster at parsing and serializing the large
+catalog documents) and the standard library otherwise; both produce the same output for the
+catalog's data. Decode errors are json.JSONDecodeError either way (orjson's subclasses it).
+"""
+
+import json
+from typing import Any, Union
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+# orjson rejects non-string keys and integers beyond 64 bits unless told otherwise; the
+# standard library converts keys to strings, so do the same
+_ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS if orjson is not None else 0
+_ORJSON_PRETTY = (orjson.OPT_INDENT_2 | _ORJSON_OPTIONS) if orjson is not None else 0
+
+
+def is_available() -> bool:
+    """True when the fast (orjson) backend is in use."""
+    return orjson is not None
+
+
+def backend() -> str:
+    return 'orjson' if orjson is not None else 'json'
+
+
+def loads(data: Union[bytes, bytearray, memoryview, str]) -> Any:
+    if orjson is not None:
+        return orjson.loads(data)
+    if isinstance(data, (bytes, bytearray, memoryview)):
+        data = bytes(data).decode('utf-8')
+    return json.loads(data)
+
+
+def _stdlib_dumps(data: Any, pretty: bool) -> bytes:
+    if pretty:
+        return json.dumps(data, indent=2, ensure_ascii=False).encode('utf-8')
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def dumps(data: Any, pretty: bool = False) -> bytes:
+    """UTF-8 JSON: minified, or indented by two spaces with pretty=True."""
+    if orjson is not None:
+        try:
+            return orjson.dumps(data, option=_ORJSON_PRETTY if pretty else _ORJSON_OPTIONS)
+        except TypeError:
+            # Values orjson does not handle (e.g. integers beyond 64 bits)
+            pass
+    return _stdlib_dumps(data, pretty)
+
+
+def dumps_str(data: Any, pretty: bool = False) -> str:
+    return dumps(data, pretty).decode('utf-8')
+
+
+def clone(value: Any) -> Any:
+    """Deep copy of a JSON value."""
+    return loads(dumps(value))
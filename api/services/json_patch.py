@@ -0,0 +1,201 @@
+"""
+JSON Patch (RFC 6902) and JSON Pointer (RFC 6901) helpers.
+make_patch computes a small patch between two documents; apply_patch applies one in place and
+apply_patch_shared returns a new document that shares everything the patch does not touch.
+"""
+
+import copy
+from typing import Any, Dict, List
+
+Patch = List[Dict[str, Any]]
+
+
+class JsonPatchError(ValueError):
+    """A patch operation could not be applied (bad path, failed test, ...)."""
+
+
+def escape_token(token: Any) -> str:
+    return str(token).replace('~', '~0').replace('/', '~1')
+
+
+def unescape_token(token: str) -> str:
+    return token.replace('~1', '/').replace('~0', '~')
+
+
+def pointer(*tokens: Any) -> str:
+    """JSON Pointer for a sequence of keys / indexes ('' is the whole document)."""
+    return ''.join('/' + escape_token(t) for t in tokens)
+
+
+def parse_pointer(path: str) -> List[str]:
+    if path == '':
+        return []
+    if not path.startswith('/'):
+        raise JsonPatchError(f"Invalid JSON pointer: {path!r}")
+    return [unescape_token(t) for t in path[1:].split('/')]
+
+
+def _list_index(container: list, token: str, allow_end: bool) -> int:
+    if token == '-' and allow_end:
+        return len(container)
+    if not token.isdigit() or (token.startswith('0') and token != '0'):
+        raise JsonPatchError(f"Invalid array index: {token!r}")
+    index = int(token)
+    if index > len(container) or (index == len(container) and not allow_end):
+        raise JsonPatchError(f"Array index out of range: {index}")
+    return index
+
+
+def _resolve(document: Any, tokens: List[str]) -> Any:
+    current = document
+    for token in tokens:
+        if isinstance(current, dict):
+            if token not in current:
+                raise JsonPatchError(f"Path not found: {pointer(*tokens)}")
+            current = current[token]
+        elif isinstance(current, list):
+            current = current[_list_index(current, token, allow_end=False)]
+        else:
+            raise JsonPatchError(f"Path not found: {pointer(*tokens)}")
+    return current
+
+
+def _add(document: Any, tokens: List[str], value: Any) -> Any:
+    if not tokens:
+        return value
+    parent = _resolve(document, tokens[:-1])
+    if isinstance(parent, dict):
+        parent[tokens[-1]] = value
+    elif isinstance(parent, list):
+        parent.insert(_list_index(parent, tokens[-1], allow_end=True), value)
+    else:
+        raise JsonPatchError(f"Cannot add to {pointer(*tokens)}")
+    return document
+
+
+def _remove(document: Any, tokens: List[str]) -> Any:
+    if not tokens:
+        raise JsonPatchError("Cannot remove the whole document")
+    parent = _resolve(document, tokens[:-1])
+    if isinstance(parent, dict):
+        if tokens[-1] not in parent:
+            raise JsonPatchError(f"Path not found: {pointer(*tokens)}")
+        return parent.pop(tokens[-1])
+    if isinstance(parent, list):
+        return parent.pop(_list_index(parent, tokens[-1], allow_end=False))
+    raise JsonPatchError(f"Cannot remove {pointer(*tokens)}")
+
+
+def apply_patch(document: Any, patch: Patch) -> Any:
+    """Apply a patch to document in place and return the (possibly replaced) document.
+
+    Values are inserted as-is; callers pass patches they no longer mutate.
+    """
+    for op in patch:
+        kind = op.get('op')
+        tokens = parse_pointer(op.get('path', ''))
+        if kind == 'add':
+            document = _add(document, tokens, op['value'])
+        elif kind == 'remove':
+            _remove(document, tokens)
+        elif kind == 'replace':
+            if not tokens:
+                document = op['value']
+                continue
+            _resolve(document, tokens)
+            parent = _resolve(document, tokens[:-1])
+            if isinstance(parent, list):
+                parent[_list_index(parent, tokens[-1], allow_end=False)] = op['value']
+            else:
+                parent[tokens[-1]] = op['value']
+        elif kind == 'move':
+            value = _remove(document, parse_pointer(op['from']))
+            document = _add(document, tokens, value)
+        elif kind == 'copy':
+            document = _add(document, tokens, copy.deepcopy(_resolve(document, parse_pointer(op['from']))))
+        elif kind == 'test':
+            if _resolve(document, tokens) != op['value']:
+                raise JsonPatchError(f"Test failed at {op.get('path')}")
+        else:
+            raise JsonPatchError(f"Unknown patch operation: {kind!r}")
+    return document
+
+
+def apply_patch_shared(document: Any, patch: Patch) -> Any:
+    """Apply a patch without modifying document (path copying).
+
+    Only the containers on the paths the patch touches are copied; every other subtree of the
+    result is the same object as in document, so successive versions of a document cost
+    memory proportional to their changes. Neither version may be mutated afterwards.
+    """
+    # Containers copied by this call, safe to modify (kept referenced so ids stay unique)
+    owned: Dict[int, Any] = {}
+
+    def own(value: Any) -> Any:
+        if isinstance(value, (dict, list)) and id(value) not in owned:
+            value = copy.copy(value)
+            owned[id(value)] = value
+        return value
+
+    def own_path(root: Any, tokens: List[str]) -> Any:
+        root = own(root)
+        current = root
+        for token in tokens:
+            if isinstance(current, dict) and token in current:
+                child = current[token] = own(current[token])
+            elif isinstance(current, list) and token.isdigit() and int(token) < len(current):
+                child = current[int(token)] = own(current[int(token)])
+            else:
+                # Invalid path: apply_patch raises the proper error
+                break
+            current = child
+        return root
+
+    for op in patch:
+        document = own_path(document, parse_pointer(op.get('path', ''))[:-1])
+        if op.get('op') == 'move':
+            document = own_path(document, parse_pointer(op['from'])[:-1])
+        document = apply_patch(document, [op])
+    return document
+
+
+def _diff(old: Any, new: Any, tokens: List[Any], patch: Patch):
+    # Identity first: versions built by apply_patch_shared share unchanged subtrees
+    if old is new or old == new:
+        return
+    if isinstance(old, dict) and isinstance(new, dict):
+        for key in old:
+            if key not in new:
+                patch.append({'op': 'remove', 'path': pointer(*tokens, key)})
+        for key, value in new.items():
+            if key not in old:
+                patch.append({'op': 'add', 'path': pointer(*tokens, key), 'value': value})
+            else:
+                _diff(old[key], value, tokens + [key], patch)
+        return
+    if isinstance(old, list) and isinstance(new, list):
+        # Trim the common prefix and suffix so a single insert/remove/edit yields one small op
+        start = 0
+        while start < len(old) and start < len(new) and old[start] == new[start]:
+            start += 1
+        old_end, new_end = len(old), len(new)
+        while old_end > start and new_end > start and old[old_end - 1] == new[new_end - 1]:
+            old_end -= 1
+            new_end -= 1
+        if old_end - start == new_end - start:
+            for i in range(start, old_end):
+                _diff(old[i], new[i], tokens + [i], patch)
+            return
+        for i in range(old_end - 1, start - 1, -1):
+            patch.append({'op': 'remove', 'path': pointer(*tokens, i)})
+        for i in range(start, new_end):
+            patch.append({'op': 'add', 'path': pointer(*tokens, i), 'value': new[i]})
+        return
+    patch.append({'op': 'replace', 'path': pointer(*tokens), 'value': new})
+
+
+def make_patch(old: Any, new: Any) -> Patch:
+    """A patch turning old into new; values in it are shared with new, not copied."""
+    patch: Patch = []
+    _diff(old, new, [], patch)
+    return patch
@@ -0,0 +1,182 @@
+"""
+The boto3 S3 client shared by everything in the process that talks to S3 (S3Service, and through
+it DataService, the storage gateway and the migration/connection scripts).
+One client per set of credentials, built with an explicit botocore Config: a connection pool
+sized to the threads that call S3 concurrently, adaptive retries (backoff plus client-side rate
+limiting when S3 throttles), TCP keepalive and bounded connect/read timeouts, so a burst of slow
+or throttled S3 calls is retried within a known time instead of holding requests until they time
+out. Event hooks count calls, retries and throttles for /api/debug/performance.
+"""
+
+import logging
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+
+import boto3
+from botocore.config import Config as BotocoreConfig
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+# Error codes S3 (and STS/KMS behind it) answer when a caller is being rate limited
+THROTTLE_CODES = frozenset({
+    'SlowDown', 'Throttling', 'ThrottlingException', 'ThrottledException', 'RequestThrottled',
+    'RequestLimitExceeded', 'TooManyRequestsException', 'ProvisionedThroughputExceededException',
+    'RequestThrottledException', 'BandwidthLimitExceeded', 'EC2ThrottledException',
+})
+
+
+def client_config() -> BotocoreConfig:
+    """botocore settings of the shared client, from Config."""
+    return BotocoreConfig(
+        max_pool_connections=Config.S3_MAX_POOL_CONNECTIONS,
+        retries={'mode': Config.S3_RETRY_MODE, 'total_max_attempts': Config.S3_MAX_ATTEMPTS},
+        tcp_keepalive=True,
+        connect_timeout=Config.S3_CONNECT_TIMEOUT,
+        read_timeout=Config.S3_READ_TIMEOUT,
+    )
+
+
+class S3ClientMetrics:
+    """Calls, retries, throttles and latency of the shared clients, collected from botocore events."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.stats = {
+            'calls': 0,
+            'retries': 0,
+            'throttles': 0,
+            'server_errors': 0,
+            'connection_errors': 0,
+            'time_ms': 0.0,
+            'max_ms': 0.0,
+        }
+        self.by_operation: Dict[str, int] = {}
+
+    def attach(self, client):
+        events = client.meta.events
+        events.register('before-call.s3', self._before_call)
+        events.register('needs-retry.s3', self._needs_retry)
+        events.register('after-call.s3', self._after_call)
+        events.register('after-call-error.s3', self._after_call_error)
+
+    def _before_call(self, model, context, **kwargs):
+        context['metrics_started'] = time.perf_counter()
+
+    def _finished(self, context, operation: Optional[str] = None, **counts):
+        started = context.get('metrics_started')
+        elapsed = (time.perf_counter() - started) * 1000 if started is not None else 0.0
+        with self._lock:
+            self.stats['calls'] += 1
+            self.stats['time_ms'] += elapsed
+            self.stats['max_ms'] = max(self.stats['max_ms'], elapsed)
+            for key, amount in counts.items():
+                self.stats[key] += amount
+            if operation:
+                self.by_operation[operation] = self.by_operation.get(operation, 0) + 1
+
+    def _needs_retry(self, response=None, caught_exception=None, **kwargs):
+        # Runs after every attempt, before the retry handler decides; count throttled attempts
+        if response is None:
+            return None
+        http_response, parsed = response
+        code = (parsed or {}).get('Error', {}).get('Code')
+        if code in THROTTLE_CODES or getattr(http_response, 'status_code', None) == 503:
+            with self._lock:
+                self.stats['throttles'] += 1
+        return None
+
+    def _after_call(self, http_response, parsed, model, context, **kwargs):
+        retries = (parsed or {}).get('ResponseMetadata', {}).get('RetryAttempts', 0)
+        # 304/404/412 are answers the callers expect; only 5xx after all retries is a failure
+        self._finished(context, model.name, retries=retries,
+                       server_errors=1 if http_response.status_code >= 500 else 0)
+
+    def _after_call_error(self, exception, context, **kwargs):
+        # No response at all (connection failures and timeouts once retries are exhausted)
+        self._finished(context, connection_errors=1)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self.stats)
+            stats['by_operation'] = dict(self.by_operation)
+        stats['avg_ms'] = round(stats['time_ms'] / stats['calls'], 2) if stats['calls'] else 0
+        stats['time_ms'] = round(stats['time_ms'], 2)
+        stats['max_ms'] = round(stats['max_ms'], 2)
+        return stats
+
+
+# If-Match value of the PutObject call in progress on this thread (see conditional_put)
+_put_condition = threading.local()
+
+
+def _add_if_match_header(params, **kwargs):
+    etag = getattr(_put_condition, 'etag', None)
+    if etag:
+        params['headers']['If-Match'] = etag
+
+
+def _if_match_modeled(client) -> bool:
+    """PutObject takes IfMatch in botocore releases from late 2024 on; older ones (such as the
+    pinned boto3 1.34) get the If-Match header added to the request instead."""
+    members = client.meta.service_model.operation_model('PutObject').input_shape.members
+    return 'IfMatch' in members
+
+
+def conditional_put(client, params: Dict[str, Any], if_match: Optional[str] = None) -> Dict[str, Any]:
+    """client.put_object(**params), only if the object still has the ETag if_match (when given)."""
+    if not if_match:
+        return client.put_object(**params)
+    if _if_match_modeled(client):
+        return client.put_object(**params, IfMatch=if_match)
+    _put_condition.etag = if_match
+    try:
+        return client.put_object(**params)
+    finally:
+        _put_condition.etag = None
+
+
+metrics = S3ClientMetrics()
+_clients: Dict[Tuple[Optional[str], Optional[str], str], Any] = {}
+_clients_lock = threading.Lock()
+
+
+def get_s3_client(access_key_id: Optional[str] = None, secret_access_key: Optional[str] = None,
+                  region_name: Optional[str] = None):
+    """The shared S3 client for these credentials (None: IAM role / default chain), created on first use.
+
+    boto3 clients are thread-safe; creating them is not, hence the lock.
+    """
+    region_name = region_name or Config.AWS_REGION
+    key = (access_key_id, secret_access_key, region_name)
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            credentials = {}
+            if access_key_id and secret_access_key:
+                credentials = {'aws_access_key_id': access_key_id, 'aws_secret_access_key': secret_access_key}
+            client = boto3.client('s3', region_name=region_name, config=client_config(), **credentials)
+            metrics.attach(client)
+            if not _if_match_modeled(client):
+                client.meta.events.register('before-call.s3.PutObject', _add_if_match_header)
+            _clients[key] = client
+            logger.info(f"S3 client created: pool of {Config.S3_MAX_POOL_CONNECTIONS} connections, "
+                        f"{Config.S3_RETRY_MODE} retries (max {Config.S3_MAX_ATTEMPTS} attempts)")
+        return client
+
+
+def get_stats() -> Dict[str, Any]:
+    """Client settings and call metrics."""
+    with _clients_lock:
+        clients = len(_clients)
+    return {
+        'clients': clients,
+        'max_pool_connections': Config.S3_MAX_POOL_CONNECTIONS,
+        'retry_mode': Config.S3_RETRY_MODE,
+        'max_attempts': Config.S3_MAX_ATTEMPTS,
+        'connect_timeout': Config.S3_CONNECT_TIMEOUT,
+        'read_timeout': Config.S3_READ_TIMEOUT,
+        **metrics.get_stats(),
+    }
@@ -1,16 +1,53 @@
-import boto3
 import json
 import logging
-from typing import Dict, Any, Optional
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Iterator, Optional, Tuple
 from botocore.exceptions import ClientError, NoCredentialsError
 import os
 from dotenv import load_dotenv
+from config import Config
+from . import json_codec, s3_client
+from .storage_codecs import compress, compression_available, decode, decompress
+from .storage_engine import WriteConflict
 
 # Load environment variables
 load_dotenv()
 
 logger = logging.getLogger(__name__)
 
+# Returned by get_object_if_changed when the object still has the ETag the caller holds
+NOT_MODIFIED = object()
+
+# User metadata (x-amz-meta-catalog-encoding) naming the compression of an object's body
+ENCODING_METADATA = 'catalog-encoding'
+
+
+def compress_object(body: bytes, compression: str, min_bytes: int = 0) -> Tuple[bytes, Dict[str, Any]]:
+    """
+    The body to store for body and the PutObject parameters that describe it
+    
+    Compressed with compression ('gzip' or 'zstd') unless it is smaller than min_bytes or does
+    not get smaller; 'none' (or '') stores it as is.
+    """
+    if compression in ('', 'none') or len(body) < min_bytes:
+        return body, {}
+    compressed = compress(body, compression)
+    if len(compressed) >= len(body):
+        return body, {}
+    return compressed, {'ContentEncoding': compression, 'Metadata': {ENCODING_METADATA: compression}}
+
+
+def _resolve_compression(name: str) -> str:
+    if name in ('', 'none'):
+        return 'none'
+    if compression_available(name):
+        return name
+    fallback = 'gzip' if name == 'zstd' else 'none'
+    logger.warning(f"S3_COMPRESSION '{name}' is not available (zstd needs the zstandard package); using '{fallback}'")
+    return fallback
+
 class S3Service:
     """Service class for handling S3 operations"""
     
@@ -21,24 +58,46 @@ class S3Service:
         self.access_key_id = os.getenv('AWS_ACCESS_KEY_ID')
         self.secret_access_key = os.getenv('AWS_SECRET_ACCESS_KEY')
         
+        # Parsed objects by key: (etag, data, monotonic time last validated)
+        self.cache_ttl = Config.STORAGE_CACHE_SECONDS
+        self._cache: Dict[str, Tuple[Optional[str], Any, float]] = {}
+        self._cache_lock = threading.Lock()
+        self.cache_stats = {
+            'hits': 0,
+            'not_modified': 0,
+            'downloads': 0,
+            'bytes_downloaded': 0,
+            'conditional_puts': 0,
+            'precondition_failures': 0,
+            'list_requests': 0,
+            'manifest_hits': 0,
+            'bytes_decompressed': 0,
+            'bytes_uploaded': 0,
+            'bytes_uploaded_uncompressed': 0,
+        }
+        
+        # Compression of the objects written (S3_COMPRESSION); objects are readable whatever they use
+        self.compression = _resolve_compression(Config.S3_COMPRESSION)
+        self.compression_min_bytes = Config.S3_COMPRESSION_MIN_BYTES
+        
+        # Listings by prefix: (monotonic time listed, {key: (size, etag)}), kept current by our own writes
+        self.manifest_ttl = Config.S3_LIST_CACHE_SECONDS
+        self._manifest: Dict[str, Tuple[float, Dict[str, Tuple[int, Optional[str]]]]] = {}
+        self._manifest_lock = threading.Lock()
+        
         # Initialize S3 client
         self._initialize_s3_client()
     
     def _initialize_s3_client(self):
-        """Initialize the S3 client with credentials"""
+        """Use the process-wide S3 client for these credentials (see services/s3_client.py)"""
         try:
             if self.access_key_id and self.secret_access_key:
                 # Use explicit credentials
-                self.s3_client = boto3.client(
-                    's3',
-                    aws_access_key_id=self.access_key_id,
-                    aws_secret_access_key=self.secret_access_key,
-                    region_name=self.region_name
-                )
+                self.s3_client = s3_client.get_s3_client(self.access_key_id, self.secret_access_key, self.region_name)
                 logger.info("S3 client initialized with explicit credentials")
             else:
                 # Use IAM role or default credentials
-                self.s3_client = boto3.client('s3', region_name=self.region_name)
+                self.s3_client = s3_client.get_s3_client(region_name=self.region_name)
                 logger.info("S3 client initialized with IAM role/default credentials")
                 
         except NoCredentialsError:
@@ -52,10 +111,100 @@ class S3Service:
         """Check if S3 service is available"""
         return self.s3_client is not None and self.bucket_name is not None
     
+    def _object_key(self, file_path: str) -> str:
+        """Key of a data file in the bucket ('_data/models' -> 'models.json')."""
+        if file_path.startswith('_data/'):
+            file_path = file_path[6:]
+        return file_path if file_path.endswith('.json') else f"{file_path}.json"
+    
+    def _count(self, key: str, amount: int = 1):
+        with self._cache_lock:
+            self.cache_stats[key] += amount
+    
+    def get_object_if_changed(self, key: str, etag: Optional[str] = None):
+        """
+        Conditional GET of an object (IfNoneMatch)
+        
+        Args:
+            key (str): Object key
+            etag (str): ETag of the copy the caller holds, if any
+            
+        Returns:
+            (body, etag), NOT_MODIFIED if the object still has etag, or None if it does not exist
+        """
+        params = {'Bucket': self.bucket_name, 'Key': key}
+        if etag:
+            params['IfNoneMatch'] = etag
+        try:
+            response = self.s3_client.get_object(**params)
+        except ClientError as e:
+            code = e.response['Error']['Code']
+            if code in ('304', 'NotModified'):
+                self._count('not_modified')
+                return NOT_MODIFIED
+            if code in ('NoSuchKey', '404'):
+                return None
+            raise
+        body = response['Body'].read()
+        self._count('downloads')
+        self._count('bytes_downloaded', len(body))
+        # Compressed objects carry ENCODING_METADATA and Content-Encoding, but ones uploaded by other
+        # tools may not, so the encoding is taken from the body's leading bytes (plain JSON is kept)
+        body = decompress(body)
+        self._count('bytes_decompressed', len(body))
+        return body, response.get('ETag')
+    
+    def put_object(self, key: str, body: bytes, if_match: Optional[str] = None) -> Optional[str]:
+        """
+        PUT an object, optionally only if it still has the ETag if_match
+        
+        Returns:
+            The new ETag
+            
+        Raises:
+            WriteConflict: the object was changed (or deleted) since if_match was read
+        """
+        stored, encoding = compress_object(body, self.compression, self.compression_min_bytes)
+        params = {'Bucket': self.bucket_name, 'Key': key, 'Body': stored, 'ContentType': 'application/json', **encoding}
+        if if_match:
+            self._count('conditional_puts')
+        try:
+            etag = s3_client.conditional_put(self.s3_client, params, if_match).get('ETag')
+        except ClientError as e:
+            if e.response['Error']['Code'] in ('PreconditionFailed', '412', 'ConditionalRequestConflict', 'NoSuchKey'):
+                self._count('precondition_failures')
+                with self._cache_lock:
+                    self._cache.pop(key, None)
+                raise WriteConflict(key) from e
+            raise
+        self._count('bytes_uploaded', len(stored))
+        self._count('bytes_uploaded_uncompressed', len(body))
+        self._manifest_update(key, (len(stored), etag))
+        return etag
+    
+    def get_cache_stats(self) -> Dict[str, Any]:
+        """Counters of the object cache, conditional GETs and listings"""
+        with self._cache_lock:
+            stats = dict(self.cache_stats)
+            stats['cached_objects'] = len(self._cache)
+        with self._manifest_lock:
+            stats['manifest'] = {prefix or '/': len(objects) for prefix, (_, objects) in self._manifest.items()}
+        stats['compression'] = self.compression
+        stats['download_compression_ratio'] = (round(stats['bytes_decompressed'] / stats['bytes_downloaded'], 2)
+                                               if stats['bytes_downloaded'] else 0)
+        reads = stats['hits'] + stats['not_modified'] + stats['downloads']
+        stats['ttl_seconds'] = self.cache_ttl
+        stats['download_avoided_ratio'] = round((stats['hits'] + stats['not_modified']) / reads, 3) if reads else 0
+        return stats
+    
     def read_json_file(self, file_path: str) -> Optional[Dict[str, Any]]:
         """
         Read a JSON file from S3
         
+        Parsed objects are cached with their ETag: within cache_ttl seconds they are served
+        from memory, after that a conditional GET revalidates them, so an unchanged object is
+        never downloaded or parsed again. Each call returns its own copy.
+        
         Args:
             file_path (str): Path to the JSON file in S3 (e.g., 'data/models.json')
             
@@ -67,27 +216,34 @@ class S3Service:
             return None
         
         try:
-            # Ensure file_path doesn't start with '_data/' for S3
-            if file_path.startswith('_data/'):
-                file_path = file_path[6:]  # Remove '_data/' prefix
-            
-            # Add .json extension if not present
-            if not file_path.endswith('.json'):
-                file_path = f"{file_path}.json"
+            file_path = self._object_key(file_path)
+            now = time.monotonic()
+            with self._cache_lock:
+                cached = self._cache.get(file_path)
+            if cached is not None and now - cached[2] < self.cache_ttl:
+                self._count('hits')
+                return json_codec.clone(cached[1])
             
             logger.info(f"Reading JSON file from S3: s3://{self.bucket_name}/{file_path}")
-            
-            response = self.s3_client.get_object(
-                Bucket=self.bucket_name,
-                Key=file_path
-            )
+            result = self.get_object_if_changed(file_path, cached[0] if cached is not None else None)
+            if result is NOT_MODIFIED:
+                with self._cache_lock:
+                    self._cache[file_path] = (cached[0], cached[1], now)
+                return json_codec.clone(cached[1])
+            if result is None:
+                with self._cache_lock:
+                    self._cache.pop(file_path, None)
+                logger.error(f"File not found in S3: {file_path}")
+                return None
             
             # Read and parse JSON content
-            content = response['Body'].read().decode('utf-8')
-            data = json.loads(content)
+            body, etag = result
+            data = decode(body)
+            with self._cache_lock:
+                self._cache[file_path] = (etag, data, now)
             
             logger.info(f"Successfully read JSON file from S3: {file_path}")
-            return data
+            return json_codec.clone(data)
             
         except ClientError as e:
             error_code = e.response['Error']['Code']
@@ -103,46 +259,43 @@ class S3Service:
             logger.error(f"Unexpected error reading from S3 {file_path}: {e}")
             return None
     
-    def write_json_file(self, file_path: str, data: Dict[str, Any]) -> bool:
+    def write_json_file(self, file_path: str, data: Dict[str, Any], if_match: Optional[str] = None) -> bool:
         """
         Write a JSON file to S3
         
         Args:
             file_path (str): Path to the JSON file in S3
             data (Dict): Data to write
+            if_match (str): Only write if the object still has this ETag
             
         Returns:
-            bool: True if successful, False otherwise
+            bool: True if successful, False otherwise (including a failed if_match)
         """
         if not self.is_available():
             logger.error("S3 service not available")
             return False
         
         try:
-            # Ensure file_path doesn't start with '_data/' for S3
-            if file_path.startswith('_data/'):
-                file_path = file_path[6:]  # Remove '_data/' prefix
-            
-            # Add .json extension if not present
-            if not file_path.endswith('.json'):
-                file_path = f"{file_path}.json"
+            file_path = self._object_key(file_path)
             
             logger.info(f"Writing JSON file to S3: s3://{self.bucket_name}/{file_path}")
             
-            # Convert data to JSON string
-            json_content = json.dumps(data, indent=2, ensure_ascii=False)
+            # Convert data to JSON
+            json_content = json_codec.dumps(data, pretty=True)
             
             # Upload to S3
-            self.s3_client.put_object(
-                Bucket=self.bucket_name,
-                Key=file_path,
-                Body=json_content.encode('utf-8'),
-                ContentType='application/json'
-            )
+            etag = self.put_object(file_path, json_content, if_match)
+            
+            # What we wrote is the current version; keep our own copy of it
+            with self._cache_lock:
+                self._cache[file_path] = (etag, json_codec.loads(json_content), time.monotonic())
             
             logger.info(f"Successfully wrote JSON file to S3: {file_path}")
             return True
             
+        except WriteConflict as e:
+            logger.error(f"S3 conditional write of {file_path} failed: {e}")
+            return False
         except ClientError as e:
             logger.error(f"S3 error writing {file_path}: {e}")
             return False
@@ -150,10 +303,93 @@ class S3Service:
             logger.error(f"Unexpected error writing to S3 {file_path}: {e}")
             return False
     
+    def iter_objects(self, prefix: str = "", delimiter: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        """
+        Stream the objects under a prefix, one list_objects_v2 page (up to 1000 keys) at a time
+        
+        Follows continuation tokens, so listings are never truncated. With a delimiter, the
+        common prefixes one level down are yielded too, as {'Prefix': ...}.
+        
+        Raises:
+            ClientError: listing failed
+        """
+        params = {'Bucket': self.bucket_name, 'Prefix': prefix}
+        if delimiter:
+            params['Delimiter'] = delimiter
+        while True:
+            response = self.s3_client.list_objects_v2(**params)
+            self._count('list_requests')
+            yield from response.get('Contents', ())
+            yield from response.get('CommonPrefixes', ())
+            if not response.get('IsTruncated'):
+                return
+            params['ContinuationToken'] = response['NextContinuationToken']
+    
+    def iter_files(self, prefix: str = "") -> Iterator[str]:
+        """Stream the keys under a prefix without holding the whole listing"""
+        for obj in self.iter_objects(prefix):
+            yield obj['Key']
+    
+    def _list_objects(self, prefix: str) -> Dict[str, Tuple[int, Optional[str]]]:
+        """
+        All objects under a prefix as {key: (size, etag)}
+        
+        Lists one level with a delimiter first, then walks the sub-prefixes (one per sharded
+        collection) in parallel, each following its own continuation tokens.
+        """
+        objects: Dict[str, Tuple[int, Optional[str]]] = {}
+        prefixes = []
+        for obj in self.iter_objects(prefix, delimiter='/'):
+            if 'Prefix' in obj:
+                prefixes.append(obj['Prefix'])
+            else:
+                objects[obj['Key']] = (obj.get('Size', 0), obj.get('ETag'))
+        
+        def walk(sub_prefix: str):
+            return [(obj['Key'], (obj.get('Size', 0), obj.get('ETag'))) for obj in self.iter_objects(sub_prefix)]
+        
+        if len(prefixes) == 1:
+            objects.update(walk(prefixes[0]))
+        elif prefixes:
+            with ThreadPoolExecutor(max_workers=min(len(prefixes), Config.S3_LIST_THREADS),
+                                    thread_name_prefix='s3-list') as pool:
+                for listed in pool.map(walk, prefixes):
+                    objects.update(listed)
+        return objects
+    
+    def _manifest_lookup(self, key: str) -> Tuple[bool, Optional[Tuple[int, Optional[str]]]]:
+        """(covered, entry): whether a fresh manifest covers key, and its (size, etag) if it exists"""
+        now = time.monotonic()
+        with self._manifest_lock:
+            hit = next(((True, objects.get(key)) for prefix, (listed, objects) in self._manifest.items()
+                        if key.startswith(prefix) and now - listed < self.manifest_ttl), None)
+        if hit is None:
+            return False, None
+        self._count('manifest_hits')
+        return hit
+    
+    def _manifest_update(self, key: str, entry: Optional[Tuple[int, Optional[str]]]):
+        """Record a write (entry) or delete (None) of key in the manifests covering it"""
+        with self._manifest_lock:
+            for prefix, (_, objects) in self._manifest.items():
+                if key.startswith(prefix):
+                    if entry is None:
+                        objects.pop(key, None)
+                    else:
+                        objects[key] = entry
+    
+    def invalidate_manifest(self):
+        """Forget cached listings (after the bucket was changed by something other than this service)"""
+        with self._manifest_lock:
+            self._manifest.clear()
+    
     def list_files(self, prefix: str = "") -> Optional[list]:
         """
         List files in S3 bucket with optional prefix
         
+        Served from the cached manifest of the prefix while it is fresh (S3_LIST_CACHE_SECONDS);
+        otherwise lists the bucket, paginated and in parallel across sub-prefixes.
+        
         Args:
             prefix (str): Prefix to filter files
             
@@ -164,26 +400,56 @@ class S3Service:
             logger.error("S3 service not available")
             return None
         
+        now = time.monotonic()
+        with self._manifest_lock:
+            cached = next((sorted(key for key in objects if key.startswith(prefix))
+                           for cached_prefix, (listed, objects) in self._manifest.items()
+                           if prefix.startswith(cached_prefix) and now - listed < self.manifest_ttl), None)
+        if cached is not None:
+            self._count('manifest_hits')
+            return cached
+        
         try:
-            response = self.s3_client.list_objects_v2(
-                Bucket=self.bucket_name,
-                Prefix=prefix
-            )
-            
-            if 'Contents' in response:
-                files = [obj['Key'] for obj in response['Contents']]
-                logger.info(f"Listed {len(files)} files with prefix '{prefix}'")
-                return files
-            else:
-                logger.info(f"No files found with prefix '{prefix}'")
-                return []
-                
+            objects = self._list_objects(prefix)
         except ClientError as e:
             logger.error(f"S3 error listing files with prefix '{prefix}': {e}")
             return None
         except Exception as e:
             logger.error(f"Unexpected error listing S3 files: {e}")
             return None
+        
+        with self._manifest_lock:
+            self._manifest[prefix] = (now, objects)
+        logger.info(f"Listed {len(objects)} files with prefix '{prefix}'")
+        return sorted(objects)
+    
+    def object_etag(self, key: str) -> Optional[str]:
+        """
+        ETag of an object, None if it does not exist
+
+        Taken from the cached listing of the key's top-level prefix, which is listed when not
+        fresh, so checking every object of a collection costs one listing per S3_LIST_CACHE_SECONDS
+        rather than a HEAD each; keys outside a prefix (or with listing caching off) are HEAD'ed.
+        """
+        covered, entry = self._manifest_lookup(key)
+        if not covered and '/' in key and self.manifest_ttl > 0:
+            self.list_files(key.split('/', 1)[0] + '/')
+            covered, entry = self._manifest_lookup(key)
+        if covered:
+            return entry[1] if entry is not None else None
+        try:
+            return self.s3_client.head_object(Bucket=self.bucket_name, Key=key).get('ETag')
+        except ClientError as e:
+            if e.response['Error']['Code'] in ('404', 'NoSuchKey', 'NotFound'):
+                return None
+            raise
+
+    def delete_object(self, key: str):
+        """Delete an object (no error if it does not exist)"""
+        self.s3_client.delete_object(Bucket=self.bucket_name, Key=key)
+        with self._cache_lock:
+            self._cache.pop(key, None)
+        self._manifest_update(key, None)
     
     def file_exists(self, file_path: str) -> bool:
         """
@@ -207,6 +473,10 @@ class S3Service:
             if not file_path.endswith('.json'):
                 file_path = f"{file_path}.json"
             
+            covered, entry = self._manifest_lookup(file_path)
+            if covered:
+                return entry is not None
+            
             self.s3_client.head_object(Bucket=self.bucket_name, Key=file_path)
             return True
         except ClientError as e:
@@ -241,6 +511,10 @@ class S3Service:
             if not file_path.endswith('.json'):
                 file_path = f"{file_path}.json"
             
+            covered, entry = self._manifest_lookup(file_path)
+            if covered:
+                return entry[0] if entry is not None else None
+            
             response = self.s3_client.head_object(Bucket=self.bucket_name, Key=file_path)
             return response['ContentLength']
             
@@ -0,0 +1,134 @@
+"""
+Text analysis for the search index.
+Turns field text and queries into normalized terms through a configurable filter chain.
+"""
+
+import re
+import unicodedata
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, Sequence
+
+
+class Token(NamedTuple):
+    """A single analyzed term with its character offsets in the source text."""
+    text: str
+    start: int
+    end: int
+    position: int
+
+
+# Letters and digits in any script; '_', '.', '-', '/' and whitespace all act as separators,
+# so snake_case names and dotted module paths are split by the tokenizer itself.
+_WORD_RE = re.compile(r"[^\W_]+")
+
+# camelCase / PascalCase / acronym boundaries: "parseHTTPResponse2" -> parse, HTTP, Response, 2
+_IDENTIFIER_PART_RE = re.compile(r"[A-Z]+(?=[A-Z][a-z])|[A-Z]?[a-z]+|[A-Z]+|\d+")
+
+# Stop words are dropped after lowercasing, so none may double as a catalog acronym ("IT")
+STOP_WORDS = frozenset({
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "in", "into",
+    "is", "of", "on", "or", "that", "the", "this", "to", "was", "with",
+})
+
+DEFAULT_FILTERS = ("split_identifiers", "lowercase", "fold_accents", "stop_words", "stem")
+
+
+def tokenize(text: str) -> List[Token]:
+    """Split text into word tokens on Unicode word boundaries."""
+    if not text:
+        return []
+    return [Token(m.group(), m.start(), m.end(), i) for i, m in enumerate(_WORD_RE.finditer(text))]
+
+
+def split_identifiers(tokens: Iterable[Token]) -> Iterable[Token]:
+    """Split camelCase and letter/digit runs into separate tokens (e.g. customerId -> customer, Id)."""
+    for token in tokens:
+        if not token.text.isascii():
+            yield token
+            continue
+        parts = list(_IDENTIFIER_PART_RE.finditer(token.text))
+        if len(parts) <= 1:
+            yield token
+            continue
+        for part in parts:
+            yield Token(part.group(), token.start + part.start(), token.start + part.end(), token.position)
+
+
+def lowercase(tokens: Iterable[Token]) -> Iterable[Token]:
+    for token in tokens:
+        yield token._replace(text=token.text.casefold())
+
+
+def fold_accents(tokens: Iterable[Token]) -> Iterable[Token]:
+    """Strip combining marks so 'café' and 'cafe' index to the same term."""
+    for token in tokens:
+        if token.text.isascii():
+            yield token
+            continue
+        decomposed = unicodedata.normalize("NFKD", token.text)
+        folded = "".join(c for c in decomposed if not unicodedata.combining(c))
+        yield token._replace(text=folded or token.text)
+
+
+def stop_words(tokens: Iterable[Token]) -> Iterable[Token]:
+    for token in tokens:
+        if token.text not in STOP_WORDS:
+            yield token
+
+
+def light_stem(word: str) -> str:
+    """Conservative plural stripping (an S-stemmer); leaves short words and -ss/-us/-is alone."""
+    if len(word) <= 3 or not word.isalpha():
+        return word
+    if word.endswith("ies") and not word.endswith(("eies", "aies")):
+        return word[:-3] + "y"
+    if word.endswith("sses"):
+        return word[:-2]
+    if word.endswith(("xes", "ches", "shes", "zzes")):
+        return word[:-2]
+    if word.endswith(("ss", "us", "is")):
+        return word
+    if word.endswith("s"):
+        return word[:-1]
+    return word
+
+
+def stem(tokens: Iterable[Token]) -> Iterable[Token]:
+    for token in tokens:
+        yield token._replace(text=light_stem(token.text))
+
+
+TOKEN_FILTERS: Dict[str, Callable[[Iterable[Token]], Iterable[Token]]] = {
+    "split_identifiers": split_identifiers,
+    "lowercase": lowercase,
+    "fold_accents": fold_accents,
+    "stop_words": stop_words,
+    "stem": stem,
+}
+
+
+class Analyzer:
+    """Tokenizer followed by an ordered chain of token filters."""
+
+    def __init__(self, filters: Sequence[str] = DEFAULT_FILTERS):
+        unknown = [name for name in filters if name not in TOKEN_FILTERS]
+        if unknown:
+            raise ValueError(f"Unknown search analyzer filter(s): {', '.join(unknown)}")
+        self.filters = list(filters)
+        self._chain = [TOKEN_FILTERS[name] for name in self.filters]
+
+    def analyze(self, text: str) -> List[Token]:
+        """Analyze text into tokens; positions are renumbered after filtering."""
+        tokens: Iterable[Token] = tokenize(text)
+        for token_filter in self._chain:
+            tokens = token_filter(tokens)
+        return [token._replace(position=i) for i, token in enumerate(tokens) if token.text]
+
+    def terms(self, text: str) -> List[str]:
+        return [token.text for token in self.analyze(text)]
+
+
+def build_analyzer(spec: Optional[str] = None) -> Analyzer:
+    """Build an analyzer from a comma-separated filter list; empty/None uses the default chain."""
+    if not spec or not spec.strip():
+        return Analyzer()
+    return Analyzer([name.strip() for name in spec.split(",") if name.strip()])
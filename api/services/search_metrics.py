@@ -0,0 +1,149 @@
+"""
+Query metrics for the search service.
+Per-phase timings, a bounded slow-query log, latency histograms per doc-type filter
+and optional sampling of query plans.
+"""
+
+import random
+import threading
+from collections import deque
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional
+
+# Upper bounds (ms) of the latency histogram buckets; the last bucket is open-ended
+LATENCY_BUCKETS_MS = [1, 2, 5, 10, 25, 50, 100, 250, 500, 1000]
+
+SEARCH_PHASES = ('parse', 'candidates', 'scoring', 'hydration')
+
+# Doc types outside known_types, and filters past MAX_FILTER_KEYS, are counted under this key
+OTHER_TYPES = 'other'
+MAX_FILTER_KEYS = 64
+
+
+class LatencyHistogram:
+    """Fixed-bucket latency histogram (milliseconds)."""
+
+    def __init__(self, bounds: List[float] = LATENCY_BUCKETS_MS):
+        self.bounds = list(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def observe(self, ms: float):
+        i = 0
+        while i < len(self.bounds) and ms > self.bounds[i]:
+            i += 1
+        self.counts[i] += 1
+        self.count += 1
+        self.total_ms += ms
+        self.max_ms = max(self.max_ms, ms)
+
+    def percentile(self, p: float) -> Optional[float]:
+        """Upper bound of the bucket holding the p-th percentile (None if empty or past the last bound)."""
+        if not self.count:
+            return None
+        rank = p * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= rank:
+                return self.bounds[i] if i < len(self.bounds) else None
+        return None
+
+    def to_dict(self) -> Dict[str, Any]:
+        buckets = {f"le_{bound}ms": n for bound, n in zip(self.bounds, self.counts)}
+        buckets[f"gt_{self.bounds[-1]}ms"] = self.counts[-1]
+        return {
+            'count': self.count,
+            'avg_ms': round(self.total_ms / self.count, 3) if self.count else None,
+            'max_ms': round(self.max_ms, 3),
+            'p50_ms': self.percentile(0.5),
+            'p95_ms': self.percentile(0.95),
+            'p99_ms': self.percentile(0.99),
+            'buckets': buckets
+        }
+
+
+class SearchMetrics:
+    """Thread-safe collector for search query metrics."""
+
+    def __init__(self, slow_query_ms: float = 50, slow_log_size: int = 100, plan_log_size: int = 50,
+                 known_types: Optional[Iterable[str]] = None):
+        self.slow_query_ms = slow_query_ms
+        # Filters come from the query string; only known types get their own histogram key
+        self.known_types = set(known_types) if known_types is not None else None
+        self._lock = threading.Lock()
+        self._slow_queries = deque(maxlen=slow_log_size)
+        self._plans = deque(maxlen=plan_log_size)
+        self.plan_sampling_enabled = False
+        self.plan_sample_rate = 0.1
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._queries = 0
+            self._histograms: Dict[str, LatencyHistogram] = {}
+            self._phase_histograms = {phase: LatencyHistogram() for phase in SEARCH_PHASES}
+            self._slow_queries.clear()
+            self._plans.clear()
+
+    def configure_plan_sampling(self, enabled: bool, sample_rate: Optional[float] = None):
+        with self._lock:
+            self.plan_sampling_enabled = enabled
+            if sample_rate is not None:
+                self.plan_sample_rate = min(max(sample_rate, 0.0), 1.0)
+
+    def should_sample_plan(self) -> bool:
+        return self.plan_sampling_enabled and random.random() < self.plan_sample_rate
+
+    def filter_key(self, doc_types: Optional[List[str]]) -> str:
+        if not doc_types:
+            return 'all'
+        known = self.known_types
+        return ','.join(sorted({t if known is None or t in known else OTHER_TYPES for t in doc_types}))
+
+    def record(self, query: str, doc_types: Optional[List[str]], phases_ms: Dict[str, float],
+               total_hits: int, returned: int, plan: Optional[Dict[str, Any]] = None):
+        """Record one executed query."""
+        total_ms = sum(phases_ms.values())
+        key = self.filter_key(doc_types)
+        with self._lock:
+            self._queries += 1
+            if key not in self._histograms and len(self._histograms) >= MAX_FILTER_KEYS:
+                key = OTHER_TYPES
+            self._histograms.setdefault(key, LatencyHistogram()).observe(total_ms)
+            for phase, ms in phases_ms.items():
+                if phase in self._phase_histograms:
+                    self._phase_histograms[phase].observe(ms)
+            if total_ms >= self.slow_query_ms:
+                self._slow_queries.append({
+                    'query': query,
+                    'types': key,
+                    'total_ms': round(total_ms, 3),
+                    'phases_ms': {phase: round(ms, 3) for phase, ms in phases_ms.items()},
+                    'total_hits': total_hits,
+                    'returned': returned,
+                    'timestamp': datetime.now().isoformat()
+                })
+            if plan is not None:
+                self._plans.append({
+                    **plan,
+                    'phases_ms': {phase: round(ms, 3) for phase, ms in phases_ms.items()},
+                    'timestamp': datetime.now().isoformat()
+                })
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'total_queries': self._queries,
+                'slow_query_threshold_ms': self.slow_query_ms,
+                'latency_by_types': {key: h.to_dict() for key, h in self._histograms.items()},
+                'latency_by_phase': {phase: h.to_dict() for phase, h in self._phase_histograms.items()},
+                'slow_queries': list(self._slow_queries),
+                'plan_sampling': {
+                    'enabled': self.plan_sampling_enabled,
+                    'sample_rate': self.plan_sample_rate
+                },
+                'sampled_plans': list(self._plans)
+            }
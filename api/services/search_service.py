@@ -3,20 +3,80 @@ Search service for the data catalog API.
 Provides search functionality across all data types.
 """
 
+import base64
+import bisect
+import hashlib
+import heapq
 import logging
 import json
+import math
 import os
-import re
-from typing import List, Dict, Any, Optional
+import threading
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
 from datetime import datetime
 
+from time import perf_counter
+
+from config import Config
+from .search_analyzer import Analyzer, Token, build_analyzer
+from .search_metrics import SEARCH_PHASES, SearchMetrics
+from . import search_vector_scoring as vector_scoring
+from .search_vector_scoring import SparseTfidfScorer
+from .storage_engine import JsonFileStorageEngine
+
 logger = logging.getLogger(__name__)
 
+# Fields indexed as-is (name/displayName are handled separately)
+SCALAR_SEARCH_FIELDS = ['title', 'description', 'extendedDescription', 'shortName', 'id', 'term', 'definition', 'category', 'owner']
+
+# Array fields whose entries are indexed as one field
+LIST_SEARCH_FIELDS = ['domain', 'changes', 'taggedModels']
+
+# Identifying fields returned with each hit (enough to label and route to it)
+RESULT_FIELDS = ['uuid', 'id', 'shortName', 'name', 'displayName', 'title', 'term', 'type']
+
+# Indexed doc types and the data files they are loaded from
+SEARCH_DOC_TYPES = {
+    'models': 'dataModels.json',
+    'dataAgreements': 'dataAgreements.json',
+    'domains': 'dataDomains.json',
+    'applications': 'applications.json',
+    'reference': 'reference.json',
+    'toolkit': 'toolkit.json',
+    'policies': 'dataPolicies.json',
+    'lexicon': 'lexicon.json',
+    'glossary': 'glossary.json'
+}
+
+# Fields used for the result's description snippet, in order of preference
+DESCRIPTION_FIELDS = ['description', 'extendedDescription', 'definition']
+
+SNIPPET_CHARS = 160
+MAX_HIGHLIGHT_FIELDS = 3
+
+# (field, start, end) of one term occurrence
+Occurrence = Tuple[str, int, int]
+
+# (score, index_key, matched_terms) of one candidate
+ScoredHit = Tuple[float, str, List[str]]
+
 class SearchService:
     """Search service for the data catalog."""
     
-    def __init__(self):
-        self.index = {}
+    def __init__(self, analyzer: Optional[Analyzer] = None):
+        self.analyzer = analyzer or build_analyzer(Config.SEARCH_ANALYZER_FILTERS)
+        self.metrics = SearchMetrics(Config.SEARCH_SLOW_QUERY_MS, Config.SEARCH_SLOW_QUERY_LOG_SIZE,
+                                     known_types=SEARCH_DOC_TYPES)
+        self._vector_scorer = None
+        if Config.SEARCH_VECTOR_SCORING != 'off':
+            if vector_scoring.is_available():
+                self._vector_scorer = SparseTfidfScorer()
+            else:
+                logger.info("NumPy not installed; search uses the pure-Python scorer")
+        self._matrix_lock = threading.Lock()
+        self._matrix_building = False
+        self._index_version = 0
+        self._reset_index()
         self.stats = {
             'total_documents': 0,
             'total_tokens': 0,
@@ -24,93 +84,244 @@ class SearchService:
             'documents_by_type': {}
         }
         self.data_dir = os.path.join(os.path.dirname(__file__), '..', '_data')
+        # Reads a data document by file name; set by the API to its storage engine
+        self.document_loader: Optional[Callable[[str], Any]] = None
     
     def load_data_file(self, filename: str) -> List[Dict[str, Any]]:
         """Load data from a JSON file."""
         try:
-            filepath = os.path.join(self.data_dir, filename)
-            if os.path.exists(filepath):
-                with open(filepath, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                    
-                    # Handle different data structures
-                    if isinstance(data, list):
-                        return data
-                    elif isinstance(data, dict):
-                        # Special handling for toolkit.json which has nested structure
-                        if filename == 'toolkit.json' and 'toolkit' in data:
-                            toolkit_data = data['toolkit']
-                            all_items = []
-                            for category in ['functions', 'containers', 'infrastructure', 'terraform']:
-                                if category in toolkit_data and isinstance(toolkit_data[category], list):
-                                    for item in toolkit_data[category]:
-                                        item_with_type = item.copy()
-                                        item_with_type['_toolkit_type'] = category
-                                        all_items.append(item_with_type)
-                            if 'toolkits' in toolkit_data and isinstance(toolkit_data['toolkits'], list):
-                                for item in toolkit_data['toolkits']:
-                                    item_with_type = item.copy()
-                                    item_with_type['_toolkit_type'] = 'toolkits'
-                                    all_items.append(item_with_type)
-                            return all_items
+            if self.document_loader is not None:
+                data = self.document_loader(filename)
+            else:
+                try:
+                    data = JsonFileStorageEngine(self.data_dir).read_document(filename)
+                except FileNotFoundError:
+                    return []
+            
+            # Handle different data structures
+            if isinstance(data, list):
+                return data
+            elif isinstance(data, dict):
+                # Special handling for toolkit.json which has nested structure
+                if filename == 'toolkit.json' and 'toolkit' in data:
+                    toolkit_data = data['toolkit']
+                    all_items = []
+                    for category in ['functions', 'containers', 'infrastructure', 'terraform']:
+                        if category in toolkit_data and isinstance(toolkit_data[category], list):
+                            for item in toolkit_data[category]:
+                                item_with_type = item.copy()
+                                item_with_type['_toolkit_type'] = category
+                                all_items.append(item_with_type)
+                    if 'toolkits' in toolkit_data and isinstance(toolkit_data['toolkits'], list):
+                        for item in toolkit_data['toolkits']:
+                            item_with_type = item.copy()
+                            item_with_type['_toolkit_type'] = 'toolkits'
+                            all_items.append(item_with_type)
+                    return all_items
                         
-                        # Look for common array keys
-                        for key in ['models', 'dataAgreements', 'domains', 'applications', 'reference', 'toolkit', 'policies', 'lexicon', 'agreements', 'terms']:
-                            if key in data and isinstance(data[key], list):
-                                return data[key]
-                        # If no array found, return the dict as a single item
-                        return [data]
-                    else:
-                        return []
-            return []
+                # Look for common array keys
+                for key in ['models', 'dataAgreements', 'domains', 'applications', 'reference', 'toolkit', 'policies', 'lexicon', 'agreements', 'terms']:
+                    if key in data and isinstance(data[key], list):
+                        return data[key]
+                # If no array found, return the dict as a single item
+                return [data]
+            else:
+                return []
         except Exception as e:
             logger.error(f"Error loading {filename}: {e}")
             return []
     
-    def extract_searchable_text(self, item: Dict[str, Any]) -> str:
-        """Extract searchable text from an item."""
-        text_parts = []
+    def extract_searchable_fields(self, item: Dict[str, Any]) -> Dict[str, str]:
+        """Extract the raw text of each searchable field of an item."""
+        fields = {}
         
-        # For toolkit items (which have displayName), prioritize displayName over name
-        # This ensures we index the display name (e.g., "Data Validation Utility") 
-        # instead of the underscored name (e.g., "data_validation_utility")
+        # Toolkit items carry a human-readable displayName (e.g. "Data Validation Utility") next to
+        # an identifier-style name (e.g. "data_validation_utility"); the analyzer splits identifiers,
+        # so both are indexed and either form matches.
         is_toolkit_item = 'displayName' in item or '_toolkit_type' in item
+        if is_toolkit_item and item.get('displayName'):
+            fields['displayName'] = str(item['displayName'])
+        if item.get('name'):
+            fields['name'] = str(item['name'])
         
-        if is_toolkit_item:
-            # For toolkit items, use displayName instead of name
-            if 'displayName' in item and item['displayName']:
-                text_parts.append(str(item['displayName']))
-            # Don't include the underscored 'name' field for toolkit items
-        else:
-            # For other items, use the standard 'name' field
-            if 'name' in item and item['name']:
-                text_parts.append(str(item['name']))
+        # Common scalar fields
+        for field in SCALAR_SEARCH_FIELDS:
+            if field in item and item[field]:
+                fields[field] = str(item[field])
         
-        # Common fields to search (excluding 'name' which we handled above)
-        search_fields = ['title', 'description', 'extendedDescription', 'shortName', 'id', 'term', 'definition', 'category', 'owner']
+        # Array fields (domains, changelog entries, glossary-tagged models)
+        for field in LIST_SEARCH_FIELDS:
+            if field in item and isinstance(item[field], list):
+                values = [str(v) for v in item[field] if v]
+                if values:
+                    fields[field] = ' '.join(values)
         
-        for field in search_fields:
-            if field in item and item[field]:
-                text_parts.append(str(item[field]))
+        return fields
+    
+    def extract_searchable_text(self, item: Dict[str, Any]) -> str:
+        """Extract searchable text from an item."""
+        return ' '.join(self.extract_searchable_fields(item).values()).lower()
+    
+    def _reset_index(self):
+        self.index = {}
+        self.postings = {}
+        self._doc_fields = {}
+        self._doc_terms = {}
+        self._doc_lengths = {}
+        self._vocabulary = None
+        self._index_version = getattr(self, '_index_version', 0) + 1
+    
+    def _analyze_fields(self, index_key: str, fields: Dict[str, str]) -> Dict[str, Tuple[str, List[Token]]]:
+        """Analyze fields, reusing cached tokens for fields whose text is unchanged."""
+        cached = self._doc_fields.get(index_key, {})
+        analyzed = {}
+        reanalyzed = 0
+        for field, text in fields.items():
+            previous = cached.get(field)
+            if previous is not None and previous[0] == text:
+                analyzed[field] = previous
+            else:
+                analyzed[field] = (text, self.analyzer.analyze(text))
+                reanalyzed += 1
+        if cached:
+            logger.debug(f"Re-analyzed {reanalyzed}/{len(fields)} fields for {index_key}")
+        return analyzed
+    
+    def _index_document(self, doc_type: str, doc_id: str, item: Dict[str, Any]) -> Optional[int]:
+        """Add or replace a document in the index. Returns its analyzed token count, or None if nothing to index."""
+        index_key = f"{doc_type}:{doc_id}"
+        fields = self.extract_searchable_fields(item)
+        analyzed = self._analyze_fields(index_key, fields)
         
-        # Search in arrays
-        if 'domain' in item and isinstance(item['domain'], list):
-            text_parts.extend([str(d) for d in item['domain']])
+        # Positional postings: term -> {index_key: [(field, start, end), ...]}
+        occurrences: Dict[str, List[Occurrence]] = {}
+        for field, (_, tokens) in analyzed.items():
+            for token in tokens:
+                occurrences.setdefault(token.text, []).append((field, token.start, token.end))
+        if not occurrences:
+            self._unindex_document(index_key)
+            return None
         
-        if 'changes' in item and isinstance(item['changes'], list):
-            text_parts.extend([str(c) for c in item['changes']])
+        old_occurrences = self._doc_terms.get(index_key, {})
+        for term in old_occurrences.keys() - occurrences.keys():
+            self._remove_posting(term, index_key)
+        for term, positions in occurrences.items():
+            if old_occurrences.get(term) != positions:
+                if term not in self.postings:
+                    self._vocabulary = None
+                self.postings.setdefault(term, {})[index_key] = positions
         
-        # Glossary-specific fields
-        if 'taggedModels' in item and isinstance(item['taggedModels'], list):
-            text_parts.extend([str(m) for m in item['taggedModels']])
+        self._index_version += 1
+        self._doc_fields[index_key] = analyzed
+        self._doc_terms[index_key] = occurrences
+        self._doc_lengths[index_key] = sum(len(positions) for positions in occurrences.values())
+        self.index[index_key] = {
+            '_search_type': doc_type,
+            '_search_id': doc_id,
+            **item
+        }
+        return self._doc_lengths[index_key]
+    
+    def _remove_posting(self, term: str, index_key: str):
+        docs = self.postings.get(term)
+        if docs is None:
+            return
+        docs.pop(index_key, None)
+        if not docs:
+            del self.postings[term]
+            self._vocabulary = None
+    
+    def _unindex_document(self, index_key: str) -> int:
+        """Remove a document from the index. Returns the number of tokens it had."""
+        if index_key in self.index:
+            self._index_version += 1
+        for term in self._doc_terms.pop(index_key, {}):
+            self._remove_posting(term, index_key)
+        self._doc_fields.pop(index_key, None)
+        self.index.pop(index_key, None)
+        return self._doc_lengths.pop(index_key, 0)
+    
+    def _expand_prefix(self, prefix: str) -> List[str]:
+        """Indexed terms starting with prefix (used for the last, possibly incomplete, query term)."""
+        if self._vocabulary is None:
+            self._vocabulary = sorted(self.postings)
+        vocabulary = self._vocabulary
+        i = bisect.bisect_left(vocabulary, prefix)
+        expanded = []
+        while i < len(vocabulary) and vocabulary[i].startswith(prefix):
+            expanded.append(vocabulary[i])
+            i += 1
+        return expanded
+    
+    def _make_snippet(self, text: str, spans: List[Tuple[int, int]]) -> Dict[str, Any]:
+        """Cut a window of text around the first match; offsets are relative to the snippet."""
+        spans = sorted(spans)
+        start = 0
+        if spans and len(text) > SNIPPET_CHARS:
+            start = max(0, spans[0][0] - SNIPPET_CHARS // 4)
+            if start > 0:
+                # Don't start mid-word
+                space = text.find(' ', start, spans[0][0])
+                start = space + 1 if space != -1 else start
+        end = min(len(text), start + SNIPPET_CHARS)
+        prefix = '…' if start > 0 else ''
+        suffix = '…' if end < len(text) else ''
         
-        return ' '.join(text_parts).lower()
+        offsets = []
+        for span_start, span_end in spans:
+            if span_start >= start and span_end <= end:
+                offset = span_start - start + len(prefix)
+                if offsets and offset <= offsets[-1][1]:
+                    offsets[-1][1] = max(offsets[-1][1], span_end - start + len(prefix))
+                else:
+                    offsets.append([offset, span_end - start + len(prefix)])
+        return {
+            'snippet': prefix + text[start:end] + suffix,
+            'offsets': offsets
+        }
+    
+    def _hydrate_hit(self, index_key: str, score: float, matched_terms: List[str],
+                     include_document: bool = False) -> Dict[str, Any]:
+        """Build a result from the index: identifying fields plus per-field highlighted snippets."""
+        item = self.index[index_key]
+        
+        spans_by_field: Dict[str, List[Tuple[int, int]]] = {}
+        for term in matched_terms:
+            for field, start, end in self.postings[term].get(index_key, ()):
+                spans_by_field.setdefault(field, []).append((start, end))
+        
+        fields = self._doc_fields.get(index_key, {})
+        highlights = {}
+        for field, (text, _) in fields.items():
+            if field in spans_by_field and len(highlights) < MAX_HIGHLIGHT_FIELDS:
+                highlights[field] = self._make_snippet(text, spans_by_field[field])
+        # Always carry a description snippet so the hit can be rendered without the document
+        description_field = next((f for f in DESCRIPTION_FIELDS if f in fields), None)
+        if description_field and description_field not in highlights:
+            highlights[description_field] = self._make_snippet(fields[description_field][0], [])
+        
+        if include_document:
+            hit = dict(item)
+        else:
+            hit = {
+                '_search_type': item['_search_type'],
+                '_search_id': item['_search_id'],
+            }
+            for field in RESULT_FIELDS:
+                if field in item:
+                    hit[field] = item[field]
+            if '_toolkit_type' in item:
+                hit['_toolkit_type'] = item['_toolkit_type']
+        hit['_search_score'] = score
+        hit['_matched_terms'] = matched_terms
+        hit['_highlights'] = highlights
+        return hit
     
     def build_index(self) -> bool:
         """Build the search index from all data sources."""
         try:
             logger.info("Building search index...")
-            self.index = {}
+            self._reset_index()
             self.stats = {
                 'total_documents': 0,
                 'total_tokens': 0,
@@ -119,17 +330,7 @@ class SearchService:
             }
             
             # Data files to index
-            data_files = {
-                'models': 'dataModels.json',
-                'dataAgreements': 'dataAgreements.json',
-                'domains': 'dataDomains.json',
-                'applications': 'applications.json',
-                'reference': 'reference.json',
-                'toolkit': 'toolkit.json',
-                'policies': 'dataPolicies.json',
-                'lexicon': 'lexicon.json',
-                'glossary': 'glossary.json'
-            }
+            data_files = SEARCH_DOC_TYPES
             
             total_documents = 0
             total_tokens = 0
@@ -150,22 +351,18 @@ class SearchService:
                     if not doc_id:
                         continue
                     
-                    # Extract searchable text
-                    searchable_text = self.extract_searchable_text(item)
-                    if not searchable_text:
-                        continue
-                    
-                    # Add to index
                     index_key = f"{doc_type}:{doc_id}"
-                    self.index[index_key] = {
-                        '_search_type': doc_type,
-                        '_search_id': doc_id,
-                        '_search_text': searchable_text,
-                        **item
-                    }
+                    if index_key in self.index:
+                        total_tokens -= self._doc_lengths.get(index_key, 0)
+                        total_documents -= 1
+                        self.stats['documents_by_type'][doc_type] -= 1
+                    
+                    token_count = self._index_document(doc_type, doc_id, item)
+                    if token_count is None:
+                        continue
                     
                     total_documents += 1
-                    total_tokens += len(searchable_text.split())
+                    total_tokens += token_count
                     self.stats['documents_by_type'][doc_type] += 1
                 
                 logger.info(f"Indexed {self.stats['documents_by_type'][doc_type]} {doc_type} documents")
@@ -173,62 +370,245 @@ class SearchService:
             self.stats['total_documents'] = total_documents
             self.stats['total_tokens'] = total_tokens
             
-            logger.info(f"Search index built successfully with {total_documents} documents")
+            logger.info(f"Search index built successfully with {total_documents} documents and {len(self.postings)} terms")
+            if self._vector_scorer is not None:
+                # Build the term-document matrix now rather than on the first broad query
+                self._sparse_matrix()
             return True
             
         except Exception as e:
             logger.error(f"Error building search index: {e}")
             return False
     
-    def search(self, query: str, doc_types: Optional[List[str]] = None, limit: int = 50) -> List[Dict[str, Any]]:
-        """Search across all indexed documents."""
-        try:
-            if not query or not query.strip():
+    def _parse_query(self, query: str) -> List[List[str]]:
+        """Analyze a query into term groups: each query term expands to the indexed terms it matches.
+        
+        Returns an empty list when the query is empty or some term matches nothing.
+        """
+        if not query or not query.strip():
+            return []
+        
+        query_terms = list(dict.fromkeys(self.analyzer.terms(query)))
+        term_groups = []
+        for i, term in enumerate(query_terms):
+            if i == len(query_terms) - 1:
+                expansions = self._expand_prefix(term)
+            else:
+                expansions = [term] if term in self.postings else []
+            if not expansions:
                 return []
-            
-            query_lower = query.lower().strip()
-            results = []
-            
-            # Filter by document types if specified
-            search_items = self.index.items()
-            if doc_types:
-                search_items = [(k, v) for k, v in search_items if v.get('_search_type') in doc_types]
-            
-            for index_key, item in search_items:
-                search_text = item.get('_search_text', '')
+            term_groups.append(expansions)
+        return term_groups
+    
+    def _candidates(self, term_groups: List[List[str]], doc_types: Optional[List[str]] = None) -> Set[str]:
+        """Documents matching every term group; intersects starting from the rarest."""
+        if not term_groups:
+            return set()
+        group_docs = []
+        for expansions in term_groups:
+            docs = set()
+            for term in expansions:
+                docs.update(self.postings[term])
+            group_docs.append(docs)
+        group_docs.sort(key=len)
+        candidates = set.intersection(*group_docs)
+        
+        if doc_types:
+            candidates = {k for k in candidates if self.index[k].get('_search_type') in doc_types}
+        return candidates
+    
+    def _idf(self, term_groups: List[List[str]]) -> Dict[str, float]:
+        total_docs = max(len(self.index), 1)
+        return {
+            term: math.log(1 + total_docs / len(self.postings[term]))
+            for expansions in term_groups for term in expansions
+        }
+    
+    def _score(self, term_groups: List[List[str]], candidates: Set[str]) -> List[ScoredHit]:
+        """Length-normalized TF-IDF per candidate, scaled to [0, 1]."""
+        idf = self._idf(term_groups)
+        max_weight = sum(max(idf[t] for t in expansions) for expansions in term_groups)
+        
+        scored = []
+        for index_key in candidates:
+            doc_length = self._doc_lengths[index_key] or 1
+            score = 0.0
+            matched_terms = []
+            for expansions in term_groups:
+                best = 0.0
+                for term in expansions:
+                    positions = self.postings[term].get(index_key)
+                    if positions:
+                        matched_terms.append(term)
+                        best = max(best, math.sqrt(len(positions) / doc_length) * idf[term])
+                score += best
+            scored.append((score / max_weight if max_weight else 0, index_key, matched_terms))
+        return scored
+    
+    def _matched_terms(self, term_groups: List[List[str]], index_key: str) -> List[str]:
+        return [term for expansions in term_groups for term in expansions if index_key in self.postings[term]]
+    
+    def _use_vector_scorer(self, term_groups: List[List[str]]) -> bool:
+        """Use the sparse-matrix scorer when available and the query could match many documents."""
+        if self._vector_scorer is None:
+            return False
+        if Config.SEARCH_VECTOR_SCORING == 'on':
+            return True
+        # Upper bound on the candidate count: the rarest term group's document frequency
+        estimate = min(sum(len(self.postings[t]) for t in expansions) for expansions in term_groups)
+        return estimate >= Config.SEARCH_VECTOR_MIN_CANDIDATES
+    
+    def _sparse_matrix(self) -> Optional[SparseTfidfScorer]:
+        """The term-document matrix if it matches the index; otherwise None (the caller scores in
+        Python) and a rebuild is started in the background, so no request waits for one."""
+        matrix = self._vector_scorer
+        if matrix.version == self._index_version:
+            return matrix
+        with self._matrix_lock:
+            if not self._matrix_building:
+                self._matrix_building = True
+                threading.Thread(target=self._rebuild_matrix, name='search-matrix', daemon=True).start()
+        return None
+    
+    def _rebuild_matrix(self):
+        """Build a matrix of the current index and swap it in; queries keep using the old object meanwhile."""
+        version = self._index_version
+        try:
+            matrix = SparseTfidfScorer()
+            matrix.rebuild(self.postings, self._doc_lengths, self.index, version)
+            self._vector_scorer = matrix
+        except (RuntimeError, KeyError) as e:
+            # The index changed while being read; the matrix is stale anyway and the next broad query rebuilds it
+            logger.debug(f"Sparse matrix build of index version {version} interrupted: {e}")
+        except Exception as e:
+            logger.error(f"Error building sparse term-document matrix: {e}")
+        finally:
+            with self._matrix_lock:
+                self._matrix_building = False
+    
+    def _query_fingerprint(self, query: str, doc_types: Optional[List[str]]) -> str:
+        key = json.dumps([query.strip().lower(), sorted(doc_types or [])])
+        return hashlib.sha1(key.encode('utf-8')).hexdigest()[:12]
+    
+    def encode_cursor(self, query: str, doc_types: Optional[List[str]], score: float, index_key: str) -> str:
+        """Opaque cursor pointing just past a hit in (score desc, index key asc) order."""
+        payload = json.dumps({'q': self._query_fingerprint(query, doc_types), 's': score, 'k': index_key})
+        return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+    
+    def decode_cursor(self, cursor: str, query: str, doc_types: Optional[List[str]]) -> Tuple[float, str]:
+        """Decode a cursor produced by encode_cursor for the same query; raises ValueError otherwise."""
+        try:
+            padded = cursor + '=' * (-len(cursor) % 4)
+            payload = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+            score, index_key = float(payload['s']), str(payload['k'])
+        except Exception:
+            raise ValueError("Malformed search cursor")
+        if payload.get('q') != self._query_fingerprint(query, doc_types):
+            raise ValueError("Search cursor does not belong to this query")
+        return score, index_key
+    
+    def search_page(self, query: str, doc_types: Optional[List[str]] = None, limit: int = 50,
+                    offset: int = 0, cursor: Optional[str] = None,
+                    include_document: bool = False) -> Dict[str, Any]:
+        """Search and return one page of hits with the true total hit count.
+        
+        Pages are either offset-based or continue from a cursor returned by a previous page.
+        Cursors are score-ordered: only hits ranked after the cursor are considered and the page
+        is picked with a bounded heap, so deep pages don't sort the whole result set.
+        Raises ValueError for an invalid cursor.
+        """
+        page = {'results': [], 'total': 0, 'offset': offset, 'next_cursor': None}
+        after = self.decode_cursor(cursor, query, doc_types) if cursor else None
+        skip = 0 if after is not None else offset
+        phases = dict.fromkeys(SEARCH_PHASES, 0.0)
+        
+        t0 = perf_counter()
+        term_groups = self._parse_query(query)
+        t1 = perf_counter()
+        phases['parse'] = (t1 - t0) * 1000
+        
+        ranked = []
+        scorer = 'python'
+        matrix = self._sparse_matrix() if term_groups and self._use_vector_scorer(term_groups) else None
+        if matrix is not None:
+            # Broad query: score every document at once on the sparse term-document matrix
+            scorer = 'vector'
+            t2 = perf_counter()
+            total, remaining, top = matrix.top_k(term_groups, self._idf(term_groups), skip + limit, doc_types, after)
+            page['total'] = total
+            if after is not None:
+                page['offset'] = total - remaining
+            ranked = [(score, key, self._matched_terms(term_groups, key)) for score, key in top[skip:]]
+        else:
+            candidates = self._candidates(term_groups, doc_types)
+            t2 = perf_counter()
+            page['total'] = len(candidates)
+            if candidates:
+                scored = self._score(term_groups, candidates)
+                if after is not None:
+                    after_score, after_key = after
+                    scored = [h for h in scored if h[0] < after_score or (h[0] == after_score and h[1] > after_key)]
+                    page['offset'] = page['total'] - len(scored)
                 
-                # Simple text matching
-                if query_lower in search_text:
-                    # Calculate a simple relevance score
-                    score = search_text.count(query_lower) / len(search_text.split()) if search_text else 0
-                    
-                    # Extract matched terms
-                    matched_terms = []
-                    words = query_lower.split()
-                    for word in words:
-                        if word in search_text:
-                            matched_terms.append(word)
-                    
-                    result = {
-                        **item,
-                        '_search_score': score,
-                        '_matched_terms': matched_terms
-                    }
-                    results.append(result)
-            
-            # Sort by relevance score (highest first)
-            results.sort(key=lambda x: x.get('_search_score', 0), reverse=True)
-            
-            # Limit results
-            return results[:limit]
-            
+                # Highest score first; index key breaks ties so the order (and cursors) are stable
+                ranked = heapq.nsmallest(skip + limit, scored, key=lambda h: (-h[0], h[1]))[skip:]
+        t3 = perf_counter()
+        phases['candidates'] = (t2 - t1) * 1000
+        phases['scoring'] = (t3 - t2) * 1000
+        
+        page['results'] = [
+            self._hydrate_hit(index_key, score, matched_terms, include_document)
+            for score, index_key, matched_terms in ranked
+        ]
+        if ranked and page['offset'] + len(ranked) < page['total']:
+            last_score, last_key, _ = ranked[-1]
+            page['next_cursor'] = self.encode_cursor(query, doc_types, last_score, last_key)
+        phases['hydration'] = (perf_counter() - t3) * 1000
+        
+        plan = None
+        if self.metrics.should_sample_plan():
+            plan = {
+                'query': query,
+                'types': self.metrics.filter_key(doc_types),
+                'terms': [
+                    {'expansions': expansions[:20], 'expansion_count': len(expansions),
+                     'doc_freq': sum(len(self.postings[t]) for t in expansions)}
+                    for expansions in term_groups
+                ],
+                'candidates': page['total'],
+                'scorer': scorer,
+                'pagination': 'cursor' if after is not None else 'offset',
+                'offset': page['offset'],
+                'limit': limit,
+                'returned': len(ranked)
+            }
+        self.metrics.record(query, doc_types, phases, page['total'], len(ranked), plan)
+        return page
+    
+    def search(self, query: str, doc_types: Optional[List[str]] = None, limit: int = 50,
+               include_document: bool = False) -> List[Dict[str, Any]]:
+        """Search across all indexed documents.
+        
+        The query goes through the same analyzer as the documents. Every query term must match
+        (the last one also matches as a prefix, for search-as-you-type), and hits are ranked by
+        length-normalized TF-IDF. Hits carry identifying fields plus highlighted snippets;
+        include_document=True returns the whole indexed document instead.
+        """
+        try:
+            return self.search_page(query, doc_types, limit, include_document=include_document)['results']
         except Exception as e:
             logger.error(f"Search error: {e}")
             return []
     
     def get_stats(self) -> Dict[str, Any]:
         """Get search index statistics."""
-        return self.stats
+        return {
+            **self.stats,
+            'total_terms': len(self.postings),
+            'analyzer': self.analyzer.filters,
+            'scorer': 'vector' if self._vector_scorer is not None else 'python',
+            'queries': self.metrics.snapshot()
+        }
     
     def rebuild_index(self) -> bool:
         """Rebuild the entire search index."""
@@ -237,21 +617,17 @@ class SearchService:
     def add_document(self, doc_type: str, doc_id: str, document: Dict[str, Any]) -> bool:
         """Add a document to the search index."""
         try:
-            searchable_text = self.extract_searchable_text(document)
-            if not searchable_text:
-                return False
-            
             index_key = f"{doc_type}:{doc_id}"
-            self.index[index_key] = {
-                '_search_type': doc_type,
-                '_search_id': doc_id,
-                '_search_text': searchable_text,
-                **document
-            }
+            if index_key in self.index:
+                return self.update_document(doc_type, doc_id, document)
+            
+            token_count = self._index_document(doc_type, doc_id, document)
+            if token_count is None:
+                return False
             
             # Update stats
             self.stats['total_documents'] += 1
-            self.stats['total_tokens'] += len(searchable_text.split())
+            self.stats['total_tokens'] += token_count
             if doc_type not in self.stats['documents_by_type']:
                 self.stats['documents_by_type'][doc_type] = 0
             self.stats['documents_by_type'][doc_type] += 1
@@ -263,26 +639,23 @@ class SearchService:
             return False
     
     def update_document(self, doc_type: str, doc_id: str, document: Dict[str, Any]) -> bool:
-        """Update a document in the search index."""
+        """Update a document in the search index; only changed fields are re-analyzed."""
         try:
-            searchable_text = self.extract_searchable_text(document)
-            if not searchable_text:
-                return False
-            
             index_key = f"{doc_type}:{doc_id}"
-            old_item = self.index.get(index_key, {})
-            old_text = old_item.get('_search_text', '')
+            if index_key not in self.index:
+                return self.add_document(doc_type, doc_id, document)
             
-            self.index[index_key] = {
-                '_search_type': doc_type,
-                '_search_id': doc_id,
-                '_search_text': searchable_text,
-                **document
-            }
+            old_tokens = self._doc_lengths.get(index_key, 0)
+            new_tokens = self._index_document(doc_type, doc_id, document)
+            if new_tokens is None:
+                # Nothing searchable left; the document was dropped from the index
+                self.stats['total_documents'] -= 1
+                self.stats['total_tokens'] -= old_tokens
+                if doc_type in self.stats['documents_by_type']:
+                    self.stats['documents_by_type'][doc_type] -= 1
+                return False
             
             # Update token count
-            old_tokens = len(old_text.split()) if old_text else 0
-            new_tokens = len(searchable_text.split())
             self.stats['total_tokens'] = self.stats['total_tokens'] - old_tokens + new_tokens
             
             logger.info(f"Updated document {doc_type}:{doc_id}")
@@ -296,14 +669,11 @@ class SearchService:
         try:
             index_key = f"{doc_type}:{doc_id}"
             if index_key in self.index:
-                item = self.index[index_key]
-                searchable_text = item.get('_search_text', '')
-                
-                del self.index[index_key]
+                token_count = self._unindex_document(index_key)
                 
                 # Update stats
                 self.stats['total_documents'] -= 1
-                self.stats['total_tokens'] -= len(searchable_text.split())
+                self.stats['total_tokens'] -= token_count
                 if doc_type in self.stats['documents_by_type']:
                     self.stats['documents_by_type'][doc_type] -= 1
                 
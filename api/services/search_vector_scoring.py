@@ -0,0 +1,132 @@
+"""
+Vectorized TF-IDF scoring for broad search queries.
+Keeps the search index as a term-document matrix in CSR form (one row per term) and scores
+every document with a single sparse matrix-vector product. Requires NumPy; without it the
+search service keeps using its pure-Python scorer.
+"""
+
+import bisect
+import logging
+import math
+from typing import Dict, List, Optional, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover
+    np = None
+
+logger = logging.getLogger(__name__)
+
+
+def is_available() -> bool:
+    return np is not None
+
+
+class SparseTfidfScorer:
+    """Term-document matrix (CSR, rows = terms) over a SearchService index.
+
+    Row data holds the length-normalized term weight sqrt(tf / doc_length); IDF is applied
+    through the query vector at search time, so the matrix does not depend on collection size.
+    Documents are numbered in index-key order so ties break the same way as the Python scorer.
+    """
+
+    def __init__(self):
+        self.version = None
+        self.doc_keys: List[str] = []
+        self.term_rows: Dict[str, int] = {}
+        self.type_codes: Dict[str, int] = {}
+        self.indptr = None
+        self.indices = None
+        self.data = None
+        self.doc_types = None
+
+    def rebuild(self, postings: Dict[str, Dict[str, list]], doc_lengths: Dict[str, int],
+                index: Dict[str, dict], version: int):
+        """Rebuild the matrix from the service's positional postings."""
+        self.doc_keys = sorted(index)
+        doc_ids = {key: i for i, key in enumerate(self.doc_keys)}
+        self.term_rows = {}
+        indptr = [0]
+        indices = []
+        data = []
+        for row, (term, docs) in enumerate(postings.items()):
+            self.term_rows[term] = row
+            for key, positions in docs.items():
+                indices.append(doc_ids[key])
+                data.append(math.sqrt(len(positions) / (doc_lengths[key] or 1)))
+            indptr.append(len(indices))
+        self.indptr = np.asarray(indptr, dtype=np.int64)
+        self.indices = np.asarray(indices, dtype=np.int32)
+        self.data = np.asarray(data, dtype=np.float64)
+
+        self.type_codes = {}
+        types = np.empty(len(self.doc_keys), dtype=np.int16)
+        for i, key in enumerate(self.doc_keys):
+            doc_type = index[key].get('_search_type')
+            types[i] = self.type_codes.setdefault(doc_type, len(self.type_codes))
+        self.doc_types = types
+        self.version = version
+        logger.info(f"Built sparse term-document matrix: {len(self.term_rows)} terms x {len(self.doc_keys)} docs, {len(self.indices)} non-zeros")
+
+    def _row(self, term: str):
+        row = self.term_rows[term]
+        start, end = self.indptr[row], self.indptr[row + 1]
+        return self.indices[start:end], self.data[start:end]
+
+    def top_k(self, term_groups: List[List[str]], idf: Dict[str, float], k: int,
+              doc_types: Optional[List[str]] = None,
+              after: Optional[Tuple[float, str]] = None) -> Tuple[int, int, List[Tuple[float, str]]]:
+        """Score all documents and select the k best.
+
+        Returns (total matches, matches ranked after the cursor, [(score, index_key), ...])
+        with scores scaled like the Python scorer.
+        """
+        n_docs = len(self.doc_keys)
+        max_weight = sum(max(idf[t] for t in expansions) for expansions in term_groups)
+
+        # Single-term groups go into one query vector and one sparse mat-vec (gather rows, scatter-add);
+        # prefix groups take the best-matching expansion per document, as in the Python scorer.
+        single_idx, single_w = [], []
+        scores = np.zeros(n_docs, dtype=np.float64)
+        matched = np.zeros(n_docs, dtype=np.int32)
+        for expansions in term_groups:
+            if len(expansions) == 1:
+                idx, weights = self._row(expansions[0])
+                single_idx.append(idx)
+                single_w.append(weights * idf[expansions[0]])
+                matched[idx] += 1
+                continue
+            best = np.zeros(n_docs, dtype=np.float64)
+            for term in expansions:
+                idx, weights = self._row(term)
+                np.maximum.at(best, idx, weights * idf[term])
+            scores += best
+            matched += best > 0
+        if single_idx:
+            scores += np.bincount(np.concatenate(single_idx), weights=np.concatenate(single_w), minlength=n_docs)
+        if max_weight:
+            scores /= max_weight
+
+        mask = matched == len(term_groups)
+        if doc_types:
+            codes = [self.type_codes[t] for t in doc_types if t in self.type_codes]
+            mask &= np.isin(self.doc_types, codes)
+        total = int(mask.sum())
+
+        if after is not None:
+            after_score, after_key = after
+            first_after = bisect.bisect_right(self.doc_keys, after_key)
+            ids = np.arange(n_docs)
+            mask &= (scores < after_score) | ((scores == after_score) & (ids >= first_after))
+        remaining = int(mask.sum())
+
+        hits = np.flatnonzero(mask)
+        if len(hits) > k:
+            # argpartition finds the k-th best score; keep everything tied with it so the
+            # (score desc, key asc) order is exact before trimming to k
+            kth = np.argpartition(-scores[hits], k - 1)[k - 1]
+            threshold = scores[hits][kth]
+            hits = hits[scores[hits] >= threshold]
+        order = np.lexsort((hits, -scores[hits]))[:k]
+        ranked = [(float(scores[i]), self.doc_keys[i]) for i in hits[order]]
+        return total, remaining, ranked
@@ -0,0 +1,177 @@
+"""
+On-disk encodings of the _data documents.
+A codec is named by a serialization - 'pretty' (indented JSON, the original format), 'compact'
+JSON or 'msgpack' - optionally followed by a compression: 'compact+zstd', 'msgpack+gzip'.
+Compressed and MessagePack files carry a suffix after the collection name (datasets.json.zst,
+toolkit.json.msgpack.gz). Readers find whichever variant exists and detect its encoding from
+the leading bytes, so a collection can be switched to another codec at any time.
+"""
+
+import gzip
+import logging
+import os
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from . import json_codec
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover
+    zstandard = None
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover
+    msgpack = None
+
+logger = logging.getLogger(__name__)
+
+GZIP_MAGIC = b'\x1f\x8b'
+ZSTD_MAGIC = b'\x28\xb5\x2f\xfd'
+_JSON_START = b'{["-0123456789tfn \t\r\n'
+
+
+def _pretty(data: Any) -> bytes:
+    return json_codec.dumps(data, pretty=True)
+
+
+def _compact(data: Any) -> bytes:
+    return json_codec.dumps(data)
+
+
+def _msgpack(data: Any) -> bytes:
+    return msgpack.packb(data, use_bin_type=True)
+
+
+def _gzip(body: bytes) -> bytes:
+    # mtime=0 keeps the output identical for identical documents
+    return gzip.compress(body, compresslevel=6, mtime=0)
+
+
+def _zstd(body: bytes) -> bytes:
+    return zstandard.ZstdCompressor(level=3).compress(body)
+
+
+# name -> (encode, file suffix, module it needs)
+_SERIALIZERS: Dict[str, Tuple[Callable[[Any], bytes], str, Any]] = {
+    'pretty': (_pretty, '', json_codec),
+    'compact': (_compact, '', json_codec),
+    'msgpack': (_msgpack, '.msgpack', msgpack),
+}
+_COMPRESSIONS: Dict[str, Tuple[Callable[[bytes], bytes], str, Any]] = {
+    'gzip': (_gzip, '.gz', gzip),
+    'zstd': (_zstd, '.zst', zstandard),
+}
+
+# Every suffix a document file can carry
+SUFFIXES: List[str] = [s + c for s in ('', '.msgpack') for c in ('', '.gz', '.zst')]
+
+
+class Codec:
+    """One serialization plus an optional compression."""
+
+    def __init__(self, spec: str):
+        serialization, _, compression = spec.strip().lower().partition('+')
+        if serialization not in _SERIALIZERS or (compression and compression not in _COMPRESSIONS):
+            raise ValueError(f"Unknown storage codec '{spec}'")
+        self.serialize, serialization_suffix, module = _SERIALIZERS[serialization]
+        if module is None:
+            raise ValueError(f"Storage codec '{spec}' needs the {serialization} package")
+        self.compress = None
+        compression_suffix = ''
+        if compression:
+            self.compress, compression_suffix, module = _COMPRESSIONS[compression]
+            if module is None:
+                raise ValueError(f"Storage codec '{spec}' needs the zstandard package")
+        self.name = serialization + (f'+{compression}' if compression else '')
+        self.suffix = serialization_suffix + compression_suffix
+
+    def encode(self, data: Any) -> bytes:
+        body = self.serialize(data)
+        return self.compress(body) if self.compress else body
+
+
+def compression_available(compression: str) -> bool:
+    return compression in _COMPRESSIONS and _COMPRESSIONS[compression][2] is not None
+
+
+def compress(body: bytes, compression: str) -> bytes:
+    """Compress body with 'gzip' or 'zstd' (deterministic: same input, same bytes)."""
+    if not compression_available(compression):
+        raise ValueError(f"Compression '{compression}' is unknown or its package is not installed")
+    return _COMPRESSIONS[compression][0](body)
+
+
+def decompress(body: bytes) -> bytes:
+    """body without its gzip or zstd compression, detected from its leading bytes (else unchanged)."""
+    if body.startswith(GZIP_MAGIC):
+        return gzip.decompress(body)
+    if body.startswith(ZSTD_MAGIC):
+        if zstandard is None:
+            raise ValueError("Document is zstd-compressed but the zstandard package is not installed")
+        return zstandard.ZstdDecompressor().decompressobj().decompress(body)
+    return body
+
+
+def decode(body: bytes) -> Any:
+    """Decode a document written by any codec, detected from its leading bytes."""
+    body = decompress(body)
+    if body.startswith(b'\xef\xbb\xbf'):
+        body = body[3:]
+    if not body or body[:1] in _JSON_START:
+        return json_codec.loads(body)
+    if msgpack is None:
+        raise ValueError("Document is not JSON and the msgpack package is not installed")
+    return msgpack.unpackb(body, raw=False)
+
+
+class CodecRegistry:
+    """The codec of each collection: per-file overrides on top of a default."""
+
+    def __init__(self, default: str = 'pretty', per_file: Optional[Dict[str, str]] = None):
+        self.default = Codec(default)
+        self.per_file: Dict[str, Codec] = {}
+        for file_name, spec in (per_file or {}).items():
+            try:
+                self.per_file[file_name] = Codec(spec)
+            except ValueError as e:
+                logger.warning(f"{e}; {file_name} uses the default codec '{self.default.name}'")
+
+    @classmethod
+    def from_config(cls, default: str, overrides: List[str]) -> 'CodecRegistry':
+        """Build from 'file=codec' entries (Config.STORAGE_CODECS)."""
+        per_file = {}
+        for entry in overrides:
+            file_name, _, spec = entry.partition('=')
+            if spec:
+                per_file[file_name.strip()] = spec.strip()
+        return cls(default, per_file)
+
+    def codec_for(self, file_name: str) -> Codec:
+        return self.per_file.get(os.path.basename(file_name), self.default)
+
+    def locate(self, path: str) -> str:
+        """The existing file holding the document at path (its codec's variant first)."""
+        preferred = path + self.codec_for(path).suffix
+        if os.path.exists(preferred):
+            return preferred
+        for suffix in SUFFIXES:
+            if os.path.exists(path + suffix):
+                return path + suffix
+        raise FileNotFoundError(path)
+
+    def stale_variants(self, path: str) -> List[str]:
+        """Files holding the document at path in another encoding than its codec's."""
+        current = self.codec_for(path).suffix
+        return [path + s for s in SUFFIXES if s != current and os.path.exists(path + s)]
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'default': self.default.name,
+            'per_file': {name: codec.name for name, codec in self.per_file.items()},
+            'available': {'zstd': zstandard is not None, 'msgpack': msgpack is not None},
+        }
+
+
+# Pretty-printed JSON everywhere: the original format, used when no registry is configured
+DEFAULT_CODECS = CodecRegistry()
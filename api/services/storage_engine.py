@@ -0,0 +1,671 @@
+"""
+Storage engines for the catalog's JSON documents.
+The API reads and writes whole documents (e.g. dataModels.json) and, for single-entity
+mutations, individual entities inside the document's lists. The JSON-file engine keeps the
+original one-file-per-collection layout; the SQLite engine stores each entity as a row so
+a single-entity write does not rewrite the collection.
+"""
+
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+from . import json_codec
+from .json_patch import Patch, make_patch, pointer
+from .storage_codecs import DEFAULT_CODECS, CodecRegistry, decode
+
+logger = logging.getLogger(__name__)
+
+# Entity fields that can be looked up directly (matched case-insensitively)
+INDEXED_FIELDS = ('uuid', 'id', 'shortName', 'modelShortName')
+
+
+def _lookup_key(value: Any) -> Optional[str]:
+    if value is None:
+        return None
+    key = str(value).strip().lower()
+    return key or None
+
+
+def _is_entity_list(value: Any) -> bool:
+    return isinstance(value, list) and all(isinstance(item, dict) for item in value)
+
+
+def entity_list_paths(document: Any) -> List[str]:
+    """Paths of the entity lists in a document: '' for a root list, 'models', 'toolkit.toolkits', ...
+
+    Lists of objects at the top level, or one level down inside a top-level object, are
+    entity lists; everything else is kept as part of the document envelope.
+    """
+    if isinstance(document, list):
+        return [''] if _is_entity_list(document) else []
+    paths = []
+    if not isinstance(document, dict):
+        return paths
+    for key, value in document.items():
+        if '.' in key:
+            continue
+        if _is_entity_list(value):
+            paths.append(key)
+        elif isinstance(value, dict):
+            paths.extend(f"{key}.{child}" for child, items in value.items()
+                         if '.' not in child and _is_entity_list(items))
+    return paths
+
+
+def get_entity_list(document: Any, list_path: str, create: bool = False) -> Optional[List[Dict[str, Any]]]:
+    """The list at list_path in a document (created when missing if create=True)."""
+    if list_path == '':
+        return document if isinstance(document, list) else None
+    container = document
+    parts = list_path.split('.')
+    for part in parts[:-1]:
+        if not isinstance(container, dict):
+            return None
+        if part not in container and create:
+            container[part] = {}
+        container = container.get(part)
+    if not isinstance(container, dict):
+        return None
+    if parts[-1] not in container and create:
+        container[parts[-1]] = []
+    items = container.get(parts[-1])
+    return items if isinstance(items, list) else None
+
+
+def fsync_dir(path: str):
+    """fsync a directory so a rename inside it survives a crash (no-op where unsupported)."""
+    try:
+        fd = os.open(path or '.', os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def atomic_write_bytes(path: str, body: bytes):
+    """Replace path with body atomically and durably.
+
+    The temp file gets a unique name in the same directory, so concurrent writers of the
+    same path never share one; it is fsync'd before the rename and the directory after it.
+    """
+    directory = os.path.dirname(path) or '.'
+    os.makedirs(directory, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix=f".{os.path.basename(path)}.", suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(body)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        try:
+            os.remove(temp_path)
+        except FileNotFoundError:
+            pass
+        raise
+    fsync_dir(directory)
+
+
+def entity_matches(entity: Dict[str, Any], field: str, value: Any) -> bool:
+    key = _lookup_key(value)
+    return key is not None and _lookup_key(entity.get(field)) == key
+
+
+class EntityOp(NamedTuple):
+    """One entity change staged by a write batch and replayed with StorageEngine.apply_entity_ops().
+
+    handle is the storage handle of the entity; for 'append' it is a placeholder that later
+    ops on the new entity refer to. previous is the entity before a 'replace' or 'delete'.
+    """
+    op: str
+    list_path: str
+    handle: Any = None
+    entity: Optional[Dict[str, Any]] = None
+    previous: Optional[Dict[str, Any]] = None
+
+
+def _create_list_patch(document: Any, tokens: List[str]) -> Patch:
+    if not tokens or not isinstance(document, dict) or len(tokens) > 2:
+        raise LookupError(f"Cannot create entity list {'.'.join(tokens) or '(root)'}")
+    if len(tokens) == 1:
+        return [{'op': 'add', 'path': pointer(tokens[0]), 'value': []}]
+    parent = document.get(tokens[0])
+    if parent is None:
+        return [{'op': 'add', 'path': pointer(tokens[0]), 'value': {tokens[1]: []}}]
+    if not isinstance(parent, dict):
+        raise LookupError(f"Cannot create entity list {'.'.join(tokens)}")
+    return [{'op': 'add', 'path': pointer(*tokens), 'value': []}]
+
+
+def entity_ops_patch(document: Any, ops: List[EntityOp], by_value: bool = False,
+                     skip_applied: bool = False) -> Patch:
+    """JSON Patch applying entity ops, in order, to document (which is not modified).
+
+    Entities are located by their list index handles, or with by_value by their previous
+    content (for documents the handles do not index). skip_applied ignores ops whose change
+    the document already has, so a commit can be rolled forward twice. Raises LookupError
+    when an entity cannot be located.
+    """
+    patch: Patch = []
+    # list_path -> (items of document, token of the entity at each current position); tokens
+    # are indexes into items, or the placeholder object of an appended entity
+    lists: Dict[str, Tuple[List[Dict[str, Any]], List[Any]]] = {}
+    changed: Dict[Any, Dict[str, Any]] = {}
+    appended: Dict[Any, Any] = {}
+
+    def content(items: List[Dict[str, Any]], token: Any) -> Dict[str, Any]:
+        return changed[token] if token in changed else items[token]
+
+    for op in ops:
+        tokens = op.list_path.split('.') if op.list_path else []
+        state = lists.get(op.list_path)
+        if state is None:
+            items = get_entity_list(document, op.list_path)
+            if items is None:
+                if op.op != 'append':
+                    if skip_applied:
+                        continue
+                    raise LookupError(f"No entity list {op.list_path!r}")
+                patch.extend(_create_list_patch(document, tokens))
+                items = []
+            state = lists[op.list_path] = (items, list(range(len(items))))
+        items, order = state
+
+        if op.op == 'append':
+            if skip_applied and any(content(items, token) == op.entity for token in order):
+                continue
+            token = object()
+            if op.handle is not None:
+                appended[op.handle] = token
+            patch.append({'op': 'add', 'path': pointer(*tokens, '-'), 'value': op.entity})
+            order.append(token)
+            changed[token] = op.entity
+            continue
+
+        if by_value:
+            index = next((i for i, token in enumerate(order) if content(items, token) == op.previous), None)
+        else:
+            token = appended.get(op.handle, op.handle)
+            index = order.index(token) if token in order else None
+        if index is None:
+            if skip_applied:
+                continue
+            raise LookupError(f"Entity {op.handle!r} not found in {op.list_path!r}")
+        token = order[index]
+        if op.op == 'replace':
+            prefix = pointer(*tokens, index)
+            patch.extend({**change, 'path': prefix + change['path']}
+                         for change in make_patch(content(items, token), op.entity))
+            changed[token] = op.entity
+        else:
+            patch.append({'op': 'remove', 'path': pointer(*tokens, index)})
+            order.pop(index)
+    return patch
+
+
+class WriteConflict(Exception):
+    """A conditional write found the document changed since it was read (another writer got there first)."""
+
+    def __init__(self, file_name: str, message: str = ''):
+        super().__init__(message or f"{file_name} was changed by another writer")
+        self.file_name = file_name
+
+
+class ReadOnlyStorage(PermissionError):
+    """A write to a data source that cannot be written (GitHub)."""
+
+    def __init__(self, file_name: str):
+        super().__init__(f"{file_name} cannot be written: the data source is read-only")
+        self.file_name = file_name
+
+
+class StorageEngine:
+    """Document and entity access to the catalog data files.
+
+    Entities are addressed by (file_name, list_path) plus an opaque handle returned by the
+    find methods. This base class implements the entity operations on top of whole-document
+    reads and writes; engines with finer-grained storage override them.
+    """
+
+    name = 'base'
+    # False for read-only data sources: writes raise ReadOnlyStorage
+    writable = True
+
+    def read_document(self, file_name: str) -> Any:
+        """Read a whole document. Raises FileNotFoundError if it does not exist."""
+        raise NotImplementedError
+
+    def write_document(self, file_name: str, data: Any):
+        raise NotImplementedError
+
+    def read_versioned(self, file_name: str) -> Tuple[Any, Optional[str]]:
+        """A document and the version it was read at, for a later write_versioned() (None where
+        the engine does not track versions; this process is then the only writer)."""
+        return self.read_document(file_name), None
+
+    def write_versioned(self, file_name: str, data: Any, version: Optional[str]):
+        """Write a document only if it is still at version (raises WriteConflict otherwise)."""
+        self.write_document(file_name, data)
+
+    def check_versions(self, versions: Dict[str, Optional[str]]):
+        """Raise WriteConflict if any document is no longer at its version (before a multi-document write)."""
+
+    def find_entities(self, file_name: str, list_path: str, field: str, value: Any) -> List[Tuple[Any, Dict[str, Any]]]:
+        """All (handle, entity) pairs whose field matches value, in document order."""
+        items = get_entity_list(self.read_document(file_name), list_path) or []
+        return [(i, item) for i, item in enumerate(items) if entity_matches(item, field, value)]
+
+    def find_entity(self, file_name: str, list_path: str, field: str, value: Any) -> Optional[Tuple[Any, Dict[str, Any]]]:
+        """The first (handle, entity) whose field matches value, or None."""
+        matches = self.find_entities(file_name, list_path, field, value)
+        return matches[0] if matches else None
+
+    def entity_ids(self, file_name: str, list_path: str, prefix: str = '') -> List[Any]:
+        """Ids of the entities in a list, optionally only those starting with prefix."""
+        items = get_entity_list(self.read_document(file_name), list_path) or []
+        ids = [item.get('id') for item in items if item.get('id') is not None]
+        return [i for i in ids if str(i).startswith(prefix)] if prefix else ids
+
+    def max_int_id(self, file_name: str, list_path: str) -> int:
+        """Largest integer id in a list (0 if none)."""
+        ids = [i for i in self.entity_ids(file_name, list_path) if isinstance(i, int) and not isinstance(i, bool)]
+        return max(ids, default=0)
+
+    def append_entity(self, file_name: str, list_path: str, entity: Dict[str, Any]) -> Any:
+        data = self.read_document(file_name)
+        items = get_entity_list(data, list_path, create=True)
+        items.append(entity)
+        self.write_document(file_name, data)
+        return len(items) - 1
+
+    def replace_entity(self, file_name: str, list_path: str, handle: Any, entity: Dict[str, Any]):
+        data = self.read_document(file_name)
+        get_entity_list(data, list_path)[handle] = entity
+        self.write_document(file_name, data)
+
+    def delete_entity(self, file_name: str, list_path: str, handle: Any):
+        data = self.read_document(file_name)
+        del get_entity_list(data, list_path)[handle]
+        self.write_document(file_name, data)
+
+    def entity_writes(self, file_name: str) -> bool:
+        """Whether entity operations on file_name write only the entity (write batches then
+        stage entity changes instead of rewriting the whole document)."""
+        return False
+
+    def apply_entity_ops(self, file_name: str, ops: List[EntityOp]):
+        """Replay a write batch's entity changes in order.
+
+        Handles found before the batch must stay valid while other entities are added and
+        removed (row ids, entity keys); engines with list index handles override this.
+        """
+        handles: Dict[Any, Any] = {}
+        for op in ops:
+            if op.op == 'append':
+                handles[op.handle] = self.append_entity(file_name, op.list_path, op.entity)
+            elif op.op == 'replace':
+                self.replace_entity(file_name, op.list_path, handles.get(op.handle, op.handle), op.entity)
+            else:
+                self.delete_entity(file_name, op.list_path, handles.get(op.handle, op.handle))
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {'engine': self.name}
+
+    def close(self):
+        pass
+
+
+class JsonFileStorageEngine(StorageEngine):
+    """One file per collection under the data directory (the original layout).
+
+    Each collection is written with its codec from the registry (pretty-printed JSON unless
+    configured otherwise); reads accept any codec's file, so switching a collection's codec
+    takes effect on its next write.
+    """
+
+    name = 'json'
+
+    def __init__(self, data_dir: str = '_data', codecs: Optional[CodecRegistry] = None):
+        self.data_dir = data_dir
+        self.codecs = codecs or DEFAULT_CODECS
+
+    def path_for(self, file_name: str) -> str:
+        if file_name.startswith(self.data_dir + '/') or os.path.isabs(file_name):
+            return file_name
+        return os.path.join(self.data_dir, file_name)
+
+    def read_document(self, file_name: str) -> Any:
+        data_path = self.codecs.locate(self.path_for(file_name))
+        logger.info(f"Reading JSON file from: {data_path}")
+        with open(data_path, 'rb') as f:
+            return decode(f.read())
+
+    def write_document(self, file_name: str, data: Any):
+        path = self.path_for(file_name)
+        codec = self.codecs.codec_for(file_name)
+        data_path = path + codec.suffix
+        logger.info(f"Writing JSON file to: {data_path} ({codec.name})")
+        atomic_write_bytes(data_path, codec.encode(data))
+        # The collection may have been stored with another codec before
+        for stale in self.codecs.stale_variants(path):
+            os.remove(stale)
+        logger.info(f"Successfully wrote to: {data_path}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {'engine': self.name, 'codecs': self.codecs.get_stats()}
+
+
+_SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    file_name TEXT PRIMARY KEY,
+    envelope TEXT NOT NULL,
+    updated_at TEXT NOT NULL DEFAULT (datetime('now'))
+);
+CREATE TABLE IF NOT EXISTS entities (
+    rowid INTEGER PRIMARY KEY,
+    file_name TEXT NOT NULL,
+    list_path TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    uuid TEXT,
+    id TEXT,
+    id_num INTEGER,
+    short_name TEXT,
+    model_short_name TEXT,
+    body TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_entities_order ON entities(file_name, list_path, seq);
+CREATE INDEX IF NOT EXISTS ix_entities_uuid ON entities(file_name, list_path, uuid, seq);
+CREATE INDEX IF NOT EXISTS ix_entities_id ON entities(file_name, list_path, id, seq);
+CREATE INDEX IF NOT EXISTS ix_entities_id_num ON entities(file_name, list_path, id_num);
+CREATE INDEX IF NOT EXISTS ix_entities_short_name ON entities(file_name, list_path, short_name, seq);
+CREATE INDEX IF NOT EXISTS ix_entities_model_short_name ON entities(file_name, list_path, model_short_name, seq);
+"""
+
+# INDEXED_FIELDS -> entities column
+_FIELD_COLUMNS = {'uuid': 'uuid', 'id': 'id', 'shortName': 'short_name', 'modelShortName': 'model_short_name'}
+
+
+class SqliteStorageEngine(StorageEngine):
+    """Entities as rows of a SQLite database (WAL mode), with indexed uuid, id, shortName and modelShortName.
+
+    Each document is split into an envelope (everything except its entity lists) and one row
+    per entity; reads reassemble the original document shape. A document missing from the
+    database is imported from its JSON file in the data directory on first access.
+    """
+
+    name = 'sqlite'
+
+    def __init__(self, db_path: str, data_dir: str = '_data', codecs: Optional[CodecRegistry] = None):
+        self.db_path = db_path
+        self.seed = JsonFileStorageEngine(data_dir, codecs)
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        # One connection shared by the API's threads; every statement runs under the lock
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SQLITE_SCHEMA)
+        logger.info(f"SQLite storage engine opened at {db_path}")
+
+    def _transaction(self):
+        return _SqliteTransaction(self._conn, self._lock)
+
+    @staticmethod
+    def _row_values(entity: Dict[str, Any]) -> Tuple:
+        raw_id = entity.get('id')
+        id_num = raw_id if isinstance(raw_id, int) and not isinstance(raw_id, bool) else None
+        return (
+            _lookup_key(entity.get('uuid')),
+            _lookup_key(raw_id),
+            id_num,
+            _lookup_key(entity.get('shortName')),
+            _lookup_key(entity.get('modelShortName')),
+            json_codec.dumps_str(entity),
+        )
+
+    def _load_envelope(self, file_name: str) -> Tuple[Any, List[str]]:
+        """Envelope and entity-list paths of a document, importing it from JSON on first use."""
+        row = self._conn.execute("SELECT envelope FROM documents WHERE file_name = ?", (file_name,)).fetchone()
+        if row is None:
+            logger.info(f"Importing {file_name} into SQLite storage")
+            self._store_document(file_name, self.seed.read_document(file_name))
+            row = self._conn.execute("SELECT envelope FROM documents WHERE file_name = ?", (file_name,)).fetchone()
+        envelope = json_codec.loads(row[0])
+        return envelope['document'], envelope['lists']
+
+    def _save_envelope(self, file_name: str, document: Any, lists: List[str]):
+        self._conn.execute(
+            "INSERT INTO documents (file_name, envelope, updated_at) VALUES (?, ?, datetime('now')) "
+            "ON CONFLICT(file_name) DO UPDATE SET envelope = excluded.envelope, updated_at = excluded.updated_at",
+            (file_name, json_codec.dumps_str({'document': document, 'lists': lists}))
+        )
+
+    @staticmethod
+    def _envelope_of(data: Any, lists: List[str]) -> Any:
+        if lists == ['']:
+            return []
+        envelope = json_codec.clone(data)
+        for path in lists:
+            get_entity_list(envelope, path).clear()
+        return envelope
+
+    def _insert_list(self, file_name: str, path: str, items: List[Dict[str, Any]]):
+        self._conn.executemany(
+            "INSERT INTO entities (file_name, list_path, seq, uuid, id, id_num, short_name, model_short_name, body) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            [(file_name, path, seq, *self._row_values(entity)) for seq, entity in enumerate(items)]
+        )
+
+    def _store_document(self, file_name: str, data: Any):
+        lists = entity_list_paths(data)
+        with self._transaction():
+            self._conn.execute("DELETE FROM entities WHERE file_name = ?", (file_name,))
+            for path in lists:
+                self._insert_list(file_name, path, get_entity_list(data, path))
+            self._save_envelope(file_name, self._envelope_of(data, lists), lists)
+
+    def _update_document(self, file_name: str, data: Any, lists: List[str]):
+        """Rewrite only the rows whose entity changed; a list whose length changed is rewritten whole."""
+        with self._transaction():
+            for path in lists:
+                items = get_entity_list(data, path)
+                rows = self._conn.execute(
+                    "SELECT rowid, body FROM entities WHERE file_name = ? AND list_path = ? ORDER BY seq",
+                    (file_name, path)
+                ).fetchall()
+                if len(rows) != len(items):
+                    self._conn.execute("DELETE FROM entities WHERE file_name = ? AND list_path = ?", (file_name, path))
+                    self._insert_list(file_name, path, items)
+                    continue
+                changed = []
+                for (rowid, body), entity in zip(rows, items):
+                    values = self._row_values(entity)
+                    if values[-1] != body:
+                        changed.append((*values, rowid))
+                self._conn.executemany(
+                    "UPDATE entities SET uuid = ?, id = ?, id_num = ?, short_name = ?, model_short_name = ?, body = ? "
+                    "WHERE rowid = ?", changed
+                )
+            self._save_envelope(file_name, self._envelope_of(data, lists), lists)
+
+    def read_document(self, file_name: str) -> Any:
+        with self._lock:
+            document, lists = self._load_envelope(file_name)
+            for path in lists:
+                rows = self._conn.execute(
+                    "SELECT body FROM entities WHERE file_name = ? AND list_path = ? ORDER BY seq",
+                    (file_name, path)
+                ).fetchall()
+                items = [json_codec.loads(body) for (body,) in rows]
+                if path == '':
+                    document = items
+                else:
+                    get_entity_list(document, path, create=True)[:] = items
+            return document
+
+    def write_document(self, file_name: str, data: Any):
+        with self._lock:
+            lists = entity_list_paths(data)
+            row = self._conn.execute("SELECT envelope FROM documents WHERE file_name = ?", (file_name,)).fetchone()
+            if row is not None and json_codec.loads(row[0])['lists'] == lists:
+                self._update_document(file_name, data, lists)
+            else:
+                self._store_document(file_name, data)
+
+    def find_entities(self, file_name: str, list_path: str, field: str, value: Any) -> List[Tuple[Any, Dict[str, Any]]]:
+        key = _lookup_key(value)
+        if key is None:
+            return []
+        if field not in _FIELD_COLUMNS:
+            # No index: scan the list, still returning row ids as handles
+            with self._lock:
+                self._load_envelope(file_name)
+                rows = self._conn.execute(
+                    "SELECT rowid, body FROM entities WHERE file_name = ? AND list_path = ? ORDER BY seq",
+                    (file_name, list_path)
+                ).fetchall()
+            entities = ((rowid, json_codec.loads(body)) for rowid, body in rows)
+            return [(rowid, entity) for rowid, entity in entities if entity_matches(entity, field, value)]
+        with self._lock:
+            self._load_envelope(file_name)
+            rows = self._conn.execute(
+                f"SELECT rowid, body FROM entities WHERE file_name = ? AND list_path = ? AND {_FIELD_COLUMNS[field]} = ? ORDER BY seq",
+                (file_name, list_path, key)
+            ).fetchall()
+        return [(rowid, json_codec.loads(body)) for rowid, body in rows]
+
+    def entity_ids(self, file_name: str, list_path: str, prefix: str = '') -> List[Any]:
+        with self._lock:
+            self._load_envelope(file_name)
+            if prefix:
+                # Range scan on the id index; ids are stored lower-cased, so re-check the original case
+                low = prefix.lower()
+                rows = self._conn.execute(
+                    "SELECT body FROM entities WHERE file_name = ? AND list_path = ? AND id >= ? AND id < ?",
+                    (file_name, list_path, low, low + '\uffff')
+                ).fetchall()
+                ids = [json_codec.loads(body).get('id') for (body,) in rows]
+                return [i for i in ids if str(i).startswith(prefix)]
+            rows = self._conn.execute(
+                "SELECT body FROM entities WHERE file_name = ? AND list_path = ? AND id IS NOT NULL",
+                (file_name, list_path)
+            ).fetchall()
+            return [json_codec.loads(body).get('id') for (body,) in rows]
+
+    def max_int_id(self, file_name: str, list_path: str) -> int:
+        with self._lock:
+            self._load_envelope(file_name)
+            row = self._conn.execute(
+                "SELECT MAX(id_num) FROM entities WHERE file_name = ? AND list_path = ?",
+                (file_name, list_path)
+            ).fetchone()
+        return row[0] or 0
+
+    def append_entity(self, file_name: str, list_path: str, entity: Dict[str, Any]) -> Any:
+        with self._lock:
+            document, lists = self._load_envelope(file_name)
+            with self._transaction():
+                if list_path not in lists:
+                    get_entity_list(document, list_path, create=True)
+                    self._save_envelope(file_name, document, lists + [list_path])
+                cursor = self._conn.execute(
+                    "INSERT INTO entities (file_name, list_path, seq, uuid, id, id_num, short_name, model_short_name, body) "
+                    "SELECT ?, ?, COALESCE(MAX(seq), -1) + 1, ?, ?, ?, ?, ?, ? FROM entities WHERE file_name = ? AND list_path = ?",
+                    (file_name, list_path, *self._row_values(entity), file_name, list_path)
+                )
+            return cursor.lastrowid
+
+    def replace_entity(self, file_name: str, list_path: str, handle: Any, entity: Dict[str, Any]):
+        with self._lock, self._transaction():
+            cursor = self._conn.execute(
+                "UPDATE entities SET uuid = ?, id = ?, id_num = ?, short_name = ?, model_short_name = ?, body = ? "
+                "WHERE rowid = ? AND file_name = ? AND list_path = ?",
+                (*self._row_values(entity), handle, file_name, list_path)
+            )
+            if cursor.rowcount != 1:
+                raise KeyError(f"Entity {handle} not found in {file_name}:{list_path}")
+
+    def delete_entity(self, file_name: str, list_path: str, handle: Any):
+        with self._lock, self._transaction():
+            cursor = self._conn.execute(
+                "DELETE FROM entities WHERE rowid = ? AND file_name = ? AND list_path = ?",
+                (handle, file_name, list_path)
+            )
+            if cursor.rowcount != 1:
+                raise KeyError(f"Entity {handle} not found in {file_name}:{list_path}")
+
+    def entity_writes(self, file_name: str) -> bool:
+        return True
+
+    def apply_entity_ops(self, file_name: str, ops: List[EntityOp]):
+        # One SQLite transaction for the whole batch
+        with self._lock, self._transaction():
+            super().apply_entity_ops(file_name, ops)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            documents = self._conn.execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+            entities = self._conn.execute("SELECT COUNT(*) FROM entities").fetchone()[0]
+        return {'engine': self.name, 'db_path': self.db_path, 'documents': documents, 'entities': entities}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class _SqliteTransaction:
+    """BEGIN IMMEDIATE ... COMMIT/ROLLBACK on an autocommit connection; nested use joins the outer transaction."""
+
+    def __init__(self, conn: sqlite3.Connection, lock: threading.RLock):
+        self.conn = conn
+        self.lock = lock
+        self.outer = False
+
+    def __enter__(self):
+        self.lock.acquire()
+        self.outer = not self.conn.in_transaction
+        if self.outer:
+            self.conn.execute("BEGIN IMMEDIATE")
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            if self.outer:
+                self.conn.execute("ROLLBACK" if exc_type else "COMMIT")
+        finally:
+            self.lock.release()
+        return False
+
+
+def create_storage_engine(engine: str = 'json', data_dir: str = '_data', sqlite_path: Optional[str] = None,
+                          sharded_files: Optional[List[str]] = None, object_store=None,
+                          checkpoint_interval: float = 30.0, checkpoint_records: int = 1000,
+                          codecs: Optional[CodecRegistry] = None) -> StorageEngine:
+    """Build the configured storage engine ('json', 'sqlite', 'sharded' or 'journal').
+
+    The sharded engine keeps its objects in object_store (default: the local data directory);
+    the journal engine checkpoints every checkpoint_interval seconds or checkpoint_records records.
+    codecs chooses the encoding of the collection files in data_dir (json engine, journal
+    checkpoints, sqlite seed files).
+    """
+    engine = (engine or 'json').lower()
+    if engine == 'sqlite':
+        return SqliteStorageEngine(sqlite_path or os.path.join(data_dir, 'catalog.db'), data_dir, codecs)
+    if engine == 'sharded':
+        from .storage_sharded import LocalObjectStore, ShardedJsonStorageEngine
+        return ShardedJsonStorageEngine(object_store or LocalObjectStore(data_dir), sharded_files or [])
+    if engine == 'journal':
+        from .storage_journal import JournaledStorageEngine
+        return JournaledStorageEngine(data_dir, checkpoint_interval=checkpoint_interval,
+                                      checkpoint_records=checkpoint_records, codecs=codecs)
+    if engine != 'json':
+        logger.warning(f"Unknown storage engine '{engine}', using json")
+    return JsonFileStorageEngine(data_dir, codecs)
@@ -0,0 +1,290 @@
+"""
+Catalog documents in a remote backend (S3 or GitHub) behind a shared read-through cache.
+Each collection is one object named after its file (dataModels.json), as migrate_to_s3.py lays
+them out. The cache keeps the parsed document and its version (S3 / HTTP ETag) in memory and
+the raw bytes on disk (services/tiered_cache.py). Within the TTL reads are served from memory;
+after it a conditional GET (If-None-Match) revalidates the version and the object is downloaded
+again only if it changed. Replicas sharing a bucket therefore see each other's writes within one
+TTL without downloading every document per request, and a restarted replica starts from disk.
+"""
+
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Optional, Set, Tuple
+
+import requests
+
+from . import json_codec
+from .s3_service import NOT_MODIFIED
+from .storage_codecs import decode
+from .storage_engine import ReadOnlyStorage, StorageEngine, WriteConflict
+from .tiered_cache import CachedDocument, DiskTier, MemoryTier
+
+logger = logging.getLogger(__name__)
+
+_LAST_MODIFIED = 'last-modified:'
+
+
+class S3DocumentStore:
+    """Collection objects in the configured S3 bucket."""
+
+    name = 's3'
+    writable = True
+
+    def __init__(self, s3_service):
+        self.s3 = s3_service
+        self.origin = f"s3://{s3_service.bucket_name}"
+
+    def fetch(self, key: str, version: Optional[str] = None):
+        """(body, version) of an object, NOT_MODIFIED if it still has version, None if it does not exist."""
+        return self.s3.get_object_if_changed(key, version)
+
+    def put(self, key: str, body: bytes, if_match: Optional[str] = None) -> Optional[str]:
+        """Write an object (only if it still has if_match, else WriteConflict); returns its new version."""
+        return self.s3.put_object(key, body, if_match)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return self.s3.get_cache_stats()
+
+
+class GitHubDocumentStore:
+    """Collection files served read-only from a GitHub raw content URL."""
+
+    name = 'github'
+    writable = False
+
+    def __init__(self, base_url: str, timeout: float = 30.0):
+        self.base_url = base_url.rstrip('/')
+        self.origin = self.base_url
+        self.timeout = timeout
+
+    def fetch(self, key: str, version: Optional[str] = None):
+        # The version is the ETag, or Last-Modified (prefixed) for a server that sends no ETag
+        headers = {}
+        if version and version.startswith(_LAST_MODIFIED):
+            headers['If-Modified-Since'] = version[len(_LAST_MODIFIED):]
+        elif version:
+            headers['If-None-Match'] = version
+        response = requests.get(f"{self.base_url}/{key}", headers=headers, timeout=self.timeout)
+        if response.status_code == 304:
+            return NOT_MODIFIED
+        if response.status_code == 404:
+            return None
+        response.raise_for_status()
+        last_modified = response.headers.get('Last-Modified')
+        return response.content, response.headers.get('ETag') or (_LAST_MODIFIED + last_modified if last_modified else None)
+
+    def put(self, key: str, body: bytes, if_match: Optional[str] = None) -> Optional[str]:
+        raise ReadOnlyStorage(key)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {'base_url': self.base_url}
+
+
+class CachedDocumentStorageEngine(StorageEngine):
+    """Whole documents in a remote store, read through memory (L1) and disk (L2) cache tiers.
+
+    Each read gets its own copy of the cached document, so callers may change what they get.
+    Documents are served from memory for ttl seconds (or ttls[file_name]) and then revalidated
+    (ttl=0: every read revalidates, passthrough); refresh() revalidates one ahead of that, off the
+    request path (services/document_prefetcher.py). A document found only on disk, as after a restart, is served at
+    once and revalidated in the background. Writes through write_versioned() are conditional
+    on the version the document was read at, so replicas never overwrite each other's changes;
+    read_versioned() never returns a document the origin has not confirmed.
+    """
+
+    name = 'gateway'
+
+    def __init__(self, store, ttl: float = 5.0, memory_bytes: int = 64 * 1024 * 1024,
+                 disk_dir: Optional[str] = None, ttls: Optional[Dict[str, float]] = None):
+        self.store = store
+        self.writable = store.writable
+        self.ttl = ttl
+        self.ttls = dict(ttls or {})
+        self.memory = MemoryTier(memory_bytes)
+        self.disk = DiskTier(disk_dir, store.origin) if disk_dir else None
+        self._lock = threading.Lock()
+        self._refreshing: Set[str] = set()
+        self._refresher = ThreadPoolExecutor(max_workers=2, thread_name_prefix='cache-revalidate')
+        self.stats = {
+            'hits': 0,
+            'stale_hits': 0,
+            'revalidated': 0,
+            'misses': 0,
+            'background_refreshes': 0,
+            'prefetch_downloads': 0,
+            'prefetch_not_modified': 0,
+            'writes': 0,
+            'conflicts': 0,
+            'bytes_fetched': 0,
+        }
+        # Stores that switch all documents at once (a new GitHub commit) expire the whole cache
+        if hasattr(store, 'subscribe'):
+            store.subscribe(self.memory.expire)
+
+    def _count(self, key: str, amount: int = 1):
+        with self._lock:
+            self.stats[key] += amount
+
+    def _remember(self, file_name: str, body: bytes, version: Optional[str], checked: Optional[float]) -> CachedDocument:
+        entry = CachedDocument(decode(body), version, checked, len(body))
+        self.memory.put(file_name, entry)
+        return entry
+
+    def _fetched(self, file_name: str, fetched) -> CachedDocument:
+        self._count('misses')
+        return self._store_fetched(file_name, fetched)
+
+    def _store_fetched(self, file_name: str, fetched) -> CachedDocument:
+        if fetched is None:
+            self.invalidate(file_name)
+            raise FileNotFoundError(file_name)
+        body, version = fetched
+        self._count('bytes_fetched', len(body))
+        entry = self._remember(file_name, body, version, time.monotonic())
+        if self.disk is not None:
+            self.disk.put(file_name, body, version)
+        return entry
+
+    def _revalidate(self, file_name: str, entry: CachedDocument) -> CachedDocument:
+        fetched = self.store.fetch(file_name, entry.version)
+        if fetched is NOT_MODIFIED:
+            entry.checked = time.monotonic()
+            self._count('revalidated')
+            return entry
+        return self._fetched(file_name, fetched)
+
+    def _revalidate_in_background(self, file_name: str, entry: CachedDocument):
+        with self._lock:
+            if file_name in self._refreshing:
+                return
+            self._refreshing.add(file_name)
+        self._refresher.submit(self._background_revalidate, file_name, entry)
+
+    def _background_revalidate(self, file_name: str, entry: CachedDocument):
+        try:
+            self._revalidate(file_name, entry)
+            self._count('background_refreshes')
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            # The disk copy keeps being served (and retried) until the origin answers
+            logger.warning(f"Background revalidation of {file_name} failed: {e}")
+        finally:
+            with self._lock:
+                self._refreshing.discard(file_name)
+
+    def _entry(self, file_name: str, confirmed: bool = False) -> CachedDocument:
+        entry = self.memory.get(file_name)
+        if entry is None and self.disk is not None:
+            stored = self.disk.get(file_name)
+            if stored is not None:
+                # Not confirmed by the origin since this process started
+                entry = self._remember(file_name, stored[0], stored[1], None)
+        if entry is None:
+            return self._fetched(file_name, self.store.fetch(file_name))
+        if entry.checked is None and not confirmed:
+            self._count('stale_hits')
+            self._revalidate_in_background(file_name, entry)
+            return entry
+        if entry.checked is not None and time.monotonic() - entry.checked < self.ttl_for(file_name):
+            self._count('hits')
+            return entry
+        return self._revalidate(file_name, entry)
+
+    def ttl_for(self, file_name: str) -> float:
+        return self.ttls.get(file_name, self.ttl)
+
+    def expires_at(self, file_name: str) -> Optional[float]:
+        """time.monotonic() at which the cached copy needs revalidating (None: not cached or unconfirmed)."""
+        entry = self.memory.peek(file_name)
+        if entry is None or entry.checked is None:
+            return None
+        return entry.checked + self.ttl_for(file_name)
+
+    def refresh(self, file_name: str):
+        """Revalidate a document with the origin now, loading it if it is not cached.
+
+        Counted apart from request reads (prefetch_*), so hit_ratio stays what requests saw.
+        """
+        entry = self.memory.peek(file_name)
+        if entry is None and self.disk is not None:
+            stored = self.disk.get(file_name)
+            if stored is not None:
+                entry = self._remember(file_name, stored[0], stored[1], None)
+        fetched = self.store.fetch(file_name, entry.version if entry is not None else None)
+        if fetched is NOT_MODIFIED:
+            entry.checked = time.monotonic()
+            self._count('prefetch_not_modified')
+            return
+        self._count('prefetch_downloads')
+        self._store_fetched(file_name, fetched)
+
+    def read_document(self, file_name: str) -> Any:
+        return json_codec.clone(self._entry(file_name).document)
+
+    def read_versioned(self, file_name: str) -> Tuple[Any, Optional[str]]:
+        entry = self._entry(file_name, confirmed=True)
+        return json_codec.clone(entry.document), entry.version
+
+    def write_document(self, file_name: str, data: Any):
+        self.write_versioned(file_name, data, None)
+
+    def write_versioned(self, file_name: str, data: Any, version: Optional[str]):
+        body = json_codec.dumps(data, pretty=True)
+        try:
+            version = self.store.put(file_name, body, version)
+        except WriteConflict:
+            self._count('conflicts')
+            self.invalidate(file_name)
+            raise
+        self._count('writes')
+        logger.info(f"Wrote {file_name} to {self.store.name} (version {version})")
+        self._remember(file_name, body, version, time.monotonic())
+        if self.disk is not None:
+            self.disk.put(file_name, body, version)
+
+    def check_versions(self, versions: Dict[str, Optional[str]]):
+        for file_name, version in versions.items():
+            if version is None:
+                continue
+            fetched = self.store.fetch(file_name, version)
+            if fetched is not NOT_MODIFIED:
+                self._count('conflicts')
+                self.invalidate(file_name)
+                raise WriteConflict(file_name)
+
+    def version(self, file_name: str) -> Optional[str]:
+        """Version of the cached copy of a document (None if not cached)."""
+        entry = self.memory.peek(file_name)
+        return entry.version if entry is not None else None
+
+    def invalidate(self, file_name: Optional[str] = None):
+        self.memory.discard(file_name)
+        if self.disk is not None:
+            self.disk.discard(file_name)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self.stats)
+        served = stats['hits'] + stats['stale_hits'] + stats['revalidated']
+        reads = served + stats['misses']
+        stats['hit_ratio'] = round(served / reads, 3) if reads else 0
+        prefetches = stats['prefetch_downloads'] + stats['prefetch_not_modified']
+        origin_requests = stats['revalidated'] + stats['misses'] + prefetches
+        not_modified = stats['revalidated'] + stats['prefetch_not_modified']
+        stats['tiers'] = {
+            'memory': self.memory.get_stats(),
+            'disk': self.disk.get_stats() if self.disk is not None else None,
+            'origin': {
+                'requests': origin_requests,
+                'not_modified': not_modified,
+                'downloads': stats['misses'] + stats['prefetch_downloads'],
+                'not_modified_ratio': round(not_modified / origin_requests, 3) if origin_requests else 0,
+            },
+        }
+        return {'engine': self.name, 'backend': self.store.name, 'ttl_seconds': self.ttl,
+                'ttl_overrides': dict(self.ttls),
+                'cached_documents': self.memory.versions(), **stats, self.store.name: self.store.get_stats()}
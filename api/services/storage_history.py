@@ -0,0 +1,218 @@
+"""
+Version history of the catalog collections.
+Every committed version of a collection is kept as an immutable document that shares all
+unchanged parts with the previous version (see json_patch.apply_patch_shared), and is stored
+on disk as the JSON Patch from the previous version. Versions are numbered with the catalog
+version of the commit that produced them, so one number names a consistent catalog state.
+"""
+
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from . import json_codec
+from .json_patch import JsonPatchError, Patch, apply_patch_shared, make_patch
+from .storage_engine import EntityOp, entity_ops_patch
+from .storage_journal import _Journal
+
+logger = logging.getLogger(__name__)
+
+# (version, unix timestamp, document); documents are shared between versions and never mutated
+Version = Tuple[int, float, Any]
+
+
+def _clone(value: Any) -> Any:
+    return json_codec.clone(value)
+
+
+class _CollectionHistory:
+    def __init__(self, history_dir: str, file_name: str):
+        # history_dir/<file>.journal: a base record with the whole document, then one patch per version
+        self.log = _Journal(history_dir, file_name)
+        self.versions: List[Version] = []
+        self.lock = threading.Lock()
+        self.loaded = False
+
+    def load(self):
+        if self.loaded:
+            return
+        document = None
+        for record in self.log.records(repair=True):
+            if 'document' in record:
+                document = record['document']
+            else:
+                document = apply_patch_shared(document, record['patch'])
+            self.versions.append((record['seq'], record['ts'], document))
+        self.loaded = True
+
+    def prune(self, drop: int):
+        """Forget the oldest drop versions; the journal restarts from the oldest one kept."""
+        keep = self.versions[drop:]
+        base_seq, base_ts, base = keep[0]
+        records = [{'seq': base_seq, 'ts': base_ts, 'document': base}]
+        records.extend(record for record in self.log.records() if record['seq'] > base_seq)
+        self.log.rewrite(records)
+        self.versions = keep
+
+    def last_version(self) -> int:
+        if self.loaded:
+            return self.versions[-1][0] if self.versions else 0
+        records = self.log.records()
+        return records[-1]['seq'] if records else 0
+
+
+class VersionHistory:
+    """Per-collection version history kept in memory and in history_dir.
+
+    Each collection keeps at most keep_versions versions, and none superseded more than
+    keep_days ago (0: no limit); older ones are pruned in batches of a tenth of the limit,
+    so the journal is not rewritten on every commit.
+    """
+
+    def __init__(self, history_dir: str, exclude: Iterable[str] = (), keep_versions: int = 0, keep_days: float = 0):
+        self.history_dir = history_dir
+        self.exclude = set(exclude)
+        self.keep_versions = keep_versions
+        self.keep_days = keep_days
+        self.pruned = 0
+        os.makedirs(history_dir, exist_ok=True)
+        self._collections: Dict[str, _CollectionHistory] = {}
+        self._lock = threading.Lock()
+
+    def _collection(self, file_name: str) -> _CollectionHistory:
+        with self._lock:
+            history = self._collections.get(file_name)
+            if history is None:
+                history = self._collections[file_name] = _CollectionHistory(self.history_dir, file_name)
+            return history
+
+    def tracks(self, file_name: str) -> bool:
+        return file_name not in self.exclude
+
+    def last_version(self) -> int:
+        """The highest version recorded for any collection (the catalog version to resume from)."""
+        suffix = '.journal'
+        names = [name[:-len(suffix)] for name in os.listdir(self.history_dir) if name.endswith(suffix)]
+        return max((self._collection(name).last_version() for name in names), default=0)
+
+    def ensure_base(self, file_name: str, version: int, load_previous: Callable[[], Any]):
+        """Start the history of a collection before its first recorded commit: load_previous()
+        returns its document as of version (raises FileNotFoundError if it did not exist)."""
+        if not self.tracks(file_name):
+            return
+        history = self._collection(file_name)
+        with history.lock:
+            history.load()
+            if history.versions:
+                return
+            try:
+                previous = load_previous()
+            except FileNotFoundError:
+                previous = None
+            now = time.time()
+            history.log.append({'seq': version, 'ts': now, 'document': previous})
+            history.versions.append((version, now, previous))
+            logger.info(f"Started version history of {file_name} at version {version}")
+
+    def _append(self, history: _CollectionHistory, version: int, patch: Patch, document: Any):
+        now = time.time()
+        history.log.append({'seq': version, 'ts': now, 'patch': patch})
+        history.versions.append((version, now, document))
+        self._prune(history, now)
+
+    def _prune(self, history: _CollectionHistory, now: float):
+        versions = history.versions
+        drop = max(0, len(versions) - self.keep_versions) if self.keep_versions else 0
+        if self.keep_days:
+            cutoff = now - self.keep_days * 86400
+            # A version stays while its successor is recent, so the state at the cutoff is kept
+            while drop < len(versions) - 1 and versions[drop + 1][1] < cutoff:
+                drop += 1
+        if drop >= max(1, self.keep_versions // 10):
+            history.prune(drop)
+            self.pruned += drop
+
+    def record(self, file_name: str, version: int, document: Any):
+        """Add the version of a collection written by a commit (after ensure_base)."""
+        if not self.tracks(file_name):
+            return
+        history = self._collection(file_name)
+        with history.lock:
+            current = history.versions[-1][2]
+            # Cloned so the history never shares objects with the caller's document
+            patch = _clone(make_patch(current, document))
+            if patch:
+                self._append(history, version, patch, apply_patch_shared(current, patch))
+
+    def record_entity_ops(self, file_name: str, version: int, ops: List[EntityOp], load_current: Callable[[], Any]):
+        """Add the version of a collection a commit changed with entity ops (after ensure_base).
+
+        The patch is built from the ops alone, locating the changed entities by their previous
+        content; if the history does not match storage, the written document is diffed whole.
+        """
+        if not self.tracks(file_name):
+            return
+        history = self._collection(file_name)
+        with history.lock:
+            current = history.versions[-1][2]
+            try:
+                patch = _clone(entity_ops_patch(current, ops, by_value=True))
+                document = apply_patch_shared(current, patch)
+            except (LookupError, JsonPatchError) as e:
+                logger.warning(f"History of {file_name} does not match storage ({e}); recording the whole document")
+                patch = _clone(make_patch(current, load_current()))
+                document = apply_patch_shared(current, patch)
+            if patch:
+                self._append(history, version, patch, document)
+
+    def latest(self, file_name: str) -> Optional[Version]:
+        """The last recorded version of a collection, None if it has no history yet."""
+        if not self.tracks(file_name):
+            return None
+        history = self._collection(file_name)
+        with history.lock:
+            history.load()
+            return history.versions[-1] if history.versions else None
+
+    def versions(self, file_name: str) -> List[Version]:
+        history = self._collection(file_name)
+        with history.lock:
+            history.load()
+            return list(history.versions)
+
+    def version_at(self, file_name: str, version: Optional[int] = None,
+                   timestamp: Optional[float] = None) -> Optional[Version]:
+        """The collection as of a catalog version or a unix timestamp (the latest if neither is
+        given); None when the history does not reach back that far."""
+        found = None
+        for entry in self.versions(file_name):
+            if (version is not None and entry[0] > version) or (timestamp is not None and entry[1] > timestamp):
+                break
+            found = entry
+        return found
+
+    def diff(self, file_name: str, from_version: int, to_version: int) -> Optional[Patch]:
+        """JSON Patch from the collection at from_version to the collection at to_version."""
+        old = self.version_at(file_name, from_version)
+        new = self.version_at(file_name, to_version)
+        if old is None or new is None:
+            return None
+        return make_patch(old[2], new[2])
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            collections = list(self._collections.items())
+        return {
+            'history_dir': self.history_dir,
+            'keep_versions': self.keep_versions,
+            'keep_days': self.keep_days,
+            'pruned_versions': self.pruned,
+            'versions': {name: len(history.versions) for name, history in collections if history.loaded},
+        }
+
+    def close(self):
+        with self._lock:
+            for history in self._collections.values():
+                history.log.close()
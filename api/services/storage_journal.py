@@ -0,0 +1,317 @@
+"""
+Write-ahead journaled storage for the catalog documents.
+Each mutation is appended to a per-document journal as a JSON Patch record and fsync'd, then
+applied to the in-memory document; the full document is only rewritten by the background
+checkpointer. On startup a document is recovered from its last checkpoint plus the journal tail.
+"""
+
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from . import json_codec
+from .json_patch import Patch, apply_patch, apply_patch_shared, make_patch, pointer
+from .storage_codecs import CodecRegistry
+from .storage_engine import (EntityOp, JsonFileStorageEngine, StorageEngine, atomic_write_bytes, entity_matches,
+                             entity_ops_patch, get_entity_list)
+
+logger = logging.getLogger(__name__)
+
+
+def _clone(value: Any) -> Any:
+    return json_codec.clone(value)
+
+
+class _Journal:
+    """Append-only JSON-lines journal of one document plus its checkpoint."""
+
+    def __init__(self, journal_dir: str, file_name: str):
+        self.path = os.path.join(journal_dir, f"{file_name}.journal")
+        self.checkpoint_path = os.path.join(journal_dir, f"{file_name}.checkpoint")
+        self._handle = None
+
+    def append(self, record: Dict[str, Any]) -> int:
+        if self._handle is None:
+            self._handle = open(self.path, 'ab')
+        line = json_codec.dumps(record) + b'\n'
+        self._handle.write(line)
+        self._handle.flush()
+        os.fsync(self._handle.fileno())
+        return len(line)
+
+    def records(self, repair: bool = False) -> List[Dict[str, Any]]:
+        """Complete records in the journal; a torn last line from a crash is dropped
+        (and cut off the file when repair is set, so new appends start on a clean line)."""
+        if not os.path.exists(self.path):
+            return []
+        records = []
+        valid_size = 0
+        with open(self.path, 'rb') as f:
+            for line in f:
+                if not line.endswith(b'\n'):
+                    logger.warning(f"Ignoring incomplete record at the end of {self.path}")
+                    break
+                records.append(json_codec.loads(line))
+                valid_size += len(line)
+        if repair and valid_size < os.path.getsize(self.path):
+            with open(self.path, 'r+b') as f:
+                f.truncate(valid_size)
+                os.fsync(f.fileno())
+        return records
+
+    def truncate_through(self, seq: int):
+        """Drop records already covered by a checkpoint at seq."""
+        self.rewrite([r for r in self.records() if r['seq'] > seq])
+
+    def rewrite(self, records: List[Dict[str, Any]]):
+        """Replace the journal with records, atomically."""
+        self.close()
+        atomic_write_bytes(self.path, b''.join(
+            json_codec.dumps(record) + b'\n' for record in records
+        ))
+
+    def read_checkpoint(self) -> Optional[Tuple[int, Any]]:
+        if not os.path.exists(self.checkpoint_path):
+            return None
+        with open(self.checkpoint_path, 'rb') as f:
+            checkpoint = json_codec.loads(f.read())
+        return checkpoint['seq'], checkpoint['document']
+
+    def write_checkpoint(self, seq: int, document: Any):
+        # Sequence number and document in one file, so one atomic rename publishes both
+        checkpoint = {'seq': seq, 'created': datetime.now().isoformat(), 'document': document}
+        atomic_write_bytes(self.checkpoint_path, json_codec.dumps(checkpoint))
+
+    def close(self):
+        if self._handle is not None:
+            self._handle.close()
+            self._handle = None
+
+
+class _DocumentState:
+    def __init__(self, document: Any, seq: int, checkpoint_seq: int, journal: _Journal):
+        self.document = document
+        self.seq = seq
+        self.checkpoint_seq = checkpoint_seq
+        self.journal = journal
+        # Checkpoints serializing the current version outside the lock
+        self.pinned = 0
+
+
+class JournaledStorageEngine(StorageEngine):
+    """Documents held in memory, made durable by a per-document journal of JSON patches.
+
+    The journal and checkpoints live in journal_dir. Checkpoints also export the collection
+    file (in its configured codec) to the data directory, so other readers of _data (and the
+    json engine) see the same data, lagging by at most one checkpoint interval. They run on
+    the checkpointer thread only (every checkpoint_interval seconds, or as soon as a document
+    has checkpoint_records journal records), never on a writer's request.
+    """
+
+    name = 'journal'
+
+    def __init__(self, data_dir: str = '_data', journal_dir: Optional[str] = None,
+                 checkpoint_interval: float = 30.0, checkpoint_records: int = 1000,
+                 codecs: Optional[CodecRegistry] = None):
+        self.files = JsonFileStorageEngine(data_dir, codecs)
+        self.journal_dir = journal_dir or os.path.join(data_dir, '_journal')
+        os.makedirs(self.journal_dir, exist_ok=True)
+        self.checkpoint_interval = checkpoint_interval
+        self.checkpoint_records = checkpoint_records
+        self._lock = threading.RLock()
+        self._docs: Dict[str, _DocumentState] = {}
+        self.stats = {
+            'records_appended': 0,
+            'bytes_appended': 0,
+            'records_replayed': 0,
+            'checkpoints': 0,
+            'last_checkpoint': None,
+        }
+        self._stop = threading.Event()
+        # Set by a commit that takes a document past checkpoint_records
+        self._checkpoint_due = threading.Event()
+        # One checkpoint at a time (the checkpointer thread and close())
+        self._checkpoint_lock = threading.Lock()
+        self._checkpointer = None
+        if checkpoint_interval > 0 or checkpoint_records > 0:
+            self._checkpointer = threading.Thread(target=self._checkpoint_loop, name='storage-checkpointer', daemon=True)
+            self._checkpointer.start()
+
+    # -- recovery --------------------------------------------------------
+
+    def _state(self, file_name: str) -> _DocumentState:
+        state = self._docs.get(file_name)
+        if state is not None:
+            return state
+        journal = _Journal(self.journal_dir, file_name)
+        checkpoint = journal.read_checkpoint()
+        if checkpoint is not None:
+            checkpoint_seq, document = checkpoint
+        else:
+            checkpoint_seq, document = 0, self.files.read_document(file_name)
+        seq = checkpoint_seq
+        replayed = 0
+        for record in journal.records(repair=True):
+            if record['seq'] <= checkpoint_seq:
+                continue
+            document = apply_patch(document, record['patch'])
+            seq = record['seq']
+            replayed += 1
+        if replayed:
+            logger.info(f"Recovered {file_name}: replayed {replayed} journal records after checkpoint {checkpoint_seq}")
+            self.stats['records_replayed'] += replayed
+        state = _DocumentState(document, seq, checkpoint_seq, journal)
+        self._docs[file_name] = state
+        return state
+
+    # -- writes ----------------------------------------------------------
+
+    def _commit(self, file_name: str, state: _DocumentState, patch: Patch):
+        """Journal a patch durably, then apply it to the in-memory document."""
+        if not patch:
+            return
+        record = {'seq': state.seq + 1, 'ts': time.time(), 'patch': patch}
+        self.stats['bytes_appended'] += state.journal.append(record)
+        self.stats['records_appended'] += 1
+        state.seq += 1
+        # Copy-on-write while a checkpoint is serializing the current version outside the lock
+        apply = apply_patch_shared if state.pinned else apply_patch
+        state.document = apply(state.document, _clone(patch))
+        if self.checkpoint_records and state.seq - state.checkpoint_seq >= self.checkpoint_records:
+            self._checkpoint_due.set()
+
+    def read_document(self, file_name: str) -> Any:
+        with self._lock:
+            return _clone(self._state(file_name).document)
+
+    def write_document(self, file_name: str, data: Any):
+        with self._lock:
+            try:
+                state = self._state(file_name)
+            except FileNotFoundError:
+                # New document: write it out directly and start journaling from there
+                self.files.write_document(file_name, data)
+                return
+            self._commit(file_name, state, make_patch(state.document, data))
+
+    def find_entities(self, file_name: str, list_path: str, field: str, value: Any) -> List[Tuple[Any, Dict[str, Any]]]:
+        with self._lock:
+            items = get_entity_list(self._state(file_name).document, list_path) or []
+            return [(i, _clone(item)) for i, item in enumerate(items) if entity_matches(item, field, value)]
+
+    def entity_ids(self, file_name: str, list_path: str, prefix: str = '') -> List[Any]:
+        with self._lock:
+            items = get_entity_list(self._state(file_name).document, list_path) or []
+            ids = [item.get('id') for item in items if item.get('id') is not None]
+            return [i for i in ids if str(i).startswith(prefix)] if prefix else ids
+
+    @staticmethod
+    def _list_tokens(list_path: str) -> List[str]:
+        return list_path.split('.') if list_path else []
+
+    def append_entity(self, file_name: str, list_path: str, entity: Dict[str, Any]) -> Any:
+        with self._lock:
+            state = self._state(file_name)
+            items = get_entity_list(state.document, list_path)
+            if items is None:
+                # Let the generic path create the missing list
+                patch = make_patch(state.document, self._with_list(state.document, list_path, entity))
+                self._commit(file_name, state, patch)
+                return 0
+            self._commit(file_name, state, [{'op': 'add', 'path': pointer(*self._list_tokens(list_path), '-'), 'value': entity}])
+            return len(get_entity_list(state.document, list_path)) - 1
+
+    @staticmethod
+    def _with_list(document: Any, list_path: str, entity: Dict[str, Any]) -> Any:
+        updated = _clone(document)
+        get_entity_list(updated, list_path, create=True).append(entity)
+        return updated
+
+    def replace_entity(self, file_name: str, list_path: str, handle: Any, entity: Dict[str, Any]):
+        with self._lock:
+            state = self._state(file_name)
+            current = (get_entity_list(state.document, list_path) or [])[handle]
+            # Journal only the fields that changed inside the entity
+            patch = make_patch(current, entity)
+            prefix = pointer(*self._list_tokens(list_path), handle)
+            self._commit(file_name, state, [{**op, 'path': prefix + op['path']} for op in patch])
+
+    def delete_entity(self, file_name: str, list_path: str, handle: Any):
+        with self._lock:
+            state = self._state(file_name)
+            self._commit(file_name, state, [{'op': 'remove', 'path': pointer(*self._list_tokens(list_path), handle)}])
+
+    def entity_writes(self, file_name: str) -> bool:
+        return True
+
+    def apply_entity_ops(self, file_name: str, ops: List[EntityOp]):
+        # Handles are list indexes from before the batch; one journal record for all of its changes
+        with self._lock:
+            state = self._state(file_name)
+            self._commit(file_name, state, entity_ops_patch(state.document, ops))
+
+    # -- checkpoints -----------------------------------------------------
+
+    def _checkpoint(self, file_name: str, state: _DocumentState):
+        # The current version is pinned (later commits copy-on-write instead of changing it), so it
+        # is serialized and written without holding the lock; writers keep journaling meanwhile
+        with self._lock:
+            seq, document = state.seq, state.document
+            state.pinned += 1
+        try:
+            state.journal.write_checkpoint(seq, document)
+            self.files.write_document(file_name, document)
+        finally:
+            with self._lock:
+                state.pinned -= 1
+        with self._lock:
+            state.journal.truncate_through(seq)
+            state.checkpoint_seq = seq
+            self.stats['checkpoints'] += 1
+            self.stats['last_checkpoint'] = datetime.now().isoformat()
+        logger.info(f"Checkpointed {file_name} at journal seq {seq}")
+
+    def checkpoint(self, file_name: Optional[str] = None):
+        """Checkpoint one document (or every document with journaled changes)."""
+        with self._checkpoint_lock:
+            with self._lock:
+                due = [(name, state) for name, state in self._docs.items()
+                       if (file_name is None or name == file_name) and state.seq > state.checkpoint_seq]
+            for name, state in due:
+                self._checkpoint(name, state)
+
+    def _checkpoint_loop(self):
+        while not self._stop.is_set():
+            self._checkpoint_due.wait(self.checkpoint_interval if self.checkpoint_interval > 0 else None)
+            self._checkpoint_due.clear()
+            if self._stop.is_set():
+                break
+            try:
+                self.checkpoint()
+            except Exception as e:
+                logger.error(f"Storage checkpoint failed: {e}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            pending = {name: state.seq - state.checkpoint_seq for name, state in self._docs.items()
+                       if state.seq > state.checkpoint_seq}
+        return {
+            'engine': self.name,
+            'journal_dir': self.journal_dir,
+            'checkpoint_interval_seconds': self.checkpoint_interval,
+            'pending_records': pending,
+            **self.stats
+        }
+
+    def close(self):
+        self._stop.set()
+        self._checkpoint_due.set()
+        if self._checkpointer is not None:
+            self._checkpointer.join(timeout=5)
+        self.checkpoint()
+        with self._lock:
+            for state in self._docs.values():
+                state.journal.close()
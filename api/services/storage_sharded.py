@@ -0,0 +1,445 @@
+"""
+One-file-per-entity storage for the larger _data collections.
+A sharded collection such as dataModels.json lives in a directory (or S3 prefix) named after
+it: a small _manifest.json holding the document envelope and the entity order, plus one JSON
+object per entity keyed by uuid. Updating one model rewrites that model's file only; adding or
+removing one also rewrites the manifest. Other documents stay single objects.
+"""
+
+import hashlib
+import logging
+import os
+import re
+import threading
+from typing import Any, Container, Dict, Iterable, List, Optional, Tuple
+
+from . import json_codec
+from .s3_service import NOT_MODIFIED
+from .storage_engine import (StorageEngine, WriteConflict, atomic_write_bytes, entity_list_paths, entity_matches,
+                             get_entity_list)
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_NAME = '_manifest.json'
+
+# Directory used for documents whose root is the entity list (datasets.json, pipelines.json)
+ROOT_LIST_DIR = '_items'
+
+_UNSAFE_KEY_CHARS = re.compile(r'[^a-z0-9._-]+')
+
+
+class LocalObjectStore:
+    """Objects as files under a root directory; writes are atomic (temp file + rename)."""
+
+    name = 'local'
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, *key.split('/'))
+
+    def get(self, key: str) -> Optional[bytes]:
+        try:
+            with open(self._path(key), 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def fetch(self, key: str, version: Optional[Tuple[int, int]] = None):
+        """(body, version), NOT_MODIFIED if the object is still at version, None if it does not exist."""
+        current = self.version(key)
+        if current is None:
+            return None
+        if current == version:
+            return NOT_MODIFIED
+        body = self.get(key)
+        return (body, current) if body is not None else None
+
+    def put(self, key: str, body: bytes, if_match: Optional[Tuple[int, int]] = None) -> Optional[Tuple[int, int]]:
+        """Write an object (only if it is still at version if_match, when given); returns its new version."""
+        if if_match is not None and self.version(key) != if_match:
+            raise WriteConflict(key)
+        atomic_write_bytes(self._path(key), body)
+        return self.version(key)
+
+    def delete(self, key: str):
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def version(self, key: str) -> Optional[Tuple[int, int]]:
+        """Cheap change marker used to validate cached objects (None if missing)."""
+        try:
+            st = os.stat(self._path(key))
+        except FileNotFoundError:
+            return None
+        return (st.st_mtime_ns, st.st_size)
+
+    def list(self, prefix: str) -> List[str]:
+        base = self._path(prefix.rstrip('/'))
+        keys = []
+        for dirpath, _, filenames in os.walk(base):
+            for filename in filenames:
+                if filename.endswith('.json'):
+                    rel = os.path.relpath(os.path.join(dirpath, filename), self.root)
+                    keys.append(rel.replace(os.sep, '/'))
+        return keys
+
+
+class S3ObjectStore:
+    """Objects in the configured S3 bucket (keys relative to the bucket root, as migrate_to_s3.py lays them out).
+
+    Versions are ETags, taken from the service's cached bucket listing (S3_LIST_CACHE_SECONDS),
+    so another replica's writes are seen within one listing interval.
+    """
+
+    name = 's3'
+
+    def __init__(self, s3_service):
+        self.s3 = s3_service
+
+    def get(self, key: str) -> Optional[bytes]:
+        fetched = self.s3.get_object_if_changed(key)
+        return fetched[0] if fetched is not None else None
+
+    def fetch(self, key: str, version: Optional[str] = None):
+        return self.s3.get_object_if_changed(key, version)
+
+    def put(self, key: str, body: bytes, if_match: Optional[str] = None) -> Optional[str]:
+        try:
+            return self.s3.put_object(key, body, if_match)
+        except WriteConflict:
+            # The listing our versions came from is out of date
+            self.s3.invalidate_manifest()
+            raise
+
+    def delete(self, key: str):
+        self.s3.delete_object(key)
+
+    def version(self, key: str) -> Optional[str]:
+        return self.s3.object_etag(key)
+
+    def list(self, prefix: str) -> List[str]:
+        return [key for key in (self.s3.list_files(prefix) or []) if key.endswith('.json')]
+
+
+def _encode(data: Any) -> bytes:
+    return json_codec.dumps(data, pretty=True)
+
+
+def collection_dir(file_name: str) -> str:
+    return file_name[:-len('.json')] if file_name.endswith('.json') else file_name
+
+
+def entity_key(entity: Dict[str, Any], taken: Container[str] = ()) -> str:
+    """File-safe key for an entity: its uuid, else its id, else its name; suffixed when already taken."""
+    raw = entity.get('uuid') or entity.get('id') or entity.get('shortName') or entity.get('name') or 'item'
+    base = _UNSAFE_KEY_CHARS.sub('_', str(raw).strip().lower()).strip('._') or 'item'
+    key, n = base, 2
+    while key in taken:
+        key = f"{base}-{n}"
+        n += 1
+    return key
+
+
+class ShardedJsonStorageEngine(StorageEngine):
+    """Sharded layout for the configured collections; every other document is one object.
+
+    Entity handles are entity keys. Collection reads are assembled from an in-process cache
+    of the entity objects, revalidated against the store's change markers, so an unchanged
+    entity is never re-read. Every object write is conditional on the version last seen here,
+    so a write racing another replica's raises WriteConflict instead of overwriting it.
+    """
+
+    name = 'sharded'
+
+    def __init__(self, store, sharded_files: Iterable[str]):
+        self.store = store
+        self.sharded_files = set(sharded_files)
+        self._lock = threading.RLock()
+        # object key -> (version, raw bytes, parsed value)
+        self._cache: Dict[str, Tuple[Any, bytes, Any]] = {}
+        self.stats = {'object_reads': 0, 'object_writes': 0, 'object_deletes': 0, 'cache_hits': 0, 'conflicts': 0}
+
+    # -- object access -------------------------------------------------
+
+    def _get(self, key: str) -> Optional[Tuple[bytes, Any]]:
+        """Raw bytes and parsed value of an object, served from the cache while it is current."""
+        version = self.store.version(key)
+        cached = self._cache.get(key)
+        if cached is not None and cached[0] == version:
+            self.stats['cache_hits'] += 1
+            return cached[1], cached[2]
+        fetched = self.store.fetch(key, cached[0] if cached is not None else None)
+        self.stats['object_reads'] += 1
+        if fetched is NOT_MODIFIED:
+            self.stats['cache_hits'] += 1
+            return cached[1], cached[2]
+        if fetched is None:
+            self._cache.pop(key, None)
+            return None
+        body, version = fetched
+        value = json_codec.loads(body)
+        self._cache[key] = (version, body, value)
+        return body, value
+
+    def _version(self, key: str) -> Any:
+        """Version of the object as last read or written here (None if not cached)."""
+        cached = self._cache.get(key)
+        return cached[0] if cached is not None else None
+
+    def _put(self, key: str, value: Any):
+        """Write an object, only if it is still at the version last read or written here
+        (unconditionally if it is not cached); another writer's change raises WriteConflict."""
+        body = _encode(value)
+        cached = self._cache.get(key)
+        if cached is not None and cached[1] == body:
+            return
+        try:
+            version = self.store.put(key, body, cached[0] if cached is not None else None)
+        except WriteConflict:
+            self.stats['conflicts'] += 1
+            self._cache.pop(key, None)
+            raise
+        self.stats['object_writes'] += 1
+        self._cache[key] = (version, body, json_codec.loads(body))
+
+    def _delete(self, key: str):
+        self.store.delete(key)
+        self.stats['object_deletes'] += 1
+        self._cache.pop(key, None)
+
+    # -- layout ----------------------------------------------------------
+
+    def is_sharded(self, file_name: str) -> bool:
+        return file_name in self.sharded_files
+
+    def entity_writes(self, file_name: str) -> bool:
+        return self.is_sharded(file_name)
+
+    @staticmethod
+    def _manifest_key(file_name: str) -> str:
+        return f"{collection_dir(file_name)}/{MANIFEST_NAME}"
+
+    @staticmethod
+    def _entity_object_key(file_name: str, list_path: str, key: str) -> str:
+        return f"{collection_dir(file_name)}/{list_path or ROOT_LIST_DIR}/{key}.json"
+
+    def _manifest(self, file_name: str) -> Optional[Dict[str, Any]]:
+        hit = self._get(self._manifest_key(file_name))
+        return hit[1] if hit else None
+
+    def _write_manifest(self, file_name: str, envelope: Any, lists: Dict[str, List[str]]):
+        self._put(self._manifest_key(file_name), {'file': file_name, 'document': envelope, 'lists': lists})
+
+    def _entity(self, file_name: str, list_path: str, key: str) -> Tuple[bytes, Dict[str, Any]]:
+        hit = self._get(self._entity_object_key(file_name, list_path, key))
+        if hit is None:
+            raise FileNotFoundError(f"Missing entity object {key} in {file_name}:{list_path}")
+        return hit
+
+    # -- documents -------------------------------------------------------
+
+    def read_document(self, file_name: str) -> Any:
+        with self._lock:
+            manifest = self._manifest(file_name) if self.is_sharded(file_name) else None
+            if manifest is None:
+                # Not sharded (or not converted yet): the document is a single object
+                hit = self._get(file_name)
+                if hit is None:
+                    raise FileNotFoundError(file_name)
+                return json_codec.loads(hit[0])
+
+            document = json_codec.clone(manifest['document'])
+            for path, keys in manifest['lists'].items():
+                # Fresh copies from the cached bytes, so callers can mutate what they get
+                items = [json_codec.loads(self._entity(file_name, path, key)[0]) for key in keys]
+                if path == '':
+                    document = items
+                else:
+                    get_entity_list(document, path, create=True)[:] = items
+            return document
+
+    def _document_version(self, file_name: str) -> Optional[str]:
+        """Version of a document as last read: its object's, or for a sharded collection a digest
+        of the manifest's and every entity object's (an entity write leaves the manifest alone)."""
+        manifest = self._cache.get(self._manifest_key(file_name)) if self.is_sharded(file_name) else None
+        if manifest is None:
+            version = self._version(file_name)
+            return str(version) if version is not None else None
+        versions = [manifest[0]] + [self._version(self._entity_object_key(file_name, path, key))
+                                    for path, keys in manifest[2]['lists'].items() for key in keys]
+        return hashlib.sha1(repr(versions).encode('utf-8')).hexdigest()
+
+    def read_versioned(self, file_name: str) -> Tuple[Any, Optional[str]]:
+        with self._lock:
+            return self.read_document(file_name), self._document_version(file_name)
+
+    def write_versioned(self, file_name: str, data: Any, version: Optional[str]):
+        with self._lock:
+            self.check_versions({file_name: version})
+            self.write_document(file_name, data)
+
+    def check_versions(self, versions: Dict[str, Optional[str]]):
+        with self._lock:
+            for file_name, version in versions.items():
+                if version is None:
+                    continue
+                try:
+                    self.read_document(file_name)
+                except FileNotFoundError:
+                    pass
+                if self._document_version(file_name) != version:
+                    self.stats['conflicts'] += 1
+                    raise WriteConflict(file_name)
+
+    def write_document(self, file_name: str, data: Any):
+        with self._lock:
+            if not self.is_sharded(file_name):
+                self._put(file_name, data)
+                return
+
+            old = self._manifest(file_name)
+            old_keys = {(path, key) for path, keys in (old or {}).get('lists', {}).items() for key in keys}
+            paths = entity_list_paths(data)
+            if paths == ['']:
+                envelope = []
+            else:
+                envelope = json_codec.clone(data)
+                for path in paths:
+                    get_entity_list(envelope, path).clear()
+
+            lists = {}
+            for path in paths:
+                keys, taken = [], set()
+                for entity in get_entity_list(data, path):
+                    key = entity_key(entity, taken)
+                    keys.append(key)
+                    taken.add(key)
+                    # Unchanged entities serialize to the cached bytes and are skipped by _put
+                    self._put(self._entity_object_key(file_name, path, key), entity)
+                lists[path] = keys
+
+            self._write_manifest(file_name, envelope, lists)
+            for path, key in old_keys - {(path, key) for path, keys in lists.items() for key in keys}:
+                self._delete(self._entity_object_key(file_name, path, key))
+
+    # -- entities --------------------------------------------------------
+
+    def _sharded_list(self, file_name: str, list_path: str) -> Optional[Tuple[Dict[str, Any], List[str]]]:
+        if not self.is_sharded(file_name):
+            return None
+        manifest = self._manifest(file_name)
+        if manifest is None:
+            # Convert on first entity access so later writes only touch one object
+            logger.info(f"Converting {file_name} to the sharded layout")
+            self.write_document(file_name, self.read_document(file_name))
+            manifest = self._manifest(file_name)
+        return manifest, manifest['lists'].get(list_path, [])
+
+    def find_entities(self, file_name: str, list_path: str, field: str, value: Any) -> List[Tuple[Any, Dict[str, Any]]]:
+        with self._lock:
+            sharded = self._sharded_list(file_name, list_path)
+            if sharded is None:
+                return super().find_entities(file_name, list_path, field, value)
+            _, keys = sharded
+            matches = []
+            for key in keys:
+                body, entity = self._entity(file_name, list_path, key)
+                if entity_matches(entity, field, value):
+                    matches.append((key, json_codec.loads(body)))
+            return matches
+
+    def entity_ids(self, file_name: str, list_path: str, prefix: str = '') -> List[Any]:
+        with self._lock:
+            sharded = self._sharded_list(file_name, list_path)
+            if sharded is None:
+                return super().entity_ids(file_name, list_path, prefix)
+            ids = [self._entity(file_name, list_path, key)[1].get('id') for key in sharded[1]]
+            ids = [i for i in ids if i is not None]
+            return [i for i in ids if str(i).startswith(prefix)] if prefix else ids
+
+    def append_entity(self, file_name: str, list_path: str, entity: Dict[str, Any]) -> Any:
+        with self._lock:
+            sharded = self._sharded_list(file_name, list_path)
+            if sharded is None:
+                return super().append_entity(file_name, list_path, entity)
+            manifest, keys = sharded
+            key = entity_key(entity, set(keys))
+            # Entity object first, then the manifest that references it
+            self._put(self._entity_object_key(file_name, list_path, key), entity)
+            lists = dict(manifest['lists'])
+            lists[list_path] = keys + [key]
+            document = manifest['document']
+            if list_path not in manifest['lists'] and list_path != '':
+                document = json_codec.clone(document)
+                get_entity_list(document, list_path, create=True)
+            self._write_manifest(file_name, document, lists)
+            return key
+
+    def replace_entity(self, file_name: str, list_path: str, handle: Any, entity: Dict[str, Any]):
+        with self._lock:
+            sharded = self._sharded_list(file_name, list_path)
+            if sharded is None:
+                return super().replace_entity(file_name, list_path, handle, entity)
+            if handle not in sharded[1]:
+                raise KeyError(f"Entity {handle} not found in {file_name}:{list_path}")
+            self._put(self._entity_object_key(file_name, list_path, handle), entity)
+
+    def delete_entity(self, file_name: str, list_path: str, handle: Any):
+        with self._lock:
+            sharded = self._sharded_list(file_name, list_path)
+            if sharded is None:
+                return super().delete_entity(file_name, list_path, handle)
+            manifest, keys = sharded
+            if handle not in keys:
+                raise KeyError(f"Entity {handle} not found in {file_name}:{list_path}")
+            lists = dict(manifest['lists'])
+            lists[list_path] = [key for key in keys if key != handle]
+            # Manifest first: a crash in between leaves an unreferenced object, not a dangling key
+            self._write_manifest(file_name, manifest['document'], lists)
+            self._delete(self._entity_object_key(file_name, list_path, handle))
+
+    # -- conversion ------------------------------------------------------
+
+    def shard(self, file_name: str, remove_source: bool = False) -> int:
+        """Convert a monolithic document to the sharded layout. Returns the number of entities written."""
+        with self._lock:
+            hit = self._get(file_name)
+            if hit is None:
+                raise FileNotFoundError(file_name)
+            self.sharded_files.add(file_name)
+            self.write_document(file_name, hit[1])
+            if remove_source:
+                self._delete(file_name)
+            return sum(len(keys) for keys in self._manifest(file_name)['lists'].values())
+
+    def unshard(self, file_name: str, remove_shards: bool = False) -> int:
+        """Write a sharded collection back as one monolithic document. Returns the number of entities."""
+        with self._lock:
+            manifest = self._manifest(file_name)
+            if manifest is None:
+                raise FileNotFoundError(self._manifest_key(file_name))
+            document = self.read_document(file_name)
+            body = _encode(document)
+            self.store.put(file_name, body)
+            self.stats['object_writes'] += 1
+            self._cache.pop(file_name, None)
+            if remove_shards:
+                for path, keys in manifest['lists'].items():
+                    for key in keys:
+                        self._delete(self._entity_object_key(file_name, path, key))
+                self._delete(self._manifest_key(file_name))
+                self.sharded_files.discard(file_name)
+            return sum(len(keys) for keys in manifest['lists'].values())
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'engine': self.name,
+            'store': self.store.name,
+            'sharded_files': sorted(self.sharded_files),
+            'cached_objects': len(self._cache),
+            **self.stats
+        }
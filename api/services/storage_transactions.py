@@ -0,0 +1,284 @@
+"""
+Atomic multi-collection commits and snapshot reads for the catalog documents.
+A commit that changes several collections first records all of their new documents (or entity
+changes) in a commit record, then writes them, then bumps the published version; a crash in
+between is rolled forward from the record on startup. Readers pin a version with snapshot() and keep
+seeing the documents as of that version while later commits are published.
+"""
+
+import logging
+import os
+import threading
+import weakref
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Set
+
+from . import json_codec
+from .json_patch import apply_patch
+from .storage_engine import EntityOp, StorageEngine, atomic_write_bytes, entity_ops_patch
+from .storage_history import VersionHistory
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+
+def _clone(value: Any) -> Any:
+    return json_codec.clone(value)
+
+
+class Snapshot:
+    """Read-only view of the catalog as of one published version.
+
+    The version is pinned by the first read. Documents are read from storage the first time
+    they are asked for and kept for the life of the snapshot; a commit that changes a document
+    a pinned snapshot has not read yet hands it the previous version first, so every read sees
+    the same version of the whole catalog. That previous version is shared by every snapshot
+    it is handed to, so it is copied on read, once per snapshot even with copy=False.
+    """
+
+    def __init__(self, manager: 'TransactionManager'):
+        self._manager = manager
+        self.version: Optional[int] = None
+        self._documents: Dict[str, Any] = {}
+        # Documents shared with other snapshots, copied before the first uncopied read
+        self._shared: Set[str] = set()
+
+    def read_document(self, file_name: str, copy: bool = True) -> Any:
+        """The document as of this snapshot; with copy=False the snapshot's own copy is returned,
+        for a caller that owns the snapshot and will not change it unintentionally."""
+        document = self._documents.get(file_name, None)
+        if file_name not in self._documents:
+            document = self._manager._load(self, file_name)
+        if document is _MISSING:
+            raise FileNotFoundError(file_name)
+        if copy:
+            return _clone(document)
+        if file_name in self._shared:
+            document = self._own(file_name, document)
+        return document
+
+    def _own(self, file_name: str, shared: Any) -> Any:
+        document = _clone(shared)
+        with self._manager._lock:
+            if file_name not in self._shared or self._documents.get(file_name) is not shared:
+                return self._documents.get(file_name, document)
+            self._shared.discard(file_name)
+            self._documents[file_name] = document
+            return document
+
+    def forget(self, file_name: str):
+        """Drop a document so the next read sees the latest version (read-your-writes after a commit)."""
+        with self._manager._lock:
+            self._documents.pop(file_name, None)
+            self._shared.discard(file_name)
+
+    def close(self):
+        self._manager._release(self)
+
+    def __enter__(self) -> 'Snapshot':
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class TransactionManager:
+    """Publishes commits of one or more documents atomically on top of a storage engine.
+
+    The commit record (log_dir/commit.pending) is the manifest of an in-flight multi-document
+    commit: it is written atomically before any document changes and removed once all of them
+    are written. Single-document commits skip it, since the engines already replace one
+    document atomically. Without a log_dir there is no commit record: an interrupted
+    multi-document commit is not rolled forward. With a version history, every committed document is also recorded
+    there under the commit's version, and versions continue from the history after a restart.
+    """
+
+    def __init__(self, storage: StorageEngine, log_dir: Optional[str], history: Optional[VersionHistory] = None):
+        self.storage = storage
+        self.history = history
+        self.log_dir = log_dir
+        self.pending_path = os.path.join(log_dir, 'commit.pending') if log_dir else None
+        if log_dir:
+            os.makedirs(log_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._snapshots: 'weakref.WeakSet[Snapshot]' = weakref.WeakSet()
+        self.version = history.last_version() if history is not None else 0
+        self.stats = {
+            'commits': 0,
+            'multi_document_commits': 0,
+            'recovered_commits': 0,
+            'snapshot_copies': 0,
+        }
+        self.recover()
+
+    # -- snapshots -------------------------------------------------------
+
+    def snapshot(self) -> Snapshot:
+        """A snapshot pinned to the version current at its first read; close it (or use it as a
+        context manager) when done."""
+        with self._lock:
+            snapshot = Snapshot(self)
+            self._snapshots.add(snapshot)
+            return snapshot
+
+    def _release(self, snapshot: Snapshot):
+        with self._lock:
+            self._snapshots.discard(snapshot)
+            snapshot._documents.clear()
+            snapshot._shared.clear()
+
+    def _load(self, snapshot: Snapshot, file_name: str) -> Any:
+        if snapshot.version is None:
+            with self._lock:
+                if snapshot.version is None:
+                    snapshot.version = self.version
+        try:
+            document = self.storage.read_document(file_name)
+        except FileNotFoundError:
+            document = _MISSING
+        with self._lock:
+            # A commit may have handed over the previous version while we were reading
+            return snapshot._documents.setdefault(file_name, document)
+
+    def _current_document(self, file_name: str) -> Any:
+        """The document as last committed, not to be changed: the version history's own (shared)
+        copy where it has one, so there is no storage read."""
+        latest = self.history.latest(file_name) if self.history is not None else None
+        if latest is not None:
+            return _MISSING if latest[2] is None else latest[2]
+        try:
+            return self.storage.read_document(file_name)
+        except FileNotFoundError:
+            return _MISSING
+
+    def _unread(self, file_name: str):
+        return [s for s in self._snapshots if s.version is not None and file_name not in s._documents]
+
+    def _previous_documents(self, file_names) -> Dict[str, Any]:
+        """Documents about to change that pinned snapshots have not read yet, loaded before the
+        commit takes the lock (commits of one document are serialized, so they cannot change)."""
+        with self._lock:
+            needed = [file_name for file_name in file_names if self._unread(file_name)]
+        return {file_name: self._current_document(file_name) for file_name in needed}
+
+    def _preserve(self, file_names, previous: Dict[str, Any]):
+        """Give live snapshots that have not read a document yet its version before this commit,
+        one document shared by all of them."""
+        for file_name in file_names:
+            readers = self._unread(file_name)
+            if not readers:
+                continue
+            document = previous[file_name] if file_name in previous else self._current_document(file_name)
+            for snapshot in readers:
+                snapshot._documents[file_name] = document
+                if document is not _MISSING:
+                    snapshot._shared.add(file_name)
+            self.stats['snapshot_copies'] += 1
+
+    # -- commits ---------------------------------------------------------
+
+    def commit(self, documents: Dict[str, Any], read_versions: Optional[Dict[str, Optional[str]]] = None,
+               entity_ops: Optional[Dict[str, List[EntityOp]]] = None):
+        """Write new versions of one or more documents and publish them as one version.
+
+        documents are written whole; entity_ops are replayed through the engine's entity
+        calls. Callers serialize commits touching the same document (the write coordinator
+        holds its per-collection locks while committing). read_versions are the storage
+        versions the whole documents were read at: a document changed since by another writer
+        raises WriteConflict before anything is written. Multi-document commits check all of
+        them first and then write unconditionally, as object stores offer no multi-object
+        conditional write.
+        """
+        entity_ops = entity_ops or {}
+        file_names = sorted({*documents, *entity_ops})
+        if not file_names:
+            return
+        read_versions = read_versions or {}
+        previous = self._previous_documents(file_names)
+        if len(file_names) == 1:
+            with self._lock:
+                self._preserve(file_names, previous)
+                self.version += 1
+                version = self.version
+            # A conditional write that fails leaves a version number unused, nothing else
+            self._apply(version, documents, entity_ops, read_versions)
+            with self._lock:
+                self.stats['commits'] += 1
+            return
+
+        self.storage.check_versions({f: read_versions[f] for f in documents if read_versions.get(f) is not None})
+        # Readers must not pin a version between the first and the last document write
+        with self._lock:
+            self._preserve(file_names, previous)
+            version = self.version + 1
+            if self.pending_path:
+                record = {
+                    'version': version,
+                    'created': datetime.now().isoformat(),
+                    'documents': documents,
+                    # Entity changes by content: rolled forward by value, as handles may not survive a restart
+                    'entity_ops': {file_name: [{'op': op.op, 'list_path': op.list_path, 'entity': op.entity,
+                                                'previous': op.previous} for op in ops]
+                                   for file_name, ops in entity_ops.items()},
+                }
+                atomic_write_bytes(self.pending_path, json_codec.dumps(record))
+            self._apply(version, documents, entity_ops)
+            if self.pending_path:
+                os.remove(self.pending_path)
+            self.version = version
+            self.stats['commits'] += 1
+            self.stats['multi_document_commits'] += 1
+        logger.info(f"Committed version {version}: {', '.join(file_names)}")
+
+    def _apply(self, version: int, documents: Dict[str, Any], entity_ops: Dict[str, List[EntityOp]],
+               read_versions: Optional[Dict[str, Optional[str]]] = None):
+        for file_name in sorted({*documents, *entity_ops}):
+            if self.history is not None:
+                self.history.ensure_base(file_name, version - 1, lambda: self.storage.read_document(file_name))
+            if file_name in entity_ops:
+                self.storage.apply_entity_ops(file_name, entity_ops[file_name])
+                if self.history is not None:
+                    self.history.record_entity_ops(file_name, version, entity_ops[file_name],
+                                                   lambda: self.storage.read_document(file_name))
+                continue
+            if read_versions and read_versions.get(file_name) is not None:
+                self.storage.write_versioned(file_name, documents[file_name], read_versions[file_name])
+            else:
+                self.storage.write_document(file_name, documents[file_name])
+            if self.history is not None:
+                self.history.record(file_name, version, documents[file_name])
+
+    def recover(self):
+        """Roll forward a multi-document commit interrupted by a crash."""
+        if not self.pending_path or not os.path.exists(self.pending_path):
+            return
+        try:
+            with open(self.pending_path, 'rb') as f:
+                record = json_codec.loads(f.read())
+        except ValueError as e:
+            # The record is written atomically, so this is not a torn write; leave it for inspection
+            logger.error(f"Unreadable commit record {self.pending_path}: {e}")
+            return
+        documents = dict(record['documents'])
+        for file_name, ops in record.get('entity_ops', {}).items():
+            # Located by content and skipped where already applied, then written whole
+            try:
+                document = self.storage.read_document(file_name)
+            except FileNotFoundError:
+                document = None
+            ops = [EntityOp(op['op'], op['list_path'], None, op['entity'], op['previous']) for op in ops]
+            documents[file_name] = apply_patch(document, entity_ops_patch(document, ops, by_value=True, skip_applied=True))
+        logger.warning(f"Rolling forward interrupted commit {record.get('version')}: {', '.join(sorted(documents))}")
+        self._apply(record['version'], documents, {})
+        os.remove(self.pending_path)
+        self.version = max(self.version, record['version'])
+        self.stats['recovered_commits'] += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            live = sum(1 for s in self._snapshots if s.version is not None)
+        stats = {'version': self.version, 'pinned_snapshots': live, **self.stats}
+        if self.history is not None:
+            stats['history'] = self.history.get_stats()
+        return stats
@@ -0,0 +1,188 @@
+"""
+Cache tiers in front of a remote document store (see storage_gateway.py).
+L1 is an in-process LRU of parsed documents bounded by a byte budget (the size of their encoded
+bodies). L2 keeps each document's raw bytes and validator (ETag, or Last-Modified) on local
+disk, so a restarted replica or a new worker starts with the documents it had and only has to
+revalidate them with the origin instead of downloading everything again.
+"""
+
+import hashlib
+import logging
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from . import json_codec
+from .storage_engine import atomic_write_bytes
+
+logger = logging.getLogger(__name__)
+
+
+def _ratio(hits: int, misses: int) -> float:
+    return round(hits / (hits + misses), 3) if hits + misses else 0
+
+
+class CachedDocument:
+    """A parsed document in L1 with its version and when the origin last confirmed it."""
+
+    __slots__ = ('document', 'version', 'checked', 'size')
+
+    def __init__(self, document: Any, version: Optional[str], checked: float, size: int):
+        self.document = document
+        self.version = version
+        self.checked = checked
+        self.size = size
+
+
+class MemoryTier:
+    """LRU of parsed documents; the least recently used are dropped beyond budget_bytes."""
+
+    name = 'memory'
+
+    def __init__(self, budget_bytes: int):
+        self.budget_bytes = budget_bytes
+        self._entries: 'OrderedDict[str, CachedDocument]' = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+
+    def get(self, key: str) -> Optional[CachedDocument]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.stats['misses'] += 1
+                return None
+            self._entries.move_to_end(key)
+            self.stats['hits'] += 1
+            return entry
+
+    def peek(self, key: str) -> Optional[CachedDocument]:
+        """The entry without counting a lookup or refreshing its recency."""
+        with self._lock:
+            return self._entries.get(key)
+
+    def put(self, key: str, entry: CachedDocument):
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous.size
+            if entry.size > self.budget_bytes:
+                # Larger than the whole budget: served from L2 / the origin only
+                return
+            self._entries[key] = entry
+            self._bytes += entry.size
+            while self._bytes > self.budget_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= evicted.size
+                self.stats['evictions'] += 1
+
+    def discard(self, key: Optional[str] = None):
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+                self._bytes = 0
+            else:
+                entry = self._entries.pop(key, None)
+                if entry is not None:
+                    self._bytes -= entry.size
+
+    def expire(self):
+        """Make every entry due for revalidation on its next read."""
+        with self._lock:
+            for entry in self._entries.values():
+                entry.checked = float('-inf')
+
+    def versions(self) -> Dict[str, Optional[str]]:
+        with self._lock:
+            return {key: entry.version for key, entry in self._entries.items()}
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self.stats)
+            stats['entries'] = len(self._entries)
+            stats['bytes'] = self._bytes
+        stats['budget_bytes'] = self.budget_bytes
+        stats['hit_ratio'] = _ratio(stats['hits'], stats['misses'])
+        return stats
+
+
+class DiskTier:
+    """Raw document bytes plus their validator under a directory private to one origin.
+
+    Each document is two files written atomically: <name>.body and <name>.meta (JSON with the
+    key and version). A body without readable metadata is treated as missing.
+    """
+
+    name = 'disk'
+
+    def __init__(self, root: str, origin: str):
+        # One directory per origin, so switching bucket or repository never serves the old one's files
+        self.directory = os.path.join(root, hashlib.sha1(origin.encode('utf-8')).hexdigest()[:16])
+        self.origin = origin
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'writes': 0, 'errors': 0}
+
+    def _paths(self, key: str) -> Tuple[str, str]:
+        name = hashlib.sha1(key.encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, name + '.body'), os.path.join(self.directory, name + '.meta')
+
+    def _count(self, key: str):
+        with self._lock:
+            self.stats[key] += 1
+
+    def get(self, key: str) -> Optional[Tuple[bytes, Optional[str]]]:
+        """(body, version) stored for key, or None."""
+        body_path, meta_path = self._paths(key)
+        try:
+            with open(meta_path, 'rb') as f:
+                meta = json_codec.loads(f.read())
+            with open(body_path, 'rb') as f:
+                body = f.read()
+        except FileNotFoundError:
+            self._count('misses')
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable disk cache entry for {key}: {e}")
+            self._count('errors')
+            return None
+        if meta.get('key') != key or meta.get('size') != len(body):
+            # Torn pair (a crash between the two writes) or a hash collision
+            self._count('misses')
+            return None
+        self._count('hits')
+        return body, meta.get('version')
+
+    def put(self, key: str, body: bytes, version: Optional[str]):
+        body_path, meta_path = self._paths(key)
+        try:
+            atomic_write_bytes(body_path, body)
+            atomic_write_bytes(meta_path, json_codec.dumps({'key': key, 'version': version, 'size': len(body)}))
+            self._count('writes')
+        except OSError as e:
+            # The disk tier is an optimization; a full or read-only disk must not fail the read
+            logger.warning(f"Could not write disk cache entry for {key}: {e}")
+            self._count('errors')
+
+    def discard(self, key: Optional[str] = None):
+        paths = [p for k in ([key] if key is not None else []) for p in self._paths(k)]
+        if key is None and os.path.isdir(self.directory):
+            paths = [os.path.join(self.directory, name) for name in os.listdir(self.directory)]
+        for path in paths:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self.stats)
+        entries = size = 0
+        if os.path.isdir(self.directory):
+            for entry in os.scandir(self.directory):
+                if entry.name.endswith('.body'):
+                    entries += 1
+                    size += entry.stat().st_size
+        stats.update(entries=entries, bytes=size, directory=self.directory,
+                     hit_ratio=_ratio(stats['hits'], stats['misses']))
+        return stats
@@ -0,0 +1,156 @@
+"""
+Request-scoped unit of work over the catalog collections.
+A request reads each collection at most once (from its catalog snapshot) and every caller in
+the request shares that document. Changes are staged as mutations and flushed together: one
+collection through the write coordinator's group commit, several as one transaction.
+"""
+
+import threading
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple, Union
+
+from .async_io import blocking_io
+from .storage_engine import entity_matches, get_entity_list
+from .storage_transactions import Snapshot
+from .write_coordinator import WriteBatch, WriteCoordinator
+
+
+class WorkStats:
+    """Totals over all finished units of work."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.stats = {
+            'units': 0,
+            'reads': 0,
+            'documents_loaded': 0,
+            'memoized_reads': 0,
+            'flushes': 0,
+            'staged_mutations': 0,
+            'collections_flushed': 0,
+        }
+
+    def add(self, counts: Dict[str, int]):
+        with self._lock:
+            self.stats['units'] += 1
+            for key, value in counts.items():
+                self.stats[key] += value
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self.stats)
+        stats['avg_documents_loaded'] = round(stats['documents_loaded'] / stats['units'], 2) if stats['units'] else 0
+        return stats
+
+
+unit_of_work_stats = WorkStats()
+
+
+class UnitOfWork:
+    """Collections read and changed while handling one request.
+
+    Offers the read side of the storage engine API (read_document, find_entities, find_entity),
+    so lookup helpers accept it in place of an engine; collections are only changed by staged
+    mutations. Documents returned by read_document() are the request's working copies: they
+    are shared by every caller in the request and are not written back unless a staged
+    mutation does so. Entity lookups are answered from the same snapshot documents, so every
+    read in the request sees one version of the catalog; the handles are only for reading.
+    """
+
+    def __init__(self, snapshot: Snapshot, coordinator: WriteCoordinator):
+        self.snapshot = snapshot
+        self.coordinator = coordinator
+        self._documents: Dict[str, Any] = {}
+        self._staged: List[Tuple[Tuple[str, ...], Callable[[WriteBatch], Any]]] = []
+        self._lock = threading.Lock()
+        self.counts = {key: 0 for key in ('reads', 'documents_loaded', 'memoized_reads', 'flushes',
+                                          'staged_mutations', 'collections_flushed')}
+
+    # -- reads -----------------------------------------------------------
+
+    def read_document(self, file_name: str) -> Any:
+        with self._lock:
+            self.counts['reads'] += 1
+            if file_name in self._documents:
+                self.counts['memoized_reads'] += 1
+                return self._documents[file_name]
+        document = self.snapshot.read_document(file_name, copy=False)
+        with self._lock:
+            self.counts['documents_loaded'] += 1
+            return self._documents.setdefault(file_name, document)
+
+    async def read_document_async(self, file_name: str) -> Any:
+        """read_document for async code: only a read that has to load the document leaves the loop."""
+        with self._lock:
+            if file_name in self._documents:
+                self.counts['reads'] += 1
+                self.counts['memoized_reads'] += 1
+                return self._documents[file_name]
+        return await blocking_io.run(self.read_document, file_name)
+
+    def find_entities(self, file_name: str, list_path: str, field: str, value: Any) -> List[Tuple[Any, Dict[str, Any]]]:
+        items = get_entity_list(self.read_document(file_name), list_path) or []
+        return [(i, item) for i, item in enumerate(items) if entity_matches(item, field, value)]
+
+    def find_entity(self, file_name: str, list_path: str, field: str, value: Any) -> Optional[Tuple[Any, Dict[str, Any]]]:
+        matches = self.find_entities(file_name, list_path, field, value)
+        return matches[0] if matches else None
+
+    # -- writes ----------------------------------------------------------
+
+    @property
+    def dirty(self) -> List[str]:
+        """Collections with staged mutations, in staging order."""
+        return list(dict.fromkeys(file_name for file_names, _ in self._staged for file_name in file_names))
+
+    def stage(self, file_names: Union[str, Iterable[str]], mutation: Callable[[WriteBatch], Any]):
+        """Queue mutation(batch) on one or more collections for the next flush."""
+        file_names = (file_names,) if isinstance(file_names, str) else tuple(file_names)
+        self._staged.append((file_names, mutation))
+        self.counts['staged_mutations'] += 1
+
+    def _take_staged(self) -> Tuple[List[str], Optional[Callable[[WriteBatch], List[Any]]]]:
+        file_names = self.dirty
+        staged, self._staged = self._staged, []
+        if not staged:
+            return [], None
+
+        def apply_all(batch: WriteBatch) -> List[Any]:
+            return [mutation(batch) for _, mutation in staged]
+        return file_names, apply_all
+
+    def _flushed(self, file_names: List[str]):
+        # Later reads in this request see what it just wrote
+        with self._lock:
+            for file_name in file_names:
+                self._documents.pop(file_name, None)
+                self.snapshot.forget(file_name)
+        self.counts['flushes'] += 1
+        self.counts['collections_flushed'] += len(file_names)
+
+    async def flush(self) -> List[Any]:
+        """Commit the staged mutations (all of them or none) and return their results in order."""
+        file_names, apply_all = self._take_staged()
+        if apply_all is None:
+            return []
+        try:
+            if len(file_names) == 1:
+                return await self.coordinator.mutate(file_names[0], apply_all)
+            return await self.coordinator.transaction(file_names, apply_all)
+        finally:
+            self._flushed(file_names)
+
+    def flush_sync(self) -> List[Any]:
+        """flush() for code running in a worker thread."""
+        file_names, apply_all = self._take_staged()
+        if apply_all is None:
+            return []
+        try:
+            if len(file_names) == 1:
+                return self.coordinator.mutate_sync(file_names[0], apply_all)
+            return self.coordinator.transaction_sync(file_names, apply_all)
+        finally:
+            self._flushed(file_names)
+
+    def close(self):
+        self.snapshot.close()
+        unit_of_work_stats.add(self.counts)
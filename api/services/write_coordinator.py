@@ -0,0 +1,510 @@
+"""
+Serialized, group-committed writes to the catalog collections.
+Every read-modify-write of a collection goes through WriteCoordinator.mutate(). Mutations of
+one collection run one at a time against a write batch; mutations queued while a write is in
+progress are applied together and persisted with a single commit. On engines that write
+single entities the batch records entity changes and the commit replays just those;
+otherwise the document is loaded once and written back whole.
+WriteCoordinator.transaction() applies one mutation to several collections and commits them
+together. Writes are conditional on the storage version the documents were read at; when
+another writer (an API replica sharing the bucket) changed one in between, the documents are
+read again and the mutations re-applied.
+"""
+
+import asyncio
+import logging
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple, Union
+
+from . import json_codec
+from .storage_engine import EntityOp, ReadOnlyStorage, StorageEngine, WriteConflict, entity_matches, get_entity_list
+from .storage_transactions import TransactionManager
+
+logger = logging.getLogger(__name__)
+
+
+def _clone(value: Any) -> Any:
+    return json_codec.clone(value)
+
+
+class _WholeDocumentAccess(BaseException):
+    """A batch read or wrote a whole document it was staging entity changes for.
+
+    A BaseException, so a mutation's own except clauses do not swallow it; the coordinator
+    runs the batch again with that document loaded whole.
+    """
+
+    def __init__(self, file_name: str):
+        super().__init__(file_name)
+        self.file_name = file_name
+
+
+class _Appended:
+    """Handle of an entity appended by a batch, until the commit gives it a storage handle."""
+
+    __slots__ = ()
+
+    def __repr__(self) -> str:
+        return '<appended entity>'
+
+
+_MISSING = object()
+
+
+class WriteBatch(StorageEngine):
+    """The changes a batch of mutations makes to its collections.
+
+    Offers the storage engine API, so mutation functions use the same calls as code running
+    against the engine directly. Where the engine writes single entities (entity_writes()),
+    entity calls are answered by the engine's own lookups and staged as entity changes that
+    the commit replays; handles are the engine's. A collection read or written whole is
+    loaded once for the batch and written back whole; handles are then list indexes. Changes
+    are recorded so a mutation that raises can be undone without affecting the others in its
+    batch.
+    """
+
+    name = 'batch'
+
+    def __init__(self, storage: StorageEngine, file_names: Union[str, Iterable[str]],
+                 whole_documents: Iterable[str] = ()):
+        self.storage = storage
+        self.file_names = (file_names,) if isinstance(file_names, str) else tuple(file_names)
+        self.whole_documents = set(whole_documents)
+        self.documents: Dict[str, Any] = {}
+        # Storage version each document was read at, for the conditional write
+        self.read_versions: Dict[str, Optional[str]] = {}
+        # Staged entity changes, and the current content of every entity the batch has seen
+        self.entity_changes: Dict[str, List[EntityOp]] = {}
+        self._entities: Dict[Tuple[str, str, Any], Dict[str, Any]] = {}
+        self._deleted: set = set()
+        self._touched: Dict[Tuple[str, str, Any], None] = {}
+        self._modes: Dict[str, bool] = {}
+        self._undo: List[Tuple[str, Callable[[], None]]] = []
+
+    def _check(self, file_name: str):
+        if file_name not in self.file_names:
+            raise ValueError(f"Write batch for {', '.join(self.file_names)} cannot access {file_name}")
+
+    def _stages_entities(self, file_name: str) -> bool:
+        """Whether entity calls on file_name are staged as entity changes (fixed by the first call)."""
+        staged = self._modes.get(file_name)
+        if staged is None:
+            self._check(file_name)
+            staged = self._modes[file_name] = (file_name not in self.whole_documents
+                                               and self.storage.entity_writes(file_name))
+        return staged
+
+    def _document(self, file_name: str) -> Any:
+        self._check(file_name)
+        if self._modes.setdefault(file_name, False):
+            raise _WholeDocumentAccess(file_name)
+        if file_name not in self.documents:
+            try:
+                self.documents[file_name], self.read_versions[file_name] = self.storage.read_versioned(file_name)
+            except FileNotFoundError:
+                # Mutations may create the document; read_document() raises until one does
+                self.documents[file_name] = None
+        return self.documents[file_name]
+
+    def _items(self, file_name: str, list_path: str, create: bool = False) -> List[Dict[str, Any]]:
+        items = get_entity_list(self._document(file_name), list_path, create=create)
+        return items if items is not None else []
+
+    @property
+    def dirty(self) -> bool:
+        return bool(self._undo)
+
+    def changed_documents(self) -> Dict[str, Any]:
+        """The whole documents this batch has changed, by file name."""
+        return {file_name: self.documents[file_name]
+                for file_name in dict.fromkeys(f for f, _ in self._undo) if file_name in self.documents}
+
+    def entity_ops(self) -> Dict[str, List[EntityOp]]:
+        """The entity changes this batch has staged, by file name."""
+        return {file_name: list(ops) for file_name, ops in self.entity_changes.items() if ops}
+
+    def _changed(self, file_name: str, undo: Callable[[], None]):
+        self._undo.append((file_name, undo))
+
+    def _stage(self, file_name: str, op: EntityOp, key: Tuple[str, str, Any]):
+        ops = self.entity_changes.setdefault(file_name, [])
+        prior = (self._entities.get(key, _MISSING), key in self._deleted, key in self._touched)
+        ops.append(op)
+        if op.op == 'delete':
+            self._deleted.add(key)
+        else:
+            self._entities[key] = op.entity
+            self._touched[key] = None
+
+        def undo():
+            ops.pop()
+            entity, deleted, touched = prior
+            if entity is _MISSING:
+                self._entities.pop(key, None)
+            else:
+                self._entities[key] = entity
+            if not deleted:
+                self._deleted.discard(key)
+            if not touched:
+                self._touched.pop(key, None)
+        self._changed(file_name, undo)
+
+    def _current(self, file_name: str, list_path: str, handle: Any) -> Dict[str, Any]:
+        key = (file_name, list_path, handle)
+        if key in self._deleted or key not in self._entities:
+            raise KeyError(f"Entity {handle} not found in {file_name}:{list_path} (use a handle found through this batch)")
+        return self._entities[key]
+
+    def _staged_ops(self, file_name: str, list_path: str) -> List[EntityOp]:
+        return [op for op in self.entity_changes.get(file_name, ()) if op.list_path == list_path]
+
+    def read_document(self, file_name: str) -> Any:
+        document = self._document(file_name)
+        if document is None:
+            raise FileNotFoundError(file_name)
+        return _clone(document)
+
+    def write_document(self, file_name: str, data: Any):
+        previous = self._document(file_name)
+        self.documents[file_name] = data
+
+        def undo():
+            self.documents[file_name] = previous
+        self._changed(file_name, undo)
+
+    def find_entities(self, file_name: str, list_path: str, field: str, value: Any) -> List[Tuple[Any, Dict[str, Any]]]:
+        if not self._stages_entities(file_name):
+            return [(i, _clone(item)) for i, item in enumerate(self._items(file_name, list_path))
+                    if entity_matches(item, field, value)]
+        try:
+            found = self.storage.find_entities(file_name, list_path, field, value)
+        except FileNotFoundError:
+            found = []
+        matches, seen = [], set()
+        for handle, entity in found:
+            key = (file_name, list_path, handle)
+            seen.add(key)
+            if key in self._deleted:
+                continue
+            current = self._entities.setdefault(key, entity)
+            if current is entity or entity_matches(current, field, value):
+                matches.append((handle, _clone(current)))
+        # Entities this batch changed or added so that they match now
+        for key in self._touched:
+            if key[:2] == (file_name, list_path) and key not in seen and key not in self._deleted:
+                if entity_matches(self._entities[key], field, value):
+                    matches.append((key[2], _clone(self._entities[key])))
+        return matches
+
+    def entity_ids(self, file_name: str, list_path: str, prefix: str = '') -> List[Any]:
+        if not self._stages_entities(file_name):
+            ids = [item.get('id') for item in self._items(file_name, list_path) if item.get('id') is not None]
+            return [i for i in ids if str(i).startswith(prefix)] if prefix else ids
+        try:
+            ids = self.storage.entity_ids(file_name, list_path, prefix)
+        except FileNotFoundError:
+            ids = []
+        for op in self._staged_ops(file_name, list_path):
+            for entity, add in ((op.previous, False), (op.entity, True)):
+                entity_id = entity.get('id') if entity is not None else None
+                if entity_id is None or not str(entity_id).startswith(prefix):
+                    continue
+                if add:
+                    ids.append(entity_id)
+                elif entity_id in ids:
+                    ids.remove(entity_id)
+        return ids
+
+    def max_int_id(self, file_name: str, list_path: str) -> int:
+        if not self._stages_entities(file_name):
+            return super().max_int_id(file_name, list_path)
+        try:
+            largest = self.storage.max_int_id(file_name, list_path)
+        except FileNotFoundError:
+            largest = 0
+        # Ids freed by staged deletes are not reused, so the staged entities can only raise it
+        for op in self._staged_ops(file_name, list_path):
+            entity_id = op.entity.get('id') if op.entity is not None else None
+            if isinstance(entity_id, int) and not isinstance(entity_id, bool):
+                largest = max(largest, entity_id)
+        return largest
+
+    def append_entity(self, file_name: str, list_path: str, entity: Dict[str, Any]) -> Any:
+        if not self._stages_entities(file_name):
+            items = self._items(file_name, list_path, create=True)
+            items.append(_clone(entity))
+            self._changed(file_name, items.pop)
+            return len(items) - 1
+        handle = _Appended()
+        self._stage(file_name, EntityOp('append', list_path, handle, _clone(entity)), (file_name, list_path, handle))
+        return handle
+
+    def replace_entity(self, file_name: str, list_path: str, handle: Any, entity: Dict[str, Any]):
+        if not self._stages_entities(file_name):
+            items = self._items(file_name, list_path)
+            previous = items[handle]
+            items[handle] = _clone(entity)
+
+            def undo():
+                items[handle] = previous
+            self._changed(file_name, undo)
+            return
+        previous = self._current(file_name, list_path, handle)
+        self._stage(file_name, EntityOp('replace', list_path, handle, _clone(entity), previous),
+                    (file_name, list_path, handle))
+
+    def delete_entity(self, file_name: str, list_path: str, handle: Any):
+        if not self._stages_entities(file_name):
+            items = self._items(file_name, list_path)
+            previous = items.pop(handle)
+            self._changed(file_name, lambda: items.insert(handle, previous))
+            return
+        previous = self._current(file_name, list_path, handle)
+        self._stage(file_name, EntityOp('delete', list_path, handle, None, previous), (file_name, list_path, handle))
+
+    def apply(self, mutation: Callable[['WriteBatch'], Any]) -> Any:
+        """Run one mutation; if it raises, its changes are rolled back before re-raising."""
+        mark = len(self._undo)
+        try:
+            return mutation(self)
+        except BaseException:
+            while len(self._undo) > mark:
+                self._undo.pop()[1]()
+            raise
+
+
+class _CollectionQueue:
+    def __init__(self):
+        self.guard = threading.Lock()
+        self.pending: List[Tuple[Callable[[WriteBatch], Any], Future]] = []
+        self.flushing = False
+        # Held while the collection is loaded, mutated and written (by its writer or a transaction)
+        self.commit_lock = threading.Lock()
+
+
+class WriteCoordinator:
+    """Per-collection write queue with group commit on top of a storage engine.
+
+    The first mutation queued for an idle collection starts a writer on the coordinator's thread
+    pool; it drains the queue batch by batch until it is empty. Works from any thread or event
+    loop (results are delivered through concurrent futures). With a transaction manager, writes
+    are published through it so snapshot readers never see a partial transaction.
+    """
+
+    def __init__(self, storage: StorageEngine, transactions: Optional[TransactionManager] = None,
+                 max_writers: int = 4, conflict_retries: int = 3):
+        self.storage = storage
+        self.transactions = transactions
+        self.conflict_retries = conflict_retries
+        self._queues: Dict[str, _CollectionQueue] = {}
+        self._queues_lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_writers, thread_name_prefix='storage-writer')
+        self._stats_lock = threading.Lock()
+        self.stats = {
+            'mutations': 0,
+            'failed_mutations': 0,
+            'transactions': 0,
+            'batches': 0,
+            'writes': 0,
+            'max_batch_size': 0,
+            'write_time_ms': 0.0,
+            'conflicts': 0,
+            'conflict_retries': 0,
+        }
+
+    def _queue(self, file_name: str) -> _CollectionQueue:
+        with self._queues_lock:
+            queue = self._queues.get(file_name)
+            if queue is None:
+                queue = self._queues[file_name] = _CollectionQueue()
+            return queue
+
+    def submit(self, file_name: str, mutation: Callable[[WriteBatch], Any]) -> Future:
+        """Queue mutation(batch) for a collection; the future resolves once its batch is written."""
+        future: Future = Future()
+        if not self.storage.writable:
+            future.set_exception(ReadOnlyStorage(file_name))
+            return future
+        queue = self._queue(file_name)
+        with queue.guard:
+            queue.pending.append((mutation, future))
+            start_writer = not queue.flushing
+            queue.flushing = True
+        if start_writer:
+            self._executor.submit(self._drain, file_name, queue)
+        return future
+
+    async def mutate(self, file_name: str, mutation: Callable[[WriteBatch], Any]) -> Any:
+        """Apply mutation to a collection and return its result once persisted (raises what it raised)."""
+        return await asyncio.wrap_future(self.submit(file_name, mutation))
+
+    def mutate_sync(self, file_name: str, mutation: Callable[[WriteBatch], Any]) -> Any:
+        """Blocking mutate() for code running in a worker thread."""
+        return self.submit(file_name, mutation).result()
+
+    def submit_transaction(self, file_names: Iterable[str], mutation: Callable[[WriteBatch], Any]) -> Future:
+        """Run mutation(batch) over several collections; all of its changes are committed together or not at all."""
+        file_names = sorted(set(file_names))
+        if not self.storage.writable:
+            future: Future = Future()
+            future.set_exception(ReadOnlyStorage(', '.join(file_names)))
+            return future
+        return self._executor.submit(self._transaction, file_names, mutation)
+
+    async def transaction(self, file_names: Iterable[str], mutation: Callable[[WriteBatch], Any]) -> Any:
+        """Apply mutation to several collections atomically and return its result once persisted."""
+        return await asyncio.wrap_future(self.submit_transaction(file_names, mutation))
+
+    def transaction_sync(self, file_names: Iterable[str], mutation: Callable[[WriteBatch], Any]) -> Any:
+        """Blocking transaction() for code running in a worker thread."""
+        return self.submit_transaction(file_names, mutation).result()
+
+    def _write(self, batch: WriteBatch):
+        documents = batch.changed_documents()
+        entity_ops = batch.entity_ops()
+        if self.transactions is not None:
+            self.transactions.commit(documents, batch.read_versions, entity_ops)
+        else:
+            for file_name, document in documents.items():
+                self.storage.write_versioned(file_name, document, batch.read_versions.get(file_name))
+            for file_name, ops in entity_ops.items():
+                self.storage.apply_entity_ops(file_name, ops)
+
+    def _retry_conflict(self, attempt: int, error: WriteConflict) -> bool:
+        """Whether to re-read and re-apply after a write lost to a concurrent writer."""
+        with self._stats_lock:
+            self.stats['conflicts'] += 1
+            if attempt >= self.conflict_retries:
+                return False
+            self.stats['conflict_retries'] += 1
+        logger.warning(f"{error}; re-applying ({attempt + 1}/{self.conflict_retries})")
+        return True
+
+    def _transaction(self, file_names: List[str], mutation: Callable[[WriteBatch], Any]) -> Any:
+        queues = [self._queue(file_name) for file_name in file_names]
+        # Sorted lock order, so transactions over overlapping collections cannot deadlock
+        for queue in queues:
+            queue.commit_lock.acquire()
+        try:
+            attempt = 0
+            whole_documents = set()
+            while True:
+                batch = WriteBatch(self.storage, file_names, whole_documents)
+                try:
+                    result = batch.apply(mutation)
+                except _WholeDocumentAccess as e:
+                    whole_documents.add(e.file_name)
+                    continue
+                except BaseException:
+                    with self._stats_lock:
+                        self.stats['failed_mutations'] += 1
+                    raise
+                started = time.perf_counter()
+                changed = batch.dirty
+                try:
+                    if changed:
+                        self._write(batch)
+                    break
+                except WriteConflict as e:
+                    if not self._retry_conflict(attempt, e):
+                        with self._stats_lock:
+                            self.stats['failed_mutations'] += 1
+                        raise
+                    attempt += 1
+            with self._stats_lock:
+                self.stats['mutations'] += 1
+                self.stats['transactions'] += 1
+                self.stats['writes'] += 1 if changed else 0
+                self.stats['write_time_ms'] += (time.perf_counter() - started) * 1000
+            return result
+        finally:
+            for queue in reversed(queues):
+                queue.commit_lock.release()
+
+    def _drain(self, file_name: str, queue: _CollectionQueue):
+        while True:
+            with queue.guard:
+                batch = queue.pending
+                queue.pending = []
+                if not batch:
+                    queue.flushing = False
+                    return
+            with queue.commit_lock:
+                self._commit(file_name, batch)
+
+    def _commit(self, file_name: str, batch: List[Tuple[Callable[[WriteBatch], Any], Future]]):
+        attempt = 0
+        whole_documents = set()
+        while True:
+            try:
+                documents = WriteBatch(self.storage, file_name, whole_documents)
+            except BaseException as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                return
+
+            outcomes = []
+            restart = False
+            for mutation, future in batch:
+                try:
+                    outcomes.append((future, documents.apply(mutation), None))
+                except _WholeDocumentAccess:
+                    # A mutation needs the whole document: run the batch again with it loaded
+                    whole_documents.add(file_name)
+                    restart = True
+                    break
+                except BaseException as e:
+                    outcomes.append((future, None, e))
+            if restart:
+                continue
+
+            write_error = None
+            write_ms = 0.0
+            if documents.dirty:
+                started = time.perf_counter()
+                try:
+                    self._write(documents)
+                except WriteConflict as e:
+                    if self._retry_conflict(attempt, e):
+                        attempt += 1
+                        continue
+                    write_error = e
+                except BaseException as e:
+                    logger.error(f"Error writing {file_name}: {str(e)}")
+                    write_error = e
+                write_ms = (time.perf_counter() - started) * 1000
+            break
+
+        failed = 0
+        for future, result, error in outcomes:
+            error = error or write_error
+            if error is not None:
+                failed += 1
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+        with self._stats_lock:
+            self.stats['mutations'] += len(batch)
+            self.stats['failed_mutations'] += failed
+            self.stats['batches'] += 1
+            self.stats['writes'] += 1 if documents.dirty else 0
+            self.stats['max_batch_size'] = max(self.stats['max_batch_size'], len(batch))
+            self.stats['write_time_ms'] += write_ms
+        if len(batch) > 1:
+            logger.info(f"Group commit: {len(batch)} mutations of {file_name} in one write")
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            stats = dict(self.stats)
+        stats['avg_batch_size'] = round(stats['mutations'] / stats['batches'], 2) if stats['batches'] else 0
+        stats['write_time_ms'] = round(stats['write_time_ms'], 2)
+        with self._queues_lock:
+            queues = list(self._queues.items())
+        stats['queued'] = {name: len(queue.pending) for name, queue in queues if queue.pending}
+        return stats
+
+    def close(self):
+        self._executor.shutdown(wait=True)
@@ -7,6 +7,7 @@ Usage: python test_s3_connection.py
 import os
 import logging
 from dotenv import load_dotenv
+from services import s3_client
 from services.s3_service import S3Service
 from config import Config
 
@@ -180,6 +181,10 @@ def main():
         print("   Your API may be read-only")
         print("   Check your IAM permissions")
     
+    stats = s3_client.get_stats()
+    print(f"\n📈 S3 client: {stats['calls']} calls, {stats['retries']} retries, {stats['throttles']} throttled, "
+          f"avg {stats['avg_ms']} ms (pool {stats['max_pool_connections']}, {stats['retry_mode']} retries)")
+    
     print("\n🎉 S3 integration test completed successfully!")
     print("\nNext steps:")
     print("1. Your S3 configuration is working correctly")
@@ -0,0 +1,28 @@
+#!/usr/bin/env python3
+"""
+Search regression tests over the local _data catalog
+Usage: python -m pytest test_search.py
+"""
+
+import pytest
+
+from services.search_analyzer import build_analyzer
+from services.search_service import SearchService
+
+
+@pytest.fixture(scope='module')
+def search():
+    service = SearchService()
+    assert service.build_index()
+    return service
+
+
+def test_acronym_it_is_not_a_stop_word():
+    assert 'it' in build_analyzer().terms("IT systems and infrastructure")
+
+
+def test_search_for_it_finds_it_documents(search):
+    # "IT infrastructure and service management model", ...
+    page = search.search_page('IT', limit=50)
+    assert page['total'] > 0
+    assert {hit['_search_type'] for hit in page['results']} >= {'models', 'policies'}
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Tests of the S3 read-through cache (services/storage_gateway.py) against moto's mock S3
+Usage: pip install -r requirements-dev.txt && python -m pytest test_storage_gateway.py
+"""
+
+import json
+import os
+import time
+
+import pytest
+from moto import mock_aws
+
+os.environ.update(S3_BUCKET_NAME='catalog-test', AWS_ACCESS_KEY_ID='testing',
+                  AWS_SECRET_ACCESS_KEY='testing', AWS_REGION='us-east-1')
+
+from services import s3_client
+from services.s3_service import S3Service
+from services.storage_engine import WriteConflict
+from services.storage_gateway import CachedDocumentStorageEngine, S3DocumentStore
+
+TTL = 0.2
+DOCUMENT = {'models': [{'id': 1, 'shortName': 'CUST', 'description': 'Customer'}]}
+
+
+@pytest.fixture
+def bucket():
+    """A mock bucket holding dataModels.json; yields the S3 client (with a count of calls by operation)."""
+    with mock_aws():
+        # Clients are shared per process; make one inside the mock
+        s3_client._clients.clear()
+        client = S3Service().s3_client
+        client.create_bucket(Bucket='catalog-test')
+        client.put_object(Bucket='catalog-test', Key='dataModels.json', Body=json.dumps(DOCUMENT).encode())
+        client.calls = {}
+        client.meta.events.register('before-call.s3.*', lambda model, **kwargs: client.calls.__setitem__(
+            model.name, client.calls.get(model.name, 0) + 1))
+        yield client
+        s3_client._clients.clear()
+
+
+def _engine() -> CachedDocumentStorageEngine:
+    return CachedDocumentStorageEngine(S3DocumentStore(S3Service()), TTL)
+
+
+def test_reads_within_ttl_make_no_gets(bucket):
+    engine = _engine()
+    assert engine.read_document('dataModels.json') == DOCUMENT
+    assert bucket.calls.get('GetObject') == 1
+    for _ in range(20):
+        assert engine.read_document('dataModels.json') == DOCUMENT
+    assert bucket.calls.get('GetObject') == 1
+
+
+def test_revalidation_is_not_modified(bucket):
+    engine = _engine()
+    engine.read_document('dataModels.json')
+    time.sleep(TTL * 1.5)
+    assert engine.read_document('dataModels.json') == DOCUMENT
+    # One conditional GET (If-None-Match) answered 304, nothing downloaded again
+    assert bucket.calls.get('GetObject') == 2
+    assert engine.store.s3.cache_stats['not_modified'] == 1
+    assert engine.store.s3.cache_stats['downloads'] == 1
+
+
+def test_second_engine_sees_write_after_ttl(bucket):
+    first, second = _engine(), _engine()
+    assert second.read_document('dataModels.json') == DOCUMENT
+    changed = {'models': [dict(DOCUMENT['models'][0], description='Changed by the first engine')]}
+    first.write_document('dataModels.json', changed)
+    assert bucket.calls.get('PutObject') == 1
+    time.sleep(TTL * 1.5)
+    assert second.read_document('dataModels.json') == changed
+
+
+def test_write_with_stale_etag_conflicts(bucket):
+    first, second = _engine(), _engine()
+    document, version = second.read_versioned('dataModels.json')
+    first.write_document('dataModels.json', {'models': []})
+    document['models'][0]['description'] = 'Stale write'
+    with pytest.raises(WriteConflict):
+        second.write_versioned('dataModels.json', document, version)
+    assert json.loads(bucket.get_object(Bucket='catalog-test', Key='dataModels.json')['Body'].read()) == {'models': []}
@@ -33,8 +33,9 @@ import { useNavigate } from 'react-router-dom';
 import { globalSearch, getSearchSuggestions, getSearchStats } from '../services/api';
 import {
   getSearchResultPath,
-  getSearchResultTitle,
   getSearchResultDescription,
+  getSearchResultDescriptionHighlight,
+  getSearchResultTitleHighlight,
   getSearchTypeLabel,
 } from '../utils/catalogSearchNavigation';
 
@@ -197,6 +198,27 @@ const GlobalSearch = ({ open, onClose }) => {
     }
   };
 
+  const markStyle = {
+    backgroundColor: darkMode ? '#ffd54f' : '#ffeb3b',
+    color: '#000',
+    padding: '0 2px',
+    borderRadius: '2px'
+  };
+
+  // Render a server-side highlight ({ snippet, offsets: [[start, end], ...] }).
+  const renderHighlight = ({ snippet, offsets }) => {
+    if (!offsets || offsets.length === 0) return snippet;
+    const parts = [];
+    let cursor = 0;
+    offsets.forEach(([start, end], index) => {
+      if (start > cursor) parts.push(snippet.slice(cursor, start));
+      parts.push(<mark key={index} style={markStyle}>{snippet.slice(start, end)}</mark>);
+      cursor = end;
+    });
+    if (cursor < snippet.length) parts.push(snippet.slice(cursor));
+    return parts;
+  };
+
   const highlightText = (text, query) => {
     if (!query || !text || typeof text !== 'string') return text;
     
@@ -207,15 +229,7 @@ const GlobalSearch = ({ open, onClose }) => {
     
     return parts.map((part, index) => 
       regex.test(part) ? (
-        <mark 
-          key={index} 
-          style={{ 
-            backgroundColor: darkMode ? '#ffd54f' : '#ffeb3b',
-            color: darkMode ? '#000' : '#000',
-            padding: '0 2px',
-            borderRadius: '2px'
-          }}
-        >
+        <mark key={index} style={markStyle}>
           {part}
         </mark>
       ) : part
@@ -358,7 +372,8 @@ const GlobalSearch = ({ open, onClose }) => {
             <List>
               {results.map((item, index) => {
                 const type = item._search_type;
-                const title = getSearchResultTitle(item);
+                const titleHighlight = getSearchResultTitleHighlight(item);
+                const descriptionHighlight = getSearchResultDescriptionHighlight(item);
                 const description = getSearchResultDescription(item);
                 const score = item._search_score;
                 const matchedTerms = item._matched_terms || [];
@@ -384,7 +399,7 @@ const GlobalSearch = ({ open, onClose }) => {
                         primary={
                           <Box display="flex" alignItems="center" gap={1}>
                             <Typography variant="subtitle1" sx={{ color: currentTheme?.text || '#000000' }}>
-                              {highlightText(title, query)}
+                              {renderHighlight(titleHighlight)}
                             </Typography>
                             <Chip
                               size="small"
@@ -413,7 +428,7 @@ const GlobalSearch = ({ open, onClose }) => {
                           <Box>
                             {description && (
                               <Typography variant="body2" sx={{ mb: 0.5, color: currentTheme?.textSecondary || '#7f8c8d' }}>
-                                {highlightText(description, query)}
+                                {descriptionHighlight ? renderHighlight(descriptionHighlight) : highlightText(description, query)}
                               </Typography>
                             )}
                             {matchedTerms.length > 0 && (
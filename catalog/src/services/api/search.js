@@ -2,12 +2,18 @@ import { getApiUrl, getAuthHeaders } from './client.js';
 
 export const globalSearch = async (query, options = {}) => {
   try {
-    const { types, limit = 50 } = options;
+    const { types, limit = 50, offset, cursor } = options;
     let url = `${getApiUrl()}/search?q=${encodeURIComponent(query)}&limit=${limit}`;
 
     if (types && types.length > 0) {
       url += `&types=${types.join(',')}`;
     }
+    // Pass data.next_cursor from the previous page to continue; offset is for direct page jumps.
+    if (cursor) {
+      url += `&cursor=${encodeURIComponent(cursor)}`;
+    } else if (offset) {
+      url += `&offset=${offset}`;
+    }
 
     const response = await fetch(url, {
       headers: getAuthHeaders(),
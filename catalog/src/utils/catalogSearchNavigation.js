@@ -6,8 +6,34 @@ export function getSearchResultTitle(item) {
   return String(item.name || item.shortName || item.title || item.term || item.id || 'Untitled');
 }
 
+const TITLE_HIGHLIGHT_FIELDS = ['name', 'displayName', 'shortName', 'title', 'term', 'id'];
+const DESCRIPTION_HIGHLIGHT_FIELDS = ['description', 'extendedDescription', 'definition'];
+
+/**
+ * Server-computed highlight for a hit (`_highlights[field]` = { snippet, offsets }), preferring
+ * the first of `fields` that has one.
+ */
+export function getSearchResultHighlight(item, fields) {
+  const highlights = item._highlights || {};
+  const field = fields.find((f) => highlights[f]);
+  return field ? highlights[field] : null;
+}
+
+export function getSearchResultTitleHighlight(item) {
+  const title = getSearchResultTitle(item);
+  const highlight = getSearchResultHighlight(item, TITLE_HIGHLIGHT_FIELDS);
+  return highlight && highlight.snippet === title ? highlight : { snippet: title, offsets: [] };
+}
+
+export function getSearchResultDescriptionHighlight(item) {
+  return getSearchResultHighlight(item, DESCRIPTION_HIGHLIGHT_FIELDS);
+}
+
 export function getSearchResultDescription(item) {
-  return String(item.description || item.extendedDescription || item.definition || item.status || '');
+  const fromDocument = item.description || item.extendedDescription || item.definition || item.status;
+  if (fromDocument) return String(fromDocument);
+  const highlight = getSearchResultDescriptionHighlight(item);
+  return highlight ? highlight.snippet : '';
 }
 
 export function getSearchTypeLabel(type) {